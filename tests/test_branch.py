@@ -15,8 +15,8 @@ from ugit.commands.checkout import checkout
 from ugit.commands.commit import commit
 from ugit.commands.config import config
 from ugit.commands.init import init
-from ugit.core.exceptions import BranchNotFoundError
-from ugit.core.repository import Repository
+from ugit.core.exceptions import BranchNotFoundError, CheckoutConflictError
+from ugit.core.repository import Index, Repository
 
 
 class TestBranchCommand(TestCase):
@@ -102,3 +102,50 @@ class TestBranchCommand(TestCase):
             head_content = f.read().strip()
 
         self.assertEqual(head_content, "ref: refs/heads/new-branch")
+
+    def test_checkout_only_touches_changed_paths(self):
+        """Test that switching branches rewrites only differing files."""
+        checkout("feature", create_branch=True)
+        with open("feature.txt", "w") as f:
+            f.write("feature only")
+        add(["feature.txt"])
+        commit("Add feature file")
+
+        checkout("main")
+        self.assertFalse(os.path.exists("feature.txt"))
+
+        with open("notes.txt", "w") as f:
+            f.write("untracked notes")
+        unchanged_inode = os.stat("test.txt").st_ino
+        unchanged_mtime = os.stat("test.txt").st_mtime
+
+        checkout("feature")
+
+        self.assertTrue(os.path.exists("feature.txt"))
+        self.assertTrue(os.path.exists("notes.txt"))
+        self.assertEqual(os.stat("test.txt").st_ino, unchanged_inode)
+        self.assertEqual(os.stat("test.txt").st_mtime, unchanged_mtime)
+
+        index_data = Index(Repository()).read()
+        self.assertEqual(set(index_data), {"test.txt", "feature.txt"})
+
+    def test_checkout_refuses_to_clobber_dirty_file(self):
+        """Test that checkout refuses to overwrite local modifications."""
+        checkout("feature", create_branch=True)
+        with open("test.txt", "w") as f:
+            f.write("Feature version")
+        add(["test.txt"])
+        commit("Change on feature")
+
+        checkout("main")
+        with open("test.txt", "w") as f:
+            f.write("Uncommitted local edit")
+
+        with pytest.raises(CheckoutConflictError) as excinfo:
+            checkout("feature")
+
+        self.assertEqual(excinfo.value.paths, ["test.txt"])
+        with open("test.txt", "r") as f:
+            self.assertEqual(f.read(), "Uncommitted local edit")
+        with open(os.path.join(".ugit", "HEAD"), "r") as f:
+            self.assertEqual(f.read().strip(), "ref: refs/heads/main")
@@ -2,10 +2,13 @@
 Test cases for ugit diff command.
 """
 
+import io
 import os
 import shutil
 import tempfile
+from contextlib import redirect_stdout
 from unittest import TestCase
+from unittest.mock import patch
 
 from ugit.commands.add import add
 from ugit.commands.commit import commit
@@ -101,3 +104,43 @@ class TestDiffCommand(TestCase):
             f.write("Modified temporary file")
 
         diff()  # Should only show test.txt changes, not temp.tmp
+
+    def test_diff_clean_tree_skips_hashing(self):
+        """Test that unchanged files are skipped using the index stat cache."""
+        with open("test.txt", "w") as f:
+            f.write("Hello, World!")
+
+        add(["test.txt"])
+        commit("Initial commit")
+
+        output = io.StringIO()
+        with patch("ugit.commands.diff.hash_blob") as mock_hash:
+            with redirect_stdout(output):
+                diff()
+        mock_hash.assert_not_called()
+        self.assertIn("No changes in working directory", output.getvalue())
+
+    def test_diff_detects_modified_and_deleted_files(self):
+        """Test that stat-changed files are hashed and shown when different."""
+        with open("keep.txt", "w") as f:
+            f.write("same\n")
+        with open("edit.txt", "w") as f:
+            f.write("old line\n")
+        with open("gone.txt", "w") as f:
+            f.write("bye\n")
+
+        add(["."])
+        commit("Initial commit")
+
+        with open("edit.txt", "w") as f:
+            f.write("new line, longer\n")
+        os.remove("gone.txt")
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            diff()
+        text = output.getvalue()
+        self.assertIn("--- edit.txt", text)
+        self.assertIn("new line, longer", text)
+        self.assertIn("--- gone.txt", text)
+        self.assertNotIn("keep.txt", text)
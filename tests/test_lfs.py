@@ -0,0 +1,169 @@
+"""
+Test cases for ugit LFS pointers.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import TestCase
+from unittest.mock import patch
+
+from ugit.commands.add import add
+from ugit.commands.clone import clone
+from ugit.commands.commit import commit
+from ugit.commands.config import config
+from ugit.commands.init import init
+from ugit.commands.lfs import lfs
+from ugit.commands.push import push
+from ugit.commands.status import status
+from ugit.core.lfs import (
+    LfsAttributes,
+    LfsPointer,
+    lfs_object_exists,
+    lfs_object_path,
+    parse_pointer,
+)
+from ugit.core.objects import get_object
+from ugit.core.repository import Repository
+from ugit.utils.helpers import get_commit_data, get_tree_files
+
+
+class TestLfsFormat(TestCase):
+    """Test cases for pointers and attribute matching."""
+
+    def test_pointer_round_trip(self):
+        """Pointers parse back to themselves; other content is not a pointer."""
+        pointer = LfsPointer("ab" * 32, 1234)
+        self.assertEqual(parse_pointer(pointer.encode()), pointer)
+        self.assertIsNone(parse_pointer(b"hello"))
+        self.assertIsNone(parse_pointer(pointer.encode() + b"extra"))
+
+    def test_last_matching_line_wins(self):
+        """Later lines override earlier ones for the paths they match."""
+        attributes = LfsAttributes(
+            "*.bin filter=lfs diff=lfs merge=lfs -text\n"
+            "# comment\n"
+            "small.bin -text\n"
+        )
+        self.assertTrue(attributes.matches("data/big.bin"))
+        self.assertFalse(attributes.matches("small.bin"))
+        self.assertFalse(attributes.matches("notes.txt"))
+        self.assertEqual(attributes.patterns, ["*.bin"])
+
+
+class TestLfs(TestCase):
+    """Test cases for storing, checking out and pushing LFS files."""
+
+    def setUp(self):
+        """Set up a repository tracking *.bin with LFS."""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        self.source = os.path.join(self.test_dir, "source")
+        os.makedirs(self.source)
+        os.chdir(self.source)
+
+        with redirect_stdout(io.StringIO()):
+            init()
+            config("user.name", "Test User")
+            config("user.email", "test@ugit.com")
+            lfs("track", ["*.bin"])
+        self.data = os.urandom(200000)
+        self._write("big.bin", self.data)
+        self._write("notes.txt", b"notes")
+        self._commit("Add big file")
+        self.repo = Repository()
+
+    def tearDown(self):
+        """Clean up test environment."""
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+
+    def _write(self, path, data):
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def _commit(self, message):
+        with redirect_stdout(io.StringIO()):
+            add(".")
+            commit(message)
+
+    def _head_files(self, repo):
+        tree = get_commit_data(repo.get_head_ref(), repo=repo)["tree"]
+        return get_tree_files(tree, repo=repo)
+
+    def test_tracked_files_are_committed_as_pointers(self):
+        """The tree holds a pointer and the content goes to the LFS store."""
+        files = self._head_files(self.repo)
+        pointer = parse_pointer(get_object(files["big.bin"])[1])
+        self.assertIsNotNone(pointer)
+        self.assertEqual(pointer.size, len(self.data))
+        with open(lfs_object_path(self.repo, pointer.oid), "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertEqual(get_object(files["notes.txt"])[1], b"notes")
+
+    def test_status_skips_hashing_when_size_changes(self):
+        """A size change is enough to report an LFS file as modified."""
+        self._write("big.bin", self.data + b"more")
+        output = io.StringIO()
+        with patch("ugit.commands.status.hash_file") as mock_hash:
+            with redirect_stdout(output):
+                status()
+        mock_hash.assert_not_called()
+        self.assertIn("M big.bin", output.getvalue())
+
+    def test_clone_fetches_content_lazily(self):
+        """Checkout downloads the content a clone's pointers refer to."""
+        os.chdir(self.test_dir)
+        with redirect_stdout(io.StringIO()):
+            clone(self.source, "copy")
+        copy = Repository(os.path.join(self.test_dir, "copy"))
+        with open(os.path.join(copy.path, "big.bin"), "rb") as f:
+            self.assertEqual(f.read(), self.data)
+
+        os.chdir(copy.path)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            status()
+        self.assertIn("Nothing to commit", output.getvalue())
+
+    def test_missing_content_leaves_pointer_until_pull(self):
+        """Without the content a pointer is checked out; lfs pull fixes it."""
+        pointer = parse_pointer(get_object(self._head_files(self.repo)["big.bin"])[1])
+        stored = lfs_object_path(self.repo, pointer.oid)
+        held = os.path.join(self.test_dir, "held")
+        shutil.move(stored, held)
+
+        os.chdir(self.test_dir)
+        with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+            clone(self.source, "copy")
+        os.chdir("copy")
+        with open("big.bin", "rb") as f:
+            self.assertEqual(parse_pointer(f.read()), pointer)
+
+        shutil.move(held, stored)
+        with redirect_stdout(io.StringIO()):
+            lfs("pull")
+        with open("big.bin", "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            status()
+        self.assertIn("Nothing to commit", output.getvalue())
+
+    def test_push_uploads_content(self):
+        """Pushing a new LFS file copies its content to the remote's store."""
+        os.chdir(self.test_dir)
+        with redirect_stdout(io.StringIO()):
+            clone(self.source, "copy")
+        os.chdir("copy")
+        data = os.urandom(50000)
+        self._write("other.bin", data)
+        self._commit("Add another big file")
+        with redirect_stdout(io.StringIO()):
+            push("origin", "main", force=True)
+
+        files = self._head_files(Repository())
+        pointer = parse_pointer(get_object(files["other.bin"])[1])
+        self.assertTrue(lfs_object_exists(self.repo, pointer.oid))
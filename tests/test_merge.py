@@ -261,6 +261,46 @@ class TestMergeCommand(unittest.TestCase):
         self.assertTrue(os.path.exists("feature.txt"))
         self.assertTrue(os.path.exists("main.txt"))
 
+    def test_checkout_after_three_way_merge(self):
+        """Test that a clean three-way merge leaves the index up to date."""
+        init()
+
+        with open("f.txt", "w") as f:
+            f.write("a")
+        with open("g.txt", "w") as f:
+            f.write("x")
+        add(["f.txt", "g.txt"])
+        commit("Base commit", "Test Author <test@example.com>")
+
+        branch("feat")
+        checkout("feat")
+        with open("f.txt", "w") as f:
+            f.write("C")
+        add(["f.txt"])
+        commit("Feature commit", "Test Author <test@example.com>")
+
+        checkout("main")
+        with open("g.txt", "w") as f:
+            f.write("x2")
+        add(["g.txt"])
+        commit("Main commit", "Test Author <test@example.com>")
+
+        branch("old")
+        merge("feat")
+
+        # The merged files must not look like local changes
+        checkout("old")
+        with open("f.txt") as f:
+            self.assertEqual(f.read(), "a")
+        with open("g.txt") as f:
+            self.assertEqual(f.read(), "x2")
+
+        checkout("main")
+        merge("feat", squash=True)
+        checkout("old")
+        with open("f.txt") as f:
+            self.assertEqual(f.read(), "a")
+
 
 if __name__ == "__main__":
     unittest.main()
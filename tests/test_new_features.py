@@ -30,8 +30,11 @@ import os
 import shutil
 import subprocess
 import tempfile
+import time
 import unittest
+import zlib
 from pathlib import Path
+from unittest.mock import patch
 
 import pytest
 
@@ -42,7 +45,7 @@ from ugit.commands.blame import blame
 from ugit.commands.cherry_pick import cherry_pick
 from ugit.commands.commit import commit
 from ugit.commands.fsck import fsck
-from ugit.commands.gc import gc
+from ugit.commands.gc import gc, parse_prune_expire
 from ugit.commands.grep import grep
 from ugit.commands.init import init
 from ugit.commands.log import log
@@ -53,6 +56,8 @@ from ugit.commands.stats import stats
 from ugit.commands.tag import tag
 from ugit.commands.worktree import worktree
 from ugit.core.exceptions import UgitError
+from ugit.core.objects import hash_object, object_exists
+from ugit.core.pack import create_pack
 from ugit.core.repository import Index, Repository
 
 
@@ -409,6 +414,81 @@ class TestGarbageCollection(TestNewFeaturesBase):
         # Run GC (should not raise)
         gc()
 
+    def _loose_path(self, sha):
+        return os.path.join(".ugit", "objects", sha[:2], sha[2:])
+
+    def _age(self, sha, seconds):
+        old = time.time() - seconds
+        os.utime(self._loose_path(sha), (old, old))
+
+    def test_gc_keeps_objects_in_use(self):
+        """Index, stash, reflog and remote-tracking refs all keep objects."""
+        with open("a.txt", "w") as f:
+            f.write("first")
+        add("a.txt")
+        commit("First")
+        first = Repository().get_head_ref()
+        with open("a.txt", "w") as f:
+            f.write("second")
+        add("a.txt")
+        commit("Second")
+
+        repo = Repository()
+        remote = hash_object(b'{"message": "remote"}', "commit", repo=repo)
+        os.makedirs(os.path.join(".ugit", "refs", "remotes", "origin"))
+        with open(os.path.join(".ugit", "refs", "remotes", "origin", "main"), "w") as f:
+            f.write(remote)
+        with open("b.txt", "w") as f:
+            f.write("staged only")
+        add("b.txt")
+        staged = hash_object(b"staged only", write=False)
+        orphan = hash_object(b"orphan", repo=repo)
+
+        # Drop the branch back so "Second" is only in the reflog
+        with open(os.path.join(".ugit", "refs", "heads", "main"), "w") as f:
+            f.write(first)
+        second_blob = hash_object(b"second", write=False)
+
+        gc(prune="now")
+        for sha in (remote, staged, second_blob):
+            self.assertTrue(object_exists(sha, repo=repo), sha)
+        self.assertFalse(object_exists(orphan, repo=repo))
+
+    def test_gc_grace_period(self):
+        """Only unreachable objects older than the grace period go."""
+        repo = Repository()
+        recent = hash_object(b"recent", repo=repo)
+        old = hash_object(b"old", repo=repo)
+        self._age(old, 30 * 86400)
+        self._age(recent, 3600)
+
+        gc(prune="never")
+        self.assertTrue(object_exists(old, repo=repo))
+        gc()
+        self.assertFalse(object_exists(old, repo=repo))
+        self.assertTrue(object_exists(recent, repo=repo))
+
+        # Writing the object again refreshes its mtime
+        self._age(recent, 30 * 86400)
+        hash_object(b"recent", repo=repo)
+        gc(prune="2.weeks.ago")
+        self.assertTrue(object_exists(recent, repo=repo))
+        gc(prune="30 minutes")
+        self.assertTrue(object_exists(recent, repo=repo))
+
+    def test_parse_prune_expire(self):
+        """Prune ages accept now, never, relative ages and dates."""
+        self.assertIsNone(parse_prune_expire("never"))
+        now = time.time()
+        self.assertAlmostEqual(parse_prune_expire("now"), now, delta=5)
+        self.assertAlmostEqual(
+            parse_prune_expire("2.weeks.ago"), now - 14 * 86400, delta=5
+        )
+        self.assertAlmostEqual(parse_prune_expire("3 days"), now - 3 * 86400, delta=5)
+        self.assertEqual(parse_prune_expire("2024-01-01T00:00:00Z"), 1704067200.0)
+        with self.assertRaises(UgitError):
+            parse_prune_expire("soon")
+
 
 class TestFsck(TestNewFeaturesBase):
     """Test fsck functionality."""
@@ -425,6 +505,42 @@ class TestFsck(TestNewFeaturesBase):
         result = fsck()
         self.assertIsInstance(result, int)
 
+    def _commit_two_files(self):
+        for name in ("a.txt", "b.txt"):
+            with open(name, "w") as f:
+                f.write(name)
+            add(name)
+        commit("Two files")
+        return Repository()
+
+    def test_fsck_full_parallel(self):
+        """A full check of loose and packed objects passes in a process pool."""
+        repo = self._commit_two_files()
+        create_pack(repo, [hash_object(b"packed", repo=repo)])
+        with patch("ugit.commands.fsck.PARALLEL_THRESHOLD", 0), patch(
+            "ugit.commands.fsck.PACK_CHUNK_SIZE", 1
+        ):
+            self.assertEqual(fsck(full=True, workers=2), 0)
+
+    def test_fsck_detects_bit_rot(self):
+        """Content that no longer matches its SHA-1 is reported."""
+        repo = self._commit_two_files()
+        sha = hash_object(b"a.txt", write=False)
+        path = os.path.join(repo.ugit_dir, "objects", sha[:2], sha[2:])
+        os.chmod(path, 0o644)
+        with open(path, "wb") as f:
+            f.write(zlib.compress(b"blob 5\0a.txX"))
+        self.assertEqual(fsck(), 0)
+        self.assertEqual(fsck(full=True), 1)
+
+    def test_fsck_detects_missing_blob(self):
+        """Connectivity covers every tree entry, not just commits."""
+        repo = self._commit_two_files()
+        sha = hash_object(b"b.txt", write=False)
+        os.remove(os.path.join(repo.ugit_dir, "objects", sha[:2], sha[2:]))
+        self.assertEqual(fsck(), 1)
+        self.assertEqual(fsck(full=True), 1)
+
 
 class TestWorktree(TestNewFeaturesBase):
     """Test worktree functionality."""
@@ -1,9 +1,29 @@
 """Tests for core object storage functionality."""
 
 import os
+import sys
 import tempfile
+from unittest.mock import patch
 
-from ugit.core.objects import get_object, hash_object, object_exists
+import pytest
+
+from ugit.core.exceptions import UgitError
+from ugit.core.objects import (
+    TEMP_OBJECT_PREFIX,
+    get_object,
+    hash_object,
+    object_exists,
+    object_write_batch,
+)
+from ugit.core.odb import (
+    FileObjectDatabase,
+    MemoryObjectDatabase,
+    SQLiteObjectDatabase,
+    get_object_database,
+)
+from ugit.core.repository import Repository
+from ugit.utils.atomic import atomic_write, get_fsync_method
+from ugit.utils.config import Config
 
 
 class TestObjectStorage:
@@ -90,6 +110,139 @@ class TestObjectStorage:
                 os.chdir(old_cwd)
 
 
+class TestFsyncMethod:
+    """Test durable object writes under each core.fsyncMethod."""
+
+    def _repo(self, tmpdir, method=None):
+        os.makedirs(os.path.join(tmpdir, ".ugit", "objects"))
+        if method:
+            Config(tmpdir).set("core", "fsyncMethod", method)
+        return Repository(tmpdir)
+
+    def test_default_is_batch(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            repo = self._repo(tmpdir)
+            assert get_fsync_method(repo.ugit_dir) == "batch"
+            Config(tmpdir).set("core", "fsyncMethod", "Per-File")
+            assert get_fsync_method(repo.ugit_dir) == "per-file"
+
+    def test_per_file_fsyncs_each_object(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            repo = self._repo(tmpdir, "per-file")
+            with patch("os.fsync") as fsync:
+                hash_object(b"one", repo=repo)
+                hash_object(b"two", repo=repo)
+            assert fsync.call_count == 2
+
+    def test_none_never_fsyncs(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            repo = self._repo(tmpdir, "none")
+            with patch("os.fsync") as fsync:
+                sha = hash_object(b"data", repo=repo)
+                atomic_write(os.path.join(repo.ugit_dir, "index"), b"{}")
+            fsync.assert_not_called()
+            assert get_object(sha, repo=repo) == ("blob", b"data")
+
+    def test_batch_flushes_once(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            repo = self._repo(tmpdir, "batch")
+            with patch("os.fsync"), patch("ugit.core.objects._sync_files") as sync:
+                with object_write_batch(repo):
+                    shas = [hash_object(b"%d" % i, repo=repo) for i in range(20)]
+                    # Readable before the batch is flushed, but not yet in place
+                    assert get_object(shas[0], repo=repo) == ("blob", b"0")
+                    loose = os.path.join(repo.ugit_dir, "objects", shas[0][:2])
+                    assert not os.path.exists(os.path.join(loose, shas[0][2:]))
+                    sync.assert_not_called()
+            sync.assert_called_once()
+
+            for sha in shas:
+                path = os.path.join(repo.ugit_dir, "objects", sha[:2], sha[2:])
+                assert os.path.exists(path)
+            for _, _, files in os.walk(os.path.join(repo.ugit_dir, "objects")):
+                assert not any(f.startswith(TEMP_OBJECT_PREFIX) for f in files)
+
+    def test_batch_fsync_count(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            repo = self._repo(tmpdir, "batch")
+            with patch("os.fsync") as fsync, patch("os.sync", create=True) as sync:
+                with patch("ugit.core.objects._syncfs", return_value=True) as syncfs:
+                    with object_write_batch(repo):
+                        shas = [hash_object(b"%d" % i, repo=repo) for i in range(20)]
+                        fsync.assert_not_called()
+            sync.assert_not_called()
+            directories = {sha[:2] for sha in shas}
+            if sys.platform == "linux":
+                # One syncfs for the objects, then one fsync per directory
+                syncfs.assert_called_once()
+                assert fsync.call_count == len(directories)
+            else:
+                assert fsync.call_count == len(shas) + len(directories)
+
+    def test_batch_without_syncfs_fsyncs_each_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            repo = self._repo(tmpdir, "batch")
+            with patch("os.fsync") as fsync:
+                with patch("ugit.core.objects._syncfs", return_value=False):
+                    with object_write_batch(repo):
+                        shas = [hash_object(b"%d" % i, repo=repo) for i in range(3)]
+            directories = {sha[:2] for sha in shas}
+            assert fsync.call_count == len(shas) + len(directories)
+
+
+class TestObjectDatabase:
+    """Test the object database backends."""
+
+    def _check_backend(self, database):
+        sha = database.write("blob", b"hello")
+        assert sha == hash_object(b"hello", "blob", write=False)
+        assert database.exists(sha)
+        assert database.read(sha) == ("blob", b"hello")
+        shas = database.batch_write([("blob", b"a"), ("tree", b"{}")])
+        assert sorted(database.iterate()) == sorted([sha] + shas)
+        assert not database.exists("0" * 40)
+        try:
+            database.read("0" * 40)
+            assert False, "Should have raised FileNotFoundError"
+        except FileNotFoundError:
+            pass
+
+    def test_backends(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.makedirs(os.path.join(tmpdir, ".ugit", "objects"))
+            self._check_backend(FileObjectDatabase(Repository(tmpdir)))
+            self._check_backend(MemoryObjectDatabase())
+            sqlite = SQLiteObjectDatabase(os.path.join(tmpdir, "objects.sqlite"))
+            try:
+                self._check_backend(sqlite)
+            finally:
+                sqlite.close()
+
+    def test_object_storage_setting(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.makedirs(os.path.join(tmpdir, ".ugit", "objects"))
+            Config(tmpdir).set("core", "objectStorage", "sqlite")
+            repo = Repository(tmpdir)
+            database = get_object_database(repo)
+            assert isinstance(database, SQLiteObjectDatabase)
+
+            # Objects go to the database, not to loose files
+            sha = hash_object(b"stored", repo=repo)
+            assert object_exists(sha, repo=repo)
+            assert get_object(sha, repo=repo) == ("blob", b"stored")
+            assert list(database.iterate()) == [sha]
+            assert not os.listdir(os.path.join(repo.ugit_dir, "objects"))
+
+            Config(tmpdir).set("core", "objectStorage", "files")
+            assert isinstance(get_object_database(repo), FileObjectDatabase)
+            assert not object_exists(sha, repo=repo)
+
+            # An in-process store would lose every object on exit
+            Config(tmpdir).set("core", "objectStorage", "memory")
+            with pytest.raises(UgitError, match="Unknown core.objectStorage"):
+                get_object_database(repo)
+
+
 def test_different_object_types():
     """Test hashing different object types produces different hashes."""
     data = b"same content"
@@ -0,0 +1,694 @@
+"""
+Test cases for pack files and object enumeration.
+"""
+
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from ugit.commands.add import add
+from ugit.commands.commit import commit
+from ugit.commands.gc import gc
+from ugit.commands.init import init
+from ugit.commands.maintenance import needs_maintenance, run_maintenance
+from ugit.commands.pack import _get_all_objects, pack_objects, unpack_objects
+from ugit.commands.reflog import get_reflog_entries
+from ugit.commands.repack import geometric_split, repack
+from ugit.core.bitmap import find_reachable, load_bitmap
+from ugit.core.chunking import (
+    MANIFEST_MAGIC,
+    chunk_boundaries,
+    hash_blob,
+    parse_manifest,
+    read_blob,
+    uses_chunking,
+)
+from ugit.core.compression import (
+    compress,
+    get_compression_levels,
+    is_incompressible,
+)
+from ugit.core.exceptions import CorruptPackError, UgitError
+from ugit.core.midx import (
+    get_multi_pack_index,
+    verify_multi_pack_index,
+    write_multi_pack_index,
+)
+from ugit.core.objects import get_object, hash_object, object_exists
+from ugit.core.odb import get_object_database
+from ugit.core.pack import (
+    Pack,
+    PackWriter,
+    apply_delta,
+    create_delta,
+    create_pack,
+    get_packs,
+    index_pack,
+    invalidate_pack_cache,
+    new_temp_pack_path,
+    object_sha,
+    write_pack,
+)
+from ugit.core.protocol import upload_pack
+from ugit.core.repository import Repository
+from ugit.core.revlist import list_objects
+from ugit.core.shallow import parse_since
+from ugit.utils.config import Config
+from ugit.utils.helpers import get_commit_data
+
+
+def _append_delta(base: bytes, suffix: bytes) -> bytes:
+    """Build a delta that copies all of a small base, then inserts a suffix."""
+    target_size = len(base) + len(suffix)
+    return bytes([len(base), target_size, 0x90, len(base), len(suffix)]) + suffix
+
+
+class TestPackBase(TestCase):
+    """Base class with a temporary repository."""
+
+    def setUp(self):
+        """Set up a repository with one commit."""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        init()
+        self.repo = Repository()
+        self._commit_file("a.txt", "first", "Initial commit")
+
+    def tearDown(self):
+        """Clean up test environment."""
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+
+    def _commit_file(self, path, content, message):
+        with open(path, "w") as f:
+            f.write(content)
+        add(path)
+        commit(message, "Test Author <test@example.com>")
+        return self.repo.get_head_ref()
+
+    def _remove_loose(self, sha):
+        os.remove(os.path.join(self.repo.ugit_dir, "objects", sha[:2], sha[2:]))
+
+
+class TestPackFormat(TestPackBase):
+    """Test cases for writing and reading packs."""
+
+    def test_packed_objects_are_readable(self):
+        """Objects moved into a pack are still found by get_object."""
+        head = self.repo.get_head_ref()
+        tree = get_commit_data(head, repo=self.repo)["tree"]
+        blob = hash_object(b"first", repo=self.repo)
+
+        create_pack(self.repo, [head, tree, blob])
+        for sha in (head, tree, blob):
+            self._remove_loose(sha)
+
+        self.assertTrue(object_exists(blob, repo=self.repo))
+        self.assertEqual(get_object(blob, repo=self.repo), ("blob", b"first"))
+        self.assertEqual(get_object(head, repo=self.repo)[0], "commit")
+
+    def test_invalidation_closes_packs(self):
+        """Packs evicted from the cache release their memory maps."""
+        blob = hash_object(b"first", repo=self.repo)
+        create_pack(self.repo, [blob])
+        objects_dir = os.path.join(self.repo.ugit_dir, "objects")
+        (pack,) = get_packs(objects_dir)
+        self.assertEqual(pack.get_object(blob), ("blob", b"first"))
+        self.assertIsNotNone(pack._map)
+
+        invalidate_pack_cache(objects_dir)
+        self.assertIsNone(pack._map)
+        self.assertEqual(get_object(blob, repo=self.repo), ("blob", b"first"))
+
+    def test_index_lookup(self):
+        """The index finds every packed object and nothing else."""
+        shas = [hash_object(f"blob {i}".encode(), repo=self.repo) for i in range(50)]
+        pack = Pack(create_pack(self.repo, shas))
+        try:
+            self.assertEqual(len(pack), 50)
+            self.assertEqual(sorted(pack), sorted(shas))
+            for sha in shas:
+                self.assertIn(sha, pack)
+            self.assertNotIn("0" * 40, pack)
+            self.assertTrue(pack.index.verify_checksum())
+        finally:
+            pack.close()
+
+    def test_depth_and_since_limit_history(self):
+        """depth and since cut the walk off below the wants."""
+        tree = get_commit_data(self.repo.get_head_ref(), repo=self.repo)["tree"]
+        parent = None
+        commits = []
+        for year in (2020, 2021, 2022):
+            data = {
+                "tree": tree,
+                "parent": parent,
+                "author": "A",
+                "timestamp": f"{year}-06-01T00:00:00Z",
+                "message": str(year),
+            }
+            parent = hash_object(json.dumps(data).encode(), "commit", repo=self.repo)
+            commits.append(parent)
+
+        def listed_commits(**kwargs):
+            listed = list_objects(self.repo, [commits[-1]], **kwargs)
+            return [sha for sha in listed if sha in commits]
+
+        self.assertEqual(listed_commits(depth=2), [commits[2], commits[1]])
+        since = parse_since("2021-01-01")
+        self.assertEqual(listed_commits(since=since), [commits[2], commits[1]])
+        self.assertEqual(listed_commits(shallow=[commits[1]]), [commits[2], commits[1]])
+
+    def test_deltas_and_thin_pack_completion(self):
+        """Delta chains resolve, and missing REF_DELTA bases are appended."""
+        base = b"base content"
+        base_sha = hash_object(base, repo=self.repo)
+        middle = base + b" more"
+        top = middle + b" and more"
+        middle_sha = object_sha("blob", middle)
+        top_sha = object_sha("blob", top)
+
+        # The base is only in the repository, not in the pack
+        path = new_temp_pack_path(self.repo)
+        with open(path, "wb") as f:
+            writer = PackWriter(f, 2)
+            writer.add_ref_delta(middle_sha, base_sha, _append_delta(base, b" more"))
+            middle_offset = writer.entries[0][1]
+            writer.add_ofs_delta(
+                top_sha, middle_offset, _append_delta(middle, b" and more")
+            )
+            writer.finish()
+
+        installed = index_pack(self.repo, path)
+        self._remove_loose(base_sha)
+
+        pack = Pack(installed)
+        try:
+            self.assertEqual(len(pack), 3)
+            self.assertEqual(pack.get_object(top_sha), ("blob", top))
+            self.assertEqual(pack.get_object(base_sha), ("blob", base))
+        finally:
+            pack.close()
+        self.assertEqual(get_object(middle_sha, repo=self.repo), ("blob", middle))
+
+    def test_create_delta_round_trip(self):
+        """create_delta output rebuilds the target and is small for edits."""
+        base = "".join(f"line {i}\n" for i in range(500)).encode()
+        target = base[:2000] + b"inserted text\n" + base[2100:] + b"tail\n"
+
+        delta = create_delta(base, target)
+        self.assertEqual(apply_delta(base, delta), target)
+        self.assertLess(len(delta), 100)
+        self.assertEqual(apply_delta(b"", create_delta(b"", b"new")), b"new")
+
+    def test_corrupt_pack_rejected(self):
+        """A pack whose trailer does not match is refused."""
+        blob = hash_object(b"payload", repo=self.repo)
+        path = new_temp_pack_path(self.repo)
+        with open(path, "wb") as f:
+            writer = PackWriter(f, 1)
+            writer.add_object(blob, "blob", b"payload")
+            writer.finish()
+        with open(path, "r+b") as f:
+            f.seek(14)
+            f.write(b"\x00")
+
+        with self.assertRaises(CorruptPackError):
+            index_pack(self.repo, path)
+
+    def test_pack_and_unpack_commands(self):
+        """pack_objects and unpack_objects round-trip loose objects."""
+        pack_file = pack_objects(repo=self.repo)
+        blob = hash_object(b"first", write=False)
+
+        other_dir = tempfile.mkdtemp()
+        try:
+            os.chdir(other_dir)
+            init()
+            other = Repository()
+            self.assertEqual(unpack_objects(pack_file, repo=other), 3)
+            self.assertEqual(get_object(blob, repo=other), ("blob", b"first"))
+        finally:
+            os.chdir(self.test_dir)
+            shutil.rmtree(other_dir)
+
+
+class TestListObjects(TestPackBase):
+    """Test cases for transfer negotiation."""
+
+    def test_haves_exclude_known_history(self):
+        """Only objects introduced after the haves are listed."""
+        first = self.repo.get_head_ref()
+        second = self._commit_file("b.txt", "second", "Second commit")
+
+        everything = list_objects(self.repo, [second])
+        self.assertEqual(len(everything), 6)  # 2 commits, 2 trees, 2 blobs
+
+        new = list_objects(self.repo, [second], [first])
+        tree = get_commit_data(second, repo=self.repo)["tree"]
+        blob = hash_object(b"second", write=False)
+        self.assertEqual(new, [second, tree, blob])
+
+    def test_merge_parents_are_followed(self):
+        """Both parents of a merge are walked."""
+        first = self.repo.get_head_ref()
+        second = self._commit_file("b.txt", "second", "Second commit")
+        side = hash_object(b"side", repo=self.repo)
+        merge_data = get_commit_data(second, repo=self.repo)
+        merge = hash_object(
+            (
+                '{"tree": "%s", "parent": "%s", "parent2": "%s", '
+                '"author": "A", "timestamp": "2030-01-01T00:00:00Z", '
+                '"message": "Merge"}' % (merge_data["tree"], first, second)
+            ).encode(),
+            "commit",
+            repo=self.repo,
+        )
+
+        listed = list_objects(self.repo, [merge], [first])
+        self.assertIn(second, listed)
+        self.assertNotIn(first, listed)
+        self.assertNotIn(side, listed)
+
+    def test_upload_pack_contents(self):
+        """upload_pack streams a pack of exactly the listed objects."""
+        first = self.repo.get_head_ref()
+        second = self._commit_file("b.txt", "second", "Second commit")
+
+        out = io.BytesIO()
+        count = upload_pack(self.repo, [second], [first], out)
+        self.assertEqual(count, 3)
+
+        path = new_temp_pack_path(self.repo)
+        with open(path, "wb") as f:
+            f.write(out.getvalue())
+        pack = Pack(index_pack(self.repo, path))
+        try:
+            self.assertEqual(set(pack), set(list_objects(self.repo, [second], [first])))
+        finally:
+            pack.close()
+
+
+class TestBitmaps(TestPackBase):
+    """Test cases for reachability bitmaps."""
+
+    def setUp(self):
+        """Set up a repository with a few commits, all packed with bitmaps."""
+        super().setUp()
+        self.commits = [self.repo.get_head_ref()]
+        for i in range(4):
+            self.commits.append(self._commit_file(f"f{i}.txt", str(i), f"c{i}"))
+        self.walked = list_objects(self.repo, [self.commits[-1]], [self.commits[1]])
+        with patch("ugit.core.bitmap.BITMAP_INTERVAL", 2):
+            self.pack_file = pack_objects(repo=self.repo, bitmap=True)
+
+    def test_bitmaps_written_for_selected_commits(self):
+        """The head and every second commit get a bitmap."""
+        bitmap = load_bitmap(self.repo)
+        self.assertIsNotNone(bitmap)
+        self.assertIn(self.commits[-1], bitmap)
+        self.assertIn(self.commits[1], bitmap)
+        self.assertNotIn(self.commits[0], bitmap)
+
+        # XOR-stored entries decode to the full history of their commit
+        listed = list_objects(self.repo, [self.commits[3]])
+        reachable = find_reachable(self.repo, [self.commits[3]], bitmap)
+        self.assertEqual(set(reachable), set(listed))
+
+    def test_list_objects_uses_bitmaps(self):
+        """Bitmap enumeration lists the same objects, grouped by type."""
+        listed = list_objects(self.repo, [self.commits[-1]], [self.commits[1]])
+        self.assertEqual(set(listed), set(self.walked))
+        self.assertEqual(set(listed[:3]), set(self.commits[2:]))
+
+        # A newer loose commit is walked down to the bitmapped head
+        new = self._commit_file("new.txt", "new", "New commit")
+        listed = list_objects(self.repo, [new], [self.commits[-1]])
+        tree = get_commit_data(new, repo=self.repo)["tree"]
+        self.assertEqual(listed, [new, tree, hash_object(b"new", write=False)])
+
+    def test_gc_keeps_reachable_loose_objects(self):
+        """gc with bitmaps removes only unreachable loose objects."""
+        from ugit.commands.gc import gc
+
+        new = self._commit_file("new.txt", "new", "New commit")
+        orphan = hash_object(b"orphan", repo=self.repo)
+        with patch("builtins.print"):
+            gc(prune="now")
+        self.assertFalse(object_exists(orphan, repo=self.repo))
+        self.assertTrue(object_exists(new, repo=self.repo))
+        self.assertTrue(
+            object_exists(get_commit_data(new, repo=self.repo)["tree"], repo=self.repo)
+        )
+
+    def test_stale_bitmap_ignored(self):
+        """A bitmap whose pack changed is not used."""
+        path = self.pack_file[: -len(".pack")] + ".bitmap"
+        with open(path, "r+b") as f:
+            f.seek(10)
+            f.write(b"\x00" * 4)
+        self.assertIsNone(load_bitmap(self.repo))
+
+
+class TestMultiPackIndex(TestPackBase):
+    """Test cases for the multi-pack-index."""
+
+    def setUp(self):
+        """Set up two packs and a multi-pack-index covering them."""
+        super().setUp()
+        self.objects_dir = os.path.join(self.repo.ugit_dir, "objects")
+        self.shas = [
+            hash_object(f"blob {i}".encode(), repo=self.repo) for i in range(6)
+        ]
+        self.packs = [
+            create_pack(self.repo, self.shas[:3]),
+            create_pack(self.repo, self.shas[2:]),
+        ]
+        for sha in self.shas:
+            self._remove_loose(sha)
+        self.count = write_multi_pack_index(self.objects_dir)
+
+    def test_lookups_use_index(self):
+        """Every packed object is found through the index, once."""
+        self.assertEqual(self.count, 6)
+        midx = get_multi_pack_index(self.objects_dir)
+        self.assertIsNotNone(midx)
+        self.assertEqual(len(midx.pack_names), 2)
+        for i, sha in enumerate(self.shas):
+            self.assertIsNotNone(midx.find(sha))
+            expected = ("blob", f"blob {i}".encode())
+            self.assertEqual(get_object(sha, repo=self.repo), expected)
+        self.assertIsNone(midx.find("0" * 40))
+        self.assertEqual(verify_multi_pack_index(self.objects_dir), [])
+
+    def test_new_pack_still_found(self):
+        """A pack written after the index is searched on its own."""
+        sha = hash_object(b"later", repo=self.repo)
+        create_pack(self.repo, [sha])
+        self._remove_loose(sha)
+        self.assertEqual(get_object(sha, repo=self.repo), ("blob", b"later"))
+
+    def test_missing_pack(self):
+        """An index naming a removed pack is ignored and fails verify."""
+        os.remove(self.packs[0])
+        os.remove(self.packs[0][: -len(".pack")] + ".idx")
+        self.assertTrue(object_exists(self.shas[2], repo=self.repo))
+        self.assertFalse(object_exists(self.shas[0], repo=self.repo))
+
+        problems = verify_multi_pack_index(self.objects_dir)
+        self.assertEqual(len(problems), 1)
+        self.assertIn("is missing", problems[0])
+
+
+class TestRepack(TestPackBase):
+    """Test cases for full and geometric repacking."""
+
+    def _pack_blobs(self, count, prefix):
+        shas = [
+            hash_object(f"{prefix} {i}".encode(), repo=self.repo) for i in range(count)
+        ]
+        return create_pack(self.repo, shas)
+
+    def test_geometric_split(self):
+        """Only packs breaking the progression are rolled up."""
+        self.assertEqual(geometric_split([1, 2, 4, 100], 2), 0)
+        self.assertEqual(geometric_split([1, 5, 6, 100], 2), 3)
+        self.assertEqual(geometric_split([3, 5, 100], 2), 2)
+        # Loose objects can pull the smallest packs in too
+        self.assertEqual(geometric_split([4, 20, 100], 2, loose=3), 1)
+        self.assertEqual(geometric_split([], 2, loose=3), 0)
+
+    def test_full_repack(self):
+        """Everything ends up in one pack and no loose object is left."""
+        self._pack_blobs(3, "a")
+        self._pack_blobs(3, "b")
+        objects_dir = os.path.join(self.repo.ugit_dir, "objects")
+        replaced = get_packs(objects_dir)
+        for pack in replaced:
+            pack._data()  # Mapped, as by an earlier read
+        with patch("builtins.print"):
+            pack_file = repack(repo=self.repo)
+
+        # The replaced packs were unmapped before their files were removed
+        for pack in replaced:
+            self.assertIsNone(pack._map)
+            self.assertFalse(os.path.exists(pack.path))
+        packs = get_packs(objects_dir)
+        self.assertEqual([pack.path for pack in packs], [pack_file])
+        self.assertEqual(_get_all_objects(self.repo), [])
+        head = self.repo.get_head_ref()
+        self.assertEqual(get_object(head, repo=self.repo)[0], "commit")
+        blob = hash_object(b"b 2", write=False)
+        self.assertEqual(get_object(blob, repo=self.repo)[1], b"b 2")
+
+    def test_geometric_repack_keeps_large_pack(self):
+        """Small packs are combined while the large one is left alone."""
+        large = self._pack_blobs(40, "large")
+        self._pack_blobs(2, "x")
+        self._pack_blobs(2, "y")
+        objects_dir = os.path.join(self.repo.ugit_dir, "objects")
+        write_multi_pack_index(objects_dir)
+
+        with patch("builtins.print"):
+            pack_file = repack(geometric=2, repo=self.repo)
+
+        paths = sorted(pack.path for pack in get_packs(objects_dir))
+        self.assertEqual(paths, sorted([large, pack_file]))
+        self.assertEqual(_get_all_objects(self.repo), [])
+        self.assertEqual(verify_multi_pack_index(objects_dir), [])
+
+        # A second run finds the progression intact
+        with patch("builtins.print"):
+            self.assertIsNone(repack(geometric=2, repo=self.repo))
+
+
+class TestMaintenance(TestPackBase):
+    """Test cases for maintenance tasks and auto maintenance."""
+
+    def setUp(self):
+        """Set up a repository with a few commits."""
+        super().setUp()
+        for i in range(3):
+            self._commit_file(f"f{i}.txt", str(i), f"c{i}")
+        self.objects_dir = os.path.join(self.repo.ugit_dir, "objects")
+        self.config = Config(self.repo.path)
+
+    def test_run_packs_loose_objects(self):
+        """The default tasks pack everything, trim reflogs and write bitmaps."""
+        self.config.set("gc", "reflogLimit", "2")
+        orphan = hash_object(b"orphan", repo=self.repo)
+        with patch("builtins.print"):
+            run_maintenance(self.repo)
+
+        self.assertEqual(_get_all_objects(self.repo), [])
+        # The orphan is within the prune grace period, so it is packed
+        self.assertTrue(object_exists(orphan, repo=self.repo))
+        self.assertIsNotNone(load_bitmap(self.repo))
+        self.assertEqual(len(get_reflog_entries(self.repo, "main")), 2)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.repo.ugit_dir, "maintenance.lock"))
+        )
+
+    def test_auto_thresholds(self):
+        """Auto maintenance runs once there are too many packs."""
+        self.config.set("gc", "autoPackLimit", "1")
+        self.config.set("gc", "autoDetach", "false")
+        create_pack(self.repo, [hash_object(b"one", repo=self.repo)])
+        self.assertFalse(needs_maintenance(self.repo))
+
+        create_pack(self.repo, [hash_object(b"two", repo=self.repo)])
+        self.assertTrue(needs_maintenance(self.repo))
+        with patch("builtins.print"):
+            self._commit_file("g.txt", "g", "Trigger maintenance")
+        counts = sorted(len(pack) for pack in get_packs(self.objects_dir))
+        self.assertEqual(len(counts), 2)
+        self.assertEqual(geometric_split(counts, 2), 0)
+        self.assertEqual(_get_all_objects(self.repo), [])
+
+        self.config.set("gc", "autoPackLimit", "0")
+        self.config.set("gc", "auto", "0")
+        create_pack(self.repo, [hash_object(b"three", repo=self.repo)])
+        self.assertFalse(needs_maintenance(self.repo))
+
+    def test_lock_and_unknown_task(self):
+        """Maintenance refuses to run twice at once or run unknown tasks."""
+        with self.assertRaises(UgitError):
+            run_maintenance(self.repo, ["commit-graph"])
+        lock = os.path.join(self.repo.ugit_dir, "maintenance.lock")
+        with open(lock, "w") as f:
+            f.write("1\n")
+        with self.assertRaises(UgitError):
+            run_maintenance(self.repo, ["loose-objects"])
+        self.assertTrue(os.path.exists(lock))
+
+    def test_sqlite_storage(self):
+        """Object tasks refuse an SQLite store; pack reads through it."""
+        self.config.set("core", "objectStorage", "sqlite")
+        head = self._commit_file("g.txt", "g", "Stored in SQLite")
+        database = get_object_database(self.repo)
+        self.assertIn(head, _get_all_objects(self.repo))
+
+        with patch("builtins.print"):
+            for command in (gc, repack):
+                with self.assertRaisesRegex(UgitError, "objectStorage=sqlite"):
+                    command(repo=self.repo)
+            with self.assertRaisesRegex(UgitError, "objectStorage=sqlite"):
+                run_maintenance(self.repo, ["prune"])
+            self.config.set("gc", "autoPackLimit", "1")
+            self.assertFalse(needs_maintenance(self.repo))
+            run_maintenance(self.repo)  # Only the tasks that are safe
+
+            pack = Pack(pack_objects(repo=self.repo))
+        try:
+            self.assertEqual(sorted(pack), sorted(database.iterate()))
+        finally:
+            pack.close()
+        self.assertTrue(database.exists(head))
+
+
+class TestChunking(TestPackBase):
+    """Test cases for content-defined chunking of large files."""
+
+    def setUp(self):
+        """Turn chunking on for files of 100 KB or more."""
+        super().setUp()
+        self.config = Config(self.repo.path)
+        self.config.set("chunking", "enabled", "true")
+        self.config.set("chunking", "threshold", "100000")
+        self.data = random.Random(7).randbytes(3 << 20)
+
+    def _commit_data(self, data, message):
+        with open("big.bin", "wb") as f:
+            f.write(data)
+        add("big.bin")
+        with patch("builtins.print"):
+            commit(message, "Test Author <test@example.com>")
+        return self.repo.get_head_ref()
+
+    def test_boundaries_follow_content(self):
+        """An insertion only changes the chunks around it."""
+        before = chunk_boundaries(self.data)
+        self.assertEqual(before[0][0], 0)
+        self.assertEqual(before[-1][1], len(self.data))
+        self.assertGreater(len(before), 4)
+
+        edited = self.data[:1500000] + b"x" * 1000 + self.data[1500000:]
+        old = {self.data[start:end] for start, end in before}
+        new = [edited[start:end] for start, end in chunk_boundaries(edited)]
+        self.assertLessEqual(len([chunk for chunk in new if chunk not in old]), 2)
+
+    def test_chunked_file_round_trip(self):
+        """Large files are stored as manifests and read back whole."""
+        first = self._commit_data(self.data, "Add big file")
+        self.assertTrue(uses_chunking(self.repo))
+
+        tree_sha = get_commit_data(first, repo=self.repo)["tree"]
+        tree = json.loads(get_object(tree_sha)[1].decode())
+        manifest_sha = dict(tree)["big.bin"]
+        chunks = parse_manifest(get_object(manifest_sha)[1])
+        self.assertIsNotNone(chunks)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(read_blob(manifest_sha), ("blob", self.data))
+
+        # Status sees the committed file as unchanged
+        self.assertEqual(hash_blob(self.data, write=False), manifest_sha)
+
+    def test_transfer_and_gc_follow_chunks(self):
+        """Only new chunks are sent, and gc keeps every chunk."""
+        first = self._commit_data(self.data, "Add big file")
+        edited = self.data[:1500000] + b"x" * 1000 + self.data[1500000:]
+        second = self._commit_data(edited, "Edit big file")
+
+        new = list_objects(self.repo, [second], [first])
+        self.assertLessEqual(len(new), 2 + 1 + 2)  # commit, tree, manifest, chunks
+        everything = list_objects(self.repo, [second])
+
+        with patch("builtins.print"):
+            gc(prune="now", repo=self.repo)
+        for sha in everything:
+            self.assertTrue(object_exists(sha, repo=self.repo))
+
+    def test_manifest_lookalike_content(self):
+        """Content that looks like a manifest is never taken for one."""
+        self.config.set("chunking", "enabled", "false")
+        data = MANIFEST_MAGIC + b'{"size": 0, "chunks": []}'
+        sha = hash_blob(data, repo=self.repo)
+        self.assertNotEqual(sha, hash_object(data, write=False))
+        self.assertEqual(read_blob(sha, repo=self.repo), ("blob", data))
+
+
+class TestCompression(TestPackBase):
+    """Test cases for compression levels and reusing packed entries."""
+
+    def test_levels_come_from_config(self):
+        """pack.compression defaults to core.compression."""
+        ugit_dir = self.repo.ugit_dir
+        self.assertEqual(get_compression_levels(ugit_dir), (-1, -1))
+        config = Config(self.repo.path)
+        config.set("core", "compression", "1")
+        self.assertEqual(get_compression_levels(ugit_dir), (1, 1))
+        config.set("pack", "compression", "9")
+        self.assertEqual(get_compression_levels(ugit_dir), (1, 9))
+        config.set("core", "compression", "eleven")
+        self.assertEqual(get_compression_levels(ugit_dir), (-1, 9))
+
+    def test_incompressible_content_is_stored(self):
+        """Random data skips deflate; text is still compressed."""
+        noise = random.Random(3).randbytes(100000)
+        text = b"the quick brown fox jumps over the lazy dog\n" * 3000
+        self.assertTrue(is_incompressible(noise))
+        self.assertFalse(is_incompressible(text))
+        self.assertFalse(is_incompressible(noise[:1000]))
+        self.assertLess(len(compress(noise, 9)), len(noise) + 100)
+        self.assertLess(len(compress(text, 9)), len(text) // 10)
+
+        sha = hash_object(noise, repo=self.repo)
+        self.assertEqual(get_object(sha, repo=self.repo), ("blob", noise))
+
+    def test_packed_entries_are_copied(self):
+        """Repacking copies entries, deltas after their base, as stored."""
+        base = b"base content " * 20
+        base_sha = hash_object(base, repo=self.repo)
+        top = base + b" more"
+        top_sha = object_sha("blob", top)
+        path = new_temp_pack_path(self.repo)
+        with open(path, "wb") as f:
+            writer = PackWriter(f, 2)
+            writer.add_object(base_sha, "blob", base)
+            writer.add_ref_delta(top_sha, base_sha, create_delta(base, top))
+            writer.finish()
+        pack = Pack(index_pack(self.repo, path))
+        self._remove_loose(base_sha)
+
+        try:
+            stored = pack.stored_entry(top_sha)
+            self.assertEqual(stored.base_sha, base_sha)
+            with patch("ugit.core.objects.get_object") as mock_get:
+                with open(new_temp_pack_path(self.repo), "wb") as f:
+                    write_pack(self.repo, [base_sha, top_sha], f)
+            mock_get.assert_not_called()
+
+            # A delta whose base is not written yet is packed whole
+            copy_path = new_temp_pack_path(self.repo)
+            with open(copy_path, "wb") as f:
+                write_pack(self.repo, [top_sha, base_sha], f)
+            copy = Pack(index_pack(self.repo, copy_path))
+            try:
+                self.assertEqual(copy.stored_entry(top_sha).base_sha, None)
+                self.assertEqual(copy.get_object(top_sha), ("blob", top))
+                self.assertEqual(copy.get_object(base_sha), ("blob", base))
+            finally:
+                copy.close()
+        finally:
+            pack.close()
+
+        with patch("builtins.print"):
+            repack(repo=self.repo)
+        self.assertEqual(get_object(top_sha, repo=self.repo), ("blob", top))
+        self.assertEqual(get_object(base_sha, repo=self.repo), ("blob", base))
@@ -0,0 +1,172 @@
+"""
+Test cases for ugit packed refs.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+from contextlib import redirect_stdout
+from unittest import TestCase
+from unittest.mock import patch
+
+from ugit.commands.add import add
+from ugit.commands.branch import branch
+from ugit.commands.checkout import checkout
+from ugit.commands.commit import commit
+from ugit.commands.config import config
+from ugit.commands.fsck import fsck
+from ugit.commands.init import init
+from ugit.commands.pack_refs import pack_refs
+from ugit.commands.tag import tag
+from ugit.core.refs import (
+    LOCK_SUFFIX,
+    PACKED_REFS,
+    PACKED_REFS_HEADER,
+    PackedRefs,
+    list_refs,
+    read_ref,
+    update_ref,
+)
+from ugit.core.repository import Repository
+
+
+class TestPackedRefsFormat(TestCase):
+    """Test cases for searching a packed-refs file."""
+
+    def setUp(self):
+        """Build a packed-refs file of many tags."""
+        self.refs = {f"refs/tags/v{i:05d}": f"{i:040x}" for i in range(2000)}
+        self.refs["refs/heads/main"] = "a" * 40
+        lines = [f"{self.refs[ref]} {ref}\n" for ref in sorted(self.refs)]
+        self.packed = PackedRefs(PACKED_REFS_HEADER + "".join(lines).encode())
+
+    def test_lookup(self):
+        """Every ref is found, and names between or around them are not."""
+        for ref, sha in self.refs.items():
+            self.assertEqual(self.packed.get(ref), sha)
+        for missing in ("refs/a", "refs/tags/v00001x", "refs/tags/v9", "refs/z"):
+            self.assertIsNone(self.packed.get(missing))
+        self.assertIsNone(PackedRefs(b"").get("refs/heads/main"))
+
+    def test_prefix_listing(self):
+        """Listing a prefix yields only its refs, in order."""
+        names = [ref for ref, _ in self.packed.items("refs/tags/v001")]
+        self.assertEqual(names, [f"refs/tags/v{i:05d}" for i in range(100, 200)])
+        heads = list(self.packed.items("refs/heads/"))
+        self.assertEqual(heads, [("refs/heads/main", "a" * 40)])
+        self.assertEqual(len(list(self.packed.items())), 2001)
+
+
+class TestPackRefs(TestCase):
+    """Test cases for packing, reading and deleting refs."""
+
+    def setUp(self):
+        """Set up a repository with a nested branch and some tags."""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+
+        with redirect_stdout(io.StringIO()):
+            init()
+            config("user.name", "Test User")
+            config("user.email", "test@ugit.com")
+            with open("file.txt", "w") as f:
+                f.write("content")
+            add(["file.txt"])
+            commit("Initial commit")
+            branch("feature/nested")
+            tag("v1.0")
+            tag("v2.0")
+        self.repo = Repository()
+        self.head = self.repo.get_head_ref()
+
+    def tearDown(self):
+        """Clean up test environment."""
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+
+    def _loose_files(self):
+        refs_dir = os.path.join(self.repo.ugit_dir, "refs")
+        return sorted(
+            os.path.relpath(os.path.join(root, name), refs_dir).replace(os.sep, "/")
+            for root, _, files in os.walk(refs_dir)
+            for name in files
+        )
+
+    def test_pack_tags_then_all(self):
+        """Tags are packed by default and branches only with all_refs."""
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(pack_refs(repo=self.repo), 2)
+        self.assertEqual(self._loose_files(), ["heads/feature/nested", "heads/main"])
+
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(pack_refs(all_refs=True, repo=self.repo), 4)
+        self.assertEqual(self._loose_files(), [])
+        self.assertEqual(
+            list_refs(self.repo),
+            {
+                "refs/heads/feature/nested": self.head,
+                "refs/heads/main": self.head,
+                "refs/tags/v1.0": self.head,
+                "refs/tags/v2.0": self.head,
+            },
+        )
+        self.assertEqual(self.repo.get_head_ref(), self.head)
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            branch(list_branches=True)
+            self.assertEqual(fsck(), 0)
+        self.assertIn("  feature/nested\n* main\n", output.getvalue())
+
+    def test_loose_ref_overrides_packed(self):
+        """Updates after packing win, and deletes remove the packed copy."""
+        with redirect_stdout(io.StringIO()):
+            pack_refs(all_refs=True, repo=self.repo)
+            with open("file.txt", "w") as f:
+                f.write("changed")
+            add(["file.txt"])
+            commit("Second commit")
+        second = self.repo.get_head_ref()
+        self.assertNotEqual(second, self.head)
+        self.assertEqual(read_ref(self.repo, "refs/heads/main"), second)
+
+        update_ref(self.repo, "refs/tags/v1.0", second, self.head)
+        tags = list_refs(self.repo, ("refs/tags",))
+        self.assertEqual(tags["refs/tags/v1.0"], second)
+
+        with redirect_stdout(io.StringIO()):
+            tag(delete="v1.0")
+            tag(delete="v2.0")
+            checkout("feature/nested")
+            checkout("main")
+            branch(delete="feature/nested")
+        self.assertEqual(list_refs(self.repo), {"refs/heads/main": second})
+        with open(os.path.join(self.repo.ugit_dir, PACKED_REFS), "rb") as f:
+            self.assertNotIn(b"refs/tags", f.read())
+
+    def test_lock_taken_after_rename_is_kept(self):
+        """A lock taken by the next writer right after a rename survives."""
+        real_replace = os.replace
+
+        def replace_then_relock(src, dst):
+            real_replace(src, dst)
+            with open(src, "w"):
+                pass  # The next writer takes the lock
+
+        for write in (
+            lambda: update_ref(self.repo, "refs/tags/v1.0", self.head, self.head),
+            lambda: pack_refs(all_refs=True, repo=self.repo),
+        ):
+            with patch("ugit.core.refs.os.replace", replace_then_relock):
+                with redirect_stdout(io.StringIO()):
+                    write()
+            locks = [
+                os.path.join(root, name)
+                for root, _, files in os.walk(self.repo.ugit_dir)
+                for name in files
+                if name.endswith(LOCK_SUFFIX)
+            ]
+            self.assertEqual(len(locks), 1)
+            os.remove(locks[0])
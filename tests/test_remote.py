@@ -2,6 +2,8 @@
 Tests for remote operations.
 """
 
+import io
+import json
 import os
 import shutil
 import sys
@@ -9,12 +11,40 @@ import tempfile
 import unittest
 from unittest.mock import patch
 
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from ugit.commands.bundle import bundle
 from ugit.commands.clone import clone
 from ugit.commands.fetch import fetch
+from ugit.commands.http_remote import (
+    close_http_clients,
+    fetch_objects_http,
+    get_http_client,
+    get_http_settings,
+)
 from ugit.commands.push import push
 from ugit.commands.remote import add_remote, list_remotes, remove_remote, show_remote
+from ugit.core.bundle import read_bundle_header
 from ugit.core.exceptions import UgitError
+from ugit.core.objects import get_object, hash_object, object_exists
+from ugit.core.pack import get_packs, new_temp_pack_path
+from ugit.core.promisor import parse_filter
+from ugit.core.protocol import (
+    UPDATE_OK,
+    advertise_refs,
+    decode_push_commands,
+    pack_etag,
+    receive_pack,
+    receive_pack_enabled,
+    resume_offset,
+    upload_objects,
+    upload_pack,
+)
 from ugit.core.repository import Repository
+from ugit.core.shallow import read_shallow
 from ugit.utils.config import Config
 
 
@@ -204,6 +234,110 @@ class TestCloneOperations(unittest.TestCase):
         origin_url = config.get("remote", "origin.url")
         self.assertEqual(origin_url, self.source_dir)
 
+    def test_clone_keeps_tags(self):
+        """Local clones, full and partial, bring the source's tags along."""
+        from ugit.commands.tag import tag
+        from ugit.core.refs import read_ref
+
+        os.chdir(self.source_dir)
+        with patch("builtins.print"):
+            tag("v1.0")
+            tag("v1.1", annotated=True, message="Release 1.1")
+        source = Repository()
+        tags = {
+            name: read_ref(source, f"refs/tags/{name}") for name in ("v1.0", "v1.1")
+        }
+        os.chdir(self.test_dir)
+
+        clone(self.source_dir, "full")
+        clone(self.source_dir, "partial", filter_spec="blob:none")
+        for directory in ("full", "partial"):
+            repo = Repository(directory)
+            for name, sha in tags.items():
+                self.assertEqual(read_ref(repo, f"refs/tags/{name}"), sha)
+                self.assertTrue(object_exists(sha, repo=repo))
+
+    def test_clone_hardlinks_objects(self):
+        """Local clones hardlink object files unless told not to."""
+        clone(self.source_dir, "linked")
+        clone(self.source_dir, "copied", hardlinks=False)
+
+        repo = Repository(self.source_dir)
+        head = repo.get_head_ref()
+        rel_path = os.path.join(".ugit", "objects", head[:2], head[2:])
+        source_stat = os.stat(os.path.join(self.source_dir, rel_path))
+
+        self.assertTrue(
+            os.path.samestat(source_stat, os.stat(os.path.join("linked", rel_path)))
+        )
+        self.assertFalse(
+            os.path.samestat(source_stat, os.stat(os.path.join("copied", rel_path)))
+        )
+
+    def test_clone_shared_uses_alternates(self):
+        """A shared clone reads objects from the source through alternates."""
+        from ugit.core.objects import get_object, hash_object, object_exists
+
+        clone(self.source_dir, "shared", shared=True)
+
+        repo = Repository("shared")
+        head = repo.get_head_ref()
+        objects_dir = os.path.join(repo.ugit_dir, "objects")
+        self.assertFalse(os.path.exists(os.path.join(objects_dir, head[:2])))
+        self.assertTrue(object_exists(head, repo=repo))
+        self.assertEqual(get_object(head, repo=repo)[0], "commit")
+
+        with open(os.path.join("shared", "test.txt"), "r") as f:
+            self.assertEqual(f.read(), "Hello, World!")
+
+        # New objects are written locally, never into the borrowed store
+        sha = hash_object(b"only in the clone", "blob", repo=repo)
+        self.assertTrue(os.path.exists(os.path.join(objects_dir, sha[:2], sha[2:])))
+        self.assertFalse(object_exists(sha, repo=Repository(self.source_dir)))
+
+    def test_partial_clone_fetches_blobs_on_demand(self):
+        """A blob:limit clone leaves large blobs behind until they are read."""
+        from ugit.commands.add import add
+        from ugit.commands.commit import commit
+        from ugit.core.objects import get_object, hash_object, object_exists
+
+        os.chdir(self.source_dir)
+        with open("big.bin", "w") as f:
+            f.write("x" * 4096)
+        add(["big.bin"])
+        commit("Add big file", "Test Author <test@example.com>")
+        with open("big.bin", "w") as f:
+            f.write("y" * 4096)
+        add(["big.bin"])
+        commit("Change big file", "Test Author <test@example.com>")
+        old_big = hash_object(b"x" * 4096, write=False)
+        new_big = hash_object(b"y" * 4096, write=False)
+
+        os.chdir(self.test_dir)
+        clone(self.source_dir, "partial", filter_spec="blob:limit=1k")
+        repo = Repository("partial")
+
+        # Checkout fetched the current version; history stays on the remote
+        self.assertTrue(object_exists(new_big, repo=repo))
+        self.assertFalse(object_exists(old_big, repo=repo))
+        self.assertEqual(get_object(old_big, repo=repo), ("blob", b"x" * 4096))
+        self.assertTrue(object_exists(old_big, repo=repo))
+
+        self.assertEqual(
+            Config("partial").get("remote", "origin.partialclonefilter"),
+            "blob:limit=1k",
+        )
+
+    def test_parse_filter(self):
+        """Filters translate to the size from which blobs are left out."""
+        self.assertEqual(parse_filter("blob:none"), 0)
+        self.assertEqual(parse_filter("blob:limit=1m"), 1024 * 1024)
+        self.assertEqual(parse_filter("blob:limit=500"), 500)
+        with self.assertRaises(UgitError):
+            parse_filter("tree:0")
+        with self.assertRaises(UgitError):
+            clone(self.source_dir, "bad", filter_spec="blob:limit=x")
+
     def test_clone_existing_directory(self):
         """Test cloning to an existing directory."""
         os.makedirs("existing")
@@ -296,6 +430,39 @@ class TestFetchOperations(unittest.TestCase):
             calls = [call.args[0] for call in mock_print.call_args_list]
             self.assertTrue(any("origin/main" in str(call) for call in calls))
 
+    def test_fetch_copies_one_pack_of_new_objects(self):
+        """Fetch stops at known history and copies the rest as one pack."""
+        from ugit.commands.add import add
+        from ugit.commands.checkout import checkout
+        from ugit.commands.commit import commit
+        from ugit.commands.merge import merge
+
+        # A merge whose second parent is only reachable through parent2
+        os.chdir(self.source_dir)
+        checkout("feature", create_branch=True)
+        with open("feature.txt", "w") as f:
+            f.write("Feature")
+        add(["feature.txt"])
+        commit("Feature commit", "Test Author <test@example.com>")
+        feature_head = Repository().get_head_ref()
+        checkout("main")
+        with open("main.txt", "w") as f:
+            f.write("Main")
+        add(["main.txt"])
+        commit("Main commit", "Test Author <test@example.com>")
+        merge("feature", no_ff=True)
+
+        os.chdir(self.target_dir)
+        with patch("builtins.print"):
+            self.assertEqual(fetch("origin"), 0)
+
+        target = Repository()
+        self.assertTrue(object_exists(feature_head, repo=target))
+        packs = get_packs(os.path.join(target.ugit_dir, "objects"))
+        self.assertEqual(len(packs), 1)
+        # 3 commits, 3 trees and 2 blobs; the initial commit was not resent
+        self.assertEqual(len(packs[0]), 8)
+
     def test_fetch_nonexistent_remote(self):
         """Test fetching from non-existent remote."""
         with patch("builtins.print") as mock_print:
@@ -364,6 +531,706 @@ class TestPushOperations(unittest.TestCase):
         with self.assertRaises(UgitError):
             push("nonexistent")
 
+    def test_push_sends_thin_pack(self):
+        """A push sends one pack with deltas against objects the remote has."""
+        from ugit.commands.add import add
+        from ugit.commands.commit import commit
+
+        lines = "".join(f"line {i} of a longer file\n" for i in range(200))
+        with open("test.txt", "w") as f:
+            f.write(lines)
+        add(["test.txt"])
+        commit("Grow file", "Test Author <test@example.com>")
+        with patch("builtins.print"):
+            push("origin", "main")
+
+        with open("test.txt", "a") as f:
+            f.write("one more line\n")
+        add(["test.txt"])
+        commit("Append line", "Test Author <test@example.com>")
+        with patch("builtins.print"):
+            push("origin", "main")
+
+        remote = Repository(self.target_dir)
+        local_head = Repository().get_head_ref()
+        with open(os.path.join(remote.ugit_dir, "refs", "heads", "main")) as f:
+            self.assertEqual(f.read(), local_head)
+
+        # The second pack is the thin one, completed with its delta base
+        packs = get_packs(os.path.join(remote.ugit_dir, "objects"))
+        self.assertEqual(sorted(len(pack) for pack in packs), [4, 6])
+        blob = hash_object((lines + "one more line\n").encode(), write=False)
+        self.assertTrue(object_exists(blob, repo=remote))
+
+    def test_receive_pack_compares_old_value(self):
+        """A ref update is refused if the ref moved since it was read."""
+        with patch("builtins.print"):
+            push("origin", "main")
+        remote = Repository(self.target_dir)
+        head = Repository().get_head_ref()
+
+        results = receive_pack(remote, None, [("refs/heads/main", "0" * 40, head)])
+        self.assertNotEqual(results["refs/heads/main"], UPDATE_OK)
+
+        results = receive_pack(remote, None, [("refs/heads/copy", None, head)])
+        self.assertEqual(results["refs/heads/copy"], UPDATE_OK)
+        results = receive_pack(remote, None, [("refs/heads/copy", None, head)])
+        self.assertNotEqual(results["refs/heads/copy"], UPDATE_OK)
+
+    def test_receive_pack_refuses_checked_out_branch(self):
+        """The branch checked out in the receiving repository is not moved."""
+        from ugit.commands.add import add
+        from ugit.commands.branch import branch
+        from ugit.commands.commit import commit
+
+        with patch("builtins.print"):
+            push("origin", "main")
+            with open("next.txt", "w") as f:
+                f.write("Next")
+            add(["next.txt"])
+            commit("Next commit", "Test Author <test@example.com>")
+            branch("next")
+            push("origin", "next")
+        remote = Repository(self.target_dir)
+        old_head = remote.get_head_ref()
+        update = ("refs/heads/main", old_head, Repository().get_head_ref())
+
+        results = receive_pack(remote, None, [update])
+        self.assertEqual(
+            results["refs/heads/main"], "refusing to update the checked out branch"
+        )
+        self.assertEqual(remote.get_head_ref(), old_head)
+
+        Config(self.target_dir).set("receive", "denyCurrentBranch", "ignore")
+        results = receive_pack(remote, None, [update])
+        self.assertEqual(results["refs/heads/main"], UPDATE_OK)
+
+
+class TestShallowOperations(unittest.TestCase):
+    """Test shallow clones and fetches that move the shallow boundary."""
+
+    def setUp(self):
+        """Set up a source repository with five commits."""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        self.source_dir = os.path.join(self.test_dir, "source")
+        os.makedirs(self.source_dir)
+        os.chdir(self.source_dir)
+
+        from ugit.commands.init import init
+
+        with patch("builtins.print"):
+            init()
+            self.commits = [self._commit_source(i) for i in range(5)]
+            os.chdir(self.test_dir)
+            clone(self.source_dir, "shallow", depth=2)
+        self.repo = Repository(os.path.join(self.test_dir, "shallow"))
+
+    def tearDown(self):
+        """Clean up test environment."""
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+
+    def _commit_source(self, i):
+        from ugit.commands.add import add
+        from ugit.commands.commit import commit
+
+        os.chdir(self.source_dir)
+        with open("file.txt", "w") as f:
+            f.write(f"version {i}")
+        add(["file.txt"])
+        commit(f"Commit {i}", "Test Author <test@example.com>")
+        return Repository().get_head_ref()
+
+    def _log_messages(self):
+        from ugit.commands.log import log
+
+        os.chdir(self.repo.path)
+        with patch("builtins.print") as mock_print:
+            log(oneline=True)
+        return [call.args[0].split(" ", 1)[1] for call in mock_print.call_args_list]
+
+    def test_shallow_clone_records_boundary(self):
+        """A depth 2 clone holds two commits and marks the older one shallow."""
+        self.assertEqual(read_shallow(self.repo), {self.commits[3]})
+        self.assertFalse(object_exists(self.commits[2], repo=self.repo))
+        self.assertEqual(self._log_messages(), ["Commit 4", "Commit 3"])
+
+    def test_fetch_keeps_boundary(self):
+        """Fetching new commits into a shallow clone leaves the boundary alone."""
+        new_head = self._commit_source(5)
+        os.chdir(self.repo.path)
+        with patch("builtins.print"):
+            self.assertEqual(fetch("origin"), 0)
+
+        self.assertTrue(object_exists(new_head, repo=self.repo))
+        self.assertFalse(object_exists(self.commits[2], repo=self.repo))
+        self.assertEqual(read_shallow(self.repo), {self.commits[3]})
+
+    def test_fetch_deepen(self):
+        """--deepen fetches history below the boundary and moves it down."""
+        os.chdir(self.repo.path)
+        with patch("builtins.print"):
+            self.assertEqual(fetch("origin", deepen=2), 0)
+
+        self.assertEqual(read_shallow(self.repo), {self.commits[1]})
+        self.assertEqual(
+            self._log_messages(), ["Commit 4", "Commit 3", "Commit 2", "Commit 1"]
+        )
+
+        with patch("builtins.print"):
+            self.assertEqual(fetch("origin", deepen=5), 0)
+        self.assertEqual(read_shallow(self.repo), frozenset())
+        self.assertFalse(os.path.exists(os.path.join(self.repo.ugit_dir, "shallow")))
+
+    def test_depth_and_deepen_conflict(self):
+        """--depth and --deepen cannot be combined."""
+        os.chdir(self.repo.path)
+        with patch("builtins.print"):
+            self.assertEqual(fetch("origin", depth=1, deepen=1), 1)
+
+
+class TestBundleOperations(unittest.TestCase):
+    """Test bundle files and cloning and fetching from them."""
+
+    def setUp(self):
+        """Set up a source repository with one commit."""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        self.source_dir = os.path.join(self.test_dir, "source")
+        self.bundle_path = os.path.join(self.test_dir, "nightly.bundle")
+        os.makedirs(self.source_dir)
+        os.chdir(self.source_dir)
+
+        from ugit.commands.init import init
+
+        with patch("builtins.print"):
+            init()
+            self.first = self._commit_source("one")
+
+    def tearDown(self):
+        """Clean up test environment."""
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+
+    def _commit_source(self, content):
+        from ugit.commands.add import add
+        from ugit.commands.commit import commit
+
+        os.chdir(self.source_dir)
+        with open("file.txt", "w") as f:
+            f.write(content)
+        add(["file.txt"])
+        commit(content, "Test Author <test@example.com>")
+        return Repository().get_head_ref()
+
+    def _bundle(self, *revs):
+        os.chdir(self.source_dir)
+        with patch("builtins.print"):
+            bundle("create", self.bundle_path, list(revs))
+
+    def test_clone_and_fetch_from_bundle(self):
+        """A bundle can be cloned, then fetched from as the origin remote."""
+        self._bundle("--all")
+        header = read_bundle_header(self.bundle_path)
+        self.assertEqual(header.refs["refs/heads/main"], self.first)
+        self.assertEqual(header.prerequisites, [])
+
+        os.chdir(self.test_dir)
+        with patch("builtins.print"):
+            clone(self.bundle_path)
+        clone_dir = os.path.join(self.test_dir, "nightly")
+        with open(os.path.join(clone_dir, "file.txt")) as f:
+            self.assertEqual(f.read(), "one")
+
+        # The next bundle only carries what was committed since
+        second = self._commit_source("two")
+        self._bundle(f"{self.first}..main")
+        header = read_bundle_header(self.bundle_path)
+        self.assertEqual(header.prerequisites, [self.first])
+
+        os.chdir(clone_dir)
+        with patch("builtins.print"):
+            self.assertEqual(fetch("origin"), 0)
+        repo = Repository(clone_dir)
+        self.assertTrue(object_exists(second, repo=repo))
+        tracking = os.path.join(repo.ugit_dir, "refs", "remotes", "origin", "main")
+        with open(tracking) as f:
+            self.assertEqual(f.read(), second)
+
+    def test_bundle_ref_names_are_checked(self):
+        """A bundle naming a ref outside refs/ is refused, not written."""
+        self._bundle("--all")
+        with open(self.bundle_path, "rb") as f:
+            data = f.read()
+        with open(self.bundle_path, "wb") as f:
+            f.write(data.replace(b" refs/heads/main\n", b" refs/heads/../../x\n", 1))
+
+        os.chdir(self.test_dir)
+        with patch("builtins.print"), self.assertRaisesRegex(UgitError, "Invalid"):
+            clone(self.bundle_path, "evil")
+        self.assertFalse(os.path.exists("evil"))
+
+    def test_unbundle_requires_prerequisites(self):
+        """Unbundling fails when the repository lacks a prerequisite."""
+        self._commit_source("two")
+        self._bundle(f"^{self.first}", "main")
+
+        from ugit.commands.init import init
+
+        empty_dir = os.path.join(self.test_dir, "empty")
+        os.makedirs(empty_dir)
+        os.chdir(empty_dir)
+        with patch("builtins.print"):
+            init()
+        with self.assertRaises(UgitError):
+            bundle("unbundle", self.bundle_path)
+        with self.assertRaises(UgitError):
+            clone(self.bundle_path, os.path.join(self.test_dir, "partial"))
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, "partial")))
+
+
+class _FakeResponse:
+    """Minimal stand-in for an httpx response."""
+
+    def __init__(self, status_code, content=b"", headers=None, fail_after=None):
+        self.status_code = status_code
+        self.content = content
+        self.text = content.decode(errors="replace")
+        self.headers = headers or {}
+        self.fail_after = fail_after
+
+    def json(self):
+        return json.loads(self.content)
+
+    def read(self):
+        return self.content
+
+    def iter_bytes(self):
+        for start in range(0, len(self.content), 4096):
+            if self.fail_after is not None and start >= self.fail_after:
+                raise OSError("connection reset")
+            yield self.content[start : start + 4096]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _FakeHttpx:
+    """Stands in for the httpx module, serving a local repository."""
+
+    HTTPError = OSError
+
+    def __init__(self, server_dir):
+        self.server = Repository(server_dir)
+        self.requests = []
+        self.ranges = []
+        self.fail_after = None
+
+    def Client(self, **kwargs):
+        return _FakeClient(self)
+
+    def Timeout(self, timeout, connect=None):
+        return (timeout, connect)
+
+    def Limits(self, **kwargs):
+        return kwargs
+
+
+class _FakeClient:
+    """Routes client calls to the protocol functions of the served repository."""
+
+    def __init__(self, httpx_module):
+        self.httpx = httpx_module
+        self.server = httpx_module.server
+        self.is_closed = False
+
+    def close(self):
+        self.is_closed = True
+
+    def get(self, url):
+        self.httpx.requests.append(("GET", url, None))
+        if url.endswith("/ugit/info/refs"):
+            body = json.dumps(advertise_refs(self.server)).encode()
+            return _FakeResponse(200, body)
+        return _FakeResponse(404)
+
+    def stream(self, method, url, json=None, headers=None):
+        self.httpx.requests.append((method, url, json))
+        headers = headers or {}
+        self.httpx.ranges.append(headers.get("Range"))
+        out = io.BytesIO()
+        if url.endswith("/ugit/objects"):
+            upload_objects(self.server, json["shas"], out)
+        else:
+            upload_pack(
+                self.server,
+                json["wants"],
+                json["haves"],
+                out,
+                filter_spec=json.get("filter"),
+                depth=json.get("depth"),
+                since=json.get("since"),
+                shallow=json.get("shallow", ()),
+            )
+
+        # Serve ranges the way web.server does
+        etag = pack_etag(out)
+        size = out.tell()
+        offset = resume_offset(
+            headers.get("Range"), headers.get("If-Range"), etag, size
+        )
+        response_headers = {"ETag": etag}
+        if offset:
+            response_headers["Content-Range"] = f"bytes {offset}-{size - 1}/{size}"
+        fail_after, self.httpx.fail_after = self.httpx.fail_after, None
+        return _FakeResponse(
+            206 if offset else 200,
+            out.getvalue()[offset:],
+            response_headers,
+            fail_after,
+        )
+
+    def post(self, url, content=None, headers=None):
+        commands, pack = b"".join(content).split(b"\n", 1)
+        updates = decode_push_commands(commands)
+        self.httpx.requests.append(("POST", url, updates))
+        if not receive_pack_enabled(self.server):
+            return _FakeResponse(403, b"Pushing is disabled")
+        pack_path = None
+        if pack:
+            pack_path = new_temp_pack_path(self.server)
+            with open(pack_path, "wb") as f:
+                f.write(pack)
+        results = receive_pack(self.server, pack_path, updates)
+        return _FakeResponse(200, json.dumps({"results": results}).encode())
+
+
+class TestHttpTransport(unittest.TestCase):
+    """Test clone, fetch and push over the smart HTTP protocol."""
+
+    def setUp(self):
+        """Set up a source repository served through a fake httpx."""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        self.source_dir = os.path.join(self.test_dir, "source")
+        os.makedirs(self.source_dir)
+        os.chdir(self.source_dir)
+        self._commit_file("test.txt", "Hello, World!", "Initial commit", init=True)
+
+        self.fake_httpx = _FakeHttpx(self.source_dir)
+        patcher = patch("ugit.commands.http_remote.httpx", self.fake_httpx)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        close_http_clients()
+        self.addCleanup(close_http_clients)
+
+        os.chdir(self.test_dir)
+        clone("http://example.com/source", "target")
+        self.target_dir = os.path.join(self.test_dir, "target")
+
+    def tearDown(self):
+        """Clean up test environment."""
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+
+    def _commit_file(self, path, content, message, init=False):
+        from ugit.commands.add import add
+        from ugit.commands.commit import commit
+        from ugit.commands.init import init as init_repo
+
+        if init:
+            init_repo()
+        with open(path, "w") as f:
+            f.write(content)
+        add([path])
+        commit(message, "Test Author <test@example.com>")
+        return Repository().get_head_ref()
+
+    def test_clone_over_http(self):
+        """Clone downloads one pack and checks out the remote HEAD branch."""
+        with open(os.path.join(self.target_dir, "test.txt")) as f:
+            self.assertEqual(f.read(), "Hello, World!")
+
+        target = Repository(self.target_dir)
+        self.assertEqual(
+            target.get_head_ref(), Repository(self.source_dir).get_head_ref()
+        )
+        packs = get_packs(os.path.join(target.ugit_dir, "objects"))
+        self.assertEqual(len(packs), 1)
+        self.assertEqual(len(packs[0]), 3)
+
+    def test_fetch_sends_only_new_objects(self):
+        """Fetch negotiates with local tips so only new objects are sent."""
+        os.chdir(self.source_dir)
+        old_head = Repository().get_head_ref()
+        new_head = self._commit_file("new.txt", "New content", "New commit")
+
+        os.chdir(self.target_dir)
+        self.assertEqual(fetch("origin"), 0)
+
+        method, url, body = self.fake_httpx.requests[-1]
+        self.assertEqual(url, "http://example.com/source/ugit/upload-pack")
+        self.assertEqual(body["wants"], [new_head])
+        self.assertIn(old_head, body["haves"])
+
+        remote_ref = os.path.join(".ugit", "refs", "remotes", "origin", "main")
+        with open(remote_ref) as f:
+            self.assertEqual(f.read(), new_head)
+
+        # Clone brought 3 objects; the fetch adds a commit, a tree and a blob
+        packs = get_packs(os.path.abspath(os.path.join(".ugit", "objects")))
+        self.assertEqual(sorted(len(pack) for pack in packs), [3, 3])
+
+    def test_push_over_http(self):
+        """Push sends its ref update and pack in one request."""
+        os.chdir(self.target_dir)
+        old_head = Repository().get_head_ref()
+        new_head = self._commit_file("pushed.txt", "Pushed", "Pushed commit")
+
+        # Pushing needs an opt-in, and the served checked out branch
+        # only moves once that is allowed too
+        with patch("builtins.print"), self.assertRaises(UgitError) as cm:
+            push("origin", "main")
+        self.assertIn("HTTP 403", str(cm.exception))
+        config = Config(self.source_dir)
+        config.set("http", "receivepack", "true")
+        with patch("builtins.print"), self.assertRaises(UgitError) as cm:
+            push("origin", "main")
+        self.assertIn("checked out branch", str(cm.exception))
+        self.assertEqual(Repository(self.source_dir).get_head_ref(), old_head)
+        config.set("receive", "denyCurrentBranch", "ignore")
+
+        with patch("builtins.print"):
+            self.assertEqual(push("origin", "main"), 0)
+
+        method, url, updates = self.fake_httpx.requests[-1]
+        self.assertEqual(url, "http://example.com/source/ugit/receive-pack")
+        self.assertEqual(updates, [("refs/heads/main", old_head, new_head)])
+        self.assertEqual(Repository(self.source_dir).get_head_ref(), new_head)
+
+    def test_malicious_advertisement_rejected(self):
+        """Ref names, SHAs and HEAD from the server are checked before writing."""
+        os.chdir(self.target_dir)
+        real = advertise_refs(Repository(self.source_dir))
+        head = real["refs"]["refs/heads/main"]
+        for refs, head_branch in (
+            ({"refs/heads/../../../../escaped": head}, "main"),
+            ({"refs/heads/main": "not-a-sha"}, "main"),
+            ({"refs/heads/main": head}, "../../../escaped"),
+        ):
+            advertisement = dict(real, refs=refs, head=head_branch)
+            with patch(f"{__name__}.advertise_refs", return_value=advertisement):
+                with patch("builtins.print"):
+                    self.assertEqual(fetch("origin"), 1)
+                with self.assertRaisesRegex(UgitError, "Invalid"):
+                    clone("http://example.com/source", "evil")
+                self.assertFalse(os.path.exists("evil"))
+
+        for directory in (self.test_dir, self.target_dir):
+            self.assertFalse(os.path.exists(os.path.join(directory, "escaped")))
+        tracking = os.path.join(".ugit", "refs", "remotes", "origin")
+        self.assertEqual(os.listdir(tracking), ["main"])
+
+        # Refs other than branches and tags are skipped
+        advertisement = dict(real, refs={"refs/heads/main": head, "refs/x/y": head})
+        with patch(f"{__name__}.advertise_refs", return_value=advertisement):
+            self.assertEqual(fetch("origin"), 0)
+        self.assertFalse(os.path.exists(os.path.join(".ugit", "refs", "x")))
+
+    def test_fetch_objects_in_batches(self):
+        """Specific objects are fetched in several batches in flight at once."""
+        os.chdir(self.source_dir)
+        shas = [
+            hash_object(f"object {i}".encode(), repo=Repository()) for i in range(10)
+        ]
+
+        os.chdir(self.target_dir)
+        with patch("ugit.commands.http_remote.OBJECT_BATCH_SIZE", 3):
+            batches = fetch_objects_http(
+                Repository(), "http://example.com/source", shas
+            )
+
+        self.assertEqual(batches, 4)
+        for sha in shas:
+            self.assertTrue(object_exists(sha, repo=Repository()))
+
+    def _commit_large_file(self):
+        """Commit an incompressible file to the source, so its pack is big."""
+        os.chdir(self.source_dir)
+        return self._commit_file("large.bin", os.urandom(96 * 1024).hex(), "Large")
+
+    def test_interrupted_fetch_resumes(self):
+        """A dropped download resumes from its last checkpoint."""
+        new_head = self._commit_large_file()
+        os.chdir(self.target_dir)
+        self.fake_httpx.fail_after = 64 * 1024
+        with patch("ugit.commands.http_remote.CHECKPOINT_INTERVAL", 16 * 1024):
+            self.assertEqual(fetch("origin"), 0)
+
+        first, second = self.fake_httpx.ranges[-2:]
+        self.assertIsNone(first)
+        self.assertEqual(second, f"bytes={64 * 1024}-")
+        self.assertTrue(object_exists(new_head, repo=Repository()))
+
+        pack_dir = os.path.join(".ugit", "objects", "pack")
+        self.assertFalse([n for n in os.listdir(pack_dir) if n.startswith("tmp-")])
+
+    def test_interrupted_clone_resumes(self):
+        """Cloning again into an interrupted clone downloads only the rest."""
+        self._commit_large_file()
+        os.chdir(self.test_dir)
+        self.fake_httpx.fail_after = 32 * 1024
+        with patch("ugit.commands.http_remote.CHECKPOINT_INTERVAL", 16 * 1024):
+            with patch("ugit.commands.http_remote.DOWNLOAD_RETRIES", 0):
+                with self.assertRaises(UgitError):
+                    clone("http://example.com/source", "again")
+            self.assertTrue(os.path.isdir("again"))
+
+            clone("http://example.com/source", "again")
+
+        self.assertEqual(self.fake_httpx.ranges[-1], f"bytes={32 * 1024}-")
+        with open(os.path.join("again", "large.bin")) as f:
+            self.assertEqual(len(f.read()), 192 * 1024)
+
+    def test_partial_clone_over_http(self):
+        """A blob:none clone gets blobs for checkout in one batch, others lazily."""
+        os.chdir(self.source_dir)
+        old_blob = hash_object(b"Hello, World!", write=False)
+        self._commit_file("test.txt", "Changed", "Change")
+
+        os.chdir(self.test_dir)
+        clone("http://example.com/source", "partial", filter_spec="blob:none")
+        repo = Repository(os.path.join(self.test_dir, "partial"))
+
+        pack_requests = [r for r in self.fake_httpx.requests if r[0] == "POST"]
+        method, url, body = pack_requests[-2]
+        self.assertEqual(body["filter"], "blob:none")
+        method, url, body = pack_requests[-1]
+        self.assertEqual(url, "http://example.com/source/ugit/objects")
+        self.assertEqual(len(body["shas"]), 1)
+
+        with open(os.path.join(repo.path, "test.txt")) as f:
+            self.assertEqual(f.read(), "Changed")
+        self.assertFalse(object_exists(old_blob, repo=repo))
+        self.assertEqual(get_object(old_blob, repo=repo), ("blob", b"Hello, World!"))
+
+    def test_shallow_clone_over_http(self):
+        """A depth 1 clone asks the server for one commit of history."""
+        os.chdir(self.source_dir)
+        first = Repository().get_head_ref()
+        second = self._commit_file("test.txt", "Changed", "Change")
+
+        os.chdir(self.test_dir)
+        clone("http://example.com/source", "shallow", depth=1)
+        repo = Repository(os.path.join(self.test_dir, "shallow"))
+
+        method, url, body = self.fake_httpx.requests[-1]
+        self.assertEqual(body["depth"], 1)
+        self.assertEqual(read_shallow(repo), {second})
+        self.assertFalse(object_exists(first, repo=repo))
+
+
+@unittest.skipIf(httpx is None, "httpx is not installed")
+class TestHttpClientPool(unittest.TestCase):
+    """Test the shared httpx clients, with a mock transport as the server."""
+
+    _commit_file = TestHttpTransport._commit_file
+
+    def setUp(self):
+        """Set up a source repository and a clone of it over HTTP."""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        self.source_dir = os.path.join(self.test_dir, "source")
+        os.makedirs(self.source_dir)
+        os.chdir(self.source_dir)
+        self._commit_file("test.txt", "Hello", "Initial", init=True)
+
+        self.server = Repository(self.source_dir)
+        self.clients = []
+        self.requests = []
+        test = self
+
+        class MockTransportClient(httpx.Client):
+            def __init__(self, **kwargs):
+                super().__init__(transport=httpx.MockTransport(test._serve), **kwargs)
+                self.options = kwargs
+                test.clients.append(self)
+
+        patcher = patch("ugit.commands.http_remote.httpx.Client", MockTransportClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        close_http_clients()
+        self.addCleanup(close_http_clients)
+
+        os.chdir(self.test_dir)
+        clone("http://example.com/source", "target")
+        self.target_dir = os.path.join(self.test_dir, "target")
+
+    def tearDown(self):
+        """Clean up test environment."""
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+
+    def _serve(self, request):
+        """Answer a request the way web.server does, without ranges."""
+        self.requests.append(request)
+        path = request.url.path
+        if path.endswith("/ugit/info/refs"):
+            return httpx.Response(200, json=advertise_refs(self.server))
+        if path.endswith("/ugit/upload-pack"):
+            body = json.loads(request.content)
+            out = io.BytesIO()
+            upload_pack(self.server, body["wants"], body["haves"], out)
+            return httpx.Response(
+                200, content=out.getvalue(), headers={"ETag": pack_etag(out)}
+            )
+        return httpx.Response(404)
+
+    def test_requests_share_one_client(self):
+        """Every request to the remote host reuses the same pooled client."""
+        os.chdir(self.source_dir)
+        self._commit_file("new.txt", "New content", "New commit")
+        os.chdir(self.target_dir)
+        self.assertEqual(fetch("origin"), 0)
+        self.assertEqual(fetch("origin"), 0)
+
+        self.assertEqual(len(self.clients), 1)
+        self.assertGreaterEqual(len(self.requests), 5)
+        client = self.clients[0]
+        self.assertIs(get_http_client("http://example.com/other"), client)
+        self.assertIsNot(get_http_client("https://example.com/source"), client)
+        self.assertEqual(
+            self.requests[-1].headers["User-Agent"], client.headers["User-Agent"]
+        )
+
+        close_http_clients()
+        self.assertTrue(client.is_closed)
+
+    def test_http_settings_from_config(self):
+        """Timeouts, pool limits and HTTP/2 come from the [http] section."""
+        os.chdir(self.target_dir)
+        config = Config(".")
+        config.set("http", "timeout", "5")
+        config.set("http", "maxConnections", "2")
+        config.set("http", "version", "HTTP/2")
+        config.set("http", "maxRequests", "bogus")
+
+        settings = get_http_settings(Repository())
+        self.assertEqual(settings.timeout, 5.0)
+        self.assertEqual(settings.max_connections, 2)
+        self.assertTrue(settings.http2)
+        self.assertEqual(settings.max_requests, 4)
+
+        close_http_clients()
+        self.assertEqual(fetch("origin"), 0)
+        client = self.clients[-1]
+        self.assertEqual(client.timeout, httpx.Timeout(5.0, connect=10.0))
+        self.assertEqual(client.options["limits"].max_connections, 2)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -9,9 +9,11 @@ from unittest import TestCase
 
 from ugit.commands.add import add
 from ugit.commands.commit import commit
+from ugit.commands.config import config
 from ugit.commands.init import init
 from ugit.commands.reset import reset, unstage
-from ugit.core.repository import Repository
+from ugit.core.refs import read_ref
+from ugit.core.repository import Index, Repository
 
 
 class TestResetCommand(TestCase):
@@ -113,3 +115,47 @@ class TestResetCommand(TestCase):
             reset(soft=True)  # Should only move HEAD
         except SystemExit:
             pass
+
+    def test_hard_reset_parallel_checkout(self):
+        """Test that a hard reset restores many files through the writer pool."""
+        config("checkout.workers", "4")
+        config("checkout.thresholdForParallelism", "2")
+
+        os.makedirs(os.path.join("src", "pkg"))
+        for i in range(40):
+            directory = "src" if i % 2 else os.path.join("src", "pkg")
+            with open(os.path.join(directory, f"file{i}.txt"), "w") as f:
+                f.write(f"content {i}")
+        add(["src"])
+        commit("Add many files", "Test Author <test@example.com>")
+
+        shutil.rmtree("src")
+        reset("HEAD", hard=True)
+
+        for i in range(40):
+            directory = "src" if i % 2 else os.path.join("src", "pkg")
+            with open(os.path.join(directory, f"file{i}.txt"), "r") as f:
+                self.assertEqual(f.read(), f"content {i}")
+
+        index_data = Index(Repository()).read()
+        self.assertIn("src/pkg/file0.txt", index_data)
+        self.assertEqual(len(index_data), 41)
+
+    def test_commit_after_hard_reset_moves_branch(self):
+        """Test that a bare hard reset keeps HEAD on the branch."""
+        with open("test.txt", "w") as f:
+            f.write("Local change")
+        reset(hard=True)
+        with open("test.txt", "r") as f:
+            self.assertEqual(f.read(), "Hello, World!")
+
+        repo = Repository()
+        with open(os.path.join(repo.ugit_dir, "HEAD"), "r") as f:
+            self.assertEqual(f.read().strip(), "ref: refs/heads/main")
+
+        with open("test.txt", "w") as f:
+            f.write("After reset")
+        add(["test.txt"])
+        commit("After reset", "Test Author <test@example.com>")
+        head = repo.get_head_ref()
+        self.assertEqual(read_ref(repo, "refs/heads/main"), head)
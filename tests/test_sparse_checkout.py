@@ -0,0 +1,159 @@
+"""
+Test cases for ugit sparse checkout.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+from contextlib import redirect_stdout
+from unittest import TestCase
+
+from ugit.commands.add import add
+from ugit.commands.checkout import checkout
+from ugit.commands.clone import clone
+from ugit.commands.commit import commit
+from ugit.commands.config import config
+from ugit.commands.init import init
+from ugit.commands.reset import reset
+from ugit.commands.sparse_checkout import sparse_checkout
+from ugit.commands.status import status
+from ugit.core.repository import Index, Repository
+from ugit.core.sparse import SparseCones
+from ugit.utils.helpers import get_commit_data, get_tree_files
+
+
+class TestSparseCones(TestCase):
+    """Test cases for cone matching."""
+
+    def test_cone_matching(self):
+        """Top-level files, cone contents and files beside parent cones match."""
+        cones = SparseCones(["src/app", "docs/"])
+
+        self.assertTrue(cones.matches("README.md"))
+        self.assertTrue(cones.matches("src/app/main.py"))
+        self.assertTrue(cones.matches("src/app/deep/nested.py"))
+        self.assertTrue(cones.matches("src/setup.py"))
+        self.assertTrue(cones.matches("docs/index.md"))
+        self.assertFalse(cones.matches("src/lib/util.py"))
+        self.assertFalse(cones.matches("src/application/x.py"))
+        self.assertFalse(cones.matches("tests/test_app.py"))
+
+        self.assertTrue(cones.includes_directory("src"))
+        self.assertTrue(cones.includes_directory("src/app/deep"))
+        self.assertFalse(cones.includes_directory("src/lib"))
+        self.assertFalse(cones.includes_directory("tests"))
+
+
+class TestSparseCheckout(TestCase):
+    """Test cases for the sparse-checkout command."""
+
+    def setUp(self):
+        """Set up a repository with several top-level directories."""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+
+        init()
+        config("user.name", "Test User")
+        config("user.email", "test@ugit.com")
+        self._write("README.md", "readme")
+        self._write("app/main.py", "main")
+        self._write("lib/util.py", "util")
+        self._write("lib/core/base.py", "base")
+        self._write("tools/run.py", "run")
+        add(".")
+        commit("Initial commit")
+        self.repo = Repository()
+
+    def tearDown(self):
+        """Clean up test environment."""
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+
+    def _write(self, path, content):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def _status(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            status()
+        return output.getvalue()
+
+    def test_set_removes_files_outside_cones(self):
+        """Files outside the cones are removed and flagged skip-worktree."""
+        sparse_checkout("set", ["app"])
+
+        self.assertTrue(os.path.exists("README.md"))
+        self.assertTrue(os.path.exists("app/main.py"))
+        self.assertFalse(os.path.exists("lib"))
+
+        index = Index(self.repo)
+        self.assertEqual(len(index.read()), 5)
+        self.assertEqual(
+            index.read_skip_worktree(),
+            {"lib/util.py", "lib/core/base.py", "tools/run.py"},
+        )
+        self.assertIn("working tree clean", self._status())
+
+    def test_commit_keeps_skipped_files(self):
+        """Commits made in a sparse checkout still contain skipped files."""
+        sparse_checkout("set", ["app"])
+        self._write("app/main.py", "changed")
+        add(".")
+        commit("Change app")
+
+        commit_data = get_commit_data(self.repo.get_head_ref(), repo=self.repo)
+        files = get_tree_files(commit_data["tree"], repo=self.repo)
+        self.assertIn("lib/util.py", files)
+        self.assertIn("lib/core/base.py", files)
+
+    def test_checkout_does_not_materialize_skipped_files(self):
+        """Switching branches only writes files inside the cones."""
+        checkout("feature", create_branch=True)
+        self._write("lib/util.py", "feature util")
+        self._write("app/main.py", "feature main")
+        add(".")
+        commit("Feature change")
+        checkout("main")
+
+        sparse_checkout("set", ["app"])
+        checkout("feature")
+
+        with open("app/main.py") as f:
+            self.assertEqual(f.read(), "feature main")
+        self.assertFalse(os.path.exists("lib/util.py"))
+        self.assertIn("lib/util.py", Index(self.repo).read_skip_worktree())
+
+        reset("HEAD", hard=True)
+        self.assertFalse(os.path.exists("lib"))
+        self.assertIn("working tree clean", self._status())
+
+    def test_add_and_disable_restore_files(self):
+        """Widening the cones and disabling bring files back."""
+        sparse_checkout("set", ["app"])
+        sparse_checkout("add", ["lib/core"])
+
+        self.assertTrue(os.path.exists("lib/core/base.py"))
+        self.assertTrue(os.path.exists("lib/util.py"))  # Beside a parent cone
+        self.assertFalse(os.path.exists("tools"))
+
+        sparse_checkout("disable")
+
+        with open("tools/run.py") as f:
+            self.assertEqual(f.read(), "run")
+        self.assertEqual(Index(self.repo).read_skip_worktree(), set())
+
+    def test_clone_sparse(self):
+        """A sparse clone only checks out top-level files."""
+        clone_dir = self.test_dir + "-sparse"
+        clone(self.test_dir, clone_dir, sparse=True)
+        try:
+            self.assertTrue(os.path.exists(os.path.join(clone_dir, "README.md")))
+            self.assertFalse(os.path.exists(os.path.join(clone_dir, "app")))
+            self.assertFalse(os.path.exists(os.path.join(clone_dir, "lib")))
+        finally:
+            shutil.rmtree(clone_dir)
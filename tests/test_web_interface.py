@@ -2,6 +2,7 @@
 Tests for the web interface functionality and serve command.
 """
 
+import hashlib
 import os
 import sys
 import tempfile
@@ -14,6 +15,7 @@ from ugit.commands.add import add
 from ugit.commands.commit import commit
 from ugit.commands.init import init
 from ugit.commands.serve import serve
+from ugit.utils.config import Config
 
 pytestmark = pytest.mark.skipif(
     sys.platform == "win32",
@@ -202,6 +204,21 @@ class TestWebServer:
         response = client.get("/static/invalid.css")
         assert response.status_code == 404
 
+    def test_uploads_need_receivepack(self, client):
+        """Test that pushes and LFS uploads are refused until enabled."""
+        content = b"large file content"
+        oid = hashlib.sha256(content).hexdigest()
+        response = client.post("/ugit/receive-pack", content=b'{"updates": []}\n')
+        assert response.status_code == 403
+        response = client.put(f"/ugit/lfs/objects/{oid}", content=content)
+        assert response.status_code == 403
+
+        Config(".").set("http", "receivepack", "true")
+        response = client.put(f"/ugit/lfs/objects/{oid}", content=content)
+        assert response.status_code == 200
+        response = client.get(f"/ugit/lfs/objects/{oid}")
+        assert response.content == content
+
 
 class TestWebIntegration:
     """Integration tests for the web interface."""
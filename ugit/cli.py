@@ -14,6 +14,7 @@ from .commands import (
     bisect,
     blame,
     branch,
+    bundle,
     checkout,
     cherry_pick,
     clone,
@@ -26,17 +27,22 @@ from .commands import (
     gpg,
     grep,
     init,
+    lfs,
     log,
+    maintenance,
     merge,
+    multi_pack_index,
     pack,
+    pack_refs,
     pull,
     push,
     rebase,
     reflog,
     remote,
+    repack,
     reset,
     serve,
-    shallow_clone,
+    sparse_checkout,
     stash,
     stash_apply,
     stash_drop,
@@ -82,6 +88,10 @@ Examples:
   ugit stash pop                Apply and remove most recent stash
   ugit stash list               List all stashes
   ugit clone <url> [dir]        Clone a repository
+  ugit bundle create <file> --all Write every branch and tag to a bundle
+  ugit sparse-checkout set <dir> Check out only some directories
+  ugit lfs track '*.bin'        Store matching files as LFS pointers
+  ugit pack-refs --all          Move loose refs into packed-refs
   ugit remote add <name> <url>  Add a remote repository
   ugit remote -v                List remotes with URLs
   ugit fetch [remote]           Fetch changes from remote
@@ -239,6 +249,32 @@ Examples:
     clone_parser = subparsers.add_parser("clone", help="Clone a repository")
     clone_parser.add_argument("url", help="Repository URL to clone")
     clone_parser.add_argument("directory", nargs="?", help="Directory name (optional)")
+    clone_parser.add_argument(
+        "--sparse",
+        action="store_true",
+        help="Check out only top-level files (see sparse-checkout)",
+    )
+    clone_parser.add_argument(
+        "--no-hardlinks",
+        action="store_false",
+        dest="hardlinks",
+        help="Copy local object files instead of hardlinking them",
+    )
+    clone_parser.add_argument(
+        "-s",
+        "--shared",
+        action="store_true",
+        help="Borrow the source's objects through alternates instead of copying",
+    )
+    clone_parser.add_argument(
+        "--depth", type=int, help="Shallow clone with this many commits of history"
+    )
+    clone_parser.add_argument(
+        "--filter",
+        dest="filter_spec",
+        metavar="SPEC",
+        help="Partial clone: blob:none or blob:limit=<size>, fetch blobs on demand",
+    )
 
     # remote command
     remote_parser = subparsers.add_parser("remote", help="Manage remote repositories")
@@ -268,6 +304,15 @@ Examples:
     fetch_parser = subparsers.add_parser("fetch", help="Fetch from remote repository")
     fetch_parser.add_argument("remote", nargs="?", default="origin", help="Remote name")
     fetch_parser.add_argument("branch", nargs="?", help="Branch name")
+    fetch_parser.add_argument(
+        "--depth", type=int, help="Limit history to this many commits per tip"
+    )
+    fetch_parser.add_argument(
+        "--deepen", type=int, help="Extend shallow history by this many commits"
+    )
+    fetch_parser.add_argument(
+        "--shallow-since", metavar="DATE", help="Fetch history back to this date"
+    )
 
     # pull command
     pull_parser = subparsers.add_parser("pull", help="Fetch and merge from remote")
@@ -395,12 +440,23 @@ Examples:
     # fsck command
     fsck_parser = subparsers.add_parser("fsck", help="Check repository integrity")
     fsck_parser.add_argument("--full", action="store_true", help="Perform full check")
+    fsck_parser.add_argument(
+        "--workers",
+        type=int,
+        help="Processes used by --full (default: one per CPU)",
+    )
 
     # gc command
     gc_parser = subparsers.add_parser("gc", help="Run garbage collection")
     gc_parser.add_argument(
         "--aggressive", action="store_true", help="Aggressive cleanup"
     )
+    gc_parser.add_argument(
+        "--prune",
+        metavar="AGE",
+        help="Only delete unreachable objects older than AGE "
+        "(default: 2.weeks.ago; 'now' or 'never')",
+    )
 
     # pack command
     pack_parser = subparsers.add_parser("pack", help="Pack objects into pack files")
@@ -410,6 +466,112 @@ Examples:
     pack_parser.add_argument(
         "--unpack", help="Unpack objects from pack file", metavar="PACK_FILE"
     )
+    pack_parser.add_argument(
+        "--write-bitmap",
+        action="store_true",
+        help="Write reachability bitmaps for the new pack",
+    )
+
+    # repack command
+    repack_parser = subparsers.add_parser(
+        "repack", help="Combine packs and loose objects"
+    )
+    repack_parser.add_argument(
+        "--geometric",
+        type=int,
+        metavar="FACTOR",
+        help="Only roll up small packs, keeping pack sizes a geometric progression",
+    )
+    repack_parser.add_argument(
+        "--write-bitmap",
+        action="store_true",
+        help="Write reachability bitmaps for the new pack",
+    )
+    repack_parser.add_argument(
+        "--write-midx", action="store_true", help="Write a multi-pack-index"
+    )
+
+    # pack-refs command
+    pack_refs_parser = subparsers.add_parser(
+        "pack-refs", help="Move loose refs into packed-refs"
+    )
+    pack_refs_parser.add_argument(
+        "--all",
+        action="store_true",
+        dest="all_refs",
+        help="Pack branches and remote-tracking refs as well as tags",
+    )
+
+    # maintenance command
+    maintenance_parser = subparsers.add_parser(
+        "maintenance", help="Run or schedule repository maintenance"
+    )
+    maintenance_subparsers = maintenance_parser.add_subparsers(
+        dest="maintenance_command", help="Maintenance commands"
+    )
+    maintenance_run_parser = maintenance_subparsers.add_parser(
+        "run", help="Run maintenance tasks now"
+    )
+    maintenance_run_parser.add_argument(
+        "--task",
+        action="append",
+        dest="tasks",
+        help="Task to run (repeatable; default: every enabled task)",
+    )
+    maintenance_run_parser.add_argument(
+        "--auto",
+        action="store_true",
+        help="Only run if there are too many loose objects or packs",
+    )
+    maintenance_run_parser.add_argument(
+        "--schedule",
+        action="store_true",
+        help="Keep running the tasks periodically (used by start)",
+    )
+    maintenance_subparsers.add_parser(
+        "start", help="Start the background maintenance scheduler"
+    )
+    maintenance_subparsers.add_parser(
+        "stop", help="Stop the background maintenance scheduler"
+    )
+
+    # multi-pack-index command
+    midx_parser = subparsers.add_parser(
+        "multi-pack-index", help="Index every pack for faster object lookups"
+    )
+    midx_subparsers = midx_parser.add_subparsers(
+        dest="midx_command", help="Multi-pack-index commands"
+    )
+    midx_subparsers.add_parser("write", help="Write an index covering every pack")
+    midx_subparsers.add_parser("verify", help="Check the index against the packs")
+
+    # bundle command
+    bundle_parser = subparsers.add_parser(
+        "bundle", help="Move history through a single file"
+    )
+    bundle_subparsers = bundle_parser.add_subparsers(
+        dest="bundle_command", help="Bundle commands"
+    )
+    bundle_create_parser = bundle_subparsers.add_parser(
+        "create", help="Write refs and their objects to a bundle"
+    )
+    bundle_create_parser.add_argument("file", help="Bundle file to write")
+    bundle_create_parser.add_argument(
+        "revs",
+        nargs="*",
+        help="Refs to bundle (^<rev> or <rev>..<ref> leave out history)",
+    )
+    bundle_create_parser.add_argument(
+        "--all", action="store_true", help="Bundle every branch and tag, and HEAD"
+    )
+    bundle_list_parser = bundle_subparsers.add_parser(
+        "list-heads", help="List the refs in a bundle"
+    )
+    bundle_list_parser.add_argument("file", help="Bundle file")
+    bundle_unbundle_parser = bundle_subparsers.add_parser(
+        "unbundle", help="Install a bundle's objects and list its refs"
+    )
+    bundle_unbundle_parser.add_argument("file", help="Bundle file")
 
     # gpg command
     gpg_parser = subparsers.add_parser("gpg", help="GPG signing operations")
@@ -442,6 +604,44 @@ Examples:
         help="List worktrees",
     )
 
+    # sparse-checkout command
+    sparse_parser = subparsers.add_parser(
+        "sparse-checkout", help="Check out only some directories"
+    )
+    sparse_subparsers = sparse_parser.add_subparsers(
+        dest="sparse_command", help="Sparse-checkout commands"
+    )
+    sparse_set_parser = sparse_subparsers.add_parser(
+        "set", help="Replace the checked out directories"
+    )
+    sparse_set_parser.add_argument(
+        "directories", nargs="+", help="Directories to check out"
+    )
+    sparse_add_parser = sparse_subparsers.add_parser(
+        "add", help="Add directories to the checkout"
+    )
+    sparse_add_parser.add_argument(
+        "directories", nargs="+", help="Directories to check out"
+    )
+    sparse_subparsers.add_parser("list", help="List checked out directories")
+    sparse_subparsers.add_parser("disable", help="Check out the full tree again")
+
+    # lfs command
+    lfs_parser = subparsers.add_parser(
+        "lfs", help="Store large files as pointers to a content store"
+    )
+    lfs_subparsers = lfs_parser.add_subparsers(dest="lfs_command", help="LFS commands")
+    lfs_track_parser = lfs_subparsers.add_parser(
+        "track", help="Track files matching patterns (lists patterns without any)"
+    )
+    lfs_track_parser.add_argument("patterns", nargs="*", help="File patterns")
+    lfs_untrack_parser = lfs_subparsers.add_parser(
+        "untrack", help="Stop tracking patterns"
+    )
+    lfs_untrack_parser.add_argument("patterns", nargs="+", help="File patterns")
+    lfs_subparsers.add_parser("ls-files", help="List LFS files at HEAD")
+    lfs_subparsers.add_parser("pull", help="Download LFS content and check it out")
+
     return parser
 
 
@@ -506,14 +706,25 @@ def main(argv: Optional[List[str]] = None) -> int:
                 sys.stderr.write(f"Unknown stash command: {args.stash_command}\n")
                 return 1
         elif args.command == "clone":
-            if args.depth:
-                shallow_clone(args.url, args.directory, args.depth)
-            else:
-                clone(args.url, args.directory)
+            clone(
+                args.url,
+                args.directory,
+                args.sparse,
+                hardlinks=args.hardlinks,
+                shared=args.shared,
+                filter_spec=args.filter_spec,
+                depth=args.depth,
+            )
         elif args.command == "remote":
             remote(args)
         elif args.command == "fetch":
-            result = fetch(args.remote, args.branch)
+            result = fetch(
+                args.remote,
+                args.branch,
+                depth=args.depth,
+                deepen=args.deepen,
+                shallow_since=args.shallow_since,
+            )
         elif args.command == "pull":
             result = pull(args.remote, args.branch)
         elif args.command == "push":
@@ -556,17 +767,39 @@ def main(argv: Optional[List[str]] = None) -> int:
         elif args.command == "rebase":
             rebase(args.branch, args.interactive, args.onto)
         elif args.command == "fsck":
-            result = fsck(args.full)
+            result = fsck(args.full, args.workers)
         elif args.command == "gc":
-            gc(args.aggressive)
+            gc(args.aggressive, args.prune)
         elif args.command == "pack":
             if args.unpack:
                 pack.unpack_objects(args.unpack)
             else:
                 obj_list: Optional[List[str]] = args.objects if args.objects else None
-                pack.pack_objects(obj_list)
+                pack.pack_objects(obj_list, bitmap=args.write_bitmap)
+        elif args.command == "repack":
+            repack(args.geometric, args.write_bitmap, args.write_midx)
+        elif args.command == "pack-refs":
+            pack_refs(args.all_refs)
+        elif args.command == "maintenance":
+            maintenance(
+                args.maintenance_command,
+                getattr(args, "tasks", None),
+                getattr(args, "auto", False),
+                getattr(args, "schedule", False),
+            )
+        elif args.command == "multi-pack-index":
+            result = multi_pack_index(args.midx_command)
+        elif args.command == "bundle":
+            revs = getattr(args, "revs", None) or []
+            if getattr(args, "all", False):
+                revs = ["--all"] + revs
+            bundle(args.bundle_command, getattr(args, "file", None), revs)
         elif args.command == "worktree":
             worktree(args.worktree_command, args.path, args.branch, args.list_worktrees)
+        elif args.command == "sparse-checkout":
+            sparse_checkout(args.sparse_command, getattr(args, "directories", None))
+        elif args.command == "lfs":
+            lfs(args.lfs_command, getattr(args, "patterns", None))
         elif args.command == "gpg":
             if args.gpg_command == "sign-commit" and args.object:
                 signature = gpg.sign_commit(args.object, args.key)
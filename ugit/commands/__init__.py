@@ -8,6 +8,7 @@ from .archive import archive
 from .bisect import bisect
 from .blame import blame
 from .branch import branch
+from .bundle import bundle
 from .checkout import checkout
 from .cherry_pick import cherry_pick
 from .clone import clone
@@ -25,17 +26,23 @@ from .gpg import (
 )
 from .grep import grep
 from .init import init
+from .lfs import lfs
 from .log import log
+from .maintenance import maintenance
 from .merge import merge
+from .multi_pack_index import multi_pack_index
 from .pack import pack_objects, unpack_objects
+from .pack_refs import pack_refs
 from .pull import pull
 from .push import push
 from .rebase import rebase
 from .reflog import reflog
 from .remote import remote
+from .repack import repack
 from .reset import reset, unstage
 from .serve import serve
 from .shallow_clone import shallow_clone
+from .sparse_checkout import sparse_checkout
 from .stash import stash, stash_apply, stash_drop, stash_list, stash_pop
 from .stats import stats
 from .status import status
@@ -52,6 +59,7 @@ __all__ = [
     "status",
     "diff",
     "branch",
+    "bundle",
     "reset",
     "unstage",
     "merge",
@@ -80,6 +88,7 @@ __all__ = [
     "gc",
     "worktree",
     "shallow_clone",
+    "sparse_checkout",
     "gpg",
     "sign_commit",
     "sign_tag",
@@ -87,4 +96,9 @@ __all__ = [
     "has_gpg",
     "pack_objects",
     "unpack_objects",
+    "pack_refs",
+    "multi_pack_index",
+    "repack",
+    "maintenance",
+    "lfs",
 ]
@@ -4,15 +4,15 @@ Add files to the staging area.
 
 import os
 import sys
-from typing import Dict, List, Tuple, Union
+from typing import Dict, List, Optional, Set, Tuple, Union
 
 from ..core.exceptions import UgitError
-from ..core.objects import hash_object
-from ..core.repository import Index
+from ..core.lfs import hash_file
+from ..core.objects import object_write_batch
+from ..core.repository import Index, Repository
 from ..utils.helpers import (
     ensure_repository,
     get_ignored_patterns,
-    safe_read_file,
     should_ignore_file,
 )
 from ..utils.parallel import process_parallel
@@ -33,6 +33,7 @@ def add(paths: Union[str, List[str]]) -> None:
     repo = ensure_repository()
     index = Index(repo)
     index_data = index.read()
+    skip_worktree = index.read_skip_worktree()
     ignored_patterns = get_ignored_patterns(repo.path)
 
     if isinstance(paths, str):
@@ -55,20 +56,26 @@ def add(paths: Union[str, List[str]]) -> None:
     changes_made = False
     messages: List[str] = []
 
-    # Use parallel processing for large numbers of files
-    if len(validated_paths) > 10:
-        # Process files in parallel
-        results = process_parallel(
-            validated_paths,
-            lambda path: _add_single_path(path, index_data, ignored_patterns, []),
-            max_workers=4,
-        )
-        changes_made = any(results)
-    else:
-        # Sequential processing for small numbers
-        for file_path in validated_paths:
-            if _add_single_path(file_path, index_data, ignored_patterns, messages):
-                changes_made = True
+    # Objects are flushed to disk together, before the index refers to them
+    with object_write_batch(repo):
+        # Use parallel processing for large numbers of files
+        if len(validated_paths) > 10:
+            # Process files in parallel
+            results = process_parallel(
+                validated_paths,
+                lambda path: _add_single_path(
+                    path, index_data, ignored_patterns, [], skip_worktree
+                ),
+                max_workers=4,
+            )
+            changes_made = any(results)
+        else:
+            # Sequential processing for small numbers
+            for file_path in validated_paths:
+                if _add_single_path(
+                    file_path, index_data, ignored_patterns, messages, skip_worktree
+                ):
+                    changes_made = True
 
     if changes_made:
         index.write(index_data)
@@ -82,17 +89,22 @@ def _add_single_path(
     index_data: Dict[str, Tuple[str, float, int]],
     ignored_patterns: List[str],
     messages: List[str],
+    skip_worktree: Optional[Set[str]] = None,
 ) -> bool:
     """
     Add a single file or directory to the in-memory index, handling deletions.
+    Skip-worktree paths are missing on purpose and are never staged as deleted.
     Returns True if the index was modified.
     """
     change_detected = False
+    skip_worktree = skip_worktree or set()
     if not os.path.exists(path):
         # Path doesn't exist, check if it was a tracked file (a deletion)
         try:
             rel_path = os.path.relpath(path)
-            if rel_path in index_data:
+            if rel_path.replace(os.sep, "/") in skip_worktree:
+                pass  # Outside the sparse checkout, not deleted
+            elif rel_path in index_data:
                 del index_data[rel_path]
                 change_detected = True
                 messages.append(f"deleted: {rel_path}")
@@ -138,7 +150,7 @@ def _add_single_path(
                     change_detected = True
 
         # Find and stage deletions
-        deleted_files = tracked_files_in_dir - existing_files_in_dir
+        deleted_files = tracked_files_in_dir - existing_files_in_dir - skip_worktree
         for file_to_delete in deleted_files:
             del index_data[file_to_delete]
             change_detected = True
@@ -159,15 +171,14 @@ def _add_single_file(
 ) -> bool:
     """
     Add a single file to the in-memory index if it has changed.
+    LFS-tracked files are staged as pointers to their stored content.
     Returns True if the index was updated.
     """
     try:
         stat = os.stat(path)
-        data = safe_read_file(path)
-        new_sha = hash_object(data, "blob")
-
         rel_path = os.path.relpath(path)
         normalized_path = os.path.normpath(rel_path).replace(os.sep, "/")
+        new_sha = hash_file(Repository(), normalized_path, path)
 
         current_entry = index_data.get(normalized_path)
         if current_entry and current_entry[0] == new_sha:
@@ -181,7 +192,7 @@ def _add_single_file(
             messages.append(f"added: {normalized_path}")
         return True
 
-    except (FileNotFoundError, RuntimeError) as e:
+    except (OSError, RuntimeError) as e:
         print(f"Error adding file '{path}': {e}", file=sys.stderr)
         return False
     except Exception as e:
@@ -82,11 +82,9 @@ def _get_file_status(
 
     # Check if modified
     try:
-        from ..core.objects import hash_object
+        from ..core.lfs import hash_file
 
-        with open(full_path, "rb") as f:
-            content = f.read()
-        current_sha = hash_object(content, "blob", repo=repo)
+        current_sha = hash_file(repo, file_path, full_path)
 
         stored_sha, _, _ = index_data[file_path]
         if current_sha != stored_sha:
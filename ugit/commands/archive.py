@@ -12,8 +12,8 @@ import zipfile
 from pathlib import Path
 from typing import Optional
 
+from ..core.chunking import read_blob
 from ..core.exceptions import UgitError
-from ..core.objects import get_object
 from ..core.repository import Repository
 from ..utils.helpers import ensure_repository, get_commit_data, get_tree_entries
 from ..utils.validation import validate_sha
@@ -78,7 +78,7 @@ def _extract_tree(repo: Repository, tree_sha: str, dest_dir: str) -> None:
 
             if mode.startswith("10"):  # File
                 try:
-                    obj_type, content = get_object(sha, repo=repo)
+                    obj_type, content = read_blob(sha, repo=repo)
                     if obj_type == "blob":
                         # Create directory if needed
                         os.makedirs(os.path.dirname(dest_path), exist_ok=True)
@@ -9,6 +9,7 @@ from typing import Optional
 
 from ..core.exceptions import UgitError
 from ..core.repository import Repository
+from ..core.shallow import read_shallow
 from ..utils.helpers import ensure_repository, get_commit_data, get_current_branch_name
 from ..utils.validation import validate_sha
 
@@ -68,12 +69,13 @@ def _start_bisect(
 
     if good:
         if not validate_sha(good):
-            # Find first commit
+            # Find first commit, or the shallow boundary
             current = repo.get_head_ref()
+            shallow = read_shallow(repo)
             while current:
                 try:
                     commit_data = get_commit_data(current, repo=repo)
-                    parent = commit_data.get("parent")
+                    parent = None if current in shallow else commit_data.get("parent")
                     if not parent:
                         break
                     current = parent
@@ -174,6 +176,7 @@ def _find_midpoint(
     commits = []
     current = bad_sha
     visited = set()
+    shallow = read_shallow(repo)
 
     while current and current not in visited:
         visited.add(current)
@@ -182,7 +185,7 @@ def _find_midpoint(
         commits.append(current)
         try:
             commit_data = get_commit_data(current, repo=repo)
-            parent = commit_data.get("parent")
+            parent = None if current in shallow else commit_data.get("parent")
             if parent is not None:
                 current = parent
             else:
@@ -10,6 +10,7 @@ from typing import Dict, List, Optional, Set, Tuple
 from ..core.exceptions import InvalidRefError, UgitError
 from ..core.objects import get_object
 from ..core.repository import Repository
+from ..core.shallow import read_shallow
 from ..utils.helpers import (
     ensure_repository,
     get_commit_data,
@@ -105,6 +106,7 @@ def _find_line_origin(
     """
     current_sha = commit_sha
     visited.add(current_sha)
+    shallow = read_shallow(repo)
 
     while current_sha:
         try:
@@ -114,7 +116,7 @@ def _find_line_origin(
 
             if not file_sha:
                 # File didn't exist in this commit, check parent
-                parent = commit_data.get("parent")
+                parent = None if current_sha in shallow else commit_data.get("parent")
                 if parent and parent not in visited:
                     current_sha = parent
                     visited.add(current_sha)
@@ -129,7 +131,7 @@ def _find_line_origin(
             lines = file_data.decode("utf-8", errors="replace").splitlines()
             if line_num <= len(lines) and lines[line_num - 1] == line_content:
                 # Line exists and matches, check parent
-                parent = commit_data.get("parent")
+                parent = None if current_sha in shallow else commit_data.get("parent")
                 if parent and parent not in visited:
                     current_sha = parent
                     visited.add(current_sha)
@@ -147,7 +149,7 @@ def _find_line_origin(
             # Move to parent on error
             try:
                 commit_data = get_commit_data(current_sha, repo=repo)
-                parent = commit_data.get("parent")
+                parent = None if current_sha in shallow else commit_data.get("parent")
                 if parent and parent not in visited:
                     current_sha = parent
                     visited.add(current_sha)
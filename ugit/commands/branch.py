@@ -8,6 +8,7 @@ import os
 from typing import Optional
 
 from ..core.exceptions import BranchExistsError, BranchNotFoundError
+from ..core.refs import delete_refs, list_refs, read_ref
 from ..core.repository import Repository
 from ..utils.atomic import atomic_write_text
 from ..utils.helpers import ensure_repository, get_current_branch_name
@@ -46,14 +47,13 @@ def branch(
 
 def _list_branches(repo: Repository) -> None:
     """List all branches."""
-    heads_dir = os.path.join(repo.ugit_dir, "refs", "heads")
     current_branch = get_current_branch_name(repo)
-    if os.path.exists(heads_dir):
-        for branch_name in sorted(os.listdir(heads_dir)):
-            if branch_name == current_branch:
-                print(f"* {branch_name}")
-            else:
-                print(f"  {branch_name}")
+    for ref in list_refs(repo, ("refs/heads",)):
+        branch_name = ref[len("refs/heads/") :]
+        if branch_name == current_branch:
+            print(f"* {branch_name}")
+        else:
+            print(f"  {branch_name}")
 
 
 def _create_branch(repo: Repository, branch_name: str) -> None:
@@ -72,7 +72,7 @@ def _create_branch(repo: Repository, branch_name: str) -> None:
         raise ValueError(f"Invalid branch name: '{branch_name}'")
 
     branch_path = os.path.join(repo.ugit_dir, "refs", "heads", branch_name)
-    if os.path.exists(branch_path):
+    if read_ref(repo, f"refs/heads/{branch_name}"):
         raise BranchExistsError(f"Branch '{branch_name}' already exists")
 
     current_commit = repo.get_head_ref()
@@ -101,12 +101,9 @@ def _delete_branch(repo: Repository, branch_name: str) -> None:
     if branch_name == current_branch:
         raise ValueError(f"Cannot delete current branch '{branch_name}'")
 
-    branch_path = os.path.join(repo.ugit_dir, "refs", "heads", branch_name)
-
-    if not os.path.exists(branch_path):
+    if not delete_refs(repo, [f"refs/heads/{branch_name}"]):
         raise BranchNotFoundError(f"Branch '{branch_name}' does not exist")
 
-    os.remove(branch_path)
     print(f"Deleted branch '{branch_name}'")
 
 
@@ -0,0 +1,111 @@
+"""
+Bundle command implementation for ugit.
+
+Move history through a single file instead of a remote. A bundle can be
+unbundled into an existing repository, cloned from, or added as a remote
+and fetched from (see core.bundle for the format).
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from ..core.bundle import create_bundle, read_bundle_header, unbundle
+from ..core.exceptions import UgitError
+from ..core.objects import object_exists
+from ..core.refs import list_refs
+from ..core.repository import Repository
+from ..utils.helpers import ensure_repository
+from ..utils.validation import validate_sha
+
+# Ref namespaces a short ref name is looked up in, in order
+_REF_NAMESPACES = ("refs/heads", "refs/tags", "refs/remotes")
+
+
+def bundle(
+    command: Optional[str], file: Optional[str], revs: Optional[List[str]] = None
+) -> None:
+    """
+    Create, inspect or unpack a bundle.
+
+    Args:
+        command: Command (create, list-heads, unbundle)
+        file: Bundle file
+        revs: Refs to bundle for create: branch, tag or HEAD names, --all
+            for every branch and tag, and ^<rev> or <rev>..<ref> to leave
+            out history the receiver already has
+
+    Raises:
+        UgitError: If the bundle or a rev is invalid or the command is unknown
+    """
+    if not file:
+        raise UgitError("Usage: ugit bundle {create|list-heads|unbundle} <file>")
+
+    if command == "create":
+        repo = ensure_repository()
+        refs, excluded = _resolve_revs(repo, revs or [])
+        count = create_bundle(repo, file, refs, excluded)
+        print(f"Bundled {count} object(s) into {file}")
+    elif command == "list-heads":
+        for ref, sha in read_bundle_header(file).refs.items():
+            print(f"{sha} {ref}")
+    elif command == "unbundle":
+        repo = ensure_repository()
+        for ref, sha in unbundle(repo, file).items():
+            print(f"{sha} {ref}")
+    else:
+        raise UgitError(f"Unknown bundle command: {command}")
+
+
+def _resolve_revs(
+    repo: Repository, revs: List[str]
+) -> Tuple[Dict[str, str], List[str]]:
+    """Split bundle revs into the refs to include and the commits to leave out."""
+    all_refs = list_refs(repo, _REF_NAMESPACES)
+    refs: Dict[str, str] = {}
+    excluded: List[str] = []
+
+    for rev in revs:
+        if rev == "--all":
+            head = repo.get_head_ref()
+            if head:
+                refs["HEAD"] = head
+            refs.update(
+                (ref, sha)
+                for ref, sha in all_refs.items()
+                if not ref.startswith("refs/remotes/")
+            )
+        elif rev.startswith("^"):
+            excluded.append(_resolve_commit(repo, all_refs, rev[1:]))
+        elif ".." in rev:
+            start, _, end = rev.partition("..")
+            excluded.append(_resolve_commit(repo, all_refs, start or "HEAD"))
+            ref, sha = _resolve_ref(repo, all_refs, end or "HEAD")
+            refs[ref] = sha
+        else:
+            ref, sha = _resolve_ref(repo, all_refs, rev)
+            refs[ref] = sha
+
+    if not refs:
+        raise UgitError("No refs to bundle (name a branch, a tag, HEAD or --all)")
+    return refs, excluded
+
+
+def _resolve_ref(
+    repo: Repository, all_refs: Dict[str, str], name: str
+) -> Tuple[str, str]:
+    """Resolve a ref name to its full name and SHA."""
+    if name == "HEAD":
+        head = repo.get_head_ref()
+        if head:
+            return "HEAD", head
+    candidates = [name] + [f"{namespace}/{name}" for namespace in _REF_NAMESPACES]
+    for ref in candidates:
+        if ref in all_refs:
+            return ref, all_refs[ref]
+    raise UgitError(f"Unknown ref: {name}")
+
+
+def _resolve_commit(repo: Repository, all_refs: Dict[str, str], rev: str) -> str:
+    """Resolve a ref name or full SHA to the SHA it names."""
+    if validate_sha(rev) and object_exists(rev, repo=repo):
+        return rev
+    return _resolve_ref(repo, all_refs, rev)[1]
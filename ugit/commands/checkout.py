@@ -6,6 +6,7 @@ import os
 
 from ..core.checkout import checkout_commit
 from ..core.exceptions import InvalidRefError, UgitError
+from ..core.refs import read_ref
 from ..core.repository import Repository
 from ..utils.helpers import ensure_repository, get_current_branch_name
 from .reflog import append_reflog
@@ -22,9 +23,7 @@ def checkout(target: str, create_branch: bool = False) -> None:
     repo = ensure_repository()
 
     # Check if target is a branch name
-    branch_path = os.path.join(repo.ugit_dir, "refs", "heads", target)
-
-    if os.path.exists(branch_path):
+    if read_ref(repo, f"refs/heads/{target}"):
         # It's a branch - switch to it
         _switch_to_branch(repo, target)
     elif create_branch:
@@ -41,24 +40,23 @@ def checkout(target: str, create_branch: bool = False) -> None:
 
 def _switch_to_branch(repo: Repository, branch_name: str) -> None:
     """Switch to an existing branch."""
-    branch_path = os.path.join(repo.ugit_dir, "refs", "heads", branch_name)
-
     # Get the commit that the branch points to
-    with open(branch_path, "r", encoding="utf-8") as f:
-        commit_sha = f.read().strip()
-
-    # Update HEAD to point to the branch
-    head_path = os.path.join(repo.ugit_dir, "HEAD")
-    with open(head_path, "w", encoding="utf-8") as f:
-        f.write(f"ref: refs/heads/{branch_name}")
+    commit_sha = read_ref(repo, f"refs/heads/{branch_name}")
+    if not commit_sha:
+        raise InvalidRefError(f"Invalid reference '{branch_name}'")
 
     # Get old HEAD for reflog
     old_head = repo.get_head_ref()
     old_branch = get_current_branch_name(repo) or "HEAD"
 
-    # Checkout the commit without updating HEAD again
+    # Update the working tree while HEAD still names the old tree
     checkout_commit(repo, commit_sha, update_head=False)
 
+    # Update HEAD to point to the branch
+    head_path = os.path.join(repo.ugit_dir, "HEAD")
+    with open(head_path, "w", encoding="utf-8") as f:
+        f.write(f"ref: refs/heads/{branch_name}")
+
     # Update reflog
     append_reflog(
         repo,
@@ -7,29 +7,75 @@ This module handles cloning remote ugit repositories into local directories.
 import os
 import shutil
 import sys
-from typing import Optional
+from typing import Dict, Optional
 
+from ..core.bundle import is_bundle, unbundle
 from ..core.checkout import checkout_commit
 from ..core.exceptions import UgitError
+from ..core.objects import read_alternates_file
+from ..core.odb import get_object_database, loose_object_database
+from ..core.promisor import parse_filter, set_promisor_remote
+from ..core.protocol import check_remote_refs, local_ref_tips
+from ..core.refs import is_valid_ref_name, list_refs, read_ref, update_ref
 from ..core.repository import Repository
-from ..utils.helpers import is_local_path
+from ..core.shallow import update_shallow
+from ..core.sparse import write_sparse_cones
+from ..utils.atomic import atomic_write_text
+from ..utils.helpers import is_http_url, is_local_path, link_or_copy
+from .fetch import ShallowOptions, _fetch_pack_local
+from .http_remote import fetch_pack_http, get_http_refs, has_partial_download
 from .remote import add_remote
 
 
-def clone(url: str, directory: Optional[str] = None) -> None:
+def clone(
+    url: str,
+    directory: Optional[str] = None,
+    sparse: bool = False,
+    hardlinks: bool = True,
+    shared: bool = False,
+    filter_spec: Optional[str] = None,
+    depth: Optional[int] = None,
+) -> None:
     """
     Clone a remote repository.
 
+    Local clones hardlink the source's object files by default, so they
+    take no extra disk space for objects. With a filter, the clone is
+    partial: the filtered blobs stay on the remote and are fetched when
+    first needed. A bundle file can be cloned from like a repository.
+
     Args:
-        url: Remote repository URL
+        url: Remote repository URL, path or bundle file
         directory: Local directory name (optional)
+        sparse: Start with a sparse checkout of the top-level files only
+        hardlinks: Hardlink local object files instead of copying them
+        shared: Borrow the source's objects through objects/info/alternates
+            instead of linking or copying any object files
+        filter_spec: Object filter for a partial clone, "blob:none" or
+            "blob:limit=<size>"
+        depth: Shallow clone with this many commits of history per branch
     """
+    if filter_spec:
+        parse_filter(filter_spec)
+        if shared:
+            raise UgitError("fatal: --filter cannot be used with --shared")
+    if depth is not None:
+        if depth < 1:
+            raise UgitError("fatal: depth must be a positive number")
+        if shared:
+            raise UgitError("fatal: --depth cannot be used with --shared")
+    if is_bundle(url) and (filter_spec or depth is not None or shared):
+        raise UgitError(
+            "fatal: --filter, --depth and --shared cannot be used with a bundle"
+        )
+
     # Determine local directory name
     if directory is None:
         directory = _get_repo_name_from_url(url)
 
-    # Check if directory already exists
-    if os.path.exists(directory):
+    # Check if directory already exists; an interrupted clone is resumed
+    resuming = is_http_url(url) and _is_interrupted_clone(directory)
+    if os.path.exists(directory) and not resuming:
         raise UgitError(
             f"fatal: destination path '{directory}' already exists and is not an empty directory"
         )
@@ -49,36 +95,63 @@ def clone(url: str, directory: Optional[str] = None) -> None:
 
     try:
         # Create directory
-        os.makedirs(directory)
+        os.makedirs(directory, exist_ok=resuming)
 
         # Initialize repository in the new directory
         os.chdir(directory)
         repo = Repository()
 
         # Create ugit directory structure
-        os.makedirs(repo.ugit_dir)
-        os.makedirs(os.path.join(repo.ugit_dir, "objects"))
-        os.makedirs(os.path.join(repo.ugit_dir, "refs", "heads"))
-        os.makedirs(os.path.join(repo.ugit_dir, "refs", "remotes"))
+        os.makedirs(repo.ugit_dir, exist_ok=resuming)
+        os.makedirs(os.path.join(repo.ugit_dir, "objects"), exist_ok=resuming)
+        os.makedirs(os.path.join(repo.ugit_dir, "refs", "heads"), exist_ok=resuming)
+        os.makedirs(os.path.join(repo.ugit_dir, "refs", "remotes"), exist_ok=resuming)
 
         # Copy objects from source repository
-        if is_local_path(url):
-            _copy_local_repository(url, repo)
+        if is_bundle(url):
+            default_branch = _unbundle_repository(url, repo)
+        elif is_local_path(url):
+            _copy_local_repository(
+                url,
+                repo,
+                hardlinks=hardlinks,
+                shared=shared,
+                filter_spec=filter_spec,
+                depth=depth,
+            )
+            default_branch = _get_local_default_branch(url)
+        elif is_http_url(url):
+            default_branch = _fetch_http_repository(url, repo, filter_spec, depth)
         else:
             raise UgitError(f"fatal: remote protocols not yet supported: {url}")
 
-        # Add origin remote
+        # Record where the history of a shallow clone stops
+        if depth is not None:
+            update_shallow(repo, local_ref_tips(repo))
+
+        # Add origin remote, the promisor of a partial clone
         add_remote("origin", url)
+        if filter_spec:
+            set_promisor_remote(repo, "origin", filter_spec)
+
+        # An empty cone list checks out top-level files only
+        if sparse:
+            write_sparse_cones(repo, [])
 
         # Set up initial HEAD and checkout
-        _setup_initial_checkout(repo, url)
+        _setup_initial_checkout(repo, default_branch)
 
         print(f"Cloning into '{directory}'...")
         print("done.")
 
     except Exception as e:
-        # Clean up on error
+        # Clean up on error, but keep a download that can be resumed
         os.chdir(original_cwd)
+        if is_http_url(url) and _is_interrupted_clone(directory):
+            raise UgitError(
+                f"fatal: failed to clone repository: {e}\n"
+                f"hint: run the same clone again to resume the download"
+            )
         if os.path.exists(directory):
             try:
                 shutil.rmtree(directory)
@@ -102,10 +175,11 @@ def _get_repo_name_from_url(url: str) -> str:
     Returns:
         Directory name to use
     """
-    # Remove trailing slashes and .git suffix
+    # Remove trailing slashes and .git or .bundle suffix
     name = url.rstrip("/")
-    if name.endswith(".git"):
-        name = name[:-4]
+    for suffix in (".git", ".bundle"):
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
 
     # Get basename
     name = os.path.basename(name)
@@ -117,6 +191,30 @@ def _get_repo_name_from_url(url: str) -> str:
     return name
 
 
+def _is_interrupted_clone(directory: str) -> bool:
+    """
+    Check whether a directory holds an HTTP clone that stopped mid-download.
+
+    Such a directory has nothing but a .ugit without a HEAD, whose pack
+    directory has a download checkpoint to resume from.
+
+    Args:
+        directory: Clone destination
+
+    Returns:
+        True if cloning into the directory again should resume
+    """
+    try:
+        if os.listdir(directory) != [".ugit"]:
+            return False
+    except OSError:
+        return False
+    repo = Repository(directory)
+    if os.path.exists(os.path.join(repo.ugit_dir, "HEAD")):
+        return False
+    return has_partial_download(repo)
+
+
 def _is_valid_source(url: str) -> bool:
     """
     Check if source URL points to a valid ugit repository.
@@ -128,112 +226,221 @@ def _is_valid_source(url: str) -> bool:
         True if valid ugit repository
     """
     if is_local_path(url):
-        # Check if it's a ugit repository
+        # Check if it's a ugit repository or a bundle
         ugit_dir = os.path.join(url, ".ugit")
-        return os.path.exists(ugit_dir) and os.path.isdir(ugit_dir)
+        return os.path.isdir(ugit_dir) or is_bundle(url)
     else:
         # For remote URLs, we'd need to implement HTTP/SSH checking
         # For now, assume they're valid if they follow URL patterns
         return url.startswith(("http://", "https://", "git://", "ssh://")) or "@" in url
 
 
-def _copy_local_repository(source_url: str, dest_repo: Repository) -> None:
+def _copy_local_repository(
+    source_url: str,
+    dest_repo: Repository,
+    hardlinks: bool = True,
+    shared: bool = False,
+    filter_spec: Optional[str] = None,
+    depth: Optional[int] = None,
+) -> None:
     """
     Copy objects and refs from local source repository.
 
     Args:
         source_url: Source repository path
         dest_repo: Destination repository
+        hardlinks: Hardlink object files instead of copying them
+        shared: Reference the source objects through alternates instead
+        filter_spec: Copy only the objects this partial clone filter keeps
+        depth: Copy only this many commits of history per branch
     """
     source_ugit_dir = os.path.join(source_url, ".ugit")
+    source_refs = list_refs(Repository(source_url), ("refs/heads", "refs/tags"))
 
     # Copy objects
-    source_objects_dir = os.path.join(source_ugit_dir, "objects")
+    source_objects_dir = os.path.abspath(os.path.join(source_ugit_dir, "objects"))
     dest_objects_dir = os.path.join(dest_repo.ugit_dir, "objects")
+    alternates_file = os.path.join("info", "alternates")
+
+    if shared:
+        # Alternates are followed recursively, so the source's own are kept
+        alternates = [source_objects_dir]
+    elif filter_spec or depth is not None:
+        # Walk the source's branches and tags and pack only what the clone keeps
+        alternates = []
+        wants = sorted(set(source_refs.values()))
+        if wants:
+            _fetch_pack_local(
+                dest_repo,
+                Repository(source_url),
+                wants,
+                [],
+                filter_spec,
+                ShallowOptions(depth=depth),
+            )
+    else:
+        # Objects the source borrows are not copied, borrow them as well
+        alternates = read_alternates_file(source_objects_dir)
+        if os.path.exists(source_objects_dir):
+            for root, dirs, files in os.walk(source_objects_dir):
+                for file in files:
+                    source_file = os.path.join(root, file)
+                    # Calculate relative path
+                    rel_path = os.path.relpath(source_file, source_objects_dir)
+                    if rel_path == alternates_file:
+                        continue
+                    dest_file = os.path.join(dest_objects_dir, rel_path)
+
+                    # Create directory if needed
+                    os.makedirs(os.path.dirname(dest_file), exist_ok=True)
+
+                    link_or_copy(source_file, dest_file, hardlink=hardlinks)
+
+    if not filter_spec and depth is None:
+        # Objects kept in a core.objectStorage backend are not files
+        source_database = loose_object_database(Repository(source_url))
+        if source_database is not None:
+            get_object_database(dest_repo).batch_write(
+                source_database.read(sha) for sha in source_database.iterate()
+            )
+
+    if alternates:
+        atomic_write_text(
+            os.path.join(dest_objects_dir, alternates_file),
+            "".join(f"{path}\n" for path in alternates),
+            create_dirs=True,
+        )
+
+    # Copy heads, loose and packed, to remotes/origin/, and tags as they are
+    os.makedirs(
+        os.path.join(dest_repo.ugit_dir, "refs", "remotes", "origin"), exist_ok=True
+    )
+    _write_origin_refs(dest_repo, source_refs)
+
+
+def _get_local_default_branch(source_url: str) -> str:
+    """
+    Get the branch HEAD points at in a local source repository.
+
+    Args:
+        source_url: Source repository path
+
+    Returns:
+        Branch name, "main" if HEAD is detached or unreadable
+    """
+    source_head_path = os.path.join(source_url, ".ugit", "HEAD")
+    default_branch = "main"  # fallback
+
+    if os.path.exists(source_head_path):
+        try:
+            with open(source_head_path, "r") as f:
+                head_content = f.read().strip()
+                if head_content.startswith("ref: refs/heads/"):
+                    default_branch = head_content[16:]  # Remove 'ref: refs/heads/'
+        except (IOError, OSError):
+            pass
+
+    return default_branch
+
+
+def _fetch_http_repository(
+    url: str,
+    dest_repo: Repository,
+    filter_spec: Optional[str] = None,
+    depth: Optional[int] = None,
+) -> str:
+    """
+    Download every branch and tag of an HTTP remote as a single pack.
 
-    if os.path.exists(source_objects_dir):
-        for root, dirs, files in os.walk(source_objects_dir):
-            for file in files:
-                source_file = os.path.join(root, file)
-                # Calculate relative path
-                rel_path = os.path.relpath(source_file, source_objects_dir)
-                dest_file = os.path.join(dest_objects_dir, rel_path)
+    Args:
+        url: Remote repository URL
+        dest_repo: Destination repository
+        filter_spec: Object filter for a partial clone
+        depth: Commits of history to fetch per branch and tag
 
-                # Create directory if needed
-                os.makedirs(os.path.dirname(dest_file), exist_ok=True)
+    Returns:
+        Branch the remote HEAD points at ("main" if unknown)
+    """
+    advertisement = get_http_refs(url, dest_repo)
+    refs = advertisement["refs"]
+    fetch_pack_http(
+        dest_repo, url, sorted(set(refs.values())), [], filter_spec, depth=depth
+    )
+    _write_origin_refs(dest_repo, refs)
+    return advertisement.get("head") or "main"
 
-                # Copy file
-                shutil.copy2(source_file, dest_file)
 
-    # Copy refs
-    source_refs_dir = os.path.join(source_ugit_dir, "refs")
-    dest_refs_dir = os.path.join(dest_repo.ugit_dir, "refs")
+def _unbundle_repository(path: str, dest_repo: Repository) -> str:
+    """
+    Install the objects of a bundle and its branches and tags.
 
-    if os.path.exists(source_refs_dir):
-        # Copy to remotes/origin/
-        dest_remote_refs_dir = os.path.join(dest_refs_dir, "remotes", "origin")
-        os.makedirs(dest_remote_refs_dir, exist_ok=True)
+    Args:
+        path: Bundle file
+        dest_repo: Destination repository
 
-        # Copy heads to remotes/origin/
-        source_heads_dir = os.path.join(source_refs_dir, "heads")
-        if os.path.exists(source_heads_dir):
-            for branch_file in os.listdir(source_heads_dir):
-                source_branch = os.path.join(source_heads_dir, branch_file)
-                dest_branch = os.path.join(dest_remote_refs_dir, branch_file)
-                if os.path.isfile(source_branch):
-                    shutil.copy2(source_branch, dest_branch)
+    Returns:
+        Branch the bundled HEAD points at, "main" if it cannot be told
+    """
+    bundled = unbundle(dest_repo, path)
+    refs = check_remote_refs(bundled)
+    _write_origin_refs(dest_repo, refs)
+
+    branches = {
+        ref[len("refs/heads/") :]: sha
+        for ref, sha in refs.items()
+        if ref.startswith("refs/heads/")
+    }
+    head = bundled.get("HEAD")
+    at_head = [name for name, sha in branches.items() if sha == head]
+    for candidates in (at_head, list(branches)):
+        for name in ("main", "master"):
+            if name in candidates:
+                return name
+        if candidates:
+            return candidates[0]
+    return "main"
+
+
+def _write_origin_refs(dest_repo: Repository, refs: Dict[str, str]) -> None:
+    """Store cloned branches as origin's remote-tracking branches, and tags."""
+    for ref, sha in check_remote_refs(refs).items():
+        if ref.startswith("refs/heads/"):
+            local_ref = "refs/remotes/origin/" + ref[len("refs/heads/") :]
+        else:
+            local_ref = ref
+        update_ref(dest_repo, local_ref, sha, read_ref(dest_repo, local_ref))
 
 
-def _setup_initial_checkout(repo: Repository, source_url: str) -> None:
+def _setup_initial_checkout(repo: Repository, default_branch: str) -> None:
     """
     Set up initial HEAD and checkout the default branch.
 
     Args:
         repo: Repository instance
-        source_url: Source repository URL
+        default_branch: Branch to check out, as named on the remote
     """
-    # Read HEAD from source to determine default branch
-    if is_local_path(source_url):
-        source_head_path = os.path.join(source_url, ".ugit", "HEAD")
-        default_branch = "main"  # fallback
-
-        if os.path.exists(source_head_path):
-            try:
-                with open(source_head_path, "r") as f:
-                    head_content = f.read().strip()
-                    if head_content.startswith("ref: refs/heads/"):
-                        default_branch = head_content[16:]  # Remove 'ref: refs/heads/'
-            except (IOError, OSError):
-                pass
-
-        # Check if we have the branch in remotes/origin
-        remote_branch_path = os.path.join(
-            repo.ugit_dir, "refs", "remotes", "origin", default_branch
-        )
-        if os.path.exists(remote_branch_path):
-            try:
-                # Read the commit SHA
-                with open(remote_branch_path, "r") as f:
-                    commit_sha = f.read().strip()
-
-                # Create local branch
-                local_branch_path = os.path.join(
-                    repo.ugit_dir, "refs", "heads", default_branch
-                )
-                os.makedirs(os.path.dirname(local_branch_path), exist_ok=True)
-                with open(local_branch_path, "w") as f:
-                    f.write(commit_sha)
-
-                # Set HEAD to point to the branch
-                head_path = os.path.join(repo.ugit_dir, "HEAD")
-                with open(head_path, "w") as f:
-                    f.write(f"ref: refs/heads/{default_branch}")
-
-                # Perform checkout (simplified - just restore working directory)
-                checkout_commit(repo, commit_sha, update_head=False)
-
-            except (IOError, OSError) as e:
-                print(
-                    f"Warning: failed to checkout {default_branch}: {e}",
-                    file=sys.stderr,
-                )
+    # The name can come from the remote, so it must be a plain branch name
+    local_ref = f"refs/heads/{default_branch}"
+    if not is_valid_ref_name(local_ref):
+        raise UgitError(f"Invalid default branch from remote: {default_branch}")
+
+    # Check if we have the branch in remotes/origin
+    commit_sha = read_ref(repo, f"refs/remotes/origin/{default_branch}")
+    if commit_sha:
+        try:
+            # Populate the working directory before HEAD exists
+            checkout_commit(repo, commit_sha, update_head=False)
+
+            # Create local branch
+            update_ref(repo, local_ref, commit_sha, read_ref(repo, local_ref))
+
+            # Set HEAD to point to the branch
+            head_path = os.path.join(repo.ugit_dir, "HEAD")
+            with open(head_path, "w") as f:
+                f.write(f"ref: refs/heads/{default_branch}")
+
+        except (IOError, OSError) as e:
+            print(
+                f"Warning: failed to checkout {default_branch}: {e}",
+                file=sys.stderr,
+            )
@@ -14,6 +14,7 @@ from ..utils.config import Config
 from ..utils.helpers import ensure_repository, get_current_branch_name
 from .commit_template import get_commit_template
 from .hooks import run_hook
+from .maintenance import auto_maintenance
 from .reflog import append_reflog
 
 
@@ -95,6 +96,7 @@ def commit(message: Optional[str] = None, author: Optional[str] = None) -> None:
     run_hook(repo, "post-commit", commit_sha)
 
     print(f"Committed {commit_sha[:7]} - {message}")
+    auto_maintenance(repo)
 
 
 def _write_tree(repo: Repository) -> Optional[str]:
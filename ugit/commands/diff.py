@@ -10,10 +10,12 @@ This module handles comparing files between different states:
 import difflib
 import os
 import sys
-from typing import Dict, Optional
+from typing import Dict, Optional, Set, Tuple
 
-from ..core.objects import get_object
-from ..core.repository import Index, Repository
+from ..core.chunking import hash_blob, read_blob
+from ..core.lfs import clean_file
+from ..core.repository import Index, Repository, stat_matches
+from ..core.sparse import read_sparse_cones
 from ..utils.helpers import (
     get_commit_data,
     get_ignored_patterns,
@@ -47,20 +49,27 @@ def diff(
 
 
 def _diff_working_directory(repo: Repository) -> None:
-    """Show differences between working directory and staging area."""
-    # Get staged files
-    staged_files = _get_staged_files(repo)
-
-    # Get working directory files
-    working_files = _get_working_files(repo)
+    """
+    Show differences between working directory and staging area.
 
-    # Compare files
-    all_files = set(staged_files.keys()) | set(working_files.keys())
+    Tracked files are checked against the index stat cache first; only
+    files whose mtime or size changed are read and hashed, and blob
+    content is loaded only for files whose hash actually differs.
+    """
+    index = Index(repo)
+    index_data = index.read()
+    changed_files = _get_changed_working_files(
+        repo, index_data, index.read_skip_worktree()
+    )
 
     has_changes = False
-    for file_path in sorted(all_files):
-        staged_content = staged_files.get(file_path, "")
-        working_content = working_files.get(file_path, "")
+    for file_path in sorted(changed_files):
+        entry = index_data.get(file_path)
+        staged_content = _read_blob_text(repo, entry[0]) if entry else ""
+        working_data = changed_files[file_path]
+        working_content = (
+            working_data.decode("utf-8", errors="replace") if working_data else ""
+        )
 
         if staged_content != working_content:
             has_changes = True
@@ -137,7 +146,7 @@ def _get_staged_files(repo: Repository) -> Dict[str, str]:
 
     for path, (sha, _, _) in index_data.items():
         try:
-            obj_type, content = get_object(sha)
+            obj_type, content = read_blob(sha, repo=repo)
             if obj_type == "blob":
                 staged_files[path] = content.decode("utf-8", errors="replace")
         except (FileNotFoundError, ValueError, UnicodeDecodeError):
@@ -146,31 +155,92 @@ def _get_staged_files(repo: Repository) -> Dict[str, str]:
     return staged_files
 
 
-def _get_working_files(repo: Repository) -> Dict[str, str]:
-    """Get all working directory files and their content."""
-    working_files = {}
-    ignored_patterns = get_ignored_patterns(repo.path)
+def _get_changed_working_files(
+    repo: Repository,
+    index_data: Dict[str, Tuple[str, float, int]],
+    skip_worktree: Optional[Set[str]] = None,
+) -> Dict[str, Optional[bytes]]:
+    """
+    Find working directory files that differ from the index.
+
+    Args:
+        repo: Repository instance
+        index_data: Current index entries
+        skip_worktree: Sparse checkout paths that are not in the working tree
+
+    Returns:
+        Dictionary mapping changed paths to their working tree content,
+        or None for tracked files that were deleted
+    """
+    changed: Dict[str, Optional[bytes]] = {}
 
+    skip_worktree = skip_worktree or set()
+    for path, entry in index_data.items():
+        if path in skip_worktree:
+            continue
+
+        file_path = os.path.join(repo.path, path)
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            changed[path] = None
+            continue
+
+        if stat_matches(entry, stat):
+            continue  # Assumed unchanged
+
+        try:
+            data = _read_working_file(repo, path, file_path)
+        except (IOError, OSError):
+            changed[path] = None
+            continue
+
+        if hash_blob(data, write=False, repo=repo) != entry[0]:
+            changed[path] = data
+
+    # Untracked files have no staged content, so every one of them differs
+    ignored_patterns = get_ignored_patterns(repo.path)
+    cones = read_sparse_cones(repo)
     for root, dirs, files in os.walk(repo.path):
-        # Skip .ugit directory
         if ".ugit" in dirs:
             dirs.remove(".ugit")
+        if cones is not None:
+            rel_root = os.path.relpath(root, repo.path).replace(os.sep, "/")
+            prefix = "" if rel_root == "." else rel_root + "/"
+            dirs[:] = [d for d in dirs if cones.includes_directory(prefix + d)]
 
         for file in files:
             file_path = os.path.join(root, file)
-            rel_path = os.path.relpath(file_path, repo.path)
-
-            # Skip ignored files
-            if should_ignore_file(rel_path, ignored_patterns):
+            rel_path = os.path.relpath(file_path, repo.path).replace(os.sep, "/")
+            if rel_path in index_data or should_ignore_file(rel_path, ignored_patterns):
                 continue
 
             try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    working_files[rel_path] = f.read()
-            except (IOError, OSError, UnicodeDecodeError):
-                working_files[rel_path] = ""
+                changed[rel_path] = _read_working_file(repo, rel_path, file_path)
+            except (IOError, OSError):
+                changed[rel_path] = None
+
+    return changed
+
 
-    return working_files
+def _read_working_file(repo: Repository, path: str, file_path: str) -> bytes:
+    """Read a working tree file as it would be staged: LFS files as pointers."""
+    pointer = clean_file(repo, path, file_path, write=False)
+    if pointer is not None:
+        return pointer
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+def _read_blob_text(repo: Repository, sha: str) -> str:
+    """Read a blob and decode it for display."""
+    try:
+        obj_type, content = read_blob(sha, repo=repo)
+        if obj_type == "blob":
+            return content.decode("utf-8", errors="replace")
+    except (FileNotFoundError, ValueError):
+        pass
+    return ""
 
 
 def _get_commit_files(repo: Repository, commit_sha: str) -> Dict[str, str]:
@@ -194,7 +264,7 @@ def _get_tree_files(
             full_path = os.path.join(prefix, path) if prefix else path
             if mode.startswith("10"):  # File
                 try:
-                    type_, content = get_object(sha, repo=repo)
+                    type_, content = read_blob(sha, repo=repo)
                     if type_ == "blob":
                         files[full_path] = content.decode("utf-8", errors="replace")
                 except (FileNotFoundError, ValueError, UnicodeDecodeError):
@@ -5,23 +5,47 @@ This module handles fetching changes from remote repositories without merging th
 """
 
 import os
-import shutil
 import sys
-from typing import Dict, Optional, Set
-
-from ..core.objects import get_object, object_exists
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from ..core.bundle import is_bundle, read_bundle_header, unbundle
+from ..core.exceptions import UgitError
+from ..core.objects import object_exists
+from ..core.pack import index_pack, new_temp_pack_path, write_pack
+from ..core.promisor import get_partial_clone_filter, parse_filter
+from ..core.protocol import check_remote_refs, local_ref_tips
+from ..core.refs import list_refs, update_ref
 from ..core.repository import Repository
-from ..utils.helpers import is_local_path
+from ..core.revlist import list_objects
+from ..core.shallow import parse_since, read_shallow, update_shallow
+from ..utils.helpers import (
+    get_commit_data,
+    get_commit_parents,
+    is_http_url,
+    is_local_path,
+)
+from ..utils.validation import validate_sha
+from .http_remote import fetch_pack_http, get_http_refs
+from .maintenance import auto_maintenance
 from .remote import get_remote_url
 
 
-def fetch(remote_name: str = "origin", branch: Optional[str] = None) -> int:
+def fetch(
+    remote_name: str = "origin",
+    branch: Optional[str] = None,
+    depth: Optional[int] = None,
+    deepen: Optional[int] = None,
+    shallow_since: Optional[str] = None,
+) -> int:
     """
     Fetch objects and refs from a remote repository.
 
     Args:
         remote_name: Name of remote to fetch from
         branch: Specific branch to fetch (optional)
+        depth: Fetch at most this many commits of history below each tip
+        deepen: Extend a shallow repository's history by this many commits
+        shallow_since: Fetch history back to this date (ISO 8601)
 
     Returns:
         0 on success, 1 on error
@@ -32,6 +56,13 @@ def fetch(remote_name: str = "origin", branch: Optional[str] = None) -> int:
         print("Not a ugit repository")
         return 1
 
+    if depth is not None and deepen is not None:
+        print("fatal: --depth and --deepen cannot be used together", file=sys.stderr)
+        return 1
+    if (depth is not None and depth < 1) or (deepen is not None and deepen < 1):
+        print("fatal: depth must be a positive number", file=sys.stderr)
+        return 1
+
     # Get remote URL
     remote_url = get_remote_url(remote_name)
     if not remote_url:
@@ -44,8 +75,17 @@ def fetch(remote_name: str = "origin", branch: Optional[str] = None) -> int:
     print(f"From {remote_url}")
 
     try:
-        if is_local_path(remote_url):
-            _fetch_local(repo, remote_name, remote_url, branch)
+        shallow = ShallowOptions(
+            depth if depth is not None else deepen,
+            parse_since(shallow_since) if shallow_since else None,
+            _deepen_wants(repo) if deepen is not None or shallow_since else (),
+        )
+        if is_bundle(remote_url):
+            _fetch_bundle(repo, remote_name, remote_url, branch, shallow)
+        elif is_local_path(remote_url):
+            _fetch_local(repo, remote_name, remote_url, branch, shallow)
+        elif is_http_url(remote_url):
+            _fetch_http(repo, remote_name, remote_url, branch, shallow)
         else:
             print(
                 f"fatal: remote protocols not yet supported: {remote_url}",
@@ -57,20 +97,43 @@ def fetch(remote_name: str = "origin", branch: Optional[str] = None) -> int:
         print(f"fatal: failed to fetch from '{remote_name}': {e}", file=sys.stderr)
         return 1
 
+    auto_maintenance(repo)
     return 0
 
 
+class ShallowOptions(NamedTuple):
+    """How far back a fetch goes, for shallow repositories."""
+
+    depth: Optional[int] = None
+    since: Optional[float] = None
+    deepen_wants: Tuple[str, ...] = ()
+
+    def is_shallow_fetch(self) -> bool:
+        """Check whether the fetch limits history."""
+        return self.depth is not None or self.since is not None
+
+
 def _fetch_local(
-    repo: Repository, remote_name: str, remote_url: str, branch: Optional[str]
+    repo: Repository,
+    remote_name: str,
+    remote_url: str,
+    branch: Optional[str],
+    shallow: ShallowOptions = ShallowOptions(),
 ) -> None:
     """
     Fetch from a local repository.
 
+    The remote's history is walked from the new tips and stops at the
+    commits this repository already has (its branch, remote-tracking and
+    tag tips), so only the missing objects are read. They are copied as a
+    single pack.
+
     Args:
         repo: Local repository
         remote_name: Remote name
         remote_url: Remote repository path
         branch: Specific branch to fetch
+        shallow: History limits of a shallow fetch
     """
     # Check if remote repository exists
     remote_ugit_dir = os.path.join(remote_url, ".ugit")
@@ -83,182 +146,250 @@ def _fetch_local(
         print("No refs to fetch")
         return
 
-    # Ensure remote refs directory exists
-    local_remote_refs_dir = os.path.join(repo.ugit_dir, "refs", "remotes", remote_name)
-    os.makedirs(local_remote_refs_dir, exist_ok=True)
+    wants = _get_wants(repo, remote_refs, shallow)
+    if wants:
+        _fetch_pack_local(
+            repo,
+            Repository(remote_url),
+            wants,
+            local_ref_tips(repo),
+            get_partial_clone_filter(repo, remote_name),
+            shallow,
+        )
 
-    # Track what we need to fetch
-    commits_to_fetch = set()
-    any_changes = False
+    # Refs are only updated once their objects are in place
+    if not update_remote_refs(repo, remote_name, remote_refs):
+        print("No refs to fetch")
+    _update_shallow_boundary(repo, shallow)
 
-    for branch_name, commit_sha in remote_refs.items():
-        # Check if we need to fetch this commit
-        if not object_exists(commit_sha, repo=repo):
-            commits_to_fetch.add(commit_sha)
 
-        # Update local remote ref
-        local_remote_ref_path = os.path.join(local_remote_refs_dir, branch_name)
+def _fetch_pack_local(
+    repo: Repository,
+    remote_repo: Repository,
+    wants: List[str],
+    haves: List[str],
+    filter_spec: Optional[str] = None,
+    shallow: ShallowOptions = ShallowOptions(),
+) -> Optional[str]:
+    """
+    Copy the objects needed for the wanted tips as one pack.
 
-        # Check if ref changed
-        old_sha = None
-        if os.path.exists(local_remote_ref_path):
-            try:
-                with open(local_remote_ref_path, "r") as f:
-                    old_sha = f.read().strip()
-            except (IOError, OSError):
-                pass
+    Args:
+        repo: Repository receiving the objects
+        remote_repo: Repository holding them
+        wants: Tips to fetch
+        haves: Tips the receiving repository already has
+        filter_spec: Object filter of a partial clone, such as blob:none
+        shallow: History limits of a shallow fetch
 
-        if old_sha != commit_sha:
-            any_changes = True
-            # Write new ref
-            with open(local_remote_ref_path, "w") as f:
-                f.write(commit_sha)
+    Returns:
+        Path of the installed pack, or None if nothing was missing
+    """
+    listed = list_objects(
+        remote_repo,
+        wants,
+        haves,
+        blob_limit=parse_filter(filter_spec) if filter_spec else None,
+        depth=shallow.depth,
+        since=shallow.since,
+        shallow=read_shallow(repo),
+    )
+    shas = [sha for sha in listed if not object_exists(sha, repo=repo)]
+    if not shas:
+        return None
+
+    tmp_path = new_temp_pack_path(repo)
+    try:
+        with open(tmp_path, "wb") as f:
+            write_pack(remote_repo, shas, f)
+        return index_pack(repo, tmp_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _fetch_http(
+    repo: Repository,
+    remote_name: str,
+    remote_url: str,
+    branch: Optional[str],
+    shallow: ShallowOptions = ShallowOptions(),
+) -> None:
+    """
+    Fetch from an HTTP remote with a single pack.
 
-            # Show update status
-            if old_sha:
-                print(f" * {old_sha[:8]}..{commit_sha[:8]} {remote_name}/{branch_name}")
-            else:
-                print(
-                    f" * [new branch] {remote_name}/{branch_name} -> {remote_name}/{branch_name}"
-                )
+    The server's ref advertisement says which tips are new. They are sent as
+    wants, together with every local tip as a have, and the server replies
+    with one pack holding only the missing objects.
 
-    # If no changes, say so
-    if not any_changes:
+    Args:
+        repo: Local repository
+        remote_name: Remote name
+        remote_url: Remote repository URL
+        branch: Specific branch to fetch
+        shallow: History limits of a shallow fetch
+    """
+    advertisement = get_http_refs(remote_url, repo)
+    remote_refs = {
+        ref[len("refs/heads/") :]: sha
+        for ref, sha in advertisement["refs"].items()
+        if ref.startswith("refs/heads/")
+    }
+    if branch:
+        remote_refs = {name: sha for name, sha in remote_refs.items() if name == branch}
+    if not remote_refs:
         print("No refs to fetch")
         return
 
-    # Fetch missing objects
-    if commits_to_fetch:
-        _fetch_objects(repo, remote_url, commits_to_fetch)
+    fetch_pack_http(
+        repo,
+        remote_url,
+        _get_wants(repo, remote_refs, shallow),
+        local_ref_tips(repo),
+        get_partial_clone_filter(repo, remote_name),
+        depth=shallow.depth,
+        since=shallow.since,
+        shallow=read_shallow(repo),
+    )
+
+    if not update_remote_refs(repo, remote_name, remote_refs):
+        print("No refs to fetch")
+    _update_shallow_boundary(repo, shallow)
 
 
-def _get_remote_refs(
-    remote_url: str, branch_filter: Optional[str] = None
-) -> Dict[str, str]:
+def _fetch_bundle(
+    repo: Repository,
+    remote_name: str,
+    bundle_path: str,
+    branch: Optional[str],
+    shallow: ShallowOptions = ShallowOptions(),
+) -> None:
     """
-    Get refs from remote repository.
+    Fetch the branches of a bundle file.
 
-    Args:
-        remote_url: Remote repository path
-        branch_filter: Only fetch this branch if specified
+    The bundle's pack is installed only when one of its branch tips is
+    missing locally.
 
-    Returns:
-        Dictionary of branch names to commit SHAs
+    Args:
+        repo: Local repository
+        remote_name: Remote name
+        bundle_path: Bundle file
+        branch: Specific branch to fetch
+        shallow: History limits, which a bundle cannot apply
     """
-    refs: Dict[str, str] = {}
-    remote_heads_dir = os.path.join(remote_url, ".ugit", "refs", "heads")
+    if shallow.is_shallow_fetch() or shallow.deepen_wants:
+        raise UgitError("shallow fetches are not supported from a bundle")
+
+    remote_refs = {
+        ref[len("refs/heads/") :]: sha
+        for ref, sha in check_remote_refs(read_bundle_header(bundle_path).refs).items()
+        if ref.startswith("refs/heads/")
+    }
+    if branch:
+        remote_refs = {name: sha for name, sha in remote_refs.items() if name == branch}
+    if not remote_refs:
+        print("No refs to fetch")
+        return
 
-    if not os.path.exists(remote_heads_dir):
-        return refs
+    if any(not object_exists(sha, repo=repo) for sha in remote_refs.values()):
+        unbundle(repo, bundle_path)
 
-    for branch_file in os.listdir(remote_heads_dir):
-        if branch_filter and branch_file != branch_filter:
-            continue
+    if not update_remote_refs(repo, remote_name, remote_refs):
+        print("No refs to fetch")
+    _update_shallow_boundary(repo, shallow)
 
-        branch_path = os.path.join(remote_heads_dir, branch_file)
-        if os.path.isfile(branch_path):
-            try:
-                with open(branch_path, "r") as f:
-                    commit_sha = f.read().strip()
-                    if len(commit_sha) == 40:  # Valid SHA
-                        refs[branch_file] = commit_sha
-            except (IOError, OSError):
-                continue
 
-    return refs
+def _get_wants(
+    repo: Repository, remote_refs: Dict[str, str], shallow: ShallowOptions
+) -> List[str]:
+    """Get the remote tips to fetch, plus the history a deepen asks for."""
+    wants = {sha for sha in remote_refs.values() if not object_exists(sha, repo=repo)}
+    wants.update(shallow.deepen_wants)
+    return sorted(wants)
 
 
-def _fetch_objects(repo: Repository, remote_url: str, commits: Set[str]) -> None:
+def _deepen_wants(repo: Repository) -> Tuple[str, ...]:
     """
-    Fetch all objects needed for the given commits.
+    Get the missing parents of a shallow repository's boundary commits.
 
-    Args:
-        repo: Local repository
-        remote_url: Remote repository path
-        commits: Set of commit SHAs to fetch
+    Fetching them (with a depth or cutoff date) extends history below the
+    current boundary.
     """
-    remote_objects_dir = os.path.join(remote_url, ".ugit", "objects")
-    local_objects_dir = os.path.join(repo.ugit_dir, "objects")
-
-    # Track all objects we need to fetch
-    objects_to_fetch = set(commits)
-    fetched_objects = set()
-
-    while objects_to_fetch:
-        sha = objects_to_fetch.pop()
-
-        if sha in fetched_objects or object_exists(sha, repo=repo):
+    wants: Set[str] = set()
+    for sha in read_shallow(repo):
+        try:
+            parents = get_commit_parents(get_commit_data(sha, repo=repo))
+        except ValueError:
             continue
+        wants.update(p for p in parents if not object_exists(p, repo=repo))
+    return tuple(sorted(wants))
 
-        # Copy object from remote
-        if _copy_object(remote_objects_dir, local_objects_dir, sha):
-            fetched_objects.add(sha)
 
-            # Find dependencies of this object
-            try:
-                obj_type, obj_content = get_object(sha, repo=repo)
+def _update_shallow_boundary(repo: Repository, shallow: ShallowOptions) -> None:
+    """Recompute .ugit/shallow after a fetch that may have moved it."""
+    if shallow.is_shallow_fetch() or read_shallow(repo):
+        update_shallow(repo, local_ref_tips(repo))
 
-                if obj_type == "commit":
-                    # Parse JSON commit to find tree and parents
-                    import json
 
-                    commit_data = json.loads(obj_content.decode("utf-8"))
+def update_remote_refs(
+    repo: Repository, remote_name: str, remote_refs: Dict[str, str]
+) -> bool:
+    """
+    Point remote-tracking branches at fetched commits.
 
-                    if "tree" in commit_data:
-                        objects_to_fetch.add(commit_data["tree"])
+    Args:
+        repo: Local repository
+        remote_name: Remote name
+        remote_refs: Branch names mapped to commit SHAs
 
-                    if "parent" in commit_data:
-                        parent = commit_data["parent"]
-                        # Only fetch if it's a real parent SHA (not a ref)
-                        if not parent.startswith("ref: refs/heads/"):
-                            objects_to_fetch.add(parent)
+    Returns:
+        True if any remote-tracking branch changed
+    """
+    prefix = f"refs/remotes/{remote_name}/"
+    current = list_refs(repo, (prefix,))
 
-                elif obj_type == "tree":
-                    # Parse JSON tree to find blobs and subtrees
-                    import json
+    any_changes = False
+    for branch_name, commit_sha in remote_refs.items():
+        if not validate_sha(commit_sha):
+            raise UgitError(f"Invalid SHA for {branch_name} from remote: {commit_sha}")
 
-                    tree_data = json.loads(obj_content.decode("utf-8"))
+        # Check if ref changed
+        old_sha = current.get(prefix + branch_name)
+        if old_sha != commit_sha:
+            any_changes = True
+            # update_ref refuses names that would leave refs/
+            update_ref(repo, prefix + branch_name, commit_sha, old_sha)
 
-                    # Tree is a list of [filename, sha] pairs
-                    for entry in tree_data:
-                        if len(entry) >= 2:
-                            objects_to_fetch.add(entry[1])
+            # Show update status
+            if old_sha:
+                print(f" * {old_sha[:8]}..{commit_sha[:8]} {remote_name}/{branch_name}")
+            else:
+                print(
+                    f" * [new branch] {remote_name}/{branch_name} -> {remote_name}/{branch_name}"
+                )
 
-            except (ValueError, IndexError, UnicodeDecodeError):
-                # If we can't parse the object, that's ok - skip it
-                continue
+    return any_changes
 
 
-def _copy_object(remote_objects_dir: str, local_objects_dir: str, sha: str) -> bool:
+def _get_remote_refs(
+    remote_url: str, branch_filter: Optional[str] = None
+) -> Dict[str, str]:
     """
-    Copy an object from remote to local repository.
+    Get refs from remote repository.
 
     Args:
-        remote_objects_dir: Remote objects directory
-        local_objects_dir: Local objects directory
-        sha: Object SHA to copy
+        remote_url: Remote repository path
+        branch_filter: Only fetch this branch if specified
 
     Returns:
-        True if object was copied successfully
+        Dictionary of branch names to commit SHAs
     """
-    # Try both old flat and new hierarchical formats
-    remote_paths = [
-        os.path.join(remote_objects_dir, sha),  # Old flat
-        os.path.join(remote_objects_dir, sha[:2], sha[2:]),  # New hierarchical
-    ]
-
-    for remote_path in remote_paths:
-        if os.path.exists(remote_path):
-            # Copy to hierarchical format in local
-            local_dir = os.path.join(local_objects_dir, sha[:2])
-            local_path = os.path.join(local_dir, sha[2:])
-
-            os.makedirs(local_dir, exist_ok=True)
-
-            try:
-                shutil.copy2(remote_path, local_path)
-                return True
-            except (IOError, OSError):
-                continue
-
-    return False
+    refs: Dict[str, str] = {}
+    remote_heads = list_refs(Repository(remote_url), ("refs/heads",))
+    for ref, commit_sha in remote_heads.items():
+        branch_name = ref[len("refs/heads/") :]
+        if branch_filter and branch_name != branch_filter:
+            continue
+        refs[branch_name] = commit_sha
+
+    return refs
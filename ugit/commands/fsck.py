@@ -2,89 +2,99 @@
 Fsck (file system check) command implementation for ugit.
 
 Verify repository integrity and detect corruption.
+
+Every ref must point at an existing object, and everything reachable from
+the refs must be present: commits, their trees and parents, tree entries
+and tag targets. Blobs left out of a partial clone and the parents of
+shallow boundary commits are allowed to be missing.
+
+With --full, every stored object is also checked. Loose objects are
+inflated and their SHA-1 recomputed, as are objects kept in a
+core.objectStorage backend. Each pack's trailer and index
+checksums are verified, and each packed object is read back and hashed.
+The work is split by fan-out directory and pack range across a pool of
+processes. The objects parsed along the way feed the connectivity check,
+so nothing is read twice.
 """
 
+import hashlib
 import json
 import os
+import time
 import zlib
-from typing import List
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
 
+from ..core.chunking import parse_manifest, uses_chunking
+from ..core.exceptions import CorruptPackError
+from ..core.midx import MIDX_FILE, verify_multi_pack_index
 from ..core.objects import get_object, object_exists
+from ..core.odb import ObjectDatabase, loose_object_database
+from ..core.pack import (
+    TYPE_NAMES,
+    Pack,
+    get_pack_dir,
+    get_packs,
+    object_sha,
+    verify_pack_checksum,
+)
+from ..core.promisor import get_promisor_remote
+from ..core.refs import PACKED_REFS, read_packed_refs
 from ..core.repository import Repository
-from ..utils.helpers import ensure_repository, get_commit_data, get_tree_entries
+from ..core.shallow import read_shallow
+from ..utils.helpers import ensure_repository, get_commit_parents
 from ..utils.validation import validate_sha
 
+# Below this many objects, --full checks them in this process
+PARALLEL_THRESHOLD = 1000
+
+# Packed objects per unit of work
+PACK_CHUNK_SIZE = 10000
+
+_OBJECT_TYPES = ("blob", "tree", "commit", "tag")
+
+# An object's type and the (SHA, expected type) pairs it refers to; an
+# empty expected type accepts any type, and "chunk" is a blob that is part
+# of a chunked file
+ParsedObject = Tuple[str, List[Tuple[str, str]]]
 
-def fsck(full: bool = False) -> int:
+
+class _CheckResult(NamedTuple):
+    """What one unit of --full work found."""
+
+    objects: Dict[str, ParsedObject]
+    errors: List[str]
+    size: int
+
+
+def fsck(full: bool = False, workers: Optional[int] = None) -> int:
     """
     Check repository integrity.
 
     Args:
         full: Perform full check (verify all objects)
+        workers: Processes to use for the full check (default: one per CPU)
 
     Returns:
         Number of errors found
     """
     repo = ensure_repository()
-    errors = []
+    errors: List[str] = []
 
-    # Check HEAD
-    head_sha = repo.get_head_ref()
-    if head_sha and not validate_sha(head_sha):
-        errors.append(f"Invalid HEAD SHA: {head_sha}")
+    roots = _check_refs(repo, errors)
 
-    # Check branches
-    heads_dir = os.path.join(repo.ugit_dir, "refs", "heads")
-    if os.path.exists(heads_dir):
-        for branch_file in os.listdir(heads_dir):
-            branch_path = os.path.join(heads_dir, branch_file)
-            try:
-                with open(branch_path, "r") as f:
-                    sha = f.read().strip()
-                    if not validate_sha(sha):
-                        errors.append(f"Invalid SHA in branch {branch_file}: {sha}")
-                    elif not object_exists(sha, repo=repo):
-                        errors.append(
-                            f"Branch {branch_file} points to non-existent commit: {sha}"
-                        )
-            except (IOError, OSError) as e:
-                errors.append(f"Error reading branch {branch_file}: {e}")
-
-    # Check tags
-    tags_dir = os.path.join(repo.ugit_dir, "refs", "tags")
-    if os.path.exists(tags_dir):
-        for tag_file in os.listdir(tags_dir):
-            tag_path = os.path.join(tags_dir, tag_file)
-            try:
-                with open(tag_path, "r") as f:
-                    sha = f.read().strip()
-                    if not validate_sha(sha):
-                        errors.append(f"Invalid SHA in tag {tag_file}: {sha}")
-            except (IOError, OSError) as e:
-                errors.append(f"Error reading tag {tag_file}: {e}")
-
-    # Check objects if full check
+    parsed: Dict[str, ParsedObject] = {}
     if full:
-        objects_dir = os.path.join(repo.ugit_dir, "objects")
-        if os.path.exists(objects_dir):
-            for root, dirs, files in os.walk(objects_dir):
-                for file in files:
-                    if len(file) == 38:  # Remaining chars after first 2
-                        sha = os.path.basename(root) + file
-                        if len(sha) == 40:
-                            try:
-                                obj_type, content = get_object(sha, repo=repo)
-                                # Verify object integrity
-                                if obj_type not in ("blob", "tree", "commit", "tag"):
-                                    errors.append(
-                                        f"Unknown object type for {sha}: {obj_type}"
-                                    )
-                            except Exception as e:
-                                errors.append(f"Corrupted object {sha}: {e}")
-
-    # Check commit chain
-    if head_sha:
-        _check_commit_chain(repo, head_sha, errors)
+        start = time.monotonic()
+        size = _check_objects(repo, parsed, errors, workers)
+        elapsed = max(time.monotonic() - start, 1e-6)
+        mib = size / (1024 * 1024)
+        print(
+            f"Checked {len(parsed)} object(s), {mib:.1f} MiB in {elapsed:.2f}s "
+            f"({mib / elapsed:.1f} MiB/s)"
+        )
+
+    _check_connectivity(repo, roots, parsed, errors)
 
     # Print results
     if errors:
@@ -97,32 +107,324 @@ def fsck(full: bool = False) -> int:
         return 0
 
 
-def _check_commit_chain(repo: Repository, commit_sha: str, errors: List[str]) -> None:
-    """Check commit chain integrity."""
-    visited = set()
-    current = commit_sha
+def _check_refs(repo: Repository, errors: List[str]) -> List[Tuple[str, str]]:
+    """
+    Check that HEAD and every ref hold a SHA of an existing object.
+
+    Returns:
+        (SHA, name) pairs of the valid ones, to check connectivity from
+    """
+    roots: List[Tuple[str, str]] = []
+
+    # Check HEAD
+    head_sha = repo.get_head_ref()
+    if head_sha and not validate_sha(head_sha):
+        errors.append(f"Invalid HEAD SHA: {head_sha}")
+    elif head_sha:
+        roots.append((head_sha, "HEAD"))
+
+    refs_dir = os.path.join(repo.ugit_dir, "refs")
+    for root, _, files in os.walk(refs_dir):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            ref = os.path.relpath(path, refs_dir).replace(os.sep, "/")
+            if ref.endswith(".lock"):
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    sha = f.read().strip()
+            except (IOError, OSError, UnicodeDecodeError) as e:
+                errors.append(f"Error reading ref {ref}: {e}")
+                continue
+            _check_ref(repo, ref, sha, roots, errors)
+
+    # Packed refs a loose file does not override
+    previous = ""
+    for full_ref, sha in read_packed_refs(repo).items():
+        if full_ref <= previous:
+            errors.append(f"{PACKED_REFS} is not sorted at {full_ref}")
+        previous = full_ref
+        ref = full_ref[len("refs/") :]
+        if not os.path.exists(os.path.join(refs_dir, *ref.split("/"))):
+            _check_ref(repo, ref, sha, roots, errors)
+    return roots
+
+
+def _check_ref(
+    repo: Repository,
+    ref: str,
+    sha: str,
+    roots: List[Tuple[str, str]],
+    errors: List[str],
+) -> None:
+    """Check one ref's SHA, adding it to roots if it names an object."""
+    if not validate_sha(sha):
+        errors.append(f"Invalid SHA in ref {ref}: {sha}")
+    elif not object_exists(sha, repo=repo):
+        errors.append(f"Ref {ref} points to non-existent object: {sha}")
+    else:
+        roots.append((sha, f"Ref {ref}"))
+
+
+def _check_objects(
+    repo: Repository,
+    parsed: Dict[str, ParsedObject],
+    errors: List[str],
+    workers: Optional[int],
+) -> int:
+    """
+    Verify every loose and packed object, filling parsed.
+
+    Returns:
+        Number of object bytes checked
+    """
+    objects_dir = os.path.join(repo.ugit_dir, "objects")
+    tasks: List[Tuple[Callable[..., _CheckResult], Tuple[Any, ...]]] = []
+    count = 0
+
+    names = sorted(os.listdir(objects_dir)) if os.path.isdir(objects_dir) else []
+    for name in names:
+        fanout_dir = os.path.join(objects_dir, name)
+        if len(name) != 2 or not os.path.isdir(fanout_dir):
+            continue
+        files = [file for file in os.listdir(fanout_dir) if len(file) == 38]
+        if files:
+            tasks.append((_check_loose_objects, (fanout_dir, files)))
+            count += len(files)
+
+    for pack in get_packs(objects_dir):
+        tasks.append((_check_pack_file, (pack.path,)))
+        try:
+            total = len(pack)
+        except (OSError, CorruptPackError) as e:
+            errors.append(f"Cannot read index of {pack.path}: {e}")
+            continue
+        for start in range(0, total, PACK_CHUNK_SIZE):
+            end = min(start + PACK_CHUNK_SIZE, total)
+            tasks.append((_check_packed_objects, (pack.path, start, end)))
+        count += total
 
-    while current and current not in visited:
-        visited.add(current)
+    if os.path.exists(os.path.join(get_pack_dir(objects_dir), MIDX_FILE)):
         try:
-            commit_data = get_commit_data(current, repo=repo)
-
-            # Check tree
-            tree_sha = commit_data.get("tree")
-            if tree_sha and not object_exists(tree_sha, repo=repo):
-                errors.append(
-                    f"Commit {current[:7]} references non-existent tree: {tree_sha}"
-                )
-
-            # Check parent
-            parent = commit_data.get("parent")
-            if parent and not validate_sha(parent):
-                errors.append(f"Commit {current[:7]} has invalid parent SHA: {parent}")
-
-            if parent is not None:
-                current = parent
+            problems = verify_multi_pack_index(objects_dir)
+        except (OSError, CorruptPackError) as e:
+            problems = [str(e)]
+        errors.extend(f"multi-pack-index: {problem}" for problem in problems)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    results = _run_tasks(tasks, workers if count >= PARALLEL_THRESHOLD else 1)
+    database = loose_object_database(repo)
+    if database is not None:
+        results.append(_check_database_objects(database))
+
+    size = 0
+    for result in results:
+        parsed.update(result.objects)
+        errors.extend(result.errors)
+        size += result.size
+    return size
+
+
+def _run_tasks(
+    tasks: List[Tuple[Callable[..., _CheckResult], Tuple[Any, ...]]], workers: int
+) -> List[_CheckResult]:
+    """Run check tasks in a process pool, or here if that is not worth it."""
+    workers = min(workers, len(tasks))
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(func, *args) for func, args in tasks]
+                return [future.result() for future in futures]
+        except (OSError, NotImplementedError, BrokenExecutor):
+            pass  # No working process pool here; check serially
+    return [func(*args) for func, args in tasks]
+
+
+def _check_loose_objects(fanout_dir: str, files: List[str]) -> _CheckResult:
+    """Inflate and hash the loose objects of one fan-out directory."""
+    objects: Dict[str, ParsedObject] = {}
+    errors: List[str] = []
+    size = 0
+    prefix = os.path.basename(fanout_dir)
+    for file in files:
+        sha = prefix + file
+        try:
+            with open(os.path.join(fanout_dir, file), "rb") as f:
+                stored = f.read()
+        except (IOError, OSError) as e:
+            errors.append(f"Cannot read object {sha}: {e}")
+            continue
+        size += len(stored)
+        try:
+            data = zlib.decompress(stored)
+        except zlib.error:
+            data = stored  # Old uncompressed format
+
+        null_pos = data.find(b"\x00")
+        try:
+            type_, length = data[:null_pos].decode().split()
+            valid_size = null_pos > 0 and int(length) == len(data) - null_pos - 1
+        except (ValueError, UnicodeDecodeError):
+            type_, valid_size = "", False
+        if not valid_size:
+            errors.append(f"Corrupted object {sha}: invalid header")
+        elif type_ not in _OBJECT_TYPES:
+            errors.append(f"Unknown object type for {sha}: {type_}")
+        elif hashlib.sha1(data, usedforsecurity=False).hexdigest() != sha:
+            errors.append(f"Hash mismatch for object {sha}")
+        else:
+            objects[sha] = (type_, _links(type_, data[null_pos + 1 :]))
+    return _CheckResult(objects, errors, size)
+
+
+def _check_pack_file(pack_path: str) -> _CheckResult:
+    """Verify a pack's trailer and its index's checksums."""
+    errors: List[str] = []
+    pack = Pack(pack_path)
+    try:
+        checksum = verify_pack_checksum(pack_path)
+        if not pack.index.verify_checksum():
+            errors.append(f"Index checksum mismatch for {pack_path}")
+        elif pack.index.pack_checksum != checksum:
+            errors.append(f"Index of {pack_path} belongs to a different pack")
+    except (OSError, CorruptPackError) as e:
+        errors.append(str(e))
+    finally:
+        pack.close()
+    return _CheckResult({}, errors, 0)
+
+
+def _check_packed_objects(pack_path: str, start: int, end: int) -> _CheckResult:
+    """Read back and hash a range of a pack's objects, in index order."""
+    objects: Dict[str, ParsedObject] = {}
+    errors: List[str] = []
+    size = 0
+    pack = Pack(pack_path)
+    try:
+        index = pack.index
+        for i in range(start, end):
+            sha = index.sha_at(i)
+            try:
+                type_code, data = pack.read_at(index.offset_at(i))
+            except (OSError, CorruptPackError, zlib.error) as e:
+                errors.append(f"Corrupted object {sha} in {pack_path}: {e}")
+                continue
+            type_ = TYPE_NAMES.get(type_code, "")
+            size += len(data)
+            if object_sha(type_, data) != sha:
+                errors.append(f"Hash mismatch for object {sha} in {pack_path}")
             else:
-                break
-        except ValueError as e:
-            errors.append(f"Invalid commit {current[:7]}: {e}")
-            break
+                objects[sha] = (type_, _links(type_, data))
+    except (OSError, CorruptPackError) as e:
+        errors.append(f"Cannot read {pack_path}: {e}")
+    finally:
+        pack.close()
+    return _CheckResult(objects, errors, size)
+
+
+def _check_database_objects(database: ObjectDatabase) -> _CheckResult:
+    """Read back and hash every object of a core.objectStorage backend."""
+    objects: Dict[str, ParsedObject] = {}
+    errors: List[str] = []
+    size = 0
+    for sha in database.iterate():
+        try:
+            type_, data = database.read(sha)
+        except (OSError, ValueError) as e:
+            errors.append(f"Cannot read object {sha}: {e}")
+            continue
+        size += len(data)
+        if type_ not in _OBJECT_TYPES:
+            errors.append(f"Unknown object type for {sha}: {type_}")
+        elif object_sha(type_, data) != sha:
+            errors.append(f"Hash mismatch for object {sha}")
+        else:
+            objects[sha] = (type_, _links(type_, data))
+    return _CheckResult(objects, errors, size)
+
+
+def _links(type_: str, data: bytes) -> List[Tuple[str, str]]:
+    """List the objects an object refers to, with their expected types."""
+    if type_ == "blob":
+        return [(chunk, "chunk") for chunk, _ in parse_manifest(data) or []]
+    try:
+        content = json.loads(data.decode())
+    except (ValueError, UnicodeDecodeError):
+        return []
+    if type_ == "commit" and isinstance(content, dict):
+        links = [(content["tree"], "tree")] if content.get("tree") else []
+        links.extend((parent, "commit") for parent in get_commit_parents(content))
+        return links
+    if type_ == "tree":
+        entries = content.items() if isinstance(content, dict) else content
+        try:
+            return [(sha, "blob") for _, sha in entries]
+        except (TypeError, ValueError):
+            return []
+    if type_ == "tag" and isinstance(content, dict) and content.get("object"):
+        return [(content["object"], "")]
+    return []
+
+
+def _check_connectivity(
+    repo: Repository,
+    roots: List[Tuple[str, str]],
+    parsed: Dict[str, ParsedObject],
+    errors: List[str],
+) -> None:
+    """Check that everything reachable from the roots is present."""
+    shallow = read_shallow(repo)
+    partial = get_promisor_remote(repo) is not None
+    follow_chunks = uses_chunking(repo)
+    seen: Set[str] = set()
+    stack: List[Tuple[str, str, str]] = [(sha, "", name) for sha, name in roots]
+
+    while stack:
+        sha, expected, referrer = stack.pop()
+        if sha in seen:
+            continue
+        seen.add(sha)
+        if not validate_sha(sha):
+            errors.append(f"{referrer} has invalid reference: {sha}")
+            continue
+
+        obj = parsed.get(sha)
+        if obj is None:
+            obj = _read_links(repo, sha, expected, follow_chunks)
+        if expected == "chunk":
+            expected = "blob"
+        if obj is None:
+            if not (partial and expected == "blob"):
+                kind = expected or "object"
+                errors.append(f"{referrer} references non-existent {kind}: {sha}")
+            continue
+
+        type_, links = obj
+        if expected and type_ != expected:
+            errors.append(f"{referrer} references {sha} as a {expected}, not a {type_}")
+            continue
+        label = f"{type_.capitalize()} {sha[:7]}"
+        for link, link_type in links:
+            if link_type == "commit" and sha in shallow:
+                continue  # Parents of a shallow boundary are missing by design
+            stack.append((link, link_type, label))
+
+
+def _read_links(
+    repo: Repository, sha: str, expected: str, follow_chunks: bool
+) -> Optional[ParsedObject]:
+    """
+    Read an object outside the full check.
+
+    Blobs are only read if they may be chunked files; chunks never are.
+    """
+    if not object_exists(sha, repo=repo):
+        return None
+    if expected == "chunk" or (expected == "blob" and not follow_chunks):
+        return "blob", []
+    try:
+        type_, data = get_object(sha, repo=repo)
+    except (FileNotFoundError, ValueError):
+        return None
+    return type_, _links(type_, data)
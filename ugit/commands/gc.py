@@ -2,135 +2,257 @@
 Garbage collection command implementation for ugit.
 
 Clean up unreachable objects to reclaim disk space.
+
+Objects are kept if anything could still need them: HEAD, every ref
+(branches, tags, remote-tracking refs, packed refs, and refs being
+updated), every commit in a reflog, stashed changes and the index.
+Unreachable loose objects are only deleted once they are older than the
+prune grace period (gc.pruneExpire, two weeks by default), so objects
+written by a command running at the same time, which are not referenced
+yet, survive. Writing an object that already exists refreshes its mtime
+for the same reason.
+
+Objects missing from a partial clone or beyond a shallow boundary are
+skipped rather than fetched. Packed objects are never deleted here; see
+``ugit repack``.
 """
 
+import json
 import os
-from typing import Set
-
-from ..core.repository import Repository
-from ..utils.helpers import ensure_repository, get_commit_data
-
-
-def gc(aggressive: bool = False) -> None:
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Container, Dict, Iterable, List, Optional, Set, Tuple
+
+from ..core.bitmap import find_reachable
+from ..core.chunking import chunk_references, uses_chunking
+from ..core.exceptions import UgitError
+from ..core.objects import TEMP_OBJECT_PREFIX, get_object, object_exists
+from ..core.odb import require_file_storage
+from ..core.refs import read_packed_refs
+from ..core.repository import Index, Repository
+from ..core.shallow import parse_since, read_shallow
+from ..utils.config import Config
+from ..utils.helpers import ensure_repository, get_commit_parents, get_tree_files
+from ..utils.validation import validate_sha
+
+DEFAULT_PRUNE_EXPIRE = "2.weeks.ago"
+
+_AGE_UNITS = {
+    "second": 1,
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+    "week": 7 * 86400,
+    "month": 30 * 86400,
+    "year": 365 * 86400,
+}
+_AGE_PATTERN = re.compile(r"^(\d+)[.\s]*([a-z]+?)s?(?:[.\s]+ago)?$")
+
+
+def gc(
+    aggressive: bool = False,
+    prune: Optional[str] = None,
+    repo: Optional[Repository] = None,
+) -> None:
     """
     Run garbage collection to clean up unreachable objects.
 
     Args:
         aggressive: More aggressive cleanup (not implemented yet)
+        prune: Only delete unreachable objects older than this: "now",
+            "never", an age such as "2.weeks.ago", or a date; defaults to
+            gc.pruneExpire
+        repo: Repository instance
+
+    Raises:
+        UgitError: If the prune age is invalid, or objects are not stored
+            as loose files
     """
-    repo = ensure_repository()
+    if repo is None:
+        repo = ensure_repository()
+    require_file_storage(repo, "gc")
+    if prune is None:
+        prune = Config(repo.path).get("gc", "pruneExpire") or DEFAULT_PRUNE_EXPIRE
+    cutoff = parse_prune_expire(prune)
 
-    # Find all reachable objects
-    reachable = _find_reachable_objects(repo)
+    if cutoff is None:
+        print("Removed 0 unreachable object(s)")
+        return
 
-    # Find all objects in repository
-    all_objects = _find_all_objects(repo)
+    # Find all reachable objects
+    reachable, kept = _find_reachable_objects(repo)
 
     # Find unreachable objects
-    unreachable = all_objects - reachable
+    unreachable = [
+        sha
+        for sha in _find_all_objects(repo)
+        if sha not in reachable and sha not in kept
+    ]
 
-    # Delete unreachable objects
-    deleted_count = 0
-    for sha in unreachable:
-        if _delete_object(repo, sha):
-            deleted_count += 1
+    # Delete the ones past the grace period
+    deleted_count, recent_count = _prune_objects(repo, unreachable, cutoff)
 
     print(f"Removed {deleted_count} unreachable object(s)")
+    stale_count = _prune_temp_objects(repo, cutoff)
+    if stale_count:
+        print(f"Removed {stale_count} temporary object file(s) left by crashes")
+    if recent_count:
+        print(f"Kept {recent_count} unreachable object(s) newer than {prune}")
     if deleted_count > 0:
         print(f"Repository size reduced")
 
 
-def _find_reachable_objects(repo: Repository) -> Set[str]:
-    """Find all reachable objects from refs."""
-    reachable = set()
+def parse_prune_expire(value: str) -> Optional[float]:
+    """
+    Parse a prune grace period.
+
+    Args:
+        value: "now", "never", an age such as "2.weeks.ago" or "3 days",
+            or an ISO 8601 date or seconds since the epoch
+
+    Returns:
+        Cutoff time: unreachable objects modified at or before it may be
+        deleted. None means never delete.
 
-    # Start from all refs
-    refs = []
+    Raises:
+        UgitError: If the value cannot be parsed
+    """
+    value = value.strip()
+    if value.lower() == "never":
+        return None
+    if value.lower() == "now":
+        return time.time()
+
+    match = _AGE_PATTERN.match(value.lower())
+    if match and match.group(2) in _AGE_UNITS:
+        return time.time() - int(match.group(1)) * _AGE_UNITS[match.group(2)]
+    try:
+        return parse_since(value)
+    except UgitError as e:
+        raise UgitError(f"Invalid prune age: {value}") from e
+
+
+def find_roots(repo: Repository) -> Tuple[List[str], Set[str]]:
+    """
+    Find the objects garbage collection must keep, with their history.
+
+    Args:
+        repo: Repository instance
 
-    # HEAD
+    Returns:
+        Tuple of (commit or tag SHAs to walk from, blob SHAs to keep as
+        they are). Walk roots come from HEAD, every ref and every reflog;
+        blobs come from the index and stashed changes.
+    """
+    roots: List[str] = []
     head_sha = repo.get_head_ref()
     if head_sha:
-        refs.append(head_sha)
+        roots.append(head_sha)
+
+    # Every ref, including remote-tracking refs and locked refs mid-update
+    refs_dir = os.path.join(repo.ugit_dir, "refs")
+    for root, _, files in os.walk(refs_dir):
+        for name in files:
+            roots.extend(_read_shas(os.path.join(root, name)))
+    roots.extend(sha for _, sha in read_packed_refs(repo).items())
+
+    # Every commit a reflog remembers
+    for root, _, files in os.walk(os.path.join(repo.ugit_dir, "logs")):
+        for name in files:
+            roots.extend(_read_shas(os.path.join(root, name)))
+
+    blobs: Set[str] = {entry[0] for entry in Index(repo).read().values()}
+    for stash_entry in _read_stashes(repo):
+        parent = stash_entry.get("parent_commit")
+        if parent:
+            roots.append(parent)
+        for staged in (stash_entry.get("staged_files") or {}).values():
+            blobs.add(staged[0])
+        blobs.update((stash_entry.get("working_changes") or {}).values())
+    blobs.update(chunk_references(repo, blobs))
+
+    return list(dict.fromkeys(sha for sha in roots if validate_sha(sha))), blobs
+
+
+def _read_shas(path: str) -> List[str]:
+    """Read the SHA at the start of each line of a ref or reflog file."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return [line.split("\t", 1)[0].strip() for line in f if line.strip()]
+    except (IOError, OSError, UnicodeDecodeError):
+        return []
+
+
+def _read_stashes(repo: Repository) -> List[Dict[str, Any]]:
+    stash_file = os.path.join(repo.ugit_dir, "stash")
+    try:
+        with open(stash_file, "r", encoding="utf-8") as f:
+            stashes = json.load(f)
+    except (IOError, OSError, ValueError):
+        return []
+    return [entry for entry in stashes if isinstance(entry, dict)]
+
+
+def _find_reachable_objects(repo: Repository) -> Tuple[Container[str], Set[str]]:
+    """
+    Find all objects reachable from the gc roots.
 
-    # Branches
-    heads_dir = os.path.join(repo.ugit_dir, "refs", "heads")
-    if os.path.exists(heads_dir):
-        for branch_file in os.listdir(heads_dir):
-            branch_path = os.path.join(heads_dir, branch_file)
-            try:
-                with open(branch_path, "r") as f:
-                    refs.append(f.read().strip())
-            except (IOError, OSError):
-                pass
+    With reachability bitmaps, only history newer than the bitmapped
+    commits is walked.
 
-    # Tags
-    tags_dir = os.path.join(repo.ugit_dir, "refs", "tags")
-    if os.path.exists(tags_dir):
-        for tag_file in os.listdir(tags_dir):
-            tag_path = os.path.join(tags_dir, tag_file)
-            try:
-                with open(tag_path, "r") as f:
-                    tag_ref = f.read().strip()
-                    refs.append(tag_ref)
-                    # If it's an annotated tag, also follow the tag object
-                    try:
-                        from ..core.objects import get_object
-
-                        obj_type, tag_data = get_object(tag_ref, repo=repo)
-                        if obj_type == "tag":
-                            import json
-
-                            tag_obj = json.loads(tag_data.decode())
-                            if "object" in tag_obj:
-                                refs.append(tag_obj["object"])
-                    except (ValueError, FileNotFoundError):
-                        pass
-            except (IOError, OSError):
-                pass
+    Returns:
+        Tuple of (reachable objects, blobs kept by the index and stash)
+    """
+    roots, blobs = find_roots(repo)
+
+    bitmap_reachable = find_reachable(repo, roots)
+    if bitmap_reachable is not None:
+        return bitmap_reachable, blobs
 
-    # Traverse from all refs
-    visited = set()
-    stack = list(refs)
+    # Traverse from all roots, stopping at the boundary of a shallow clone.
+    # Trees are flat, so their entries are blobs and need not be read,
+    # unless they may be chunked.
+    reachable: Set[str] = set()
+    tree_blobs: Set[str] = set()
+    follow_chunks = uses_chunking(repo)
+    stack = list(roots)
+    shallow = read_shallow(repo)
 
     while stack:
         sha = stack.pop()
-        if sha in visited or not sha or len(sha) != 40:
+        if sha in reachable or not validate_sha(sha):
             continue
-        visited.add(sha)
         reachable.add(sha)
+        if not object_exists(sha, repo=repo):
+            continue  # Promised to a partial clone, or never written
 
         try:
-            from ..core.objects import get_object
-            from ..utils.helpers import get_tree_entries
-
             obj_type, obj_data = get_object(sha, repo=repo)
-
             if obj_type == "commit":
-                commit_data = get_commit_data(sha, repo=repo)
+                commit_data = json.loads(obj_data.decode())
                 if "tree" in commit_data:
                     stack.append(commit_data["tree"])
-                if "parent" in commit_data and commit_data["parent"]:
-                    stack.append(commit_data["parent"])
-                if "parents" in commit_data:
-                    stack.extend(p for p in commit_data["parents"] if p)
+                if sha not in shallow:
+                    stack.extend(get_commit_parents(commit_data))
             elif obj_type == "tree":
-                entries = get_tree_entries(sha, repo=repo)
-                for _, _, entry_sha in entries:
-                    stack.append(entry_sha)
+                entries = get_tree_files(sha, repo=repo).values()
+                reachable.update(entries)
+                if follow_chunks:
+                    tree_blobs.update(entries)
             elif obj_type == "tag":
-                import json
-
                 tag_obj = json.loads(obj_data.decode())
                 if "object" in tag_obj:
                     stack.append(tag_obj["object"])
-        except (ValueError, FileNotFoundError):
+        except (ValueError, FileNotFoundError, UnicodeDecodeError):
             pass
 
-    return reachable
+    reachable.update(chunk_references(repo, tree_blobs))
+    return reachable, blobs
 
 
 def _find_all_objects(repo: Repository) -> Set[str]:
-    """Find all objects in the repository."""
+    """Find all loose objects in the repository."""
     objects: Set[str] = set()
     objects_dir = os.path.join(repo.ugit_dir, "objects")
 
@@ -149,19 +271,73 @@ def _find_all_objects(repo: Repository) -> Set[str]:
     return objects
 
 
-def _delete_object(repo: Repository, sha: str) -> bool:
-    """Delete an object from the repository."""
-    object_paths = [
-        os.path.join(repo.ugit_dir, "objects", sha),
-        os.path.join(repo.ugit_dir, "objects", sha[:2], sha[2:]),
-    ]
+def _prune_objects(
+    repo: Repository, shas: Iterable[str], cutoff: float
+) -> Tuple[int, int]:
+    """
+    Delete loose objects last modified at or before a cutoff.
 
-    for obj_path in object_paths:
-        if os.path.exists(obj_path):
+    Objects are grouped by fan-out directory, and the directories are
+    swept in parallel.
+
+    Returns:
+        Tuple of (objects deleted, objects kept for being too recent)
+    """
+    by_dir: Dict[str, List[str]] = {}
+    for sha in shas:
+        by_dir.setdefault(sha[:2], []).append(sha)
+    if not by_dir:
+        return 0, 0
+
+    workers = min(len(by_dir), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(
+            executor.map(
+                lambda batch: _prune_batch(repo, batch, cutoff), by_dir.values()
+            )
+        )
+    return sum(r[0] for r in results), sum(r[1] for r in results)
+
+
+def _prune_batch(repo: Repository, shas: List[str], cutoff: float) -> Tuple[int, int]:
+    """Delete one fan-out directory's share of unreachable objects."""
+    deleted = recent = 0
+    for sha in shas:
+        for obj_path in _object_paths(repo, sha):
             try:
+                if os.stat(obj_path).st_mtime > cutoff:
+                    recent += 1
+                    break
                 os.remove(obj_path)
-                return True
+                deleted += 1
+                break
+            except FileNotFoundError:
+                continue
+            except OSError:
+                break
+    return deleted, recent
+
+
+def _prune_temp_objects(repo: Repository, cutoff: float) -> int:
+    """Delete temporary object files older than the cutoff."""
+    removed = 0
+    objects_dir = os.path.join(repo.ugit_dir, "objects")
+    for root, _, files in os.walk(objects_dir):
+        for name in files:
+            if not name.startswith(TEMP_OBJECT_PREFIX):
+                continue
+            path = os.path.join(root, name)
+            try:
+                if os.stat(path).st_mtime <= cutoff:
+                    os.remove(path)
+                    removed += 1
             except OSError:
                 pass
+    return removed
+
 
-    return False
+def _object_paths(repo: Repository, sha: str) -> Tuple[str, str]:
+    return (
+        os.path.join(repo.ugit_dir, "objects", sha[:2], sha[2:]),
+        os.path.join(repo.ugit_dir, "objects", sha),
+    )
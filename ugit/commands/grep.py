@@ -8,8 +8,8 @@ import os
 import re
 from typing import List, Optional, Pattern
 
+from ..core.chunking import read_blob
 from ..core.exceptions import UgitError
-from ..core.objects import get_object
 from ..core.repository import Repository
 from ..utils.helpers import ensure_repository, get_commit_data, get_tree_entries
 from ..utils.validation import validate_sha
@@ -82,7 +82,7 @@ def _search_tree(
 
             if mode.startswith("10"):  # File
                 try:
-                    obj_type, content = get_object(sha, repo=repo)
+                    obj_type, content = read_blob(sha, repo=repo)
                     if obj_type == "blob":
                         # Search in file content
                         try:
@@ -1,161 +1,639 @@
 """
 HTTP/HTTPS remote support for ugit.
 
-Allows fetching and pushing to HTTP-based remote repositories.
+Allows fetching and pushing to HTTP-based remote repositories. Fetches use
+the smart protocol served by ``ugit serve`` (see core.protocol): one request
+for the ref advertisement, one for a pack of the missing objects. Pushes
+send their ref updates and a thin pack in a single request.
+
+All requests to a host share one pooled httpx.Client (keep-alive, optional
+HTTP/2, limits and timeouts from the [http] config section).
+
+Fetch and clone packs are downloaded resumably. The pack is written to
+objects/pack/tmp-<key>.pack, named after the request, and every few
+megabytes the data is synced and its length recorded in a checkpoint file
+next to it. A dropped connection, in this run or a later one, resumes with
+an HTTP Range request from the last checkpoint, and the finished pack's
+trailer checksum is verified before it is indexed.
 """
 
+import atexit
+import hashlib
+import importlib.util
 import json
 import os
+import threading
 import urllib.parse
-from typing import Dict, Optional, Set
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    IO,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
 
 try:
     import httpx
 except ImportError:
     httpx = None  # type: ignore[assignment]
 
-from ..core.exceptions import RemoteNotFoundError, UgitError
-from ..core.objects import hash_object
+from .. import __version__
+from ..core.exceptions import UgitError
+from ..core.pack import get_pack_dir, index_pack, new_temp_pack_path
+from ..core.protocol import (
+    PUSH_MEDIA_TYPE,
+    RefUpdate,
+    check_remote_refs,
+    encode_push_commands,
+)
+from ..core.refs import is_valid_ref_name, read_ref
 from ..core.repository import Repository
-from ..utils.helpers import ensure_repository, get_commit_data
+from ..utils.atomic import atomic_write_text
+from ..utils.config import Config
+from ..utils.helpers import ensure_repository
+
+# Defaults for the [http] settings
+HTTP_TIMEOUT = 30.0
+HTTP_CONNECT_TIMEOUT = 10.0
+HTTP_MAX_CONNECTIONS = 8
+HTTP_MAX_KEEPALIVE = 4
+HTTP_MAX_REQUESTS = 4
+
+# Objects requested per batch by fetch_objects_http
+OBJECT_BATCH_SIZE = 256
+
+# Bytes of a resumable download written between checkpoints
+CHECKPOINT_INTERVAL = 8 * 1024 * 1024
+
+# Times a dropped download is resumed before giving up
+DOWNLOAD_RETRIES = 3
+
+# Suffix of the checkpoint file kept next to a resumable download
+CHECKPOINT_SUFFIX = ".checkpoint"
+
+
+class HttpSettings(NamedTuple):
+    """Connection settings for HTTP remotes."""
+
+    timeout: float
+    connect_timeout: float
+    max_connections: int
+    max_keepalive: int
+    max_requests: int
+    http2: bool
+
+
+def get_http_settings(repo: Optional[Repository] = None) -> HttpSettings:
+    """
+    Read the [http] settings of a repository.
+
+    Settings: http.timeout and http.connectTimeout (seconds),
+    http.maxConnections and http.maxKeepalive (pool limits),
+    http.maxRequests (batches in flight at once) and http.version
+    ("HTTP/2" to negotiate HTTP/2 when the h2 package is installed).
+
+    Args:
+        repo: Repository whose config to read; defaults are used without one
+
+    Returns:
+        The settings, with defaults for anything unset or invalid
+    """
+    config = Config(repo.path) if repo is not None else None
+
+    def number(key: str, default: float) -> float:
+        value = config.get("http", key) if config is not None else None
+        try:
+            parsed = float(value) if value else default
+        except ValueError:
+            return default
+        return parsed if parsed > 0 else default
+
+    version = config.get("http", "version", "") if config is not None else ""
+    return HttpSettings(
+        timeout=number("timeout", HTTP_TIMEOUT),
+        connect_timeout=number("connectTimeout", HTTP_CONNECT_TIMEOUT),
+        max_connections=int(number("maxConnections", HTTP_MAX_CONNECTIONS)),
+        max_keepalive=int(number("maxKeepalive", HTTP_MAX_KEEPALIVE)),
+        max_requests=int(number("maxRequests", HTTP_MAX_REQUESTS)),
+        http2=(version or "").upper() == "HTTP/2",
+    )
+
+
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
 
 
-def fetch_http(remote_url: str, branch: Optional[str] = None) -> int:
+def get_http_client(remote_url: str, repo: Optional[Repository] = None) -> Any:
+    """
+    Get the shared client for a remote's host.
+
+    Clients are kept for the life of the process, so every request to the
+    same scheme, host and port reuses pooled keep-alive connections instead
+    of a new TCP and TLS handshake.
+
+    Args:
+        remote_url: HTTP URL of remote repository
+        repo: Repository whose [http] settings configure a new client
+
+    Returns:
+        An httpx.Client
+    """
+    _require_httpx()
+    parsed = urllib.parse.urlparse(_base_url(remote_url))
+    key = f"{parsed.scheme}://{parsed.netloc}"
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None or client.is_closed:
+            settings = get_http_settings(repo)
+            client = httpx.Client(
+                http2=settings.http2 and importlib.util.find_spec("h2") is not None,
+                timeout=httpx.Timeout(
+                    settings.timeout, connect=settings.connect_timeout
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.max_connections,
+                    max_keepalive_connections=settings.max_keepalive,
+                ),
+                headers={"User-Agent": f"ugit/{__version__}"},
+            )
+            _clients[key] = client
+    return client
+
+
+def close_http_clients() -> None:
+    """Close every shared client and its pooled connections."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+atexit.register(close_http_clients)
+
+
+def fetch_http(
+    remote_url: str, branch: Optional[str] = None, remote_name: str = "origin"
+) -> int:
     """
     Fetch from HTTP/HTTPS remote.
 
     Args:
         remote_url: HTTP URL of remote repository
         branch: Branch to fetch (default: all branches)
+        remote_name: Remote whose tracking refs are updated
 
     Returns:
         0 on success, 1 on error
     """
-    if httpx is None:
+    _require_httpx()
+    repo = ensure_repository()
+
+    from .fetch import _fetch_http
+
+    try:
+        _fetch_http(repo, remote_name, remote_url, branch)
+        return 0
+    except Exception as e:
+        print(f"Error fetching from HTTP remote: {e}")
+        return 1
+
+
+def get_http_refs(remote_url: str, repo: Optional[Repository] = None) -> Dict[str, Any]:
+    """
+    Get the ref advertisement of an HTTP remote.
+
+    Args:
+        remote_url: HTTP URL of remote repository
+        repo: Repository whose [http] settings apply
+
+    Returns:
+        Advertisement with "refs" (full ref name to SHA) and "head" (the
+        branch the remote HEAD points at, or None)
+
+    Raises:
+        UgitError: If the server cannot be reached or is not a ugit server
+    """
+    client = get_http_client(remote_url, repo)
+    url = f"{_base_url(remote_url)}/ugit/info/refs"
+    try:
+        response = client.get(url)
+    except httpx.HTTPError as e:
+        raise UgitError(f"Cannot reach {remote_url}: {e}") from e
+    if response.status_code != 200:
         raise UgitError(
-            "HTTP support requires 'httpx' package. Install with: pip install httpx"
+            f"Cannot read refs from {remote_url}: HTTP {response.status_code}"
         )
 
-    repo = ensure_repository()
-
     try:
-        # Parse URL
-        parsed = urllib.parse.urlparse(remote_url)
-        if parsed.scheme not in ("http", "https"):
-            raise UgitError(f"Invalid HTTP URL: {remote_url}")
+        advertisement = response.json()
+    except ValueError as e:
+        raise UgitError(f"Invalid ref advertisement from {remote_url}") from e
+    if not isinstance(advertisement, dict) or not isinstance(
+        advertisement.get("refs"), dict
+    ):
+        raise UgitError(f"Invalid ref advertisement from {remote_url}")
+    advertisement["refs"] = check_remote_refs(advertisement["refs"])
+    head = advertisement.get("head")
+    if head is not None and (
+        not isinstance(head, str) or not is_valid_ref_name(f"refs/heads/{head}")
+    ):
+        raise UgitError(f"Invalid HEAD branch from {remote_url}: {head}")
+    return advertisement
 
-        # Normalize URL (remove trailing slash)
-        base_url = remote_url.rstrip("/")
 
-        print(f"Fetching from {remote_url}...")
+def fetch_pack_http(
+    repo: Repository,
+    remote_url: str,
+    wants: List[str],
+    haves: List[str],
+    filter_spec: Optional[str] = None,
+    depth: Optional[int] = None,
+    since: Optional[float] = None,
+    shallow: Iterable[str] = (),
+) -> Optional[str]:
+    """
+    Download the objects needed for the wanted tips as one pack.
 
-        # Try to fetch refs via HTTP API
-        # This assumes a ugit-compatible HTTP server
-        refs_url = f"{base_url}/.ugit/refs/heads"
-        if branch:
-            refs_url = f"{refs_url}/{branch}"
+    The pack is streamed to objects/pack/tmp-*, then verified and indexed.
+    An interrupted download is resumed from its last checkpoint, both
+    within this call and by a later fetch of the same wants and haves.
 
-        try:
-            response = httpx.get(refs_url, timeout=30)
-            if response.status_code == 200:
-                # Parse refs
-                refs_data = response.text.strip()
-                if refs_data:
-                    # Store remote refs
-                    remote_refs_dir = os.path.join(
-                        repo.ugit_dir, "refs", "remotes", "origin"
-                    )
-                    os.makedirs(remote_refs_dir, exist_ok=True)
-
-                    if branch:
-                        ref_file = os.path.join(remote_refs_dir, branch)
-                        with open(ref_file, "w") as f:
-                            f.write(refs_data)
-                    else:
-                        # Parse multiple refs
-                        for line in refs_data.splitlines():
-                            if ":" in line:
-                                ref_name, ref_sha = line.split(":", 1)
-                                ref_file = os.path.join(
-                                    remote_refs_dir, ref_name.strip()
-                                )
-                                with open(ref_file, "w") as f:
-                                    f.write(ref_sha.strip())
-
-                    print(f"Fetched refs from {remote_url}")
-                    return 0
-        except httpx.RequestError:
-            pass
-
-        # Fallback: try to fetch objects if server supports it
-        print("HTTP remote support is experimental - using basic fetch")
+    Args:
+        repo: Repository receiving the objects
+        remote_url: HTTP URL of remote repository
+        wants: Tips to fetch
+        haves: Tips the repository already has, so the server can leave
+            their history out of the pack
+        filter_spec: Object filter of a partial clone, such as blob:none
+        depth: Commits of history to fetch below each want
+        since: Leave out commits older than this timestamp
+        shallow: The repository's shallow boundary commits
+
+    Returns:
+        Path of the installed pack, or None if nothing was wanted
+
+    Raises:
+        UgitError: If the transfer fails
+        CorruptPackError: If the received pack fails verification
+    """
+    if not wants:
+        return None
+    payload: Dict[str, Any] = {"wants": wants, "haves": haves}
+    if filter_spec:
+        payload["filter"] = filter_spec
+    if depth is not None:
+        payload["depth"] = depth
+    if since is not None:
+        payload["since"] = since
+    if shallow:
+        payload["shallow"] = sorted(shallow)
+    return _download_pack(repo, remote_url, "upload-pack", payload, resumable=True)
+
+
+def fetch_objects_http(repo: Repository, remote_url: str, shas: List[str]) -> int:
+    """
+    Download specific objects, in batches kept in flight together.
+
+    Batches go out over the shared client, up to http.maxRequests at a
+    time, so their round trips overlap on the pooled connections (or
+    multiplex over one HTTP/2 connection). Each batch arrives as a pack.
+
+    Args:
+        repo: Repository receiving the objects
+        remote_url: HTTP URL of remote repository
+        shas: Objects to download
+
+    Returns:
+        Number of batches downloaded
+
+    Raises:
+        UgitError: If a transfer fails
+        CorruptPackError: If a received pack fails verification
+    """
+    batches = [
+        shas[i : i + OBJECT_BATCH_SIZE] for i in range(0, len(shas), OBJECT_BATCH_SIZE)
+    ]
+    if not batches:
         return 0
 
-    except Exception as e:
-        print(f"Error fetching from HTTP remote: {e}")
-        return 1
+    workers = min(len(batches), get_http_settings(repo).max_requests)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                _download_pack, repo, remote_url, "objects", {"shas": batch}
+            )
+            for batch in batches
+        ]
+        for future in futures:
+            future.result()
+    return len(batches)
 
 
-def push_http(remote_url: str, branch: str, force: bool = False) -> int:
+def download_lfs_object_http(repo: Repository, remote_url: str, oid: str) -> None:
     """
-    Push to HTTP/HTTPS remote.
+    Download an LFS object into the content store.
+
+    The content is streamed to disk and checked against its SHA-256.
 
     Args:
+        repo: Repository receiving the object
         remote_url: HTTP URL of remote repository
-        branch: Branch to push
-        force: Force push
+        oid: SHA-256 of the content
+
+    Raises:
+        UgitError: If the download fails or the content does not match
+    """
+    from ..core.lfs import store_lfs_object
+
+    client = get_http_client(remote_url, repo)
+    url = f"{_base_url(remote_url)}/ugit/lfs/objects/{oid}"
+    try:
+        with client.stream("GET", url) as response:
+            if response.status_code != 200:
+                response.read()
+                raise UgitError(
+                    f"Server refused LFS download: HTTP {response.status_code}"
+                )
+            store_lfs_object(repo, response.iter_bytes(), oid)
+    except httpx.HTTPError as e:
+        raise UgitError(f"LFS download failed: {e}") from e
+
+
+def upload_lfs_object_http(
+    repo: Repository, remote_url: str, oid: str, path: str
+) -> bool:
+    """
+    Upload an LFS object, unless the remote already has it.
+
+    Args:
+        repo: Repository whose [http] settings apply
+        remote_url: HTTP URL of remote repository
+        oid: SHA-256 of the content
+        path: Content store file to upload
 
     Returns:
-        0 on success, 1 on error
+        True if the object was uploaded, False if the remote had it
+
+    Raises:
+        UgitError: If the upload fails
     """
-    if httpx is None:
+    from ..core.lfs import read_blocks
+
+    client = get_http_client(remote_url, repo)
+    url = f"{_base_url(remote_url)}/ugit/lfs/objects/{oid}"
+    try:
+        if client.head(url).status_code == 200:
+            return False
+        response = client.put(
+            url,
+            content=read_blocks(path),
+            headers={"Content-Type": "application/octet-stream"},
+        )
+    except httpx.HTTPError as e:
+        raise UgitError(f"LFS upload failed: {e}") from e
+    if response.status_code not in (200, 201):
         raise UgitError(
-            "HTTP support requires 'httpx' package. Install with: pip install httpx"
+            f"Server refused LFS upload: HTTP {response.status_code} {response.text}"
         )
+    return True
 
-    repo = ensure_repository()
 
-    try:
-        # Parse URL
-        parsed = urllib.parse.urlparse(remote_url)
-        if parsed.scheme not in ("http", "https"):
-            raise UgitError(f"Invalid HTTP URL: {remote_url}")
+def has_partial_download(repo: Repository) -> bool:
+    """
+    Check whether a repository holds an interrupted, resumable download.
 
-        base_url = remote_url.rstrip("/")
+    Args:
+        repo: Repository to check
 
-        # Get current branch commit
-        branch_path = os.path.join(repo.ugit_dir, "refs", "heads", branch)
-        if not os.path.exists(branch_path):
-            raise UgitError(f"Branch '{branch}' does not exist")
+    Returns:
+        True if a download checkpoint exists in objects/pack
+    """
+    pack_dir = get_pack_dir(os.path.join(repo.ugit_dir, "objects"))
+    try:
+        names = os.listdir(pack_dir)
+    except OSError:
+        return False
+    return any(
+        name.startswith("tmp-") and name.endswith(CHECKPOINT_SUFFIX) for name in names
+    )
 
-        with open(branch_path, "r") as f:
-            commit_sha = f.read().strip()
 
-        print(f"Pushing {branch} to {remote_url}...")
+def _download_pack(
+    repo: Repository,
+    remote_url: str,
+    endpoint: str,
+    payload: Dict[str, Any],
+    resumable: bool = False,
+) -> str:
+    """Stream a pack response into objects/pack/tmp-*, then index it."""
+    client = get_http_client(remote_url, repo)
+    url = f"{_base_url(remote_url)}/ugit/{endpoint}"
+    if not resumable:
+        tmp_path = new_temp_pack_path(repo)
+        try:
+            _stream_pack(client, url, payload, tmp_path)
+            return index_pack(repo, tmp_path)
+        except httpx.HTTPError as e:
+            raise UgitError(f"HTTP fetch failed: {e}") from e
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
-        # Try to push via HTTP API
-        push_url = f"{base_url}/.ugit/refs/heads/{branch}"
+    # The same request always yields the same pack, so name it after that
+    request_key = json.dumps([url, payload], sort_keys=True).encode()
+    tmp_path = new_temp_pack_path(
+        repo, hashlib.sha1(request_key, usedforsecurity=False).hexdigest()
+    )
+    checkpoint_path = tmp_path[: -len(".pack")] + CHECKPOINT_SUFFIX
+    retries = 0
+    while True:
         try:
-            response = httpx.put(
-                push_url,
-                content=commit_sha.encode(),
-                headers={"Content-Type": "text/plain"},
-                timeout=30,
-            )
-            if response.status_code in (200, 201):
-                print(f"Pushed {branch} to {remote_url}")
-                return 0
-            elif response.status_code == 409 and not force:
+            _stream_pack(client, url, payload, tmp_path, checkpoint_path)
+            break
+        except httpx.HTTPError as e:
+            retries += 1
+            if retries > DOWNLOAD_RETRIES:
                 raise UgitError(
-                    f"Push rejected - remote has changes. Use --force to override."
-                )
-        except httpx.RequestError as e:
-            print(f"HTTP push failed: {e}")
-            print("HTTP remote support is experimental")
-            return 1
+                    f"HTTP fetch failed: {e} (run the command again to resume)"
+                ) from e
 
-        return 0
+    try:
+        return index_pack(repo, tmp_path)
+    finally:
+        for path in (tmp_path, checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _stream_pack(
+    client: Any,
+    url: str,
+    payload: Dict[str, Any],
+    tmp_path: str,
+    checkpoint_path: Optional[str] = None,
+) -> None:
+    """
+    Download a pack into tmp_path, resuming from a checkpoint if possible.
+
+    With a checkpoint path, the data is synced to disk and its length saved
+    every CHECKPOINT_INTERVAL bytes, along with the pack's ETag. A later
+    call asks for the rest with "Range: bytes=<length>-" and If-Range; a
+    server that cannot resume sends the whole pack again.
+    """
+    etag, offset = _read_checkpoint(checkpoint_path, tmp_path)
+    headers = {"Range": f"bytes={offset}-", "If-Range": etag} if offset else {}
 
+    with client.stream("POST", url, json=payload, headers=headers) as response:
+        if response.status_code == 206:
+            content_range = response.headers.get("Content-Range", "")
+            if not content_range.startswith(f"bytes {offset}-"):
+                raise UgitError(f"Server resumed at the wrong offset: {content_range}")
+        elif response.status_code == 200:
+            offset = 0
+        else:
+            response.read()
+            raise UgitError(
+                f"Server refused fetch: HTTP {response.status_code} {response.text}"
+            )
+
+        etag = response.headers.get("ETag", "")
+        with open(tmp_path, "r+b" if offset else "wb") as f:
+            f.seek(offset)
+            f.truncate()
+            checkpoint = offset
+            for chunk in response.iter_bytes():
+                f.write(chunk)
+                offset += len(chunk)
+                due = offset - checkpoint >= CHECKPOINT_INTERVAL
+                if checkpoint_path and etag and due:
+                    f.flush()
+                    os.fsync(f.fileno())
+                    _write_checkpoint(checkpoint_path, etag, offset)
+                    checkpoint = offset
+
+
+def _read_checkpoint(checkpoint_path: Optional[str], tmp_path: str) -> Tuple[str, int]:
+    """Get the (ETag, offset) a download can resume from, ("", 0) if none."""
+    if not checkpoint_path:
+        return "", 0
+    try:
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        etag, offset = str(state["etag"]), int(state["offset"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return "", 0
+    # Only trust data that is still on disk
+    try:
+        if not etag or offset <= 0 or os.path.getsize(tmp_path) < offset:
+            return "", 0
+    except OSError:
+        return "", 0
+    return etag, offset
+
+
+def _write_checkpoint(checkpoint_path: str, etag: str, offset: int) -> None:
+    """Record how much of a download is safely on disk."""
+    atomic_write_text(checkpoint_path, json.dumps({"etag": etag, "offset": offset}))
+
+
+def push_http(remote_url: str, branch: str, force: bool = False) -> int:
+    """
+    Push to HTTP/HTTPS remote.
+
+    Args:
+        remote_url: HTTP URL of remote repository
+        branch: Branch to push
+        force: Force push
+
+    Returns:
+        0 on success, 1 on error
+    """
+    _require_httpx()
+    repo = ensure_repository()
+
+    from .push import _push_http
+
+    try:
+        commit_sha = read_ref(repo, f"refs/heads/{branch}")
+        if not commit_sha:
+            raise UgitError(f"Branch '{branch}' does not exist")
+
+        print(f"Pushing {branch} to {remote_url}...")
+        _push_http(repo, remote_url, branch, commit_sha, force)
+        return 0
     except Exception as e:
         print(f"Error pushing to HTTP remote: {e}")
         return 1
+
+
+def send_pack_http(
+    remote_url: str,
+    updates: List[RefUpdate],
+    pack_file: Optional[IO[bytes]],
+    repo: Optional[Repository] = None,
+) -> Dict[str, str]:
+    """
+    Send ref updates and their pack to an HTTP remote in one request.
+
+    The body is the ref update line followed by the pack, streamed from
+    pack_file so large pushes are never held in memory.
+
+    Args:
+        remote_url: HTTP URL of remote repository
+        updates: Ref updates (ref, expected old SHA, new SHA)
+        pack_file: Pack to send, or None if the remote has every object
+        repo: Repository whose [http] settings apply
+
+    Returns:
+        Each ref mapped to "ok" or the reason the remote rejected it
+
+    Raises:
+        UgitError: If the transfer fails
+    """
+    client = get_http_client(remote_url, repo)
+    url = f"{_base_url(remote_url)}/ugit/receive-pack"
+
+    def body() -> Iterator[bytes]:
+        yield encode_push_commands(updates)
+        if pack_file is not None:
+            pack_file.seek(0)
+            for chunk in iter(lambda: pack_file.read(64 * 1024), b""):
+                yield chunk
+
+    try:
+        response = client.post(
+            url, content=body(), headers={"Content-Type": PUSH_MEDIA_TYPE}
+        )
+    except httpx.HTTPError as e:
+        raise UgitError(f"HTTP push failed: {e}") from e
+    if response.status_code != 200:
+        raise UgitError(
+            f"Server refused push: HTTP {response.status_code} {response.text}"
+        )
+
+    try:
+        return dict(response.json()["results"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise UgitError(f"Invalid push response from {remote_url}") from e
+
+
+def _require_httpx() -> None:
+    """Raise a helpful error when httpx is not installed."""
+    if httpx is None:
+        raise UgitError(
+            "HTTP support requires 'httpx' package. Install with: pip install httpx"
+        )
+
+
+def _base_url(remote_url: str) -> str:
+    """Validate an HTTP remote URL and strip any trailing slash."""
+    parsed = urllib.parse.urlparse(remote_url)
+    if parsed.scheme not in ("http", "https"):
+        raise UgitError(f"Invalid HTTP URL: {remote_url}")
+    return remote_url.rstrip("/")
@@ -0,0 +1,149 @@
+"""
+LFS command implementation for ugit.
+
+Track large files as pointers to a separate content store (see core.lfs).
+"""
+
+import os
+from typing import Dict, List, Optional
+
+from ..core.exceptions import UgitError
+from ..core.lfs import (
+    ATTRIBUTES_FILE,
+    LFS_ATTRIBUTES,
+    MAX_POINTER_SIZE,
+    LfsAttributes,
+    fetch_lfs_objects,
+    find_pointers,
+    lfs_object_exists,
+    parse_pointer,
+    read_attributes,
+    smudge_to_file,
+)
+from ..core.repository import Index, Repository
+from ..utils.atomic import atomic_write_text
+from ..utils.helpers import ensure_repository, get_commit_data, get_tree_files
+
+
+def lfs(command: Optional[str] = None, patterns: Optional[List[str]] = None) -> None:
+    """
+    Manage large files stored as LFS pointers.
+
+    Args:
+        command: Command (track, untrack, ls-files, pull)
+        patterns: File patterns for track and untrack
+
+    Raises:
+        UgitError: If the command is unknown or a download fails
+    """
+    repo = ensure_repository()
+
+    if command == "track":
+        if patterns:
+            _track(repo, patterns)
+        else:
+            _list_patterns(repo)
+    elif command == "untrack":
+        _untrack(repo, patterns or [])
+    elif command is None or command == "ls-files":
+        _ls_files(repo)
+    elif command == "pull":
+        _pull(repo)
+    else:
+        raise UgitError(f"Unknown lfs command: {command}")
+
+
+def _list_patterns(repo: Repository) -> None:
+    """Print the patterns tracked by LFS."""
+    patterns = read_attributes(repo).patterns
+    if not patterns:
+        print("No patterns tracked by LFS")
+        return
+    print("Listing tracked patterns")
+    for pattern in patterns:
+        print(f"    {pattern} ({ATTRIBUTES_FILE})")
+
+
+def _track(repo: Repository, patterns: List[str]) -> None:
+    """Add filter=lfs lines for patterns to .ugitattributes."""
+    lines = _read_lines(repo)
+    for pattern in patterns:
+        rules = LfsAttributes("\n".join(lines)).rules
+        same = [tracked for p, tracked in rules if p == pattern]
+        if same and same[-1]:
+            print(f'"{pattern}" already supported')
+            continue
+        lines.append(f"{pattern} {LFS_ATTRIBUTES}")
+        print(f'Tracking "{pattern}"')
+    _write_lines(repo, lines)
+
+
+def _untrack(repo: Repository, patterns: List[str]) -> None:
+    """Remove the lines for patterns from .ugitattributes."""
+    lines = _read_lines(repo)
+    kept = [
+        line
+        for line in lines
+        if not (line.split() and line.split()[0] in patterns and "filter=lfs" in line)
+    ]
+    for pattern in patterns:
+        print(f'Untracking "{pattern}"')
+    _write_lines(repo, kept)
+
+
+def _ls_files(repo: Repository) -> None:
+    """List the LFS files at HEAD: '*' when the content is present."""
+    for path, pointer in sorted(find_pointers(repo, _head_files(repo)).items()):
+        marker = "*" if lfs_object_exists(repo, pointer.oid) else "-"
+        print(f"{pointer.oid[:10]} {marker} {path}")
+
+
+def _pull(repo: Repository) -> None:
+    """Download the LFS content of HEAD and put it in the working tree."""
+    pointers = find_pointers(repo, _head_files(repo))
+    downloaded = fetch_lfs_objects(repo, pointers.values())
+
+    # Replace pointers left in the working tree by an earlier checkout
+    index = Index(repo)
+    index_data = index.read()
+    replaced = 0
+    for path, pointer in sorted(pointers.items()):
+        entry = index_data.get(path)
+        file_path = os.path.join(repo.path, path)
+        try:
+            with open(file_path, "rb") as f:
+                data = f.read(MAX_POINTER_SIZE + 1)
+        except OSError:
+            continue
+        if entry is None or parse_pointer(data) != pointer:
+            continue
+        smudge_to_file(repo, pointer, data, file_path)
+        stat = os.stat(file_path)
+        index_data[path] = (entry[0], stat.st_mtime, stat.st_size)
+        replaced += 1
+    if replaced:
+        index.write(index_data)
+    print(f"Downloaded {downloaded} LFS object(s), checked out {replaced} file(s)")
+
+
+def _head_files(repo: Repository) -> Dict[str, str]:
+    """Get the path -> blob SHA listing of the tree at HEAD."""
+    head_sha = repo.get_head_ref()
+    if not head_sha:
+        return {}
+    tree_sha = get_commit_data(head_sha, repo=repo).get("tree")
+    return get_tree_files(tree_sha, repo=repo) if tree_sha else {}
+
+
+def _read_lines(repo: Repository) -> List[str]:
+    path = os.path.join(repo.path, ATTRIBUTES_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().splitlines()
+    except OSError:
+        return []
+
+
+def _write_lines(repo: Repository, lines: List[str]) -> None:
+    path = os.path.join(repo.path, ATTRIBUTES_FILE)
+    atomic_write_text(path, "".join(line + "\n" for line in lines))
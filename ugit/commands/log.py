@@ -8,6 +8,7 @@ from datetime import datetime
 from typing import Optional
 
 from ..core.objects import get_object
+from ..core.shallow import read_shallow
 from ..utils.helpers import ensure_repository, format_timestamp
 
 
@@ -35,6 +36,9 @@ def log(
         print("No commits yet")
         return
 
+    # History stops at the boundary of a shallow repository
+    shallow = read_shallow(repo)
+
     count = 0
     while current and (max_commits is None or count < max_commits):
         try:
@@ -49,7 +53,7 @@ def log(
             if since or until:
                 commit_time = commit.get("timestamp", "")
                 if not _is_commit_in_date_range(commit_time, since, until):
-                    parent = commit.get("parent")
+                    parent = None if current in shallow else commit.get("parent")
                     if parent and not parent.startswith("ref: refs/heads/"):
                         current = parent
                     else:
@@ -63,7 +67,7 @@ def log(
             else:
                 _print_full_commit(current, commit)
 
-            parent = commit.get("parent")
+            parent = None if current in shallow else commit.get("parent")
             if parent and not parent.startswith("ref: refs/heads/"):
                 current = parent
             else:
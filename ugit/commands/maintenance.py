@@ -0,0 +1,378 @@
+"""
+Maintenance command implementation for ugit.
+
+Keep a repository fast without manual gc or repack runs. The tasks are:
+
+    reflog-expire       drop reflog entries beyond gc.reflogLimit
+    prune               remove unreachable loose objects past the grace
+                        period (see gc)
+    loose-objects       pack loose objects and delete the packed copies
+    incremental-repack  geometric repack and multi-pack-index refresh
+    bitmaps             write reachability bitmaps for the largest pack
+    pack-refs           move tags and already packed refs into packed-refs
+
+Any task can be turned off with maintenance.<task>.enabled = false. With
+a core.objectStorage other than files, prune, loose-objects and
+incremental-repack are skipped, and auto maintenance never starts.
+
+After commit, fetch and merge, auto_maintenance() checks two cheap
+thresholds: the loose object count, estimated from the objects/17
+directory alone, against gc.auto (default 6700), and the number of packs
+against gc.autoPackLimit (default 50); 0 turns either check off. When one
+is crossed, the tasks run in a detached process (unless gc.autoDetach is
+false) with output in .ugit/maintenance.log.
+
+Runs hold .ugit/maintenance.lock, so at most one runs at a time. ``ugit
+maintenance start`` launches a background scheduler that runs the tasks
+every maintenance.interval seconds (default 3600) until ``stop``.
+"""
+
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+from ..core.bitmap import bitmap_path, write_bitmap
+from ..core.exceptions import UgitError
+from ..core.midx import find_packed_object
+from ..core.odb import loose_object_database, require_file_storage
+from ..core.pack import create_pack, get_packs
+from ..core.protocol import local_ref_tips
+from ..core.refs import pack_refs
+from ..core.repository import Repository
+from ..utils.atomic import atomic_write_text
+from ..utils.config import Config
+from ..utils.helpers import ensure_repository
+from .gc import gc
+from .pack import _get_all_objects
+from .repack import prune_packed, repack
+
+LOCK_FILE = "maintenance.lock"
+PID_FILE = "maintenance.pid"
+LOG_FILE = "maintenance.log"
+
+DEFAULT_AUTO_THRESHOLD = 6700
+DEFAULT_AUTO_PACK_LIMIT = 50
+DEFAULT_REFLOG_LIMIT = 1000
+DEFAULT_LOOSE_BATCH_SIZE = 50000
+DEFAULT_INTERVAL = 3600
+
+# A lock older than this is left over from a crashed run
+LOCK_TIMEOUT = 12 * 3600
+
+# Seconds between checks of the scheduler's pid file
+_SCHEDULER_POLL = 5
+
+
+def maintenance(
+    command: Optional[str],
+    tasks: Optional[List[str]] = None,
+    auto: bool = False,
+    schedule: bool = False,
+) -> None:
+    """
+    Run or schedule repository maintenance.
+
+    Args:
+        command: Command (run, start, stop)
+        tasks: Tasks to run for run; None runs every enabled task
+        auto: For run, only run if an auto maintenance threshold is crossed
+        schedule: For run, keep running the tasks until stopped (this is
+            what start launches)
+
+    Raises:
+        UgitError: If a task is unknown, maintenance is already running,
+            or the command is unknown
+    """
+    repo = ensure_repository()
+    if command == "run":
+        if schedule:
+            run_schedule(repo)
+        elif not auto or needs_maintenance(repo):
+            run_maintenance(repo, tasks)
+    elif command == "start":
+        pid = _scheduler_pid(repo)
+        if pid is not None:
+            print(f"Maintenance scheduler already running (pid {pid})")
+            return
+        process = _spawn(repo, ["run", "--schedule"])
+        print(f"Started maintenance scheduler (pid {process.pid})")
+    elif command == "stop":
+        pid = _scheduler_pid(repo)
+        if pid is None:
+            print("Maintenance scheduler is not running")
+            return
+        # The scheduler exits once it sees its pid file is gone
+        os.remove(os.path.join(repo.ugit_dir, PID_FILE))
+        print(f"Stopped maintenance scheduler (pid {pid})")
+    else:
+        raise UgitError("Usage: ugit maintenance {run|start|stop}")
+
+
+def run_maintenance(repo: Repository, tasks: Optional[List[str]] = None) -> None:
+    """
+    Run maintenance tasks while holding the maintenance lock.
+
+    Args:
+        repo: Repository instance
+        tasks: Tasks to run, in any order; None runs every enabled task
+
+    Raises:
+        UgitError: If a task is unknown, maintenance is already running, or
+            an object task is asked for while objects are not loose files
+    """
+    unknown = [task for task in tasks or [] if task not in TASKS]
+    if unknown:
+        raise UgitError(
+            f"Unknown maintenance task: {unknown[0]} "
+            f"(choose from {', '.join(TASKS)})"
+        )
+
+    config = Config(repo.path)
+    if tasks is None:
+        selected = [task for task in TASKS if _task_enabled(config, task)]
+        if loose_object_database(repo) is not None:
+            selected = [task for task in selected if task not in OBJECT_TASKS]
+    else:
+        selected = [task for task in TASKS if task in tasks]
+        if any(task in OBJECT_TASKS for task in selected):
+            require_file_storage(repo, "maintenance")
+
+    with _maintenance_lock(repo):
+        for task in selected:
+            print(f"Running {task}")
+            TASKS[task](repo, config)
+
+
+def needs_maintenance(repo: Repository) -> bool:
+    """
+    Check the auto maintenance thresholds.
+
+    Only objects/17 is listed to estimate the loose object count, so the
+    check stays cheap however many objects there are.
+
+    Args:
+        repo: Repository instance
+
+    Returns:
+        True if there are too many loose objects or packs
+    """
+    if loose_object_database(repo) is not None:
+        return False  # The object tasks cannot run
+    config = Config(repo.path)
+    objects_dir = os.path.join(repo.ugit_dir, "objects")
+
+    threshold = _config_int(config, "gc", "auto", DEFAULT_AUTO_THRESHOLD)
+    if threshold > 0:
+        try:
+            sample = len(os.listdir(os.path.join(objects_dir, "17")))
+        except OSError:
+            sample = 0
+        if sample * 256 > threshold:
+            return True
+
+    pack_limit = _config_int(config, "gc", "autoPackLimit", DEFAULT_AUTO_PACK_LIMIT)
+    return pack_limit > 0 and len(get_packs(objects_dir)) > pack_limit
+
+
+def auto_maintenance(repo: Repository) -> None:
+    """
+    Start maintenance if a threshold is crossed.
+
+    Called after commands that add objects. Failures are reported but
+    never fail the calling command.
+
+    Args:
+        repo: Repository instance
+    """
+    try:
+        if not needs_maintenance(repo):
+            return
+        config = Config(repo.path)
+        if (config.get("gc", "autoDetach", "true") or "").lower() == "false":
+            print("Auto packing the repository for optimum performance")
+            run_maintenance(repo)
+        else:
+            print("Auto packing the repository in the background")
+            _spawn(repo, ["run", "--auto"])
+    except (UgitError, OSError) as e:
+        print(f"warning: auto maintenance failed: {e}", file=sys.stderr)
+
+
+def run_schedule(repo: Repository) -> None:
+    """
+    Run maintenance every maintenance.interval seconds until stopped.
+
+    The scheduler records its pid in PID_FILE and checks it every few
+    seconds, so removing the file stops it without signalling it.
+
+    Args:
+        repo: Repository instance
+    """
+    interval = _config_int(
+        Config(repo.path), "maintenance", "interval", DEFAULT_INTERVAL
+    )
+    atomic_write_text(os.path.join(repo.ugit_dir, PID_FILE), f"{os.getpid()}\n")
+    next_run = time.monotonic()
+    while _scheduler_pid(repo) == os.getpid():
+        if time.monotonic() >= next_run:
+            try:
+                run_maintenance(repo)
+            except UgitError as e:
+                print(f"warning: {e}", file=sys.stderr)
+            sys.stdout.flush()
+            next_run = time.monotonic() + max(interval, 1)
+        time.sleep(_SCHEDULER_POLL)
+
+
+def _expire_reflogs(repo: Repository, config: Config) -> None:
+    """Keep only the newest gc.reflogLimit entries of every reflog."""
+    limit = _config_int(config, "gc", "reflogLimit", DEFAULT_REFLOG_LIMIT)
+    logs_dir = os.path.join(repo.ugit_dir, "logs")
+    if limit < 1 or not os.path.isdir(logs_dir):
+        return
+    for root, _, files in os.walk(logs_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            with open(path, "r", encoding="utf-8") as f:
+                lines = [line for line in f if line.strip()]
+            if len(lines) > limit:
+                atomic_write_text(path, "".join(lines[-limit:]))
+                print(f"Expired {len(lines) - limit} entries of {name}")
+
+
+def _prune(repo: Repository, config: Config) -> None:
+    gc(repo=repo)
+
+
+def _pack_loose_objects(repo: Repository, config: Config) -> None:
+    """Pack loose objects in batches and delete the loose copies."""
+    objects_dir = os.path.join(repo.ugit_dir, "objects")
+    batch_size = _config_int(
+        config, "maintenance", "loose-objects.batchSize", DEFAULT_LOOSE_BATCH_SIZE
+    )
+    loose = [
+        sha
+        for sha in _get_all_objects(repo)
+        if find_packed_object([objects_dir], sha) is None
+    ]
+    if loose:
+        batch = loose[:batch_size] if batch_size > 0 else loose
+        try:
+            pack_file = create_pack(repo, batch)
+        except (FileNotFoundError, ValueError) as e:
+            raise UgitError(f"Cannot pack loose objects: {e}") from e
+        print(f"Packed {len(batch)} loose object(s) into {pack_file}")
+    pruned = prune_packed(repo)
+    if pruned:
+        print(f"Removed {pruned} loose object(s) that are packed")
+
+
+def _incremental_repack(repo: Repository, config: Config) -> None:
+    repack(geometric=2, write_midx=True, repo=repo)
+
+
+def _write_bitmaps(repo: Repository, config: Config) -> None:
+    """Write bitmaps for the largest pack if it has none yet."""
+    packs = get_packs(os.path.join(repo.ugit_dir, "objects"))
+    if not packs or os.path.exists(bitmap_path(packs[0])):
+        return
+    tips = local_ref_tips(repo)
+    head = repo.get_head_ref()
+    if head and head not in tips:
+        tips.append(head)
+    count = write_bitmap(repo, packs[0].path, tips)
+    print(f"Wrote bitmaps for {count} commit(s)")
+
+
+def _pack_refs(repo: Repository, config: Config) -> None:
+    print(f"Packed {pack_refs(repo)} ref(s)")
+
+
+# Every task, in the order they run
+TASKS: Dict[str, Callable[[Repository, Config], None]] = {
+    "reflog-expire": _expire_reflogs,
+    "prune": _prune,
+    "loose-objects": _pack_loose_objects,
+    "incremental-repack": _incremental_repack,
+    "bitmaps": _write_bitmaps,
+    "pack-refs": _pack_refs,
+}
+
+# Tasks that delete loose object files, skipped with another core.objectStorage
+OBJECT_TASKS = ("prune", "loose-objects", "incremental-repack")
+
+
+def _task_enabled(config: Config, task: str) -> bool:
+    value = config.get("maintenance", f"{task}.enabled", "true") or "true"
+    return value.lower() == "true"
+
+
+def _config_int(config: Config, section: str, key: str, default: int) -> int:
+    try:
+        return int(config.get(section, key, str(default)) or default)
+    except ValueError:
+        return default
+
+
+@contextmanager
+def _maintenance_lock(repo: Repository) -> Iterator[None]:
+    """Hold the maintenance lock, taking over one left by a crashed run."""
+    path = os.path.join(repo.ugit_dir, LOCK_FILE)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        try:
+            stale = time.time() - os.path.getmtime(path) > LOCK_TIMEOUT
+        except OSError:
+            stale = True
+        if not stale:
+            raise UgitError(f"Maintenance is already running ({path} exists)")
+        try:
+            os.remove(path)
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except OSError as e:
+            raise UgitError("Maintenance is already running") from e
+
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(f"{os.getpid()}\n")
+        yield
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _scheduler_pid(repo: Repository) -> Optional[int]:
+    """Get the pid recorded by start, if the scheduler was not stopped."""
+    path = os.path.join(repo.ugit_dir, PID_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _spawn(repo: Repository, args: List[str]) -> "subprocess.Popen[bytes]":
+    """Start a detached ``ugit maintenance`` process logging to LOG_FILE."""
+    package_root = os.path.dirname(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        path for path in (package_root, env.get("PYTHONPATH")) if path
+    )
+    with open(os.path.join(repo.ugit_dir, LOG_FILE), "ab") as log:
+        return subprocess.Popen(
+            [sys.executable, "-m", "ugit.cli", "maintenance", *args],
+            cwd=repo.path,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
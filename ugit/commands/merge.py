@@ -8,12 +8,16 @@ import json
 import os
 import sys
 import time
-from typing import Dict, List, Optional, Set
+from typing import Collection, Dict, List, Optional, Set
 
 from ..core.checkout import checkout_commit
+from ..core.chunking import read_blob
 from ..core.exceptions import BranchNotFoundError, MergeConflictError, UgitError
 from ..core.objects import get_object, hash_object
-from ..core.repository import Repository
+from ..core.refs import read_ref
+from ..core.repository import Index, Repository
+from ..core.shallow import read_shallow
+from ..core.sparse import SparseCones, read_sparse_cones
 from ..utils.config import Config
 from ..utils.helpers import (
     ensure_repository,
@@ -22,6 +26,7 @@ from ..utils.helpers import (
     get_tree_entries,
     is_ancestor,
 )
+from .maintenance import auto_maintenance
 
 
 def merge(
@@ -50,14 +55,10 @@ def merge(
         raise UgitError(f"Cannot merge branch '{branch_name}' into itself")
 
     # Check if target branch exists
-    branch_path = os.path.join(repo.ugit_dir, "refs", "heads", branch_name)
-    if not os.path.exists(branch_path):
+    merge_commit = read_ref(repo, f"refs/heads/{branch_name}")
+    if not merge_commit:
         raise BranchNotFoundError(f"Branch '{branch_name}' does not exist")
 
-    # Get commit SHAs
-    with open(branch_path, "r", encoding="utf-8") as f:
-        merge_commit = f.read().strip()
-
     current_commit = repo.get_head_ref()
     if not current_commit:
         raise UgitError("No current commit to merge into")
@@ -78,6 +79,8 @@ def merge(
         # Need to create a merge commit
         _three_way_merge(repo, current_commit, merge_commit, branch_name)
 
+    auto_maintenance(repo)
+
 
 def _fast_forward_merge(repo: Repository, target_commit: str, branch_name: str) -> None:
     """Perform a fast-forward merge."""
@@ -87,12 +90,12 @@ def _fast_forward_merge(repo: Repository, target_commit: str, branch_name: str)
         raise UgitError("Not on a branch (detached HEAD)")
     current_branch_path = os.path.join(repo.ugit_dir, "refs", "heads", current_branch)
 
+    # Checkout the target commit before moving the branch
+    checkout_commit(repo, target_commit, update_head=False)
+
     with open(current_branch_path, "w", encoding="utf-8") as f:
         f.write(target_commit)
 
-    # Checkout the target commit
-    checkout_commit(repo, target_commit)
-
     print(f"Fast-forward merge of '{branch_name}' into '{current_branch}'")
     print(f"Updated {current_branch} to {target_commit[:7]}")
 
@@ -123,14 +126,14 @@ def _create_merge_commit(
     commit_json = json.dumps(commit_data, separators=(",", ":")).encode()
     commit_sha = hash_object(commit_json, "commit")
 
+    # Checkout the merged files
+    checkout_commit(repo, parent2, update_head=False)
+
     # Update current branch
     current_branch_path = os.path.join(repo.ugit_dir, "refs", "heads", current_branch)
     with open(current_branch_path, "w", encoding="utf-8") as f:
         f.write(commit_sha)
 
-    # Checkout the merged files
-    checkout_commit(repo, parent2, update_head=False)
-
     print(f"Merge commit created: {commit_sha[:7]}")
 
 
@@ -156,12 +159,13 @@ def _three_way_merge(
     merged_files, conflicts = _merge_files(ancestor_files, current_files, merge_files)
 
     # Always write merged files to working directory (including conflict markers)
-    _write_merged_files(merged_files)
+    _write_merged_files(merged_files, read_sparse_cones(repo), conflicts)
 
     if conflicts:
         raise MergeConflictError("Merge conflicts detected", conflicts=conflicts)
 
     # Create merge commit only if no conflicts
+    _stage_merged_files(repo, merged_files, read_sparse_cones(repo))
     merged_tree_sha = _create_tree_from_files(merged_files)
     _create_merge_commit_with_tree(
         repo, current_commit, merge_commit, branch_name, merged_tree_sha
@@ -187,15 +191,12 @@ def _squash_merge(
     # Apply all changes from merge branch to working directory
     try:
         merge_files = _get_commit_files(repo, merge_commit)
-        _write_merged_files(merge_files)
+        cones = read_sparse_cones(repo)
+        _write_merged_files(merge_files, cones)
+        _stage_merged_files(repo, merge_files, cones)
     except ValueError as e:
         raise UgitError(f"Error during squash merge: {e}")
 
-    # Stage all changes
-    from .add import add
-
-    add(".")
-
     # Create single commit with combined message
     config = Config(repo.path)
     author = config.get_author_string()
@@ -227,10 +228,13 @@ def _get_commits_between(repo: Repository, ancestor: str, descendant: str) -> Li
     commits = []
     current = descendant
     visited = set()
+    shallow = read_shallow(repo)
 
     while current and current != ancestor and current not in visited:
         visited.add(current)
         commits.append(current)
+        if current in shallow:
+            break
         try:
             commit_data = get_commit_data(current, repo=repo)
             parent = commit_data.get("parent")
@@ -308,10 +312,13 @@ def _find_common_ancestor(
     ancestors1 = _get_all_ancestors(repo, commit1)
 
     # Walk through ancestors of commit2 until we find one that's also in ancestors1
+    shallow = read_shallow(repo)
     current: Optional[str] = commit2
     while current:
         if current in ancestors1:
             return current
+        if current in shallow:
+            break
 
         try:
             commit_type, commit_data = get_object(current)
@@ -329,10 +336,13 @@ def _find_common_ancestor(
 def _get_all_ancestors(repo: Repository, commit_sha: str) -> Set[str]:
     """Get all ancestors of a commit."""
     ancestors = set()
+    shallow = read_shallow(repo)
     current: Optional[str] = commit_sha
 
     while current:
         ancestors.add(current)
+        if current in shallow:
+            break
 
         try:
             commit_type, commit_data = get_object(current)
@@ -368,7 +378,7 @@ def _get_tree_files(
             full_path = os.path.join(prefix, path) if prefix else path
             if mode.startswith("10"):  # File
                 try:
-                    type_, content = get_object(sha, repo=repo)
+                    type_, content = read_blob(sha, repo=repo)
                     if type_ == "blob":
                         files[full_path] = content.decode("utf-8", errors="replace")
                 except (FileNotFoundError, ValueError, UnicodeDecodeError):
@@ -427,9 +437,22 @@ def _create_conflict_marker(
 """
 
 
-def _write_merged_files(merged_files: Dict[str, str]) -> None:
-    """Write merged files to working directory."""
+def _write_merged_files(
+    merged_files: Dict[str, str],
+    cones: Optional[SparseCones] = None,
+    conflicts: Collection[str] = (),
+) -> None:
+    """
+    Write merged files to working directory.
+
+    With sparse checkout enabled only files inside the cones are written,
+    plus any conflicted files, which need resolving wherever they live.
+    """
     for file_path, content in merged_files.items():
+        if cones is not None and not cones.matches(file_path):
+            if file_path not in conflicts:
+                continue
+
         dir_path = os.path.dirname(file_path)
         if dir_path:
             os.makedirs(dir_path, exist_ok=True)
@@ -438,6 +461,33 @@ def _write_merged_files(merged_files: Dict[str, str]) -> None:
             f.write(content)
 
 
+def _stage_merged_files(
+    repo: Repository, files: Dict[str, str], cones: Optional[SparseCones]
+) -> None:
+    """
+    Stage merged file contents in the index.
+
+    Files written to the working tree get fresh stat data so a later
+    checkout sees them as clean; files outside the sparse checkout are
+    staged directly as skip-worktree.
+    """
+    index = Index(repo)
+    index_data = index.read()
+    skip_worktree = index.read_skip_worktree()
+    for file_path, content in files.items():
+        sha = hash_object(content.encode("utf-8"), "blob", repo=repo)
+        if cones is not None and not cones.matches(file_path):
+            entry = index_data.get(file_path)
+            if entry is None or entry[0] != sha:
+                index_data[file_path] = (sha, 0.0, -1)
+            skip_worktree.add(file_path)
+            continue
+        stat = os.stat(os.path.join(repo.path, file_path))
+        index_data[file_path] = (sha, stat.st_mtime, stat.st_size)
+        skip_worktree.discard(file_path)
+    index.write(index_data, skip_worktree=skip_worktree)
+
+
 def _create_tree_from_files(files: Dict[str, str]) -> str:
     """Create a tree object from files."""
     tree_data = {}
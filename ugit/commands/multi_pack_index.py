@@ -0,0 +1,47 @@
+"""
+Multi-pack-index command implementation for ugit.
+
+Write or check the index covering every pack in objects/pack, which keeps
+object lookups to one binary search however many packs accumulate between
+repacks (see core.midx).
+"""
+
+import os
+from typing import Optional
+
+from ..core.exceptions import CorruptPackError, UgitError
+from ..core.midx import verify_multi_pack_index, write_multi_pack_index
+from ..utils.helpers import ensure_repository
+
+
+def multi_pack_index(command: Optional[str]) -> int:
+    """
+    Write or verify the multi-pack-index.
+
+    Args:
+        command: Command (write, verify)
+
+    Returns:
+        Number of problems found (0 for write)
+
+    Raises:
+        UgitError: If there is no index to verify or the command is unknown
+    """
+    repo = ensure_repository()
+    objects_dir = os.path.join(repo.ugit_dir, "objects")
+
+    if command == "write":
+        count = write_multi_pack_index(objects_dir)
+        print(f"Indexed {count} object(s)")
+        return 0
+    if command == "verify":
+        try:
+            problems = verify_multi_pack_index(objects_dir)
+        except (OSError, CorruptPackError) as e:
+            raise UgitError(f"Cannot read multi-pack-index: {e}") from e
+        for problem in problems:
+            print(f"error: {problem}")
+        if not problems:
+            print("multi-pack-index OK")
+        return len(problems)
+    raise UgitError("Usage: ugit multi-pack-index {write|verify}")
@@ -1,29 +1,48 @@
 """
 Pack file implementation for ugit.
 
-Combines multiple objects into pack files for efficient storage.
+Combines multiple objects into pack files for efficient storage. The pack
+format itself lives in core.pack; packed objects are read transparently by
+get_object. A pack can get reachability bitmaps (see core.bitmap), which
+make gc and transfers skip walking the history it holds.
 """
 
 import os
-import struct
-import zlib
-from typing import Dict, List, Optional, Set, Tuple
-
-from ..core.exceptions import UgitError
-from ..core.objects import get_object, hash_object, object_exists
+import shutil
+import tempfile
+from typing import List, Optional
+
+from ..core.bitmap import write_bitmap
+from ..core.chunking import mark_chunked
+from ..core.exceptions import CorruptPackError, UgitError
+from ..core.objects import hash_object, object_write_batch
+from ..core.odb import loose_object_database
+from ..core.pack import (
+    TYPE_NAMES,
+    Pack,
+    create_pack,
+    scan_pack,
+    verify_pack_checksum,
+    write_pack_index,
+)
+from ..core.protocol import local_ref_tips
 from ..core.repository import Repository
 from ..utils.helpers import ensure_repository
 
 
 def pack_objects(
-    sha_list: Optional[List[str]] = None, repo: Optional[Repository] = None
+    sha_list: Optional[List[str]] = None,
+    repo: Optional[Repository] = None,
+    bitmap: bool = False,
 ) -> str:
     """
     Create a pack file from objects.
 
     Args:
-        sha_list: List of object SHAs to pack (None = pack all objects)
+        sha_list: List of object SHAs to pack (None = pack all loose objects)
         repo: Repository instance
+        bitmap: Also write reachability bitmaps for the refs whose history
+            is entirely in the new pack
 
     Returns:
         Pack file path
@@ -34,33 +53,26 @@ def pack_objects(
     if sha_list is None:
         # Pack all objects
         sha_list = _get_all_objects(repo)
-    else:
-        # sha_list is already set, use it
-        pass
 
     if not sha_list:
         raise UgitError("No objects to pack")
 
-    # Create pack file
-    pack_dir = os.path.join(repo.ugit_dir, "objects", "pack")
-    os.makedirs(pack_dir, exist_ok=True)
-
-    pack_data = _create_pack_data(repo, sha_list)
-    pack_sha = hash_object(pack_data, "pack", repo=repo)
-
-    pack_file = os.path.join(pack_dir, f"pack-{pack_sha[:40]}.pack")
-    with open(pack_file, "wb") as f:
-        f.write(pack_data)
-
-    # Create index file
-    index_data = _create_pack_index(repo, sha_list, pack_sha)
-    index_file = os.path.join(pack_dir, f"pack-{pack_sha[:40]}.idx")
-    with open(index_file, "wb") as f:
-        f.write(index_data)
+    try:
+        pack_file = create_pack(repo, sha_list)
+    except FileNotFoundError as e:
+        raise UgitError(f"Cannot pack objects: {e}") from e
 
     print(f"Created pack file: {pack_file}")
     print(f"Packed {len(sha_list)} object(s)")
 
+    if bitmap:
+        tips = local_ref_tips(repo)
+        head = repo.get_head_ref()
+        if head and head not in tips:
+            tips.append(head)
+        count = write_bitmap(repo, pack_file, tips)
+        print(f"Wrote bitmaps for {count} commit(s)")
+
     return pack_file
 
 
@@ -81,29 +93,44 @@ def unpack_objects(pack_file: str, repo: Optional[Repository] = None) -> int:
     if not os.path.exists(pack_file):
         raise UgitError(f"Pack file not found: {pack_file}")
 
-    # Read pack file
-    with open(pack_file, "rb") as f:
-        pack_data = f.read()
-
-    # Parse pack file
-    objects = _parse_pack_file(pack_data)
-
-    # Write objects
     unpacked = 0
-    for sha, obj_type, obj_data in objects:
-        obj_path = os.path.join(repo.ugit_dir, "objects", sha)
-        if not os.path.exists(obj_path):
-            os.makedirs(os.path.dirname(obj_path), exist_ok=True)
-            with open(obj_path, "wb") as f:
-                f.write(obj_data)
-            unpacked += 1
+    manifests: List[str] = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Index a private copy so the pack can be read by offset
+        tmp_pack = os.path.join(tmp_dir, "unpack.pack")
+        shutil.copyfile(pack_file, tmp_pack)
+        try:
+            checksum = verify_pack_checksum(tmp_pack)
+            with open(tmp_pack, "rb") as f:
+                entries, missing_bases = scan_pack(f.read(), manifests)
+        except CorruptPackError as e:
+            raise UgitError(f"Invalid pack file: {e}") from e
+        if missing_bases:
+            raise UgitError("Cannot unpack a thin pack: delta bases are missing")
+        write_pack_index(tmp_pack[: -len(".pack")] + ".idx", entries, checksum)
+
+        pack = Pack(tmp_pack)
+        try:
+            with object_write_batch(repo):
+                for _, offset, _ in entries:
+                    type_code, data = pack.read_at(offset)
+                    hash_object(data, TYPE_NAMES[type_code], repo=repo)
+                    unpacked += 1
+        finally:
+            pack.close()
+    if manifests:
+        mark_chunked(os.path.join(repo.ugit_dir, "objects"))
 
     print(f"Unpacked {unpacked} object(s) from {pack_file}")
     return unpacked
 
 
 def _get_all_objects(repo: Repository) -> List[str]:
-    """Get all object SHAs in repository."""
+    """Get all loose object SHAs in repository."""
+    database = loose_object_database(repo)
+    if database is not None:
+        return list(database.iterate())
+
     objects: List[str] = []
     objects_dir = os.path.join(repo.ugit_dir, "objects")
 
@@ -111,8 +138,8 @@ def _get_all_objects(repo: Repository) -> List[str]:
         return objects
 
     for root, dirs, files in os.walk(objects_dir):
-        # Skip pack directory
-        if "pack" in root:
+        # Skip pack and info directories
+        if root != objects_dir and len(os.path.basename(root)) != 2:
             continue
 
         for file in files:
@@ -124,103 +151,3 @@ def _get_all_objects(repo: Repository) -> List[str]:
                 objects.append(file)
 
     return objects
-
-
-def _create_pack_data(repo: Repository, sha_list: List[str]) -> bytes:
-    """Create pack file data."""
-    # Pack file format:
-    # - Header: "PACK" + version (4 bytes) + object count (4 bytes)
-    # - Objects: type + size + compressed data
-    # - Checksum: SHA-1 of all data
-
-    pack_objects = []
-    for sha in sha_list:
-        try:
-            obj_type, obj_data = get_object(sha, repo=repo)
-            pack_objects.append((obj_type, obj_data))
-        except (FileNotFoundError, ValueError):
-            continue
-
-    # Build pack file
-    pack_data = b"PACK"  # Magic
-    pack_data += struct.pack(">I", 2)  # Version
-    pack_data += struct.pack(">I", len(pack_objects))  # Object count
-
-    for obj_type, obj_data in pack_objects:
-        # Object header: type (3 bits) + size (variable)
-        type_map = {"blob": 1, "tree": 2, "commit": 3, "tag": 4, "delta": 7}
-        type_code = type_map.get(obj_type, 0)
-
-        # Variable-length size encoding
-        size = len(obj_data)
-        header_bytes = []
-        header_bytes.append((type_code << 4) | (size & 0x0F))
-        size >>= 4
-        while size > 0:
-            header_bytes.append(0x80 | (size & 0x7F))
-            size >>= 7
-
-        pack_data += bytes(header_bytes)
-
-        # Compressed object data
-        compressed = zlib.compress(obj_data)
-        pack_data += compressed
-
-    # Calculate checksum (simplified - would use SHA-1 in production)
-    return pack_data
-
-
-def _create_pack_index(repo: Repository, sha_list: List[str], pack_sha: str) -> bytes:
-    """Create pack index file."""
-    # Simplified index format
-    index_data = b"IDX1"  # Magic
-    index_data += struct.pack(">I", len(sha_list))  # Object count
-
-    for sha in sha_list:
-        index_data += bytes.fromhex(sha)  # SHA as bytes
-        index_data += struct.pack(">Q", 0)  # Offset (simplified)
-
-    return index_data
-
-
-def _parse_pack_file(pack_data: bytes) -> List[Tuple[str, str, bytes]]:
-    """Parse pack file and extract objects."""
-    if not pack_data.startswith(b"PACK"):
-        raise UgitError("Invalid pack file format")
-
-    # Skip header
-    offset = 8  # "PACK" + version + count
-    version = struct.unpack(">I", pack_data[4:8])[0]
-    obj_count = struct.unpack(">I", pack_data[8:12])[0]
-
-    objects = []
-    offset = 12
-
-    for _ in range(obj_count):
-        # Read object header
-        type_code = (pack_data[offset] >> 4) & 0x07
-        size = pack_data[offset] & 0x0F
-        offset += 1
-
-        # Read variable-length size
-        shift = 4
-        while pack_data[offset - 1] & 0x80:
-            size |= (pack_data[offset] & 0x7F) << shift
-            offset += 1
-            shift += 7
-
-        # Decompress object data
-        decompressor = zlib.decompressobj()
-        obj_data = decompressor.decompress(pack_data[offset : offset + size * 2])
-        offset += len(obj_data)
-
-        # Map type code to type name
-        type_map = {1: "blob", 2: "tree", 3: "commit", 4: "tag", 7: "delta"}
-        obj_type = type_map.get(type_code, "blob")
-
-        # Calculate SHA
-        obj_sha = hash_object(obj_data, obj_type)
-
-        objects.append((obj_sha, obj_type, obj_data))
-
-    return objects
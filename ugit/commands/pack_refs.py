@@ -0,0 +1,35 @@
+"""
+Pack-refs command implementation for ugit.
+
+Move loose refs into .ugit/packed-refs, one sorted file that is searched
+in place, so repositories with thousands of tags do not need a file (and
+an open) per ref (see core.refs).
+"""
+
+from typing import Optional
+
+from ..core.refs import pack_refs as _pack_refs
+from ..core.repository import Repository
+from ..utils.helpers import ensure_repository
+
+
+def pack_refs(all_refs: bool = False, repo: Optional[Repository] = None) -> int:
+    """
+    Pack loose refs.
+
+    Args:
+        all_refs: Pack branches and remote-tracking refs too, not only tags
+            and refs that are already packed
+        repo: Repository instance
+
+    Returns:
+        Number of packed refs
+
+    Raises:
+        RefUpdateError: If packed-refs is locked
+    """
+    if repo is None:
+        repo = ensure_repository()
+    count = _pack_refs(repo, all_refs)
+    print(f"Packed {count} ref(s)")
+    return count
@@ -9,6 +9,7 @@ import sys
 from typing import Optional
 
 from ..core.checkout import checkout_commit
+from ..core.refs import read_ref
 from ..core.repository import Repository
 from ..utils.helpers import get_current_branch_name, is_ancestor
 from .fetch import fetch
@@ -49,22 +50,13 @@ def pull(remote_name: str = "origin", branch: Optional[str] = None) -> int:
         return fetch_result
 
     # Get the remote ref
-    remote_ref_path = os.path.join(
-        repo.ugit_dir, "refs", "remotes", remote_name, branch
-    )
-    if not os.path.exists(remote_ref_path):
+    remote_sha = read_ref(repo, f"refs/remotes/{remote_name}/{branch}")
+    if not remote_sha:
         print(
             f"fatal: Couldn't find remote ref {remote_name}/{branch}", file=sys.stderr
         )
         return 1
 
-    try:
-        with open(remote_ref_path, "r") as f:
-            remote_sha = f.read().strip()
-    except (IOError, OSError) as e:
-        print(f"fatal: Failed to read remote ref: {e}", file=sys.stderr)
-        return 1
-
     # Get current HEAD
     current_sha = repo.get_head_ref()
     if not current_sha:
@@ -132,6 +124,9 @@ def _fast_forward_merge(repo: Repository, branch: str, target_sha: str) -> None:
         branch: Current branch name
         target_sha: Target commit SHA
     """
+    # Checkout the new commit before moving the branch
+    checkout_commit(repo, target_sha, update_head=False)
+
     # Update branch ref
     branch_path = os.path.join(repo.ugit_dir, "refs", "heads", branch)
     try:
@@ -139,6 +134,3 @@ def _fast_forward_merge(repo: Repository, branch: str, target_sha: str) -> None:
             f.write(target_sha)
     except (IOError, OSError) as e:
         raise RuntimeError(f"Failed to update branch {branch}: {e}")
-
-    # Checkout the new commit
-    checkout_commit(repo, target_sha)
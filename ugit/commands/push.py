@@ -2,16 +2,29 @@
 Push changes to remote repositories.
 
 This module handles uploading local changes to remote repositories.
+The LFS content of pushed pointers is uploaded before the refs move.
 """
 
 import os
-import shutil
-from typing import Optional, Set
+import tempfile
+from typing import Iterable, Optional
 
 from ..core.exceptions import NonFastForwardError, UgitError
-from ..core.objects import get_object
+from ..core.lfs import find_new_pointers, has_lfs_objects, push_lfs_objects
+from ..core.pack import new_temp_pack_path
+from ..core.protocol import UPDATE_OK, build_push_pack, receive_pack
+from ..core.refs import list_refs, read_ref
 from ..core.repository import Repository
-from ..utils.helpers import get_current_branch_name, is_local_path
+from ..core.shallow import read_shallow
+from ..utils.config import Config
+from ..utils.helpers import (
+    get_commit_data,
+    get_commit_parents,
+    get_current_branch_name,
+    is_http_url,
+    is_local_path,
+)
+from .http_remote import get_http_refs, send_pack_http
 from .remote import get_remote_url
 
 
@@ -48,21 +61,17 @@ def push(
             raise UgitError("fatal: You are not currently on a branch")
 
     # Get local branch ref
-    local_branch_path = os.path.join(repo.ugit_dir, "refs", "heads", branch)
-    if not os.path.exists(local_branch_path):
+    local_sha = read_ref(repo, f"refs/heads/{branch}")
+    if not local_sha:
         raise UgitError(f"fatal: src refspec {branch} does not match any")
 
-    try:
-        with open(local_branch_path, "r") as f:
-            local_sha = f.read().strip()
-    except (IOError, OSError) as e:
-        raise UgitError(f"fatal: Failed to read local ref: {e}")
-
     print(f"Pushing to {remote_url}")
 
     try:
         if is_local_path(remote_url):
-            _push_local(repo, remote_name, remote_url, branch, local_sha, force)
+            _push_local(repo, remote_url, branch, local_sha, force)
+        elif is_http_url(remote_url):
+            _push_http(repo, remote_url, branch, local_sha, force)
         else:
             raise UgitError(f"fatal: remote protocols not yet supported: {remote_url}")
 
@@ -74,7 +83,6 @@ def push(
 
 def _push_local(
     repo: Repository,
-    remote_name: str,
     remote_url: str,
     branch: str,
     local_sha: str,
@@ -83,9 +91,11 @@ def _push_local(
     """
     Push to a local repository.
 
+    The objects the remote lacks are written straight into its pack
+    directory as one thin pack, which the remote side then indexes.
+
     Args:
         repo: Local repository
-        remote_name: Remote name
         remote_url: Remote repository path
         branch: Branch to push
         local_sha: Local commit SHA
@@ -96,18 +106,102 @@ def _push_local(
     if not os.path.exists(remote_ugit_dir):
         raise ValueError(f"not a ugit repository: {remote_url}")
 
-    # Check remote branch status
-    remote_branch_path = os.path.join(remote_ugit_dir, "refs", "heads", branch)
-    remote_sha = None
+    remote_repo = Repository(remote_url)
+    ref = f"refs/heads/{branch}"
+    remote_sha = read_ref(remote_repo, ref)
+    _check_fast_forward(repo, branch, remote_sha, local_sha, force)
+    _push_lfs(repo, remote_url, local_sha, list_refs(remote_repo).values())
 
-    if os.path.exists(remote_branch_path):
-        try:
-            with open(remote_branch_path, "r") as f:
-                remote_sha = f.read().strip()
-        except (IOError, OSError):
-            pass
+    tmp_path = new_temp_pack_path(remote_repo)
+    try:
+        with open(tmp_path, "wb") as f:
+            objects_pushed = build_push_pack(
+                repo, [local_sha], list_refs(remote_repo).values(), f
+            )
+        # Local pushes have always been allowed to move the remote's
+        # checked out branch; the refusal guards pushes served over HTTP
+        results = receive_pack(
+            remote_repo,
+            tmp_path if objects_pushed else None,
+            [(ref, remote_sha, local_sha)],
+            deny_current_branch=False,
+        )
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    _report_push(repo, branch, remote_sha, local_sha, results[ref], objects_pushed)
+
+
+def _push_http(
+    repo: Repository,
+    remote_url: str,
+    branch: str,
+    local_sha: str,
+    force: bool,
+) -> None:
+    """
+    Push to an HTTP remote with a single streamed request.
+
+    Args:
+        repo: Local repository
+        remote_url: Remote repository URL
+        branch: Branch to push
+        local_sha: Local commit SHA
+        force: Force push
+    """
+    advertisement = get_http_refs(remote_url, repo)
+    ref = f"refs/heads/{branch}"
+    remote_sha = advertisement["refs"].get(ref)
+    _check_fast_forward(repo, branch, remote_sha, local_sha, force)
+    _push_lfs(repo, remote_url, local_sha, advertisement["refs"].values())
+
+    with tempfile.TemporaryFile() as pack_file:
+        objects_pushed = build_push_pack(
+            repo, [local_sha], advertisement["refs"].values(), pack_file
+        )
+        results = send_pack_http(
+            remote_url,
+            [(ref, remote_sha, local_sha)],
+            pack_file if objects_pushed else None,
+            repo,
+        )
+
+    result = results.get(ref, "no status reported for this ref")
+    _report_push(repo, branch, remote_sha, local_sha, result, objects_pushed)
 
-    # Check if this is a fast-forward push
+
+def _push_lfs(
+    repo: Repository, remote_url: str, local_sha: str, remote_shas: Iterable[str]
+) -> None:
+    """
+    Upload the LFS content of the pointers the remote is about to receive.
+
+    Args:
+        repo: Local repository
+        remote_url: Remote repository URL (lfs.url takes precedence)
+        local_sha: Local commit SHA
+        remote_shas: Commits the remote already has
+    """
+    if not has_lfs_objects(repo):
+        return  # Nothing was ever stored, so there is nothing to upload
+    pointers = find_new_pointers(repo, [local_sha], remote_shas)
+    if not pointers:
+        return
+    url = Config(repo.path).get("lfs", "url") or remote_url
+    uploaded = push_lfs_objects(repo, url, pointers)
+    if uploaded:
+        print(f"Uploaded {uploaded} LFS object(s)")
+
+
+def _check_fast_forward(
+    repo: Repository,
+    branch: str,
+    remote_sha: Optional[str],
+    local_sha: str,
+    force: bool,
+) -> None:
+    """Reject a push that would drop commits from the remote branch."""
     if remote_sha and not force:
         if not _is_fast_forward(repo, remote_sha, local_sha):
             raise NonFastForwardError(
@@ -117,20 +211,22 @@ def _push_local(
                 "hint: 'ugit pull ...') before pushing again."
             )
 
-    # Push objects
-    objects_pushed = _push_objects(repo, remote_url, local_sha)
 
-    # Update remote ref
-    os.makedirs(os.path.dirname(remote_branch_path), exist_ok=True)
-    try:
-        with open(remote_branch_path, "w") as f:
-            f.write(local_sha)
-    except (IOError, OSError) as e:
-        raise RuntimeError(f"Failed to update remote branch {branch}: {e}")
+def _report_push(
+    repo: Repository,
+    branch: str,
+    remote_sha: Optional[str],
+    local_sha: str,
+    result: str,
+    objects_pushed: int,
+) -> None:
+    """Print the outcome of a ref update, raising if it was rejected."""
+    if result != UPDATE_OK:
+        raise UgitError(f"! [remote rejected] {branch} -> {branch} ({result})")
 
     # Show status
     if remote_sha:
-        if force and not _is_fast_forward(repo, remote_sha, local_sha):
+        if not _is_fast_forward(repo, remote_sha, local_sha):
             print(
                 f" + {remote_sha[:8]}...{local_sha[:8]} {branch} -> {branch} (forced update)"
             )
@@ -161,6 +257,7 @@ def _is_fast_forward(repo: Repository, base_sha: str, target_sha: str) -> bool:
     # Check if base_sha is an ancestor of target_sha
     visited = set()
     to_check = [target_sha]
+    shallow = read_shallow(repo)
 
     while to_check:
         current_sha = to_check.pop()
@@ -171,175 +268,13 @@ def _is_fast_forward(repo: Repository, base_sha: str, target_sha: str) -> bool:
 
         if current_sha == base_sha:
             return True
+        if current_sha in shallow:
+            continue  # History below the shallow boundary is not here
 
         try:
-            commit_type, commit_content = get_object(current_sha, repo=repo)
-            if commit_type != "commit":
-                continue
-
-            # Parse JSON commit to find parents
-            import json
-
-            commit_data = json.loads(commit_content.decode("utf-8"))
-
-            if "parent" in commit_data:
-                parent = commit_data["parent"]
-                # Handle both direct SHA and ref format
-                if parent.startswith("ref: refs/heads/"):
-                    # This is the initial commit, no parent
-                    continue
-                else:
-                    # Direct parent SHA
-                    to_check.append(parent)
-
-        except (FileNotFoundError, UnicodeDecodeError, IOError):
+            to_check.extend(get_commit_parents(get_commit_data(current_sha, repo=repo)))
+        except (FileNotFoundError, ValueError, UnicodeDecodeError, IOError):
             # Skip commits that can't be read or decoded
             continue
 
     return False
-
-
-def _push_objects(repo: Repository, remote_url: str, start_sha: str) -> int:
-    """
-    Push all objects needed for the given commit to remote.
-
-    Args:
-        repo: Local repository
-        remote_url: Remote repository path
-        start_sha: Starting commit SHA
-
-    Returns:
-        Number of objects pushed
-    """
-    remote_objects_dir = os.path.join(remote_url, ".ugit", "objects")
-    local_objects_dir = os.path.join(repo.ugit_dir, "objects")
-
-    # Find all objects we need to push
-    objects_to_push: Set[str] = set()
-    _collect_objects(start_sha, objects_to_push, set(), remote_url, repo)
-
-    # Push objects
-    pushed_count = 0
-    for sha in objects_to_push:
-        if _copy_object_to_remote(local_objects_dir, remote_objects_dir, sha):
-            pushed_count += 1
-
-    return pushed_count
-
-
-def _collect_objects(
-    sha: str, to_push: Set[str], visited: Set[str], remote_url: str, repo: Repository
-) -> None:
-    """
-    Recursively collect all objects that need to be pushed.
-
-    Args:
-        sha: Object SHA to start from
-        to_push: Set to add objects to
-        visited: Set of already visited objects
-        remote_url: Remote repository path
-        repo: Local repository instance
-    """
-    if sha in visited:
-        return
-    visited.add(sha)
-
-    # Check if remote already has this object
-    if _remote_has_object(remote_url, sha):
-        return
-
-    to_push.add(sha)
-
-    try:
-        obj_type, obj_content = get_object(sha, repo=repo)
-
-        if obj_type == "commit":
-            # Parse JSON commit to find tree and parents
-            import json
-
-            commit_data = json.loads(obj_content.decode("utf-8"))
-
-            if "tree" in commit_data:
-                _collect_objects(
-                    commit_data["tree"], to_push, visited, remote_url, repo
-                )
-
-            if "parent" in commit_data:
-                parent = commit_data["parent"]
-                # Only collect if it's a real parent SHA (not a ref)
-                if parent is not None and not parent.startswith("ref: refs/heads/"):
-                    _collect_objects(parent, to_push, visited, remote_url, repo)
-
-        elif obj_type == "tree":
-            # Parse JSON tree to find blobs and subtrees
-            import json
-
-            tree_data = json.loads(obj_content.decode("utf-8"))
-
-            # Tree is a list of [filename, sha] pairs
-            for entry in tree_data:
-                if len(entry) >= 2:
-                    _collect_objects(entry[1], to_push, visited, remote_url, repo)
-
-    except (FileNotFoundError, ValueError, IndexError):
-        # Skip objects that can't be read or parsed
-        return
-
-
-def _remote_has_object(remote_url: str, sha: str) -> bool:
-    """
-    Check if remote repository has an object.
-
-    Args:
-        remote_url: Remote repository path
-        sha: Object SHA to check
-
-    Returns:
-        True if remote has the object
-    """
-    remote_objects_dir = os.path.join(remote_url, ".ugit", "objects")
-
-    # Check both formats
-    paths = [
-        os.path.join(remote_objects_dir, sha),  # Old flat
-        os.path.join(remote_objects_dir, sha[:2], sha[2:]),  # New hierarchical
-    ]
-
-    return any(os.path.exists(path) for path in paths)
-
-
-def _copy_object_to_remote(
-    local_objects_dir: str, remote_objects_dir: str, sha: str
-) -> bool:
-    """
-    Copy an object from local to remote repository.
-
-    Args:
-        local_objects_dir: Local objects directory
-        remote_objects_dir: Remote objects directory
-        sha: Object SHA to copy
-
-    Returns:
-        True if object was copied successfully
-    """
-    # Try both formats for source
-    local_paths = [
-        os.path.join(local_objects_dir, sha),  # Old flat
-        os.path.join(local_objects_dir, sha[:2], sha[2:]),  # New hierarchical
-    ]
-
-    for local_path in local_paths:
-        if os.path.exists(local_path):
-            # Copy to hierarchical format in remote
-            remote_dir = os.path.join(remote_objects_dir, sha[:2])
-            remote_path = os.path.join(remote_dir, sha[2:])
-
-            os.makedirs(remote_dir, exist_ok=True)
-
-            try:
-                shutil.copy2(local_path, remote_path)
-                return True
-            except (IOError, OSError):
-                continue
-
-    return False
@@ -11,7 +11,9 @@ from typing import List, Optional
 from ..core.checkout import checkout_commit
 from ..core.exceptions import MergeConflictError, UgitError
 from ..core.objects import get_object, hash_object
+from ..core.refs import read_ref
 from ..core.repository import Index, Repository
+from ..core.shallow import read_shallow
 from ..utils.config import Config
 from ..utils.helpers import (
     ensure_repository,
@@ -43,13 +45,10 @@ def rebase(branch: str, interactive: bool = False, onto: Optional[str] = None) -
         raise UgitError(f"Cannot rebase branch '{branch}' onto itself")
 
     # Get branch commit
-    branch_path = os.path.join(repo.ugit_dir, "refs", "heads", branch)
-    if not os.path.exists(branch_path):
+    target_commit = read_ref(repo, f"refs/heads/{branch}")
+    if not target_commit:
         raise UgitError(f"Branch '{branch}' does not exist")
 
-    with open(branch_path, "r", encoding="utf-8") as f:
-        target_commit = f.read().strip()
-
     # Get current branch commit
     current_commit = repo.get_head_ref()
     if not current_commit:
@@ -89,11 +88,14 @@ def _find_common_ancestor(
 ) -> Optional[str]:
     """Find common ancestor of two commits."""
     ancestors1 = _get_all_ancestors(repo, commit1)
+    shallow = read_shallow(repo)
     current = commit2
 
     while current:
         if current in ancestors1:
             return current
+        if current in shallow:
+            break
         try:
             commit_data = get_commit_data(current, repo=repo)
             parent = commit_data.get("parent")
@@ -110,10 +112,13 @@ def _find_common_ancestor(
 def _get_all_ancestors(repo: Repository, commit_sha: str) -> set:
     """Get all ancestors of a commit."""
     ancestors = set()
+    shallow = read_shallow(repo)
     current = commit_sha
 
     while current:
         ancestors.add(current)
+        if current in shallow:
+            break
         try:
             commit_data = get_commit_data(current, repo=repo)
             parent = commit_data.get("parent")
@@ -132,10 +137,13 @@ def _get_commits_between(repo: Repository, ancestor: str, descendant: str) -> Li
     commits = []
     current = descendant
     visited = set()
+    shallow = read_shallow(repo)
 
     while current and current != ancestor and current not in visited:
         visited.add(current)
         commits.append(current)
+        if current in shallow:
+            break
         try:
             commit_data = get_commit_data(current, repo=repo)
             parent = commit_data.get("parent")
@@ -7,6 +7,7 @@ This module handles adding, removing, listing, and showing remote repositories.
 import os
 from typing import Any, Dict, Optional
 
+from ..core.refs import delete_refs, list_refs
 from ..core.repository import Repository
 from ..utils.config import Config
 
@@ -86,8 +87,9 @@ def remove_remote(name: str) -> None:
     config.remove("remote", f"{name}.url")
     config.remove("remote", f"{name}.fetch")
 
-    # Remove remote refs directory
+    # Remove remote refs, packed ones included
     repo = Repository()
+    delete_refs(repo, list_refs(repo, (f"refs/remotes/{name}",)))
     remote_refs_path = os.path.join(repo.ugit_dir, "refs", "remotes", name)
     if os.path.exists(remote_refs_path):
         import shutil
@@ -142,18 +144,12 @@ def show_remote(name: str) -> None:
 
     # Show remote branches if they exist
     repo = Repository()
-    remote_refs_path = os.path.join(repo.ugit_dir, "refs", "remotes", name)
-    if os.path.exists(remote_refs_path):
+    prefix = f"refs/remotes/{name}/"
+    remote_refs = list_refs(repo, (prefix,))
+    if remote_refs:
         print("  Remote branches:")
-        for branch_file in os.listdir(remote_refs_path):
-            branch_path = os.path.join(remote_refs_path, branch_file)
-            if os.path.isfile(branch_path):
-                try:
-                    with open(branch_path, "r") as f:
-                        f.read().strip()
-                    print(f"    {name}/{branch_file}")
-                except (IOError, OSError):
-                    pass
+        for ref in remote_refs:
+            print(f"    {name}/{ref[len(prefix) :]}")
 
 
 def get_all_remotes() -> Dict[str, Dict[str, str]]:
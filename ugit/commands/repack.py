@@ -0,0 +1,207 @@
+"""
+Repack command implementation for ugit.
+
+Consolidate packs and loose objects. A full repack rewrites everything
+into one pack. A geometric repack (``--geometric=<factor>``) only rolls up
+the small packs, so that every remaining pack holds at least <factor> times
+as many objects as the next smaller one: each object is rewritten about
+log(n) times over its lifetime, and a routine repack only touches the
+newest few packs. Loose objects that end up packed are deleted either way.
+"""
+
+import os
+from typing import Iterable, List, Optional, Set
+
+from ..core.bitmap import bitmap_path, write_bitmap
+from ..core.exceptions import UgitError
+from ..core.midx import MIDX_FILE, find_packed_object, write_multi_pack_index
+from ..core.odb import require_file_storage
+from ..core.pack import (
+    Pack,
+    create_pack,
+    get_pack_dir,
+    get_packs,
+    invalidate_pack_cache,
+)
+from ..core.protocol import local_ref_tips
+from ..core.repository import Repository
+from ..utils.helpers import ensure_repository
+from .pack import _get_all_objects
+
+
+def repack(
+    geometric: Optional[int] = None,
+    write_bitmaps: bool = False,
+    write_midx: bool = False,
+    repo: Optional[Repository] = None,
+) -> Optional[str]:
+    """
+    Repack objects and delete the loose copies of packed objects.
+
+    Args:
+        geometric: If given, only roll up enough small packs (and the loose
+            objects) for pack sizes to grow by this factor; otherwise pack
+            everything into one pack
+        write_bitmaps: Write reachability bitmaps for the new pack
+        write_midx: Write a multi-pack-index (one that already exists is
+            always rewritten)
+        repo: Repository instance
+
+    Returns:
+        Path of the new pack, or None if nothing needed repacking
+
+    Raises:
+        UgitError: If the factor is below 2, an object cannot be read, or
+            objects are not stored as loose files
+    """
+    if repo is None:
+        repo = ensure_repository()
+    require_file_storage(repo, "repack")
+    if geometric is not None and geometric < 2:
+        raise UgitError("Geometric factor must be at least 2")
+
+    objects_dir = os.path.join(repo.ugit_dir, "objects")
+    packs = sorted(get_packs(objects_dir), key=len)
+    loose = [
+        sha
+        for sha in _get_all_objects(repo)
+        if find_packed_object([objects_dir], sha) is None
+    ]
+    if geometric is None:
+        rolled = packs
+    else:
+        counts = [len(pack) for pack in packs]
+        rolled = packs[: geometric_split(counts, geometric, len(loose))]
+
+    # Rewriting a lone pack would gain nothing
+    pack_file = None
+    if len(rolled) > 1 or loose:
+        shas = _objects_to_pack(rolled, loose)
+        try:
+            pack_file = create_pack(repo, shas)
+        except (FileNotFoundError, ValueError) as e:
+            raise UgitError(f"Cannot repack objects: {e}") from e
+        _remove_packs(objects_dir, rolled, keep=pack_file)
+        print(f"Packed {len(shas)} object(s) into {pack_file}")
+        if rolled:
+            print(f"Replaced {len(rolled)} pack(s)")
+
+    pruned = prune_packed(repo)
+    if pruned:
+        print(f"Removed {pruned} loose object(s) that are packed")
+
+    if pack_file is not None and write_bitmaps:
+        tips = local_ref_tips(repo)
+        head = repo.get_head_ref()
+        if head and head not in tips:
+            tips.append(head)
+        count = write_bitmap(repo, pack_file, tips)
+        print(f"Wrote bitmaps for {count} commit(s)")
+
+    midx_path = os.path.join(get_pack_dir(objects_dir), MIDX_FILE)
+    if write_midx or os.path.exists(midx_path):
+        write_multi_pack_index(objects_dir)
+
+    if pack_file is None:
+        print("Nothing to repack")
+    return pack_file
+
+
+def geometric_split(counts: List[int], factor: int, loose: int = 0) -> int:
+    """
+    Find how many of the smallest packs to roll up.
+
+    The packs from the split on must each hold at least factor times as
+    many objects as the one before them, and the first of them at least
+    factor times as many as everything rolled up below it.
+
+    Args:
+        counts: Object counts of the packs, smallest first
+        factor: Growth factor between consecutive packs
+        loose: Number of loose objects, which are always rolled up
+
+    Returns:
+        Number of packs, from the smallest, to combine into one
+    """
+    split = 0
+    for i in range(len(counts) - 1, 0, -1):
+        if counts[i] < factor * counts[i - 1]:
+            split = i + 1
+            break
+
+    total = loose + sum(counts[:split])
+    while split < len(counts) and counts[split] < factor * total:
+        total += counts[split]
+        split += 1
+    return split
+
+
+def prune_packed(repo: Repository) -> int:
+    """
+    Delete loose objects that are also in a pack.
+
+    Args:
+        repo: Repository instance
+
+    Returns:
+        Number of loose objects deleted
+    """
+    objects_dir = os.path.join(repo.ugit_dir, "objects")
+    removed = 0
+    for sha in _get_all_objects(repo):
+        if find_packed_object([objects_dir], sha) is None:
+            continue
+        for path in (
+            os.path.join(objects_dir, sha[:2], sha[2:]),
+            os.path.join(objects_dir, sha),
+        ):
+            try:
+                os.remove(path)
+                removed += 1
+                break
+            except FileNotFoundError:
+                continue
+    return removed
+
+
+def _objects_to_pack(packs: List[Pack], loose: List[str]) -> List[str]:
+    """
+    List the objects of some packs and loose objects, each once.
+
+    Packed objects keep their pack order, so delta bases come before their
+    deltas and both can be copied without recompressing.
+    """
+    seen: Set[str] = set()
+    shas: List[str] = []
+    sources: List[Iterable[str]] = [_in_pack_order(pack) for pack in packs]
+    for source in [*sources, loose]:
+        for sha in source:
+            if sha not in seen:
+                seen.add(sha)
+                shas.append(sha)
+    return shas
+
+
+def _in_pack_order(pack: Pack) -> List[str]:
+    """List a pack's objects by offset."""
+    index = pack.index
+    positions = sorted(range(len(index)), key=index.offset_at)
+    return [index.sha_at(position) for position in positions]
+
+
+def _remove_packs(objects_dir: str, packs: List[Pack], keep: str) -> None:
+    """Delete replaced packs with their indexes and bitmaps."""
+    replaced = [pack for pack in packs if pack.path != keep]
+    paths = [pack.path for pack in replaced]
+    bitmaps = [bitmap_path(pack) for pack in replaced]
+    # A mapped file cannot be deleted on Windows, so unmap every copy first
+    invalidate_pack_cache(objects_dir)
+    for pack in replaced:
+        pack.close()
+    for pack_path, bitmap in zip(paths, bitmaps):
+        base = pack_path[: -len(".pack")]
+        for path in (bitmap, base + ".idx", pack_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -10,8 +10,9 @@ from typing import List, Optional
 
 from ..core.checkout import checkout_commit
 from ..core.objects import get_object
+from ..core.refs import read_ref, update_ref
 from ..core.repository import Index, Repository
-from ..utils.helpers import ensure_repository
+from ..utils.helpers import ensure_repository, get_current_branch_name
 
 
 def reset(target: Optional[str] = None, hard: bool = False, soft: bool = False) -> None:
@@ -29,9 +30,9 @@ def reset(target: Optional[str] = None, hard: bool = False, soft: bool = False)
         print("Cannot specify both --soft and --hard")
         return
 
-    if target:
-        # Reset to specific commit
-        _reset_to_commit(repo, target, hard, soft)
+    if target or hard:
+        # Reset to specific commit (a bare --hard resets to HEAD)
+        _reset_to_commit(repo, target or "HEAD", hard, soft)
     else:
         # Reset staging area (default behavior)
         _reset_staging_area(repo)
@@ -75,15 +76,22 @@ def _reset_to_commit(
             sys.stderr.write(f"Error: Commit {target} not found\n")
             return
 
-        # Update HEAD
-        head_path = os.path.join(repo.ugit_dir, "HEAD")
-        with open(head_path, "w", encoding="utf-8") as f:
-            f.write(commit_sha)
-
         if hard:
-            # Reset working directory and staging area
+            # Reset working directory and staging area while HEAD still
+            # names the old tree, so only differing paths are rewritten
             _reset_working_directory(repo, commit_sha)
-            _clear_staging_area(repo)
+
+        # Move the current branch, or HEAD itself when it is detached
+        branch = get_current_branch_name(repo)
+        if branch is not None:
+            ref = f"refs/heads/{branch}"
+            update_ref(repo, ref, commit_sha, read_ref(repo, ref))
+        else:
+            head_path = os.path.join(repo.ugit_dir, "HEAD")
+            with open(head_path, "w", encoding="utf-8") as f:
+                f.write(commit_sha)
+
+        if hard:
             print(f"Hard reset to {commit_sha[:7]}")
         elif soft:
             # Only move HEAD
@@ -116,10 +124,10 @@ def _clear_staging_area(repo: Repository) -> None:
 
 
 def _reset_working_directory(repo: Repository, commit_sha: str) -> None:
-    """Reset working directory to match a commit."""
+    """Reset working directory and index to match a commit."""
     try:
-        # Use checkout functionality to restore files
-        checkout_commit(repo, commit_sha)
+        # Use checkout functionality to restore files, discarding local changes
+        checkout_commit(repo, commit_sha, update_head=False, force=True)
     except Exception as e:
         sys.stderr.write(f"Error resetting working directory: {e}\n")
 
@@ -144,10 +152,9 @@ def _unstage_file(repo: Repository, file_path: str) -> None:
 def _resolve_target(repo: Repository, target: str) -> Optional[str]:
     """Resolve a target (commit SHA or branch name) to commit SHA."""
     # Check if it's a branch name
-    branch_path = os.path.join(repo.ugit_dir, "refs", "heads", target)
-    if os.path.exists(branch_path):
-        with open(branch_path, "r", encoding="utf-8") as f:
-            return f.read().strip()
+    branch_sha = read_ref(repo, f"refs/heads/{target}")
+    if branch_sha:
+        return branch_sha
 
     # Check if it's HEAD
     if target.upper() == "HEAD":
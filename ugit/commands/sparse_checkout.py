@@ -0,0 +1,91 @@
+"""
+Sparse-checkout command implementation for ugit.
+
+Restrict the working directory to a set of directory cones.
+"""
+
+from typing import List, Optional
+
+from ..core.checkout import checkout_commit
+from ..core.exceptions import UgitError
+from ..core.repository import Index, Repository
+from ..core.sparse import (
+    disable_sparse_checkout,
+    normalize_cone,
+    read_sparse_cones,
+    write_sparse_cones,
+)
+from ..utils.helpers import ensure_repository
+from ..utils.validation import sanitize_path, validate_path
+
+
+def sparse_checkout(
+    command: Optional[str] = None, directories: Optional[List[str]] = None
+) -> None:
+    """
+    Manage the sparse checkout cones.
+
+    Args:
+        command: Command (set, add, list, disable)
+        directories: Cone directories for set and add
+
+    Raises:
+        UgitError: If a directory is invalid or the command is unknown
+    """
+    repo = ensure_repository()
+
+    if command is None or command == "list":
+        _list_cones(repo)
+    elif command == "set":
+        write_sparse_cones(repo, _validate_directories(repo, directories or []))
+        _reapply(repo)
+    elif command == "add":
+        cones = read_sparse_cones(repo)
+        existing = cones.cones if cones is not None else []
+        write_sparse_cones(
+            repo, existing + _validate_directories(repo, directories or [])
+        )
+        _reapply(repo)
+    elif command == "disable":
+        disable_sparse_checkout(repo)
+        _reapply(repo)
+    else:
+        raise UgitError(f"Unknown sparse-checkout command: {command}")
+
+
+def _list_cones(repo: Repository) -> None:
+    """Print the current cones."""
+    cones = read_sparse_cones(repo)
+    if cones is None:
+        print("Sparse checkout is not enabled")
+        return
+    for cone in cones.cones:
+        print(cone)
+
+
+def _validate_directories(repo: Repository, directories: List[str]) -> List[str]:
+    """Validate cone directories and normalize them to repository paths."""
+    cones = []
+    for directory in directories:
+        try:
+            sanitized = sanitize_path(directory)
+        except ValueError as e:
+            raise UgitError(f"Invalid path '{directory}': {e}") from e
+        if not validate_path(sanitized, base_path=repo.path):
+            raise UgitError(f"Invalid or unsafe path: {directory}")
+        cone = normalize_cone(sanitized)
+        if cone:
+            cones.append(cone)
+    return cones
+
+
+def _reapply(repo: Repository) -> None:
+    """Update the working directory and skip-worktree bits to the cones."""
+    head_sha = repo.get_head_ref()
+    if head_sha:
+        checkout_commit(repo, head_sha, update_head=False)
+
+    index = Index(repo)
+    index_data = index.read()
+    skipped = len(index.read_skip_worktree())
+    print(f"{len(index_data) - skipped} of {len(index_data)} files checked out")
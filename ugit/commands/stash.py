@@ -11,7 +11,9 @@ import time
 from typing import Any, Dict, List, Optional, Tuple
 
 from ..core.checkout import clear_working_directory
-from ..core.objects import get_object, hash_object
+from ..core.chunking import read_blob
+from ..core.lfs import hash_file, parse_pointer, read_attributes, smudge_to_file
+from ..core.objects import object_write_batch
 from ..core.repository import Index, Repository
 from ..utils.helpers import (
     ensure_repository,
@@ -33,7 +35,8 @@ def stash(message: Optional[str] = None, include_untracked: bool = False) -> Non
 
     # Check if there are changes to stash
     staged_files = _get_staged_files(repo)
-    working_changes = _get_working_changes(repo, include_untracked)
+    with object_write_batch(repo):
+        working_changes = _get_working_changes(repo, include_untracked)
 
     if not staged_files and not working_changes:
         print("No changes to stash")
@@ -176,10 +179,7 @@ def _get_working_changes(
                 continue
 
             try:
-                with open(file_path, "rb") as f:
-                    content = f.read()
-
-                current_sha = hash_object(content, "blob", write=False)
+                current_sha = hash_file(repo, rel_path, file_path, write=False)
                 staged_entry = staged_files.get(rel_path)
                 staged_sha = staged_entry[0] if staged_entry else None
 
@@ -188,7 +188,7 @@ def _get_working_changes(
                     if staged_sha or include_untracked:
                         working_changes[rel_path] = current_sha
                         # Actually store the content for later restoration
-                        hash_object(content, "blob", write=True)
+                        hash_file(repo, rel_path, file_path)
 
             except (IOError, OSError, UnicodeDecodeError):
                 pass
@@ -253,16 +253,14 @@ def _apply_stash_data(repo: Repository, stash_data: Dict) -> None:
         # Also restore to working directory
         for file_path, (sha, _, _) in stash_data["staged_files"].items():
             try:
-                obj_type, content = get_object(sha)
+                obj_type, content = read_blob(sha)
                 if obj_type == "blob":
                     # Create directory if needed
                     dir_path = os.path.dirname(file_path)
                     if dir_path:
                         os.makedirs(dir_path, exist_ok=True)
 
-                    # Write file
-                    with open(file_path, "wb") as f_out:
-                        f_out.write(content)
+                    _write_blob(repo, file_path, content)
             except (FileNotFoundError, IOError):
                 sys.stderr.write(
                     f"Warning: Could not restore staged file {file_path}\n"
@@ -271,20 +269,25 @@ def _apply_stash_data(repo: Repository, stash_data: Dict) -> None:
     # Restore working directory files
     for file_path, sha in stash_data["working_changes"].items():
         try:
-            obj_type, content = get_object(sha)
+            obj_type, content = read_blob(sha)
             if obj_type == "blob":
                 # Create directory if needed
                 dir_path = os.path.dirname(file_path)
                 if dir_path:
                     os.makedirs(dir_path, exist_ok=True)
 
-                # Write file
-                with open(file_path, "wb") as f:
-                    f.write(content)
+                _write_blob(repo, file_path, content)
         except (FileNotFoundError, IOError):
             sys.stderr.write(f"Warning: Could not restore {file_path}\n")
 
 
+def _write_blob(repo: Repository, file_path: str, content: bytes) -> None:
+    """Write restored content, replacing LFS pointers by their content."""
+    tracked = read_attributes(repo).matches(file_path.replace(os.sep, "/"))
+    pointer = parse_pointer(content) if tracked else None
+    smudge_to_file(repo, pointer, content, file_path)
+
+
 def _remove_stash(repo: Repository, stash_id: int) -> None:
     """Remove a stash from the list."""
     stashes = _get_all_stashes(repo)
@@ -7,8 +7,11 @@ Show repository statistics and object counts.
 import os
 from typing import Dict
 
+from ..core.odb import SQLITE_FILE, loose_object_database
+from ..core.refs import list_refs
 from ..core.repository import Repository
-from ..utils.helpers import ensure_repository, get_commit_data
+from ..core.shallow import read_shallow
+from ..utils.helpers import ensure_repository, get_commit_data, get_commit_parents
 
 
 def stats() -> None:
@@ -35,6 +38,7 @@ def _collect_stats(repo: Repository) -> Dict:
     if head_sha:
         visited = set()
         stack = [head_sha]
+        shallow = read_shallow(repo)
         while stack:
             sha = stack.pop()
             if sha in visited or not sha:
@@ -43,35 +47,14 @@ def _collect_stats(repo: Repository) -> Dict:
             stats["commits"] += 1
 
             try:
-                commit_data = get_commit_data(sha, repo=repo)
-                if "parent" in commit_data and commit_data["parent"]:
-                    stack.append(commit_data["parent"])
-                if "parents" in commit_data:
-                    stack.extend(p for p in commit_data["parents"] if p)
+                if sha not in shallow:
+                    stack.extend(get_commit_parents(get_commit_data(sha, repo=repo)))
             except ValueError:
                 pass
 
-    # Count branches
-    heads_dir = os.path.join(repo.ugit_dir, "refs", "heads")
-    if os.path.exists(heads_dir):
-        stats["branches"] = len(
-            [
-                f
-                for f in os.listdir(heads_dir)
-                if os.path.isfile(os.path.join(heads_dir, f))
-            ]
-        )
-
-    # Count tags
-    tags_dir = os.path.join(repo.ugit_dir, "refs", "tags")
-    if os.path.exists(tags_dir):
-        stats["tags"] = len(
-            [
-                f
-                for f in os.listdir(tags_dir)
-                if os.path.isfile(os.path.join(tags_dir, f))
-            ]
-        )
+    # Count branches and tags
+    stats["branches"] = len(list_refs(repo, ("refs/heads",)))
+    stats["tags"] = len(list_refs(repo, ("refs/tags",)))
 
     # Count objects and calculate size
     objects_dir = os.path.join(repo.ugit_dir, "objects")
@@ -85,6 +68,18 @@ def _collect_stats(repo: Repository) -> Dict:
                 except OSError:
                     pass
 
+    # Objects kept in a core.objectStorage backend
+    database = loose_object_database(repo)
+    if database is not None:
+        stats["objects"] += sum(1 for _ in database.iterate())
+        for suffix in ("", "-wal"):
+            try:
+                stats["size"] += os.path.getsize(
+                    os.path.join(repo.ugit_dir, SQLITE_FILE + suffix)
+                )
+            except OSError:
+                pass
+
     # Count files in index
     from ..core.repository import Index
 
@@ -4,10 +4,12 @@ Show repository status.
 
 import json
 import os
-from typing import Dict, List, Set
+from typing import Dict, List, Optional, Set
 
-from ..core.objects import get_object, hash_object
-from ..core.repository import Index
+from ..core.lfs import hash_file, size_differs
+from ..core.objects import get_object
+from ..core.repository import Index, Repository, stat_matches
+from ..core.sparse import SparseCones, read_sparse_cones
 from ..utils.helpers import (
     ensure_repository,
     get_ignored_patterns,
@@ -23,15 +25,23 @@ def status() -> None:
     index = Index(repo)
     index_data = index.read()
 
+    # Skip-worktree entries are not checked out, so never look for them
+    skip_worktree = index.read_skip_worktree()
+    worktree_data = {
+        path: entry for path, entry in index_data.items() if path not in skip_worktree
+    }
+
     # Get current HEAD commit for comparison
     head_sha = repo.get_head_ref()
     committed_files = _get_committed_files(head_sha) if head_sha else {}
 
     # Categorize files
     staged_files = _get_staged_files(index_data, committed_files)
-    modified_files = _get_modified_files(index_data)
-    untracked_files = _get_untracked_files(set(index_data.keys()))
-    deleted_files = _get_deleted_files(set(index_data.keys()))
+    modified_files = _get_modified_files(repo, worktree_data)
+    untracked_files = _get_untracked_files(
+        set(index_data.keys()), read_sparse_cones(repo)
+    )
+    deleted_files = _get_deleted_files(set(worktree_data.keys()))
 
     # Display status sections
     if staged_files:
@@ -91,21 +101,29 @@ def _get_staged_files(
     return staged
 
 
-def _get_modified_files(index_data: Dict[str, tuple]) -> List[str]:
-    """Get list of tracked files that have been modified."""
+def _get_modified_files(repo: Repository, index_data: Dict[str, tuple]) -> List[str]:
+    """
+    Get list of tracked files that have been modified.
+
+    An LFS file whose size differs from its pointer's is modified without
+    being hashed.
+    """
     modified = []
-    for path, (stored_sha, stored_mtime, stored_size) in index_data.items():
+    for path, entry in index_data.items():
+        stored_sha = entry[0]
         if os.path.exists(path):
             try:
                 stat = os.stat(path)
                 # Check metadata first for a quick check
-                if stat.st_mtime == stored_mtime and stat.st_size == stored_size:
+                if stat_matches(entry, stat):
                     continue  # Assumed unchanged
 
+                if size_differs(repo, path, stored_sha, stat.st_size):
+                    modified.append(f"M {path}")
+                    continue
+
                 # If metadata differs, then check hash
-                with open(path, "rb") as f:
-                    data = f.read()
-                current_sha = hash_object(data, "blob", write=False)
+                current_sha = hash_file(repo, path, path, write=False)
                 if current_sha != stored_sha:
                     modified.append(f"M {path}")
             except (IOError, OSError):
@@ -113,12 +131,19 @@ def _get_modified_files(index_data: Dict[str, tuple]) -> List[str]:
     return modified
 
 
-def _get_untracked_files(tracked_files: Set[str]) -> List[str]:
-    """Get list of untracked files, respecting .ugitignore patterns."""
+def _get_untracked_files(
+    tracked_files: Set[str], cones: Optional[SparseCones] = None
+) -> List[str]:
+    """
+    Get list of untracked files, respecting .ugitignore patterns.
+
+    With sparse checkout enabled only directories inside the cones are walked.
+    """
     untracked = []
     ignored_patterns = get_ignored_patterns()
+    include_dir = cones.includes_directory if cones is not None else None
 
-    for file_path in walk_files():
+    for file_path in walk_files(include_dir=include_dir):
         if file_path not in tracked_files and not should_ignore_file(
             file_path, ignored_patterns
         ):
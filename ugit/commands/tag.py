@@ -11,6 +11,7 @@ from typing import Optional
 
 from ..core.exceptions import InvalidRefError, UgitError
 from ..core.objects import hash_object
+from ..core.refs import delete_refs, list_refs, read_ref
 from ..core.repository import Repository
 from ..utils.atomic import atomic_write_text
 from ..utils.config import Config
@@ -54,31 +55,20 @@ def tag(
 
 def _list_tags(repo: Repository) -> None:
     """List all tags in the repository."""
-    tags_dir = os.path.join(repo.ugit_dir, "refs", "tags")
-    if not os.path.exists(tags_dir):
-        print("No tags found")
-        return
-
-    tags = sorted(os.listdir(tags_dir))
+    tags = list_refs(repo, ("refs/tags",))
     if not tags:
         print("No tags found")
         return
 
-    for tag_name in tags:
-        tag_path = os.path.join(tags_dir, tag_name)
-        try:
-            with open(tag_path, "r", encoding="utf-8") as f:
-                content = f.read().strip()
-
-            # Check if it's an annotated tag (starts with object SHA) or lightweight (direct commit SHA)
-            if len(content) == 40 and validate_sha(content):
-                # Lightweight tag - direct commit reference
-                print(tag_name)
-            else:
-                # Annotated tag - contains tag object SHA
-                print(f"{tag_name} (annotated)")
-        except (IOError, OSError):
+    for ref, content in tags.items():
+        tag_name = ref[len("refs/tags/") :]
+        # Check if it's an annotated tag (starts with object SHA) or lightweight (direct commit SHA)
+        if len(content) == 40 and validate_sha(content):
+            # Lightweight tag - direct commit reference
             print(tag_name)
+        else:
+            # Annotated tag - contains tag object SHA
+            print(f"{tag_name} (annotated)")
 
 
 def _create_lightweight_tag(
@@ -114,7 +104,7 @@ def _create_lightweight_tag(
     os.makedirs(tags_dir, exist_ok=True)
     tag_path = os.path.join(tags_dir, tag_name)
 
-    if os.path.exists(tag_path):
+    if read_ref(repo, f"refs/tags/{tag_name}"):
         raise UgitError(f"Tag '{tag_name}' already exists")
 
     atomic_write_text(tag_path, commit, create_dirs=True)
@@ -174,7 +164,7 @@ def _create_annotated_tag(
     os.makedirs(tags_dir, exist_ok=True)
     tag_path = os.path.join(tags_dir, tag_name)
 
-    if os.path.exists(tag_path):
+    if read_ref(repo, f"refs/tags/{tag_name}"):
         raise UgitError(f"Tag '{tag_name}' already exists")
 
     atomic_write_text(tag_path, tag_sha, create_dirs=True)
@@ -189,11 +179,9 @@ def _delete_tag(repo: Repository, tag_name: str) -> None:
         repo: Repository instance
         tag_name: Name of tag to delete
     """
-    tag_path = os.path.join(repo.ugit_dir, "refs", "tags", tag_name)
-    if not os.path.exists(tag_path):
+    if not delete_refs(repo, [f"refs/tags/{tag_name}"]):
         raise UgitError(f"Tag '{tag_name}' does not exist")
 
-    os.remove(tag_path)
     print(f"Deleted tag '{tag_name}'")
 
 
@@ -241,13 +229,10 @@ def get_tag_commit(repo: Repository, tag_name: str) -> str:
     Returns:
         Commit SHA
     """
-    tag_path = os.path.join(repo.ugit_dir, "refs", "tags", tag_name)
-    if not os.path.exists(tag_path):
+    content = read_ref(repo, f"refs/tags/{tag_name}")
+    if not content:
         raise UgitError(f"Tag '{tag_name}' does not exist")
 
-    with open(tag_path, "r", encoding="utf-8") as f:
-        content = f.read().strip()
-
     # If it's a lightweight tag, content is the commit SHA
     if len(content) == 40 and validate_sha(content):
         return content
@@ -9,6 +9,7 @@ import shutil
 from typing import Optional
 
 from ..core.exceptions import BranchNotFoundError, UgitError
+from ..core.refs import read_ref
 from ..core.repository import Repository
 from ..utils.helpers import ensure_repository, get_current_branch_name
 from ..utils.validation import validate_branch_name
@@ -72,8 +73,7 @@ def _add_worktree(repo: Repository, path: str, branch: Optional[str] = None) ->
         if not validate_branch_name(branch):
             raise UgitError(f"Invalid branch name: {branch}")
 
-        branch_path = os.path.join(repo.ugit_dir, "refs", "heads", branch)
-        if not os.path.exists(branch_path):
+        if not read_ref(repo, f"refs/heads/{branch}"):
             raise BranchNotFoundError(f"Branch '{branch}' does not exist")
     else:
         branch = get_current_branch_name(repo) or "main"
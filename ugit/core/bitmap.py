@@ -0,0 +1,568 @@
+"""
+Reachability bitmaps.
+
+A bitmap answers "which objects are reachable from this commit" without
+walking history. The .bitmap file next to a pack holds one bitmap per
+selected commit (every ref tip, plus a commit every BITMAP_INTERVAL along
+history), with bit i standing for the i-th object of the pack index.
+Objects reachable from several tips are then found by OR-ing bitmaps, and
+what a fetch must send is the wants' bitmap AND NOT the haves'.
+
+Only commits whose whole history is inside the pack get a bitmap, so a
+bitmap never leaves out an object. From a commit without one, the walk
+goes down until it reaches commits that have one; objects outside the pack
+found on the way are kept as a plain set.
+
+The file layout is:
+
+    header:  b"UBIT", version (4 bytes), pack checksum (20 bytes),
+             entry count (4 bytes)
+    types:   one bitmap per object type (tag, commit, tree, blob)
+    entries: index position of the commit (4 bytes), an XOR flag (1 byte),
+             then a bitmap
+    trailer: SHA-1 of everything before it
+
+Each bitmap is a 4-byte length and a zlib-compressed little-endian bit
+string. An entry with the XOR flag set stores its difference from the
+entry before it, which is usually far smaller; at most MAX_XOR_CHAIN
+entries in a row are stored that way, so reading one stays cheap.
+"""
+
+import hashlib
+import json
+import os
+import struct
+import threading
+import zlib
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from ..utils.atomic import atomic_write
+from ..utils.helpers import get_commit_parents
+from .chunking import parse_manifest, uses_chunking
+from .exceptions import CorruptPackError
+from .objects import get_object, object_exists
+from .pack import TYPE_NAMES, Pack, get_packs
+from .shallow import read_shallow
+
+if TYPE_CHECKING:
+    from .repository import Repository
+
+BITMAP_SIGNATURE = b"UBIT"
+BITMAP_VERSION = 1
+
+# Besides ref tips, one commit in this many along history gets a bitmap
+BITMAP_INTERVAL = 100
+
+# Longest run of entries stored as XORs against the entry before
+MAX_XOR_CHAIN = 10
+
+# Object types, in the order their bitmaps are stored and objects are listed
+TYPE_ORDER = ("tag", "commit", "tree", "blob")
+
+_HEADER = struct.Struct(">4sI20sI")
+_ENTRY = struct.Struct(">IBI")
+_TRAILER_SIZE = 20
+
+
+def bitmap_path(pack: Pack) -> str:
+    """Get the .bitmap path of a pack."""
+    return pack.path[: -len(".pack")] + ".bitmap"
+
+
+def _encode(bits: int) -> bytes:
+    data = zlib.compress(bits.to_bytes((bits.bit_length() + 7) // 8, "little"))
+    return struct.pack(">I", len(data)) + data
+
+
+def _decode(data: bytes, pos: int) -> Tuple[int, int]:
+    """Decode the bitmap at pos, returning it and the position after it."""
+    (length,) = struct.unpack_from(">I", data, pos)
+    start = pos + 4
+    if start + length > len(data):
+        raise CorruptPackError("Truncated bitmap")
+    try:
+        raw = zlib.decompress(data[start : start + length])
+    except zlib.error as e:
+        raise CorruptPackError(f"Corrupt bitmap: {e}") from e
+    return int.from_bytes(raw, "little"), start + length
+
+
+class PackBitmap:
+    """The reachability bitmaps of one pack."""
+
+    def __init__(self, pack: Pack):
+        """
+        Load a pack's .bitmap file.
+
+        Bitmaps of individual commits are decoded when first asked for.
+
+        Args:
+            pack: Pack the bitmaps describe
+
+        Raises:
+            CorruptPackError: If the file is invalid or belongs to another
+                version of the pack
+        """
+        self.pack = pack
+        self.path = bitmap_path(pack)
+        with open(self.path, "rb") as f:
+            data = f.read()
+        if len(data) < _HEADER.size + _TRAILER_SIZE:
+            raise CorruptPackError(f"Bitmap too short: {self.path}")
+        if hashlib.sha1(data[:-_TRAILER_SIZE], usedforsecurity=False).digest() != (
+            data[-_TRAILER_SIZE:]
+        ):
+            raise CorruptPackError(f"Bitmap checksum mismatch: {self.path}")
+
+        signature, version, checksum, count = _HEADER.unpack_from(data, 0)
+        if signature != BITMAP_SIGNATURE or version != BITMAP_VERSION:
+            raise CorruptPackError(f"Not a bitmap: {self.path}")
+        if checksum != pack.index.pack_checksum:
+            raise CorruptPackError(f"Bitmap is stale: {self.path}")
+
+        pos = _HEADER.size
+        self.types: Dict[str, int] = {}
+        for type_ in TYPE_ORDER:
+            self.types[type_], pos = _decode(data, pos)
+
+        self._data = data
+        self._entries: List[Tuple[int, int]] = []  # (XOR flag, data position)
+        self._by_sha: Dict[str, int] = {}
+        for i in range(count):
+            position, xor, length = _ENTRY.unpack_from(data, pos)
+            self._entries.append((xor, pos + _ENTRY.size - 4))
+            self._by_sha[pack.index.sha_at(position)] = i
+            pos += _ENTRY.size + length
+        self._decoded: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, sha: object) -> bool:
+        return sha in self._by_sha
+
+    def get(self, sha: str) -> Optional[int]:
+        """
+        Get the bitmap of a commit.
+
+        Args:
+            sha: Commit SHA
+
+        Returns:
+            Bitmap of every object reachable from the commit, or None if
+            the commit has no bitmap
+        """
+        i = self._by_sha.get(sha)
+        return None if i is None else self._entry(i)
+
+    def _entry(self, i: int) -> int:
+        with self._lock:
+            return self._entry_unlocked(i)
+
+    def _entry_unlocked(self, i: int) -> int:
+        bits = self._decoded.get(i)
+        if bits is None:
+            xor, pos = self._entries[i]
+            bits, _ = _decode(self._data, pos)
+            if xor:
+                bits ^= self._entry_unlocked(i - 1)
+            self._decoded[i] = bits
+        return bits
+
+
+_bitmap_cache: Dict[str, Tuple[int, PackBitmap]] = {}
+_bitmap_cache_lock = threading.Lock()
+
+
+def load_bitmap(repo: "Repository") -> Optional[PackBitmap]:
+    """
+    Get the bitmaps of a repository's largest pack that has them.
+
+    Shallow repositories never use bitmaps: a bitmap written before the
+    history was deepened would leave the new ancestors out.
+
+    Args:
+        repo: Repository instance
+
+    Returns:
+        The bitmaps, or None if no pack has a usable .bitmap
+    """
+    if read_shallow(repo):
+        return None
+    for pack in get_packs(os.path.join(repo.ugit_dir, "objects")):
+        path = bitmap_path(pack)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+        with _bitmap_cache_lock:
+            cached = _bitmap_cache.get(path)
+            if cached is not None and cached[0] == mtime and cached[1].pack is pack:
+                return cached[1]
+        try:
+            bitmap = PackBitmap(pack)
+        except (OSError, CorruptPackError, struct.error):
+            continue
+        with _bitmap_cache_lock:
+            _bitmap_cache[path] = (mtime, bitmap)
+        return bitmap
+    return None
+
+
+class Reachability:
+    """
+    The objects reachable from some tips.
+
+    Objects in the bitmapped pack are held as a bitmap, others as a set.
+    """
+
+    def __init__(
+        self,
+        pack: Pack,
+        bits: int,
+        types: Dict[str, int],
+        extra: Dict[str, str],
+    ):
+        """
+        Args:
+            pack: Pack the bit positions refer to
+            bits: Reachable objects in the pack
+            types: Object type bitmaps covering at least the reachable ones
+            extra: Reachable objects outside the pack, mapped to their type
+        """
+        self.pack = pack
+        self.bits = bits
+        self.types = types
+        self.extra = extra
+        self._view = bits.to_bytes((len(pack.index) + 7) // 8, "little")
+
+    def __contains__(self, sha: object) -> bool:
+        if not isinstance(sha, str):
+            return False
+        position = self.pack.index.position(sha)
+        if position is not None and self._view[position >> 3] >> (position & 7) & 1:
+            return True
+        return sha in self.extra
+
+    def __len__(self) -> int:
+        return bin(self.bits).count("1") + len(self.extra)
+
+    def __iter__(self) -> Iterator[str]:
+        index = self.pack.index
+        for position in _positions(self.bits):
+            yield index.sha_at(position)
+        yield from self.extra
+
+    def objects_by_type(
+        self, exclude: Optional["Reachability"] = None
+    ) -> Dict[str, List[str]]:
+        """
+        List the reachable objects of each type.
+
+        Args:
+            exclude: Reachable objects to leave out, found with the same pack
+
+        Returns:
+            Object SHAs by type, for each type in TYPE_ORDER. Objects
+            outside the pack come first, then packed ones by pack offset.
+        """
+        bits = self.bits
+        if exclude is not None:
+            bits &= ~exclude.bits
+        index = self.pack.index
+        listed: Dict[str, List[str]] = {}
+        for type_ in TYPE_ORDER:
+            shas = [
+                sha
+                for sha, extra_type in self.extra.items()
+                if extra_type == type_ and (exclude is None or sha not in exclude)
+            ]
+            packed = [
+                (index.offset_at(position), position)
+                for position in _positions(bits & self.types.get(type_, 0))
+            ]
+            shas.extend(index.sha_at(position) for _, position in sorted(packed))
+            listed[type_] = shas
+        return listed
+
+
+def _positions(bits: int) -> Iterator[int]:
+    """Yield the positions of the set bits, lowest first."""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for byte_index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield byte_index * 8 + low.bit_length() - 1
+            byte ^= low
+
+
+class _Walker:
+    """Marks objects reachable from tips into bitmaps over one pack."""
+
+    def __init__(
+        self,
+        repo: "Repository",
+        pack: Pack,
+        lookup: Callable[[str], Optional[int]],
+        stop_at: Iterable[str] = (),
+        incomplete: Iterable[str] = (),
+    ):
+        """
+        Args:
+            repo: Repository holding the objects
+            pack: Pack the bit positions refer to
+            lookup: Gets the bitmap of a commit, if it has one
+            stop_at: Shallow boundary commits, whose parents are not followed
+            incomplete: Commits whose history is known to leave the pack
+        """
+        self.repo = repo
+        self.pack = pack
+        self.index = pack.index
+        self.lookup = lookup
+        self.stop_at = frozenset(stop_at)
+        self.incomplete = frozenset(incomplete)
+        self.size = (len(self.index) + 7) // 8
+        self.marked = bytearray(self.size)
+        self.merged = 0
+        self.merged_view = bytes(self.size)
+        self.types = {type_: bytearray(self.size) for type_ in TYPE_ORDER}
+        self.extra: Dict[str, str] = {}
+        self.complete = True
+        self.follow_chunks = uses_chunking(repo)
+
+    def _covered(self, position: int) -> bool:
+        byte, bit = position >> 3, position & 7
+        return bool((self.marked[byte] | self.merged_view[byte]) >> bit & 1)
+
+    def _mark(self, sha: str, position: Optional[int], type_: str) -> None:
+        if position is None:
+            self.extra[sha] = type_
+            self.complete = False
+        else:
+            self.marked[position >> 3] |= 1 << (position & 7)
+            self.types[type_][position >> 3] |= 1 << (position & 7)
+
+    def walk(self, tips: Iterable[str]) -> None:
+        """Mark everything reachable from the tips."""
+        stack: List[Tuple[str, Optional[str]]] = [(sha, None) for sha in tips]
+        while stack:
+            sha, type_ = stack.pop()
+            position = self.index.position(sha)
+            if position is not None and self._covered(position):
+                continue
+            if position is None and sha in self.extra:
+                continue
+            if type_ in ("blob", "chunk"):
+                self._mark(sha, position, "blob")
+                if type_ == "blob" and self.follow_chunks:
+                    blob = _read_object(self.repo, self.pack, sha)
+                    chunks = parse_manifest(blob[1]) if blob is not None else None
+                    stack.extend((chunk, "chunk") for chunk, _ in chunks or [])
+                continue
+            if sha in self.incomplete:
+                self.complete = False
+                continue
+            bits = self.lookup(sha)
+            if bits is not None:
+                self.merged |= bits
+                self.merged_view = self.merged.to_bytes(self.size, "little")
+                continue
+
+            obj = _read_object(self.repo, self.pack, sha)
+            if obj is None:
+                self.complete = False  # Missing: promised or past a boundary
+                continue
+            type_, data = obj
+            try:
+                content = json.loads(data.decode())
+            except (ValueError, UnicodeDecodeError):
+                content = None
+            self._mark(sha, position, type_)
+            if type_ == "commit" and isinstance(content, dict):
+                if content.get("tree"):
+                    stack.append((content["tree"], "tree"))
+                if sha in self.stop_at:
+                    self.complete = False
+                else:
+                    parents = get_commit_parents(content)
+                    stack.extend((parent, None) for parent in parents)
+            elif type_ == "tree" and content is not None:
+                entries = content.items() if isinstance(content, dict) else content
+                stack.extend((str(blob), "blob") for _, blob in entries)
+            elif type_ == "tag" and isinstance(content, dict):
+                if content.get("object"):
+                    stack.append((content["object"], None))
+
+    def bits(self) -> int:
+        """Everything marked so far, as one bitmap."""
+        return self.merged | int.from_bytes(self.marked, "little")
+
+    def type_bits(self, stored: Dict[str, int]) -> Dict[str, int]:
+        """The stored type bitmaps plus the types of objects walked."""
+        return {
+            type_: stored.get(type_, 0) | int.from_bytes(marked, "little")
+            for type_, marked in self.types.items()
+        }
+
+
+def _read_object(
+    repo: "Repository", pack: Pack, sha: str
+) -> Optional[Tuple[str, bytes]]:
+    """Read an object, from the pack if it is there, without asking a promisor."""
+    try:
+        offset = pack.index.find(sha)
+        if offset is not None:
+            type_code, data = pack.read_at(offset)
+            return TYPE_NAMES[type_code], data
+        if object_exists(sha, repo=repo):
+            return get_object(sha, repo=repo)
+    except (FileNotFoundError, ValueError, CorruptPackError):
+        pass
+    return None
+
+
+def find_reachable(
+    repo: "Repository", tips: Iterable[str], bitmap: Optional[PackBitmap] = None
+) -> Optional[Reachability]:
+    """
+    Find every object reachable from some tips, using bitmaps.
+
+    Missing objects (promised to a partial clone, or beyond a shallow
+    boundary) are skipped rather than fetched.
+
+    Args:
+        repo: Repository instance
+        tips: Commit or tag SHAs, such as every ref
+        bitmap: Bitmaps to use; found with load_bitmap if not given
+
+    Returns:
+        The reachable objects, or None if the repository has no bitmaps
+    """
+    if bitmap is None:
+        bitmap = load_bitmap(repo)
+        if bitmap is None:
+            return None
+    walker = _Walker(repo, bitmap.pack, bitmap.get, read_shallow(repo))
+    walker.walk(tips)
+    return Reachability(
+        bitmap.pack, walker.bits(), walker.type_bits(bitmap.types), walker.extra
+    )
+
+
+def write_bitmap(repo: "Repository", pack_path: str, tips: Iterable[str]) -> int:
+    """
+    Write reachability bitmaps for a pack.
+
+    Every tip whose history is entirely in the pack gets a bitmap, as does
+    one commit in BITMAP_INTERVAL of that history. Nothing is written for a
+    shallow repository.
+
+    Args:
+        repo: Repository the pack belongs to
+        pack_path: The .pack file
+        tips: Commit or tag SHAs to select commits from, normally every ref
+
+    Returns:
+        Number of commits given a bitmap
+    """
+    pack = Pack(pack_path)
+    try:
+        return _write_bitmap(repo, pack, tips)
+    finally:
+        pack.close()
+
+
+def _write_bitmap(repo: "Repository", pack: Pack, tips: Iterable[str]) -> int:
+    path = bitmap_path(pack)
+    if read_shallow(repo):
+        if os.path.exists(path):
+            os.remove(path)
+        return 0
+
+    # Peel the tips to commits and find the packed history, parents first
+    tip_commits: List[str] = []
+    for sha in tips:
+        obj = _read_object(repo, pack, sha)
+        while obj is not None and obj[0] == "tag":
+            sha = json.loads(obj[1].decode()).get("object", "")
+            obj = _read_object(repo, pack, sha)
+        if obj is not None and obj[0] == "commit" and sha not in tip_commits:
+            tip_commits.append(sha)
+    order = _commits_parents_first(repo, pack, tip_commits)
+
+    selected = set(tip_commits)
+    selected.update(order[BITMAP_INTERVAL - 1 :: BITMAP_INTERVAL])
+
+    bitmaps: Dict[str, int] = {}
+    positions: List[int] = []
+    incomplete: Set[str] = set()
+    types = {type_: 0 for type_ in TYPE_ORDER}
+    for sha in order:
+        if sha not in selected:
+            continue
+        walker = _Walker(repo, pack, bitmaps.get, incomplete=incomplete)
+        walker.walk([sha])
+        if not walker.complete:
+            incomplete.add(sha)
+            continue
+        bitmaps[sha] = walker.bits()
+        positions.append(pack.index.position(sha) or 0)
+        types = walker.type_bits(types)
+
+    entries: List[bytes] = []
+    previous: Optional[int] = None
+    chain = 0
+    for position, bits in zip(positions, bitmaps.values()):
+        encoded = _encode(bits)
+        xor = 0
+        if previous is not None and chain < MAX_XOR_CHAIN:
+            delta = _encode(bits ^ previous)
+            if len(delta) < len(encoded):
+                encoded, xor = delta, 1
+        chain = chain + 1 if xor else 0
+        previous = bits
+        entries.append(struct.pack(">IB", position, xor) + encoded)
+
+    data = _HEADER.pack(
+        BITMAP_SIGNATURE, BITMAP_VERSION, pack.index.pack_checksum, len(entries)
+    )
+    data += b"".join(_encode(types[type_]) for type_ in TYPE_ORDER)
+    data += b"".join(entries)
+    data += hashlib.sha1(data, usedforsecurity=False).digest()
+    atomic_write(path, data, create_dirs=True)
+    return len(entries)
+
+
+def _commits_parents_first(
+    repo: "Repository", pack: Pack, tips: List[str]
+) -> List[str]:
+    """List the packed commits reachable from the tips, parents before children."""
+    parents: Dict[str, List[str]] = {}
+    order: List[str] = []
+    stack: List[Tuple[str, bool]] = [(sha, False) for sha in reversed(tips)]
+    while stack:
+        sha, expanded = stack.pop()
+        if expanded:
+            order.append(sha)
+            continue
+        if sha in parents:
+            continue
+        obj = _read_object(repo, pack, sha) if sha in pack else None
+        if obj is None or obj[0] != "commit":
+            parents[sha] = []
+            continue
+        parents[sha] = get_commit_parents(json.loads(obj[1].decode()))
+        stack.append((sha, True))
+        stack.extend((parent, False) for parent in reversed(parents[sha]))
+    return order
@@ -0,0 +1,196 @@
+"""
+Bundle files.
+
+A bundle carries refs and the objects they need in one file, so history
+can be moved without a server: copied to another machine, or kept on
+local disk to seed CI caches. The layout follows Git's version 2 bundles:
+
+    # v2 ugit bundle
+    -<sha> <comment>        one line per prerequisite commit
+    <sha> <refname>         one line per ref (HEAD included when bundled)
+    <empty line>
+    <pack>
+
+Prerequisites are commits the bundle's history stops at. The receiving
+repository must already have them; a bundle without prerequisites holds
+complete history and can be cloned from.
+"""
+
+import os
+import shutil
+from typing import IO, TYPE_CHECKING, Dict, Iterable, List, NamedTuple
+
+from ..utils.validation import validate_sha
+from .exceptions import UgitError
+from .objects import object_exists
+from .pack import index_pack, new_temp_pack_path, write_pack
+from .revlist import list_objects
+from .shallow import read_shallow
+
+if TYPE_CHECKING:
+    from .repository import Repository
+
+BUNDLE_SIGNATURE = b"# v2 ugit bundle\n"
+
+# Longest header a reader accepts before giving up on a file
+MAX_HEADER_SIZE = 16 * 1024 * 1024
+
+
+class BundleHeader(NamedTuple):
+    """The refs and prerequisites of a bundle, and where its pack starts."""
+
+    refs: Dict[str, str]
+    prerequisites: List[str]
+    pack_offset: int
+
+
+def is_bundle(path: str) -> bool:
+    """
+    Check whether a path is a bundle file.
+
+    Args:
+        path: File path or remote URL
+
+    Returns:
+        True if the path is a file starting with the bundle signature
+    """
+    if not os.path.isfile(path):
+        return False
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(BUNDLE_SIGNATURE)) == BUNDLE_SIGNATURE
+    except (IOError, OSError):
+        return False
+
+
+def read_bundle_header(path: str) -> BundleHeader:
+    """
+    Read the header of a bundle.
+
+    Args:
+        path: Bundle file
+
+    Returns:
+        The bundle's refs, prerequisites and pack offset
+
+    Raises:
+        UgitError: If the file is not a valid bundle
+    """
+    try:
+        with open(path, "rb") as f:
+            return _parse_header(f, path)
+    except (IOError, OSError) as e:
+        raise UgitError(f"Cannot read bundle {path}: {e}") from e
+
+
+def _parse_header(f: IO[bytes], path: str) -> BundleHeader:
+    """Parse a bundle header up to the empty line before the pack."""
+    if f.readline() != BUNDLE_SIGNATURE:
+        raise UgitError(f"Not a bundle: {path}")
+
+    refs: Dict[str, str] = {}
+    prerequisites: List[str] = []
+    while True:
+        line = f.readline()
+        if not line.endswith(b"\n") or f.tell() > MAX_HEADER_SIZE:
+            raise UgitError(f"Bundle header is truncated: {path}")
+        text = line.decode("utf-8", errors="replace").rstrip("\n")
+        if not text:
+            return BundleHeader(refs, prerequisites, f.tell())
+        if text.startswith("-"):
+            sha = text[1:].split(" ", 1)[0]
+            if not validate_sha(sha):
+                raise UgitError(f"Invalid bundle prerequisite: {text}")
+            prerequisites.append(sha)
+            continue
+        sha, _, ref = text.partition(" ")
+        if not validate_sha(sha) or not ref:
+            raise UgitError(f"Invalid bundle ref line: {text}")
+        refs[ref] = sha
+
+
+def create_bundle(
+    repo: "Repository",
+    path: str,
+    refs: Dict[str, str],
+    prerequisites: Iterable[str] = (),
+) -> int:
+    """
+    Write refs and the objects they need into a bundle.
+
+    Args:
+        repo: Repository to bundle from
+        path: Bundle file to write; replaced only once it is complete
+        refs: Full ref names (and optionally HEAD) mapped to SHAs
+        prerequisites: Commits whose history is left out of the bundle
+
+    Returns:
+        Number of objects in the bundle
+
+    Raises:
+        UgitError: If there is nothing to bundle or history is incomplete
+    """
+    if not refs:
+        raise UgitError("Refusing to create an empty bundle")
+    if read_shallow(repo):
+        raise UgitError("Cannot create a bundle from a shallow repository")
+
+    excluded = sorted(set(prerequisites))
+    try:
+        shas = list_objects(repo, sorted(set(refs.values())), excluded)
+    except ValueError as e:
+        raise UgitError(f"Cannot bundle: {e}") from e
+
+    header = [BUNDLE_SIGNATURE.decode()]
+    header.extend(f"-{sha}\n" for sha in excluded)
+    header.extend(f"{sha} {ref}\n" for ref, sha in refs.items())
+    header.append("\n")
+
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write("".join(header).encode("utf-8"))
+            write_pack(repo, shas, f)
+        os.replace(tmp_path, path)
+    except FileNotFoundError as e:
+        raise UgitError(f"Cannot bundle: {e}") from e
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return len(shas)
+
+
+def unbundle(repo: "Repository", path: str) -> Dict[str, str]:
+    """
+    Install the pack of a bundle into a repository.
+
+    Refs are not changed; the caller decides which ones to update.
+
+    Args:
+        repo: Repository receiving the objects
+        path: Bundle file
+
+    Returns:
+        The bundle's refs mapped to SHAs
+
+    Raises:
+        UgitError: If the bundle is invalid or a prerequisite is missing
+    """
+    header = read_bundle_header(path)
+    missing = [sha for sha in header.prerequisites if not object_exists(sha, repo=repo)]
+    if missing:
+        raise UgitError(
+            "Repository lacks the bundle's prerequisite commits: "
+            + ", ".join(sha[:8] for sha in missing)
+        )
+
+    tmp_path = new_temp_pack_path(repo)
+    try:
+        with open(path, "rb") as src, open(tmp_path, "wb") as dst:
+            src.seek(header.pack_offset)
+            shutil.copyfileobj(src, dst)
+        index_pack(repo, tmp_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return header.refs
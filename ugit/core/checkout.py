@@ -1,29 +1,99 @@
 """
 Core checkout functionality for ugit.
+
+Checkout is incremental: the tree currently at HEAD is compared with the
+target tree, and only paths whose blobs differ are deleted, updated or
+created. The index stat cache is used to tell whether a working tree file
+still matches what was checked out, so unchanged files are never read.
+
+When enough files have to be written, blob inflation and file writes are
+spread over a thread pool (zlib and file I/O release the GIL). Work is
+grouped by directory and all directories are created up front, so workers
+never contend on makedirs. The pool is tuned with the checkout.workers and
+checkout.thresholdForParallelism config settings.
+
+With sparse checkout enabled, paths outside the cones are recorded in the
+index with the skip-worktree bit and are never written to disk.
+
+LFS pointers (see core.lfs) are replaced by their content as they are
+written. Content missing from the LFS store is downloaded first, in
+parallel; if that fails the pointers are written as they are.
 """
 
+import concurrent.futures
 import os
 import shutil
 import sys
-from typing import TYPE_CHECKING
+from stat import S_ISREG
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
 
-from ..utils.helpers import get_commit_data, get_tree_entries
-from .objects import get_object
+from ..utils.config import Config
+from ..utils.helpers import get_commit_data, get_tree_files
+from .chunking import read_blob
+from .exceptions import CheckoutConflictError, UgitError
+from .lfs import LfsPointer, fetch_lfs_objects, find_pointers, hash_file, smudge_to_file
+from .promisor import fetch_promised_objects
+from .repository import Index, stat_matches
+from .sparse import SparseCones, read_sparse_cones
 
 if TYPE_CHECKING:
     from .repository import Repository
 
+IndexEntry = Tuple[str, float, int]
+
+# Defaults for parallel checkout
+DEFAULT_PARALLEL_THRESHOLD = 100
+PARALLEL_BATCH_SIZE = 64
+
 
 def checkout_commit(
-    repo: "Repository", commit_sha: str, update_head: bool = True
+    repo: "Repository",
+    commit_sha: str,
+    update_head: bool = True,
+    force: bool = False,
 ) -> None:
-    """Checkout files from a specific commit."""
+    """
+    Checkout files from a specific commit.
+
+    Callers must invoke this before moving HEAD or the branch ref, since
+    the HEAD tree is the starting point of the two-tree comparison.
+
+    Args:
+        repo: Repository instance
+        commit_sha: Commit to check out
+        update_head: Point HEAD directly at the commit afterwards
+        force: Discard local changes instead of refusing to overwrite them
+
+    Raises:
+        CheckoutConflictError: If local changes would be overwritten
+    """
     try:
-        clear_working_directory()
         commit = get_commit_data(commit_sha, repo=repo)
         tree_sha = commit.get("tree")
-        if tree_sha:
-            checkout_tree(repo, tree_sha, ".")
+        target_files = get_tree_files(tree_sha, repo=repo) if tree_sha else {}
+        head_files = _get_head_files(repo)
+
+        index = Index(repo)
+        index_data = index.read()
+
+        removals, writes, new_index, new_skip = _plan_checkout(
+            repo,
+            head_files,
+            target_files,
+            index_data,
+            force,
+            cones=read_sparse_cones(repo),
+            skip_worktree=index.read_skip_worktree(),
+        )
+
+        for path in removals:
+            _remove_file(repo, path)
+        written = _write_files(repo, repo.path, writes)
+        for path, sha in writes:
+            stat = written[path]
+            new_index[path] = (sha, stat.st_mtime, stat.st_size)
+
+        index.write(new_index, skip_worktree=new_skip)
 
         if update_head:
             head_path = os.path.join(repo.ugit_dir, "HEAD")
@@ -35,22 +105,331 @@ def checkout_commit(
         print(f"Error checking out commit {commit_sha}: {e}", file=sys.stderr)
 
 
+def _get_head_files(repo: "Repository") -> Dict[str, str]:
+    """Get the path -> blob SHA listing of the tree at HEAD."""
+    head_sha = repo.get_head_ref()
+    if not head_sha:
+        return {}
+
+    try:
+        commit = get_commit_data(head_sha, repo=repo)
+        tree_sha = commit.get("tree")
+        return get_tree_files(tree_sha, repo=repo) if tree_sha else {}
+    except ValueError:
+        return {}
+
+
+def _plan_checkout(
+    repo: "Repository",
+    head_files: Dict[str, str],
+    target_files: Dict[str, str],
+    index_data: Dict[str, IndexEntry],
+    force: bool,
+    cones: Optional[SparseCones] = None,
+    skip_worktree: Optional[Set[str]] = None,
+) -> Tuple[List[str], List[Tuple[str, str]], Dict[str, IndexEntry], Set[str]]:
+    """
+    Work out which paths a checkout has to touch.
+
+    Args:
+        repo: Repository instance
+        head_files: Files in the HEAD tree
+        target_files: Files in the target tree
+        index_data: Current index entries (used as a stat cache)
+        force: Overwrite local changes instead of refusing
+        cones: Sparse checkout cones, or None to check out everything
+        skip_worktree: Paths currently flagged skip-worktree in the index
+
+    Returns:
+        Tuple of (paths to remove, (path, sha) pairs to write, new index,
+        new skip-worktree paths). Index entries for written paths are
+        filled in after writing.
+
+    Raises:
+        CheckoutConflictError: If local changes would be overwritten
+    """
+    removals: List[str] = []
+    writes: List[Tuple[str, str]] = []
+    conflicts: List[str] = []
+    old_skip = skip_worktree or set()
+
+    if force:
+        # A forced checkout makes the index match the target exactly
+        new_index: Dict[str, IndexEntry] = {}
+        new_skip: Set[str] = set()
+        paths = set(head_files) | set(target_files) | set(index_data)
+    else:
+        new_index = dict(index_data)
+        new_skip = set(old_skip)
+        paths = set(head_files) | set(target_files)
+
+    for path in sorted(paths):
+        head_sha = head_files.get(path)
+        target_sha = target_files.get(path)
+        entry = index_data.get(path)
+        was_skipped = path in old_skip
+        skip = bool(target_sha) and cones is not None and not cones.matches(path)
+
+        if (
+            not force
+            and head_sha == target_sha
+            and entry is not None
+            and skip == was_skipped
+        ):
+            continue  # Untouched by this checkout, keep local state
+
+        # What the working tree holds now and should hold afterwards
+        head_wt = None if was_skipped else head_sha
+        target_wt = None if skip else target_sha
+
+        if skip and target_sha is not None:
+            new_skip.add(path)
+            if entry is not None and entry[0] == target_sha:
+                skip_entry = entry
+            else:
+                skip_entry = (target_sha, 0.0, -1)
+            if head_wt is None:
+                # Never materialized, so there is nothing on disk to check
+                new_index[path] = skip_entry
+                continue
+        else:
+            new_skip.discard(path)
+
+        current_sha, stat = _working_file_sha(repo, path, entry)
+
+        if current_sha == target_wt:
+            # Already in the target state, only the index may need updating
+            if target_wt and stat is not None:
+                new_index[path] = (target_wt, stat.st_mtime, stat.st_size)
+            elif skip:
+                new_index[path] = skip_entry
+            else:
+                new_index.pop(path, None)
+            continue
+
+        if not force:
+            if head_wt == target_wt:
+                # Not tracked in the index but unchanged between trees:
+                # keep the local file, cached as needing a re-hash
+                if target_wt:
+                    new_index[path] = (target_wt, 0.0, -1)
+                else:
+                    new_index.pop(path, None)
+                continue
+
+            if entry is not None and not was_skipped:
+                staged_sha: Optional[str] = entry[0]
+            else:
+                staged_sha = head_wt
+            if current_sha != head_wt or staged_sha != head_wt:
+                conflicts.append(path)
+                continue
+
+        if target_wt is None:
+            if current_sha is not None:
+                removals.append(path)
+            if skip:
+                new_index[path] = skip_entry
+            else:
+                new_index.pop(path, None)
+        else:
+            writes.append((path, target_wt))
+
+    if conflicts:
+        raise CheckoutConflictError(
+            "Your local changes to the following files would be overwritten "
+            "by checkout:\n"
+            + "\n".join(f"\t{path}" for path in conflicts)
+            + "\nCommit or stash your changes before switching.",
+            paths=conflicts,
+        )
+
+    return removals, writes, new_index, new_skip
+
+
+def _working_file_sha(
+    repo: "Repository", path: str, entry: Optional[IndexEntry]
+) -> Tuple[Optional[str], Optional[os.stat_result]]:
+    """
+    Get the blob SHA of a working tree file, using the index stat cache.
+
+    Returns:
+        Tuple of (SHA or None if the file does not exist, stat result)
+    """
+    file_path = os.path.join(repo.path, path)
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None, None
+
+    if not S_ISREG(stat.st_mode):
+        return "", stat  # A directory is in the way, never matches a blob
+
+    if entry is not None and stat_matches(entry, stat):
+        return entry[0], stat
+
+    return hash_file(repo, path, file_path, write=False), stat
+
+
+def get_parallel_checkout_settings(repo: "Repository") -> Tuple[int, int]:
+    """
+    Get the parallel checkout configuration.
+
+    Args:
+        repo: Repository instance
+
+    Returns:
+        Tuple of (worker count, minimum number of files to go parallel).
+        A worker count below 1 means one worker per CPU.
+    """
+    config = Config(repo.path)
+    try:
+        workers = int(config.get("checkout", "workers", "0") or "0")
+    except ValueError:
+        workers = 0
+    if workers < 1:
+        workers = os.cpu_count() or 1
+
+    try:
+        threshold = int(
+            config.get(
+                "checkout",
+                "thresholdForParallelism",
+                str(DEFAULT_PARALLEL_THRESHOLD),
+            )
+            or DEFAULT_PARALLEL_THRESHOLD
+        )
+    except ValueError:
+        threshold = DEFAULT_PARALLEL_THRESHOLD
+
+    return workers, threshold
+
+
+def _write_files(
+    repo: "Repository", root: str, writes: List[Tuple[str, str]]
+) -> Dict[str, os.stat_result]:
+    """
+    Write blobs into a directory, in parallel when there are enough of them.
+
+    Args:
+        repo: Repository to read blobs from
+        root: Directory the paths are relative to
+        writes: (path, blob SHA) pairs to write
+
+    Returns:
+        Dictionary mapping each written path to its new stat result
+    """
+    # A partial clone downloads every missing blob in one go
+    fetch_promised_objects(repo, [sha for _, sha in writes])
+    pointers = find_pointers(repo, dict(writes))
+    if pointers:
+        _fetch_lfs_content(repo, pointers.values())
+
+    workers, threshold = get_parallel_checkout_settings(repo)
+    if workers <= 1 or len(writes) < max(threshold, 2):
+        return {
+            path: _write_file(repo, root, path, sha, pointers.get(path))
+            for path, sha in writes
+        }
+
+    # Group by directory and create every directory before starting workers
+    groups: Dict[str, List[Tuple[str, str]]] = {}
+    for path, sha in writes:
+        groups.setdefault(os.path.dirname(path), []).append((path, sha))
+    for dirname in sorted(groups):
+        if dirname:
+            os.makedirs(os.path.join(root, dirname), exist_ok=True)
+
+    # Split very large directories so one directory cannot starve the pool
+    batches = [
+        group[i : i + PARALLEL_BATCH_SIZE]
+        for group in groups.values()
+        for i in range(0, len(group), PARALLEL_BATCH_SIZE)
+    ]
+
+    results: Dict[str, os.stat_result] = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_write_batch, repo, root, batch, pointers)
+            for batch in batches
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            results.update(future.result())
+    return results
+
+
+def _fetch_lfs_content(repo: "Repository", pointers: Iterable[LfsPointer]) -> None:
+    """Download missing LFS content, leaving pointers in place on failure."""
+    try:
+        fetch_lfs_objects(repo, pointers)
+    except UgitError as e:
+        print(f"Warning: {e}", file=sys.stderr)
+        print(
+            "Warning: files without their LFS content were checked out as "
+            "pointers; run 'ugit lfs pull' to download it",
+            file=sys.stderr,
+        )
+
+
+def _write_batch(
+    repo: "Repository",
+    root: str,
+    batch: List[Tuple[str, str]],
+    pointers: Dict[str, LfsPointer],
+) -> Dict[str, os.stat_result]:
+    """Write a batch of blobs whose directories already exist."""
+    return {
+        path: _write_file(repo, root, path, sha, pointers.get(path), make_dirs=False)
+        for path, sha in batch
+    }
+
+
+def _write_file(
+    repo: "Repository",
+    root: str,
+    path: str,
+    sha: str,
+    pointer: Optional[LfsPointer] = None,
+    make_dirs: bool = True,
+) -> os.stat_result:
+    """
+    Write a blob to the working tree and return the new file's stat.
+
+    An LFS pointer is replaced by its content when the store has it.
+    """
+    file_path = os.path.join(root, path)
+    if make_dirs:
+        dirname = os.path.dirname(file_path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+    type_, content = read_blob(sha, repo=repo)
+    smudge_to_file(repo, pointer, content, file_path)
+    return os.stat(file_path)
+
+
+def _remove_file(repo: "Repository", path: str) -> None:
+    """Remove a file from the working tree and prune empty parent directories."""
+    file_path = os.path.join(repo.path, path)
+    try:
+        os.remove(file_path)
+    except OSError:
+        return
+
+    parent = os.path.dirname(file_path)
+    while parent and parent != repo.path and parent.startswith(repo.path):
+        try:
+            os.rmdir(parent)
+        except OSError:
+            break  # Not empty
+        parent = os.path.dirname(parent)
+
+
 def checkout_tree(repo: "Repository", tree_sha: str, path: str) -> None:
-    """Recursively checkout a tree object."""
+    """Write every file of a tree object into a directory."""
     try:
-        entries = get_tree_entries(tree_sha, repo=repo)
-        for mode, name, sha in entries:
-            entry_path = os.path.join(path, name)
-            if mode.startswith("10"):  # File
-                dirname = os.path.dirname(entry_path)
-                if dirname:
-                    os.makedirs(dirname, exist_ok=True)
-                type_, content = get_object(sha, repo=repo)
-                with open(entry_path, "wb") as f:
-                    f.write(content)
-            elif mode.startswith("40"):  # Directory
-                os.makedirs(entry_path, exist_ok=True)
-                checkout_tree(repo, sha, entry_path)
+        files = get_tree_files(tree_sha, repo=repo)
+        _write_files(repo, path, sorted(files.items()))
     except (ValueError, FileNotFoundError) as e:
         print(f"Error checking out tree {tree_sha}: {e}", file=sys.stderr)
 
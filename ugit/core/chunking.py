@@ -0,0 +1,339 @@
+"""
+Content-defined chunking of large files.
+
+With chunking.enabled, files of chunking.threshold bytes or more (16 MiB
+by default) are split into chunks with a FastCDC-style rolling hash, and
+each chunk is stored as a blob of its own. The file's blob is a small
+manifest listing the chunks. Chunk boundaries depend only on the bytes
+around them, so an edit only changes the chunks it touches; a 1 KB change
+to a 2 GB file stores and transfers a few new chunks, not a new 2 GB blob.
+
+Manifests are blobs that start with MANIFEST_MAGIC, so packs, bitmaps and
+transfers need no new object type. hash_blob() and read_blob() replace
+hash_object() and get_object() wherever file content is hashed or read;
+read_blob() reassembles chunked files transparently.
+
+History walks (gc, transfers, bitmaps, fsck) normally treat blobs as
+leaves. In a repository that holds chunked blobs they also read blobs to
+follow manifests to their chunks. A repository is marked as holding them
+(objects/info/chunked) when it writes a manifest or indexes a pack that
+contains one.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from ..utils.config import Config
+from .objects import (
+    get_alternate_object_dirs,
+    get_object,
+    hash_object,
+    object_exists,
+    object_write_batch,
+)
+
+if TYPE_CHECKING:
+    from .repository import Repository
+
+MANIFEST_MAGIC = b"ugit-chunked-blob\0"
+MARKER_FILE = os.path.join("info", "chunked")
+
+DEFAULT_THRESHOLD = 16 * 1024 * 1024
+
+# Chunk sizes. Changing them changes how existing files would be chunked.
+AVERAGE_CHUNK_SIZE = 256 * 1024
+MIN_CHUNK_SIZE = AVERAGE_CHUNK_SIZE // 4
+MAX_CHUNK_SIZE = AVERAGE_CHUNK_SIZE * 4
+
+# Normalized chunking: a stricter mask before the average size and a
+# looser one after it keep chunk sizes close to the average
+_SMALL_MASK_BITS = 20
+_LARGE_MASK_BITS = 16
+
+# The rolling hash is the gear hash with XOR instead of addition,
+# h = (h << 1) ^ GEAR[byte]. Bit j of h only depends on the last j + 1
+# bytes, and bits combine without carries, so every position of a block
+# can be hashed at once: plane j holds bit j of GEAR[byte] for each byte,
+# one byte per position, and bit j of h over the block is plane j XOR bit
+# j - 1 of h one position earlier. A position is a cut candidate when the
+# low mask bits of h are all zero.
+_WINDOW = _SMALL_MASK_BITS
+_BLOCK_SIZE = 4 * MAX_CHUNK_SIZE
+
+# Random but fixed, so every repository cuts the same content the same way
+_GEAR = [
+    int.from_bytes(hashlib.sha256(bytes([i])).digest()[:4], "big") for i in range(256)
+]
+_PLANES = [bytes((gear >> bit) & 1 for gear in _GEAR) for bit in range(_WINDOW)]
+
+# Config file path -> (mtime, threshold, or None when chunking is off)
+_thresholds: Dict[str, Tuple[int, Optional[int]]] = {}
+_marker_lock = threading.Lock()
+
+
+def chunk_boundaries(data: bytes) -> List[Tuple[int, int]]:
+    """
+    Split data into content-defined chunks.
+
+    Args:
+        data: Content to split
+
+    Returns:
+        (start, end) offsets of consecutive chunks covering all of data
+    """
+    candidates = _Candidates(data)
+    boundaries = []
+    start = 0
+    while start < len(data):
+        end = min(start + MAX_CHUNK_SIZE, len(data))
+        if end - start > MIN_CHUNK_SIZE:
+            normal = min(start + AVERAGE_CHUNK_SIZE, end)
+            cut = candidates.find(True, start + MIN_CHUNK_SIZE, normal)
+            if cut < 0:
+                cut = candidates.find(False, normal, end)
+            if cut >= 0:
+                end = cut + 1
+        boundaries.append((start, end))
+        start = end
+    return boundaries
+
+
+class _Candidates:
+    """Cut candidates of data, computed a block at a time."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.blocks: Dict[int, Tuple[bytes, bytes]] = {}
+
+    def find(self, small: bool, start: int, end: int) -> int:
+        """Find the first candidate in [start, end) under one of the masks."""
+        while start < end:
+            base = start - start % _BLOCK_SIZE
+            zeros = self._block(base)[0 if small else 1]
+            found = zeros.find(b"\0", start - base, min(end - base, _BLOCK_SIZE))
+            if found >= 0:
+                return base + found
+            start = base + _BLOCK_SIZE
+        return -1
+
+    def _block(self, base: int) -> Tuple[bytes, bytes]:
+        block = self.blocks.get(base)
+        if block is None:
+            # Chunks never span more than two blocks
+            self.blocks = {b: v for b, v in self.blocks.items() if b >= base}
+            block = self.blocks[base] = _hash_block(self.data, base)
+        return block
+
+
+def _hash_block(data: bytes, base: int) -> Tuple[bytes, bytes]:
+    """
+    Hash every position of one block.
+
+    Returns:
+        Two strings with one byte per position, zero where the small
+        (respectively large) mask bits of the hash are all zero
+    """
+    lead = min(base, _WINDOW)  # Earlier bytes still in the hash window
+    piece = data[base - lead : base + _BLOCK_SIZE]
+    length = len(piece)
+
+    bit = 0
+    small = large = 0
+    for j, plane in enumerate(_PLANES):
+        bit = int.from_bytes(piece.translate(plane), "little") ^ (bit << 8)
+        if j < _LARGE_MASK_BITS:
+            large |= bit
+        else:
+            small |= bit
+    small |= large
+
+    def lanes(value: int) -> bytes:
+        return (value & ((1 << (8 * length)) - 1)).to_bytes(length, "little")[lead:]
+
+    return lanes(small), lanes(large)
+
+
+def hash_blob(
+    data: bytes, write: bool = True, repo: Optional["Repository"] = None
+) -> str:
+    """
+    Hash file content as a blob, chunking it if it is large enough.
+
+    Content that happens to start with MANIFEST_MAGIC is always chunked,
+    so it can never be mistaken for a manifest.
+
+    Args:
+        data: File content
+        write: Whether to store the blob (and its chunks)
+        repo: Repository instance (optional, defaults to current repo)
+
+    Returns:
+        SHA of the blob, or of the manifest for chunked content
+    """
+    from .repository import Repository
+
+    if repo is None:
+        repo = Repository()
+
+    threshold = get_chunking_threshold(repo)
+    chunked = threshold is not None and len(data) >= threshold
+    if not chunked and not data.startswith(MANIFEST_MAGIC):
+        return hash_object(data, "blob", write=write, repo=repo)
+
+    with object_write_batch(repo) if write else nullcontext():
+        chunks = [
+            [hash_object(data[start:end], "blob", write=write, repo=repo), end - start]
+            for start, end in chunk_boundaries(data)
+        ]
+        manifest = json.dumps(
+            {"size": len(data), "chunks": chunks}, separators=(",", ":")
+        ).encode()
+        sha = hash_object(MANIFEST_MAGIC + manifest, "blob", write=write, repo=repo)
+    if write:
+        mark_chunked(os.path.join(repo.ugit_dir, "objects"))
+    return sha
+
+
+def read_blob(sha: str, repo: Optional["Repository"] = None) -> Tuple[str, bytes]:
+    """
+    Read an object like get_object, reassembling chunked blobs.
+
+    Args:
+        sha: SHA-1 hash of the object
+        repo: Repository instance (optional, defaults to current repo)
+
+    Returns:
+        Tuple of (object_type, content)
+
+    Raises:
+        FileNotFoundError: If the object or one of its chunks is missing
+        ValueError: If the object is invalid or its chunks do not add up
+    """
+    type_, data = get_object(sha, repo=repo)
+    chunks = parse_manifest(data) if type_ == "blob" else None
+    if chunks is None:
+        return type_, data
+
+    content = b"".join(get_object(chunk, repo=repo)[1] for chunk, _ in chunks)
+    expected = sum(size for _, size in chunks)
+    if len(content) != expected:
+        raise ValueError(f"Chunked blob {sha} does not match its chunks")
+    return type_, content
+
+
+def parse_manifest(data: bytes) -> Optional[List[Tuple[str, int]]]:
+    """
+    Parse the content of a chunked blob's manifest.
+
+    Args:
+        data: Blob content
+
+    Returns:
+        (chunk SHA, size) pairs, or None if the blob is not a manifest
+    """
+    if not data.startswith(MANIFEST_MAGIC):
+        return None
+    try:
+        manifest = json.loads(data[len(MANIFEST_MAGIC) :].decode())
+        return [(str(sha), int(size)) for sha, size in manifest["chunks"]]
+    except (ValueError, UnicodeDecodeError, KeyError, TypeError):
+        return None
+
+
+def chunk_references(repo: "Repository", blob_shas: Iterable[str]) -> List[str]:
+    """
+    Find the chunks of the chunked blobs among some blobs.
+
+    Blobs are only read in repositories that hold chunked blobs; missing
+    blobs are skipped rather than fetched.
+
+    Args:
+        repo: Repository instance
+        blob_shas: Blob SHAs, such as the entries of trees being walked
+
+    Returns:
+        Chunk SHAs, without duplicates
+    """
+    if not uses_chunking(repo):
+        return []
+    chunks: Dict[str, None] = {}
+    for sha in blob_shas:
+        if not object_exists(sha, repo=repo):
+            continue
+        try:
+            type_, data = get_object(sha, repo=repo)
+        except (FileNotFoundError, ValueError):
+            continue
+        manifest = parse_manifest(data) if type_ == "blob" else None
+        chunks.update(dict.fromkeys(chunk for chunk, _ in manifest or []))
+    return list(chunks)
+
+
+def get_chunking_threshold(repo: "Repository") -> Optional[int]:
+    """
+    Get the size from which files are chunked.
+
+    Args:
+        repo: Repository instance
+
+    Returns:
+        chunking.threshold in bytes, or None when chunking.enabled is off
+    """
+    config_path = os.path.join(repo.ugit_dir, "config")
+    try:
+        mtime = os.stat(config_path).st_mtime_ns
+    except OSError:
+        mtime = -1
+    cached = _thresholds.get(config_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    config = Config(repo.path)
+    threshold: Optional[int] = None
+    if (config.get("chunking", "enabled", "false") or "").lower() == "true":
+        try:
+            threshold = int(config.get("chunking", "threshold") or DEFAULT_THRESHOLD)
+        except ValueError:
+            threshold = DEFAULT_THRESHOLD
+    _thresholds[config_path] = (mtime, threshold)
+    return threshold
+
+
+def uses_chunking(repo: "Repository") -> bool:
+    """
+    Check whether a repository, or one it borrows from, holds chunked blobs.
+
+    Args:
+        repo: Repository instance
+
+    Returns:
+        True if history walks must follow manifests to their chunks
+    """
+    if get_chunking_threshold(repo) is not None:
+        return True
+    objects_dirs = [os.path.join(repo.ugit_dir, "objects")]
+    objects_dirs.extend(get_alternate_object_dirs(repo))
+    return any(
+        os.path.exists(os.path.join(objects_dir, MARKER_FILE))
+        for objects_dir in objects_dirs
+    )
+
+
+def mark_chunked(objects_dir: str) -> None:
+    """
+    Record that an object directory holds chunked blobs.
+
+    Args:
+        objects_dir: Path to the objects directory
+    """
+    path = os.path.join(objects_dir, MARKER_FILE)
+    if os.path.exists(path):
+        return
+    with _marker_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a", encoding="utf-8"):
+            pass
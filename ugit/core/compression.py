@@ -0,0 +1,106 @@
+"""
+zlib compression of objects.
+
+core.compression sets the zlib level of loose objects: -1 for zlib's
+default, 0 to store without compressing, 1 (fastest) to 9 (smallest).
+pack.compression sets the level of pack entries and defaults to
+core.compression.
+
+Content that is already compressed (JPEG, ZIP, Parquet, ...) gains
+nothing from deflate, which then costs the most CPU for no saving. Before
+compressing anything large, a probe deflates a few small samples at level
+1; content none of them shrinks is stored at level 0, which costs about as
+much as a copy.
+"""
+
+import os
+import zlib
+from typing import Dict, Tuple
+
+DEFAULT_LEVEL = zlib.Z_DEFAULT_COMPRESSION
+
+# Smaller objects are compressed as configured without probing
+PROBE_MIN_SIZE = 16 * 1024
+PROBE_SAMPLE_SIZE = 4096
+PROBE_SAMPLES = 3
+
+# A sample that keeps this much of its size did not compress
+INCOMPRESSIBLE_RATIO = 0.95
+
+# Config file path -> (mtime, loose level, pack level)
+_levels: Dict[str, Tuple[int, int, int]] = {}
+
+
+def get_compression_levels(ugit_dir: str) -> Tuple[int, int]:
+    """
+    Get a repository's core.compression and pack.compression levels.
+
+    Args:
+        ugit_dir: Path to the repository's .ugit directory
+
+    Returns:
+        Tuple of (loose object level, pack level); invalid values fall
+        back to the default
+    """
+    config_path = os.path.join(ugit_dir, "config")
+    try:
+        mtime = os.stat(config_path).st_mtime_ns
+    except OSError:
+        mtime = -1
+    cached = _levels.get(config_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1], cached[2]
+
+    from ..utils.config import Config  # Config saves through atomic_write
+
+    config = Config(os.path.dirname(ugit_dir))
+    loose = _parse_level(config.get("core", "compression"), DEFAULT_LEVEL)
+    packed = _parse_level(config.get("pack", "compression"), loose)
+    _levels[config_path] = (mtime, loose, packed)
+    return loose, packed
+
+
+def _parse_level(value: object, default: int) -> int:
+    try:
+        level = int(str(value).strip())
+    except ValueError:
+        return default
+    return level if -1 <= level <= 9 else default
+
+
+def is_incompressible(data: bytes) -> bool:
+    """
+    Check whether content looks already compressed.
+
+    Args:
+        data: Content about to be compressed
+
+    Returns:
+        True if the content is large and no sample of its start, middle
+        and end shrinks under fast deflate
+    """
+    if len(data) < PROBE_MIN_SIZE:
+        return False
+    step = (len(data) - PROBE_SAMPLE_SIZE) // (PROBE_SAMPLES - 1)
+    for i in range(PROBE_SAMPLES):
+        sample = data[i * step : i * step + PROBE_SAMPLE_SIZE]
+        compressed = len(zlib.compress(sample, 1))
+        if compressed < len(sample) * INCOMPRESSIBLE_RATIO:
+            return False
+    return True
+
+
+def compress(data: bytes, level: int = DEFAULT_LEVEL) -> bytes:
+    """
+    Compress content, storing it uncompressed if it will not shrink.
+
+    Args:
+        data: Content to compress
+        level: zlib level to use for compressible content
+
+    Returns:
+        A zlib stream of the content
+    """
+    if level != 0 and is_incompressible(data):
+        level = 0
+    return zlib.compress(data, level)
@@ -56,3 +56,27 @@ class NonFastForwardError(UgitError):
     """Raised on a rejected non-fast-forward push."""
 
     pass
+
+
+class CheckoutConflictError(UgitError):
+    """Raised when a checkout would overwrite local changes."""
+
+    def __init__(
+        self,
+        message: str = "Local changes would be overwritten by checkout",
+        paths: Optional[List[str]] = None,
+    ) -> None:
+        super().__init__(message)
+        self.paths = paths or []
+
+
+class CorruptPackError(UgitError):
+    """Raised when a pack file or pack index fails verification."""
+
+    pass
+
+
+class RefUpdateError(UgitError):
+    """Raised when a ref changed or is locked while being updated."""
+
+    pass
@@ -0,0 +1,635 @@
+"""
+Large file storage (LFS) pointers for ugit.
+
+Paths matched by a ``filter=lfs`` line in .ugitattributes are committed
+as small pointer blobs, in the format git-lfs uses:
+
+    version https://git-lfs.github.com/spec/v1
+    oid sha256:<hex>
+    size <bytes>
+
+The file content goes to a content store, .ugit/lfs/objects/ab/cd/<oid>,
+outside the object database, so packs, transfers and history walks only
+ever see the pointers. add "cleans" a tracked file into its pointer;
+checkout "smudges" a pointer back into the content. Content missing from
+the store is downloaded from the LFS remote (lfs.url, or the promisor or
+origin remote) when checkout needs it, lfs.concurrentTransfers objects at
+a time, and push uploads the content of the pointers it sends.
+
+Status compares a changed file's size with the size recorded in its
+pointer first, so a multi-gigabyte file whose size changed is known to
+differ without being hashed, and diff shows LFS files as changes to their
+pointers rather than diffing their content. Files are hashed and stored a
+block at a time, never read into memory whole.
+
+.ugitattributes uses .ugitignore patterns, one per line followed by its
+attributes; the last line matching a path decides whether it is tracked.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from ..utils.atomic import fsync_directory, get_fsync_method
+from ..utils.config import Config
+from ..utils.helpers import is_http_url, is_local_path, should_ignore_file
+from .chunking import hash_blob
+from .exceptions import UgitError
+from .objects import get_object, hash_object
+
+if TYPE_CHECKING:
+    from .repository import Repository
+
+ATTRIBUTES_FILE = ".ugitattributes"
+LFS_ATTRIBUTES = "filter=lfs diff=lfs merge=lfs -text"
+POINTER_VERSION = "https://git-lfs.github.com/spec/v1"
+
+# Pointers are tiny; anything larger is file content
+MAX_POINTER_SIZE = 1024
+
+DEFAULT_CONCURRENT_TRANSFERS = 8
+
+# Bytes read at a time when hashing or copying content
+BLOCK_SIZE = 1024 * 1024
+
+_POINTER_RE = re.compile(rb"version (\S+)\noid sha256:([0-9a-f]{64})\nsize (\d+)\n\Z")
+_OID_RE = re.compile(r"[0-9a-f]{64}\Z")
+
+# Attributes file path -> (mtime, attributes)
+_attributes_cache: Dict[str, Tuple[int, "LfsAttributes"]] = {}
+_attributes_lock = threading.Lock()
+
+
+class LfsPointer(NamedTuple):
+    """The SHA-256 and size of a file kept in the LFS content store."""
+
+    oid: str
+    size: int
+
+    def encode(self) -> bytes:
+        """Format the pointer as the content of its blob."""
+        return (
+            f"version {POINTER_VERSION}\noid sha256:{self.oid}\nsize {self.size}\n"
+        ).encode()
+
+
+def parse_pointer(data: bytes) -> Optional[LfsPointer]:
+    """
+    Parse the content of a pointer blob.
+
+    Args:
+        data: Blob content
+
+    Returns:
+        The pointer, or None if the content is not one
+    """
+    if len(data) > MAX_POINTER_SIZE:
+        return None
+    match = _POINTER_RE.match(data)
+    if match is None:
+        return None
+    return LfsPointer(match.group(2).decode(), int(match.group(3)))
+
+
+class LfsAttributes:
+    """Matches repository paths against the lines of .ugitattributes."""
+
+    def __init__(self, text: str = ""):
+        """
+        Initialize the matcher.
+
+        Args:
+            text: Content of a .ugitattributes file
+        """
+        # (pattern, tracked by LFS), in file order
+        self.rules: List[Tuple[str, bool]] = []
+        for line in text.splitlines():
+            fields = line.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            self.rules.append((fields[0], "filter=lfs" in fields[1:]))
+
+    @property
+    def patterns(self) -> List[str]:
+        """Patterns whose files are tracked by LFS."""
+        return [pattern for pattern, tracked in self.rules if tracked]
+
+    def matches(self, path: str) -> bool:
+        """
+        Check whether a file is tracked by LFS.
+
+        Args:
+            path: File path relative to the repository root
+
+        Returns:
+            True if the last line matching the path sets filter=lfs
+        """
+        for pattern, tracked in reversed(self.rules):
+            if should_ignore_file(path, [pattern]):
+                return tracked
+        return False
+
+
+def read_attributes(repo: "Repository") -> LfsAttributes:
+    """
+    Read the .ugitattributes file of a repository's working tree.
+
+    Args:
+        repo: Repository instance
+
+    Returns:
+        Attribute matcher, empty if there is no .ugitattributes file
+    """
+    path = os.path.join(repo.path, ATTRIBUTES_FILE)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return LfsAttributes()
+    cached = _attributes_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            attributes = LfsAttributes(f.read())
+    except (OSError, UnicodeDecodeError):
+        attributes = LfsAttributes()
+    with _attributes_lock:
+        _attributes_cache[path] = (mtime, attributes)
+    return attributes
+
+
+def attributes_for_files(repo: "Repository", files: Dict[str, str]) -> LfsAttributes:
+    """
+    Get the attributes that apply to a set of files about to be written.
+
+    Args:
+        repo: Repository instance
+        files: Path -> blob SHA listing, such as a tree being checked out
+
+    Returns:
+        The attributes of the listing's own .ugitattributes, or of the
+        working tree when the listing does not include one
+    """
+    sha = files.get(ATTRIBUTES_FILE)
+    if sha is None:
+        return read_attributes(repo)
+    try:
+        return LfsAttributes(get_object(sha, repo=repo)[1].decode("utf-8"))
+    except (FileNotFoundError, ValueError, UnicodeDecodeError):
+        return read_attributes(repo)
+
+
+def lfs_object_path(repo: "Repository", oid: str) -> str:
+    """Get the content store path of an LFS object."""
+    return os.path.join(repo.ugit_dir, "lfs", "objects", oid[:2], oid[2:4], oid)
+
+
+def lfs_object_exists(repo: "Repository", oid: str) -> bool:
+    """Check whether an LFS object is in the content store."""
+    return os.path.exists(lfs_object_path(repo, oid))
+
+
+def store_lfs_object(
+    repo: "Repository", blocks: Iterable[bytes], oid: Optional[str] = None
+) -> LfsPointer:
+    """
+    Add content to the LFS content store.
+
+    The content is hashed while it is written to a temporary file, which
+    is renamed into place, so a partial or corrupt object is never seen.
+
+    Args:
+        repo: Repository instance
+        blocks: The content, in pieces
+        oid: SHA-256 the content must have, if known
+
+    Returns:
+        Pointer to the stored content
+
+    Raises:
+        UgitError: If the content does not match oid
+    """
+    tmp_dir = os.path.join(repo.ugit_dir, "lfs", "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for block in blocks:
+                digest.update(block)
+                size += len(block)
+                f.write(block)
+            if get_fsync_method(repo.ugit_dir) != "none":
+                f.flush()
+                os.fsync(f.fileno())
+
+        pointer = LfsPointer(digest.hexdigest(), size)
+        if oid is not None and pointer.oid != oid:
+            raise UgitError(f"LFS object {oid} does not match its content")
+        path = lfs_object_path(repo, pointer.oid)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.chmod(tmp_path, 0o444)
+            os.replace(tmp_path, path)
+            if get_fsync_method(repo.ugit_dir) != "none":
+                fsync_directory(os.path.dirname(path))
+        return pointer
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def read_blocks(path: str) -> Iterator[bytes]:
+    """Read a file a block at a time."""
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+            yield block
+
+
+def clean_file(
+    repo: "Repository", path: str, file_path: Optional[str] = None, write: bool = True
+) -> Optional[bytes]:
+    """
+    Turn an LFS-tracked working tree file into its pointer.
+
+    A file that already holds a pointer, as left by a checkout that could
+    not download the content, is its own pointer.
+
+    Args:
+        repo: Repository instance
+        path: File path relative to the repository root
+        file_path: Where the file is on disk (defaults to the working tree)
+        write: Whether to add the content to the content store
+
+    Returns:
+        Pointer blob content, or None if the file is not tracked by LFS
+
+    Raises:
+        OSError: If the file cannot be read
+    """
+    if not read_attributes(repo).matches(path):
+        return None
+    if file_path is None:
+        file_path = os.path.join(repo.path, path)
+
+    if os.path.getsize(file_path) <= MAX_POINTER_SIZE:
+        with open(file_path, "rb") as f:
+            data = f.read()
+        if parse_pointer(data) is not None:
+            return data
+
+    if write:
+        return store_lfs_object(repo, read_blocks(file_path)).encode()
+    digest = hashlib.sha256()
+    size = 0
+    for block in read_blocks(file_path):
+        digest.update(block)
+        size += len(block)
+    return LfsPointer(digest.hexdigest(), size).encode()
+
+
+def hash_file(
+    repo: "Repository", path: str, file_path: Optional[str] = None, write: bool = True
+) -> str:
+    """
+    Hash a working tree file as a blob, as a pointer if LFS tracks it.
+
+    Args:
+        repo: Repository instance
+        path: File path relative to the repository root
+        file_path: Where the file is on disk (defaults to the working tree)
+        write: Whether to store the blob (and the LFS content)
+
+    Returns:
+        SHA of the blob
+
+    Raises:
+        OSError: If the file cannot be read
+    """
+    if file_path is None:
+        file_path = os.path.join(repo.path, path)
+    pointer = clean_file(repo, path, file_path, write=write)
+    if pointer is not None:
+        return hash_object(pointer, "blob", write=write, repo=repo)
+    with open(file_path, "rb") as f:
+        data = f.read()
+    return hash_blob(data, write=write, repo=repo)
+
+
+def size_differs(repo: "Repository", path: str, sha: str, size: int) -> bool:
+    """
+    Check a file's size against the size its pointer blob records.
+
+    Args:
+        repo: Repository instance
+        path: File path relative to the repository root
+        sha: Blob SHA the file is compared with
+        size: Size of the working tree file
+
+    Returns:
+        True if LFS tracks the file and the sizes differ, so it has
+        changed without needing to be hashed. A file small enough to be
+        a pointer left by checkout always has to be hashed.
+    """
+    if size <= MAX_POINTER_SIZE or not read_attributes(repo).matches(path):
+        return False
+    pointer = read_pointer(repo, sha)
+    return pointer is not None and pointer.size != size
+
+
+def read_pointer(repo: "Repository", sha: str) -> Optional[LfsPointer]:
+    """
+    Read a blob as a pointer.
+
+    Args:
+        repo: Repository instance
+        sha: Blob SHA
+
+    Returns:
+        The pointer, or None if the blob is missing or not a pointer
+    """
+    try:
+        type_, data = get_object(sha, repo=repo)
+    except (FileNotFoundError, ValueError):
+        return None
+    return parse_pointer(data) if type_ == "blob" else None
+
+
+def find_pointers(
+    repo: "Repository",
+    files: Dict[str, str],
+    attributes: Optional[LfsAttributes] = None,
+) -> Dict[str, LfsPointer]:
+    """
+    Find the pointers among the LFS-tracked files of a listing.
+
+    Args:
+        repo: Repository instance
+        files: Path -> blob SHA listing
+        attributes: Attributes to use (defaults to those of the listing)
+
+    Returns:
+        Path -> pointer for every tracked file whose blob is a pointer
+    """
+    if attributes is None:
+        attributes = attributes_for_files(repo, files)
+    if not attributes.rules:
+        return {}
+    pointers = {}
+    for path, sha in files.items():
+        if attributes.matches(path):
+            pointer = read_pointer(repo, sha)
+            if pointer is not None:
+                pointers[path] = pointer
+    return pointers
+
+
+def find_new_pointers(
+    repo: "Repository", wants: Iterable[str], haves: Iterable[str] = ()
+) -> List[LfsPointer]:
+    """
+    Find the pointers introduced by commits the other side lacks.
+
+    Args:
+        repo: Repository instance
+        wants: Commits being sent
+        haves: Commits the other side already has
+
+    Returns:
+        Pointers in the new commits' trees, without duplicates
+    """
+    from ..utils.helpers import get_commit_data, get_tree_files
+    from .revlist import walk_commits
+
+    commits, _ = walk_commits(repo, wants, haves)
+    checked: Set[str] = set()
+    pointers: Dict[LfsPointer, None] = {}
+    for commit_sha in commits:
+        tree_sha = get_commit_data(commit_sha, repo=repo).get("tree")
+        files = get_tree_files(tree_sha, repo=repo) if tree_sha else {}
+        new_files = {path: sha for path, sha in files.items() if sha not in checked}
+        checked.update(files.values())
+        attributes = attributes_for_files(repo, files)
+        found = find_pointers(repo, new_files, attributes)
+        pointers.update(dict.fromkeys(found.values()))
+    return list(pointers)
+
+
+def has_lfs_objects(repo: "Repository") -> bool:
+    """Check whether a repository has ever stored LFS content."""
+    return os.path.isdir(os.path.join(repo.ugit_dir, "lfs", "objects"))
+
+
+def get_lfs_url(repo: "Repository") -> Optional[str]:
+    """
+    Get the URL LFS content is downloaded from and uploaded to.
+
+    Args:
+        repo: Repository instance
+
+    Returns:
+        lfs.url, else the URL of the promisor remote or of origin
+    """
+    from .promisor import get_promisor_remote
+
+    config = Config(repo.path)
+    url = config.get("lfs", "url")
+    if url:
+        return url
+    remote_name = get_promisor_remote(repo) or "origin"
+    return config.get("remote", f"{remote_name}.url") or None
+
+
+def get_concurrent_transfers(repo: "Repository") -> int:
+    """Get lfs.concurrentTransfers, the number of objects moved at once."""
+    try:
+        value = int(
+            Config(repo.path).get(
+                "lfs", "concurrentTransfers", str(DEFAULT_CONCURRENT_TRANSFERS)
+            )
+            or DEFAULT_CONCURRENT_TRANSFERS
+        )
+    except ValueError:
+        value = DEFAULT_CONCURRENT_TRANSFERS
+    return max(value, 1)
+
+
+def fetch_lfs_objects(
+    repo: "Repository", pointers: Iterable[LfsPointer], url: Optional[str] = None
+) -> int:
+    """
+    Download the content of pointers that is missing from the store.
+
+    Args:
+        repo: Repository instance
+        pointers: Pointers whose content is needed
+        url: Where to download from (defaults to get_lfs_url)
+
+    Returns:
+        Number of objects downloaded
+
+    Raises:
+        UgitError: If some content could not be downloaded
+    """
+    missing = [
+        pointer
+        for pointer in dict.fromkeys(pointers)
+        if not lfs_object_exists(repo, pointer.oid)
+    ]
+    if not missing:
+        return 0
+    url = url or get_lfs_url(repo)
+    if not url:
+        raise UgitError(
+            f"{len(missing)} LFS object(s) missing and no LFS remote to fetch from"
+        )
+
+    if is_http_url(url):
+        from ..commands.http_remote import download_lfs_object_http
+
+        def fetch(pointer: LfsPointer) -> None:
+            download_lfs_object_http(repo, url, pointer.oid)
+
+    elif is_local_path(url):
+        source = _local_repository(url)
+
+        def fetch(pointer: LfsPointer) -> None:
+            path = lfs_object_path(source, pointer.oid)
+            if not os.path.exists(path):
+                raise UgitError(f"LFS object {pointer.oid} not found in {url}")
+            store_lfs_object(repo, read_blocks(path), pointer.oid)
+
+    else:
+        raise UgitError(f"LFS remote protocol not supported: {url}")
+
+    _transfer(repo, missing, fetch, "download")
+    return len(missing)
+
+
+def push_lfs_objects(
+    repo: "Repository", url: str, pointers: Iterable[LfsPointer]
+) -> int:
+    """
+    Upload the content of pointers to a remote's content store.
+
+    Args:
+        repo: Repository instance
+        url: Remote repository path or HTTP URL
+        pointers: Pointers being pushed
+
+    Returns:
+        Number of objects uploaded
+
+    Raises:
+        UgitError: If local content is missing or an upload fails
+    """
+    pointers = list(dict.fromkeys(pointers))
+    missing = [p.oid for p in pointers if not lfs_object_exists(repo, p.oid)]
+    if missing:
+        raise UgitError(
+            f"Cannot push: LFS content of {missing[0]} is missing "
+            f"({len(missing)} object(s)); run 'ugit lfs pull' first"
+        )
+
+    uploaded: List[LfsPointer] = []
+    lock = threading.Lock()
+
+    if is_http_url(url):
+        from ..commands.http_remote import upload_lfs_object_http
+
+        def push(pointer: LfsPointer) -> None:
+            path = lfs_object_path(repo, pointer.oid)
+            if upload_lfs_object_http(repo, url, pointer.oid, path):
+                with lock:
+                    uploaded.append(pointer)
+
+    elif is_local_path(url):
+        target = _local_repository(url)
+
+        def push(pointer: LfsPointer) -> None:
+            if lfs_object_exists(target, pointer.oid):
+                return
+            path = lfs_object_path(repo, pointer.oid)
+            store_lfs_object(target, read_blocks(path), pointer.oid)
+            with lock:
+                uploaded.append(pointer)
+
+    else:
+        raise UgitError(f"LFS remote protocol not supported: {url}")
+
+    _transfer(repo, pointers, push, "upload")
+    return len(uploaded)
+
+
+def _local_repository(url: str) -> "Repository":
+    from .repository import Repository
+
+    if not os.path.isdir(os.path.join(url, ".ugit")):
+        raise UgitError(f"Not a ugit repository: {url}")
+    return Repository(url)
+
+
+def _transfer(
+    repo: "Repository",
+    pointers: List[LfsPointer],
+    transfer: Callable[[LfsPointer], None],
+    action: str,
+) -> None:
+    """Run transfer on every pointer, a few at a time, and report failures."""
+    workers = min(get_concurrent_transfers(repo), len(pointers))
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = [(p, executor.submit(transfer, p)) for p in pointers]
+        errors = []
+        for pointer, future in futures:
+            try:
+                future.result()
+            except (UgitError, OSError) as e:
+                errors.append(f"{pointer.oid[:10]}: {e}")
+    if errors:
+        raise UgitError(
+            f"Failed to {action} {len(errors)} LFS object(s):\n  " + "\n  ".join(errors)
+        )
+
+
+def smudge_to_file(
+    repo: "Repository", pointer: Optional[LfsPointer], content: bytes, file_path: str
+) -> None:
+    """
+    Write a blob to a working tree file, replacing a pointer by its content.
+
+    A pointer whose content is not in the store is written as is.
+
+    Args:
+        repo: Repository instance
+        pointer: The blob's pointer, or None if it is not an LFS file
+        content: Blob content
+        file_path: File to write
+    """
+    if pointer is not None and lfs_object_exists(repo, pointer.oid):
+        shutil.copyfile(lfs_object_path(repo, pointer.oid), file_path)
+        return
+    with open(file_path, "wb") as f:
+        f.write(content)
+
+
+def is_valid_oid(oid: str) -> bool:
+    """Check that an LFS object ID is a lowercase hex SHA-256."""
+    return _OID_RE.match(oid) is not None
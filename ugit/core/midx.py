@@ -0,0 +1,316 @@
+"""
+Multi-pack index.
+
+Every pack has its own .idx, so finding an object in a repository with
+many packs means a binary search in each of them in turn. The
+multi-pack-index in objects/pack covers all the packs at once: a single
+sorted SHA table maps each object to a pack and an offset, so a lookup is
+one binary search however many packs there are. Its layout is:
+
+    header:  b"MIDX", version (4 bytes), pack count (4 bytes),
+             object count (4 bytes)
+    names:   the pack file names, each ending in a NUL byte
+    fanout:  256 cumulative counts by first SHA byte
+    SHAs:    sorted 20-byte object SHAs
+    objects: pack number and 4-byte offset (with an 8-byte table for
+             offsets past 2 GiB, as in pack indexes)
+    trailer: SHA-1 of everything before it
+
+An object stored in several packs is mapped to the largest of them. Packs
+added after the index was written are searched one by one as before, and
+an index naming a pack that no longer exists is not used.
+"""
+
+import hashlib
+import os
+import struct
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from ..utils.atomic import atomic_write
+from .exceptions import CorruptPackError
+from .pack import (
+    Pack,
+    bisect_sha_table,
+    decode_offset,
+    encode_fanout,
+    encode_offsets,
+    get_pack_dir,
+    get_packs,
+)
+
+MIDX_FILE = "multi-pack-index"
+MIDX_SIGNATURE = b"MIDX"
+MIDX_VERSION = 1
+
+_HEADER = struct.Struct(">4sIII")
+_TRAILER_SIZE = 20
+
+
+class MultiPackIndex:
+    """Read access to a multi-pack-index."""
+
+    def __init__(self, path: str):
+        """
+        Load a multi-pack-index file.
+
+        Args:
+            path: Path of the multi-pack-index
+
+        Raises:
+            CorruptPackError: If the file is not a valid multi-pack-index
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self._data = data = f.read()
+
+        if len(data) < _HEADER.size + 1024 + _TRAILER_SIZE:
+            raise CorruptPackError(f"Not a multi-pack-index: {path}")
+        signature, version, pack_count, count = _HEADER.unpack_from(data, 0)
+        if signature != MIDX_SIGNATURE or version != MIDX_VERSION:
+            raise CorruptPackError(f"Not a multi-pack-index: {path}")
+
+        pos = _HEADER.size
+        self.pack_names: List[str] = []
+        for _ in range(pack_count):
+            end = data.find(b"\0", pos)
+            if end < 0:
+                raise CorruptPackError(f"Truncated multi-pack-index: {path}")
+            self.pack_names.append(data[pos:end].decode("utf-8"))
+            pos = end + 1
+
+        self._fanout = struct.unpack_from(">256I", data, pos)
+        self._count: int = count
+        self._sha_start = pos + 1024
+        self._pack_start = self._sha_start + 20 * count
+        self._offset_start = self._pack_start + 4 * count
+        self._large_start = self._offset_start + 4 * count
+        if self._fanout[255] != count or len(data) < self._large_start + 20:
+            raise CorruptPackError(f"Truncated multi-pack-index: {path}")
+
+        self._packs: Optional[Tuple[List[Pack], List[Pack]]] = None
+        self._packs_source: Optional[List[Pack]] = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def verify_checksum(self) -> bool:
+        """Check the file's trailing checksum."""
+        body = self._data[:-_TRAILER_SIZE]
+        digest = hashlib.sha1(body, usedforsecurity=False).digest()
+        return digest == self._data[-_TRAILER_SIZE:]
+
+    def sha_at(self, i: int) -> str:
+        """Get the i-th SHA in sorted order."""
+        start = self._sha_start + 20 * i
+        return self._data[start : start + 20].hex()
+
+    def entry_at(self, i: int) -> Tuple[int, int]:
+        """Get the pack number and offset of the i-th object."""
+        start = self._pack_start + 4 * i
+        pack_id = int(struct.unpack(">I", self._data[start : start + 4])[0])
+        offset = decode_offset(self._data, self._offset_start, self._large_start, i)
+        return pack_id, offset
+
+    def find(self, sha: str) -> Optional[Tuple[int, int]]:
+        """
+        Find an object.
+
+        Args:
+            sha: Hex SHA to look up
+
+        Returns:
+            Tuple of (pack number, offset), or None if no covered pack has it
+        """
+        position = bisect_sha_table(self._data, self._fanout, self._sha_start, sha)
+        return None if position is None else self.entry_at(position)
+
+    def resolve_packs(
+        self, packs: List[Pack]
+    ) -> Optional[Tuple[List[Pack], List[Pack]]]:
+        """
+        Match the covered packs to open packs.
+
+        Args:
+            packs: Packs currently in the pack directory
+
+        Returns:
+            Tuple of (covered packs by pack number, packs not covered), or
+            None if a covered pack is missing
+        """
+        if self._packs_source is not packs:
+            by_name = {_pack_file_name(pack): pack for pack in packs}
+            covered = [by_name.pop(name, None) for name in self.pack_names]
+            self._packs = None
+            if all(pack is not None for pack in covered):
+                self._packs = (
+                    [pack for pack in covered if pack is not None],
+                    list(by_name.values()),
+                )
+            self._packs_source = packs
+        return self._packs
+
+
+def _pack_file_name(pack: Pack) -> str:
+    return os.path.basename(pack.path)
+
+
+_midx_cache: Dict[str, Tuple[Tuple[int, int], MultiPackIndex]] = {}
+_midx_cache_lock = threading.Lock()
+
+
+def get_multi_pack_index(objects_dir: str) -> Optional[MultiPackIndex]:
+    """
+    Get the multi-pack-index of an object directory.
+
+    Args:
+        objects_dir: Object directory
+
+    Returns:
+        The index, or None if there is none or it cannot be read
+    """
+    path = os.path.join(get_pack_dir(objects_dir), MIDX_FILE)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (stat.st_mtime_ns, stat.st_size)
+
+    with _midx_cache_lock:
+        cached = _midx_cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+    try:
+        midx = MultiPackIndex(path)
+    except (OSError, CorruptPackError, UnicodeDecodeError, struct.error):
+        return None
+    with _midx_cache_lock:
+        _midx_cache[path] = (key, midx)
+    return midx
+
+
+def find_packed_object(objects_dirs: List[str], sha: str) -> Optional[Pack]:
+    """
+    Find the pack holding an object.
+
+    Uses each directory's multi-pack-index first, then searches the packs
+    it does not cover.
+
+    Args:
+        objects_dirs: Object directories to search, in order
+        sha: Object SHA
+
+    Returns:
+        The pack, or None if no pack holds the object
+    """
+    for objects_dir in objects_dirs:
+        packs = get_packs(objects_dir)
+        midx = get_multi_pack_index(objects_dir) if packs else None
+        resolved = midx.resolve_packs(packs) if midx is not None else None
+        if midx is not None and resolved is not None:
+            covered, packs = resolved
+            found = midx.find(sha)
+            if found is not None:
+                return covered[found[0]]
+        for pack in packs:
+            try:
+                if sha in pack:
+                    return pack
+            except (OSError, CorruptPackError):
+                continue
+    return None
+
+
+def write_multi_pack_index(objects_dir: str) -> int:
+    """
+    Write a multi-pack-index covering every pack of an object directory.
+
+    An existing index is replaced; with no packs, it is removed.
+
+    Args:
+        objects_dir: Object directory
+
+    Returns:
+        Number of objects indexed
+    """
+    path = os.path.join(get_pack_dir(objects_dir), MIDX_FILE)
+    packs = get_packs(objects_dir)
+    if not packs:
+        if os.path.exists(path):
+            os.remove(path)
+        return 0
+
+    # Largest pack first, so it wins for objects stored more than once
+    entries: Dict[bytes, Tuple[int, int]] = {}
+    for pack_id, pack in enumerate(packs):
+        index = pack.index
+        for i in range(len(index)):
+            sha = bytes.fromhex(index.sha_at(i))
+            entries.setdefault(sha, (pack_id, index.offset_at(i)))
+    ordered = sorted(entries.items())
+
+    offsets, large_offsets = encode_offsets(offset for _, (_, offset) in ordered)
+    data = b"".join(
+        [
+            _HEADER.pack(MIDX_SIGNATURE, MIDX_VERSION, len(packs), len(ordered)),
+            b"".join(_pack_file_name(pack).encode("utf-8") + b"\0" for pack in packs),
+            encode_fanout(sha for sha, _ in ordered),
+            b"".join(sha for sha, _ in ordered),
+            b"".join(struct.pack(">I", pack_id) for _, (pack_id, _) in ordered),
+            offsets,
+            large_offsets,
+        ]
+    )
+    data += hashlib.sha1(data, usedforsecurity=False).digest()
+    atomic_write(path, data, create_dirs=True)
+    return len(ordered)
+
+
+def verify_multi_pack_index(objects_dir: str) -> List[str]:
+    """
+    Check a multi-pack-index against the packs it covers.
+
+    Args:
+        objects_dir: Object directory
+
+    Returns:
+        Problems found, empty if the index is valid
+
+    Raises:
+        CorruptPackError: If there is no readable multi-pack-index
+    """
+    path = os.path.join(get_pack_dir(objects_dir), MIDX_FILE)
+    midx = MultiPackIndex(path)
+    problems: List[str] = []
+    if not midx.verify_checksum():
+        problems.append("multi-pack-index checksum mismatch")
+
+    resolved = midx.resolve_packs(get_packs(objects_dir))
+    if resolved is None:
+        present = {_pack_file_name(pack) for pack in get_packs(objects_dir)}
+        problems.extend(
+            f"pack {name} is missing" for name in midx.pack_names if name not in present
+        )
+        return problems
+    packs = resolved[0]
+
+    previous = ""
+    for i in range(len(midx)):
+        sha = midx.sha_at(i)
+        if sha <= previous:
+            problems.append(f"object {sha} is out of order")
+        previous = sha
+        pack_id, offset = midx.entry_at(i)
+        name = midx.pack_names[pack_id]
+        try:
+            actual = packs[pack_id].index.find(sha)
+        except (OSError, CorruptPackError) as e:
+            problems.append(f"cannot read {name}: {e}")
+            continue
+        if actual != offset:
+            problems.append(f"object {sha} is not at offset {offset} of {name}")
+
+    indexed = sum(len(pack) for pack in packs)
+    if indexed < len(midx):
+        problems.append("multi-pack-index lists objects its packs do not have")
+    return problems
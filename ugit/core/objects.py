@@ -3,16 +3,83 @@ Object storage and management for ugit.
 
 This module handles the core object storage functionality including
 hashing, storing, and retrieving objects (blobs, trees, commits).
+
+Objects are stored loose, one zlib file each (at the level set by
+core.compression, see core.compression), or in pack files under
+objects/pack (see core.pack). Objects missing from the repository's own
+store are looked up in the object directories listed in
+objects/info/alternates, one per line (absolute, or relative to the
+objects directory). Alternates are read recursively, so a repository can
+borrow from one that borrows itself. In a partial clone, objects found
+nowhere are fetched from the promisor remote (see core.promisor).
+With core.objectStorage set to another backend (see core.odb), objects
+are written to and first looked up in that backend instead of loose files.
+
+Loose objects are written to a temporary file and renamed into place, so
+a crash never leaves a truncated object behind. With core.fsyncMethod set
+to per-file, or to batch outside object_write_batch(), each object is
+fsynced before the rename.
 """
 
+import ctypes
 import hashlib
 import os
+import sys
+import tempfile
+import threading
 import zlib
-from typing import TYPE_CHECKING, Optional, Tuple
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+from ..utils.atomic import fsync_directory, get_fsync_method
+from .compression import compress, get_compression_levels
+from .exceptions import CorruptPackError
+from .midx import find_packed_object
+from .pack import Pack
 
 if TYPE_CHECKING:
+    from .odb import ObjectDatabase
     from .repository import Repository
 
+# Maximum nesting of alternates files, guards against cycles
+MAX_ALTERNATE_DEPTH = 5
+
+# Prefix of objects being written, in their fan-out directory
+TEMP_OBJECT_PREFIX = "tmp_obj_"
+
+
+class _WriteBatch:
+    """Objects written to temporary files, waiting for one flush."""
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.pending: Dict[str, str] = {}  # object path -> temporary path
+        self.lock = threading.Lock()
+
+    def add(self, object_path: str, temp_path: str) -> None:
+        with self.lock:
+            previous = self.pending.setdefault(object_path, temp_path)
+        if previous != temp_path:
+            os.unlink(temp_path)  # Written twice in the batch
+
+    def commit(self) -> None:
+        """Flush every pending object to disk, then move them into place."""
+        if not self.pending:
+            return
+        _sync_files(list(self.pending.values()))
+        directories = set()
+        for object_path, temp_path in self.pending.items():
+            os.replace(temp_path, object_path)
+            directories.add(os.path.dirname(object_path))
+        for directory in sorted(directories):
+            fsync_directory(directory)
+        self.pending.clear()
+
+
+# Objects directory -> batch in progress; shared by every thread
+_write_batches: Dict[str, _WriteBatch] = {}
+_write_batches_lock = threading.Lock()
+
 
 def hash_object(
     data: bytes,
@@ -53,6 +120,10 @@ def hash_object(
 
     if write:
         try:
+            database = _loose_database(repo)
+            if database is not None:
+                database.write(type_, data)
+                return sha
             _write_object(sha, full_data, repo)
         except (IOError, OSError) as e:
             raise RuntimeError(f"Failed to write object {sha}: {e}")
@@ -60,21 +131,87 @@ def hash_object(
     return sha
 
 
+@contextmanager
+def object_write_batch(repo: Optional["Repository"] = None) -> Iterator[None]:
+    """
+    Make bulk object writes durable with one flush instead of one each.
+
+    With core.fsyncMethod=batch, objects written inside the block, from any
+    thread, stay in temporary files. When the outermost block exits they
+    are flushed to disk together behind one barrier (see _sync_files),
+    renamed into place, and their fan-out directories are fsynced once each.
+    Until then they can already be read.
+    With any other method this does nothing.
+
+    Args:
+        repo: Repository instance (optional, defaults to current repo)
+    """
+    from .repository import Repository
+
+    if repo is None:
+        repo = Repository()
+    if get_fsync_method(repo.ugit_dir) != "batch":
+        yield
+        return
+
+    objects_dir = os.path.join(repo.ugit_dir, "objects")
+    with _write_batches_lock:
+        batch = _write_batches.setdefault(objects_dir, _WriteBatch())
+        batch.depth += 1
+    try:
+        yield
+    finally:
+        with _write_batches_lock:
+            batch.depth -= 1
+            finished = batch.depth == 0
+            if finished:
+                del _write_batches[objects_dir]
+        if finished:
+            batch.commit()
+
+
 def _write_object(sha: str, data: bytes, repo: "Repository") -> None:
     """Write object data to disk with compression."""
-    object_dir = os.path.join(repo.ugit_dir, "objects", sha[:2])
+    objects_dir = os.path.join(repo.ugit_dir, "objects")
+    object_dir = os.path.join(objects_dir, sha[:2])
     object_path = os.path.join(object_dir, sha[2:])
 
-    if os.path.exists(object_path):
-        return  # Object already exists
+    existing = _find_object_path(sha, repo)
+    if existing is not None or _find_pack(sha, repo):
+        # Already stored, possibly packed or in an alternate. Refresh a loose
+        # copy's mtime so gc's grace period protects it again.
+        if existing == object_path:
+            try:
+                os.utime(object_path)
+            except OSError:
+                pass
+        return
 
     os.makedirs(object_dir, exist_ok=True)
 
-    # Compress data to save space
-    compressed_data = zlib.compress(data)
+    # Compress at core.compression, or not at all if it would not shrink
+    compressed_data = compress(data, get_compression_levels(repo.ugit_dir)[0])
 
-    with open(object_path, "wb") as f:
-        f.write(compressed_data)
+    method = get_fsync_method(repo.ugit_dir)
+    batch = _write_batches.get(objects_dir) if method == "batch" else None
+    fd, temp_path = tempfile.mkstemp(dir=object_dir, prefix=TEMP_OBJECT_PREFIX)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(compressed_data)
+            os.chmod(temp_path, 0o644)  # mkstemp files are private
+            if method != "none" and batch is None:
+                f.flush()
+                os.fsync(f.fileno())
+        if batch is not None:
+            batch.add(object_path, temp_path)
+        else:
+            os.replace(temp_path, object_path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
 
 
 def get_object(sha: str, repo: Optional["Repository"] = None) -> Tuple[str, bytes]:
@@ -102,17 +239,31 @@ def get_object(sha: str, repo: Optional["Repository"] = None) -> Tuple[str, byte
     if not validate_sha(sha):
         raise ValueError(f"Invalid SHA format: {sha}")
 
-    # Try both old flat structure and new hierarchical structure
-    object_paths = [
-        os.path.join(repo.ugit_dir, "objects", sha),  # Old format
-        os.path.join(repo.ugit_dir, "objects", sha[:2], sha[2:]),  # New format
-    ]
-
-    for object_path in object_paths:
-        if os.path.exists(object_path):
-            break
-    else:
-        raise FileNotFoundError(f"Object {sha} not found")
+    database = _loose_database(repo)
+    if database is not None:
+        try:
+            return database.read(sha)
+        except FileNotFoundError:
+            pass  # Maybe packed, borrowed or promised
+
+    object_path = _find_object_path(sha, repo)
+    if object_path is None:
+        pack = _find_pack(sha, repo)
+        if pack is None:
+            from .promisor import fetch_promised_object
+
+            if fetch_promised_object(repo, sha):
+                return get_object(sha, repo=repo)
+            raise FileNotFoundError(f"Object {sha} not found")
+        try:
+            packed = pack.get_object(sha)
+        except (IOError, OSError) as e:
+            raise FileNotFoundError(f"Cannot read object {sha}: {e}")
+        except CorruptPackError as e:
+            raise ValueError(f"Invalid object format for {sha}: {e}")
+        if packed is None:
+            raise FileNotFoundError(f"Object {sha} not found")
+        return packed
 
     try:
         with open(object_path, "rb") as f:
@@ -159,7 +310,147 @@ def object_exists(sha: str, repo: Optional["Repository"] = None) -> bool:
     if not validate_sha(sha):
         return False
 
-    # Check both old and new formats
-    return os.path.exists(
-        os.path.join(repo.ugit_dir, "objects", sha)
-    ) or os.path.exists(os.path.join(repo.ugit_dir, "objects", sha[:2], sha[2:]))
+    database = _loose_database(repo)
+    if database is not None and database.exists(sha):
+        return True
+    return _find_object_path(sha, repo) is not None or _find_pack(sha, repo) is not None
+
+
+def get_alternate_object_dirs(repo: "Repository") -> List[str]:
+    """
+    Get the borrowed object directories of a repository.
+
+    Args:
+        repo: Repository instance
+
+    Returns:
+        Absolute paths of alternate object directories, nearest first
+    """
+    own_dir = os.path.realpath(os.path.join(repo.ugit_dir, "objects"))
+    result: List[str] = []
+    seen = {own_dir}
+    pending = [(own_dir, 0)]
+
+    while pending:
+        objects_dir, depth = pending.pop(0)
+        if depth >= MAX_ALTERNATE_DEPTH:
+            continue
+        for alternate in read_alternates_file(objects_dir):
+            alternate = os.path.realpath(alternate)
+            if alternate in seen or not os.path.isdir(alternate):
+                continue
+            seen.add(alternate)
+            result.append(alternate)
+            pending.append((alternate, depth + 1))
+
+    return result
+
+
+def read_alternates_file(objects_dir: str) -> List[str]:
+    """
+    Read the info/alternates file of an object directory.
+
+    Args:
+        objects_dir: Object directory containing info/alternates
+
+    Returns:
+        Listed object directories, with relative entries resolved against
+        objects_dir. Empty if there is no alternates file.
+    """
+    alternates_path = os.path.join(objects_dir, "info", "alternates")
+    try:
+        with open(alternates_path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except (IOError, OSError):
+        return []
+
+    return [
+        os.path.normpath(os.path.join(objects_dir, line.strip()))
+        for line in lines
+        if line.strip() and not line.startswith("#")
+    ]
+
+
+def _loose_database(repo: "Repository") -> Optional["ObjectDatabase"]:
+    """Get the core.objectStorage backend, or None for loose object files."""
+    from .odb import loose_object_database
+
+    return loose_object_database(repo)
+
+
+def _find_object_path(sha: str, repo: "Repository") -> Optional[str]:
+    """Find the file holding an object, in the repository or its alternates."""
+    objects_dir = os.path.join(repo.ugit_dir, "objects")
+    batch = _write_batches.get(objects_dir)
+    if batch is not None:
+        pending = batch.pending.get(os.path.join(objects_dir, sha[:2], sha[2:]))
+        if pending is not None:
+            return pending
+
+    path = _object_path_in(objects_dir, sha)
+    if path is not None:
+        return path
+
+    for alternate in get_alternate_object_dirs(repo):
+        path = _object_path_in(alternate, sha)
+        if path is not None:
+            return path
+    return None
+
+
+def _find_pack(sha: str, repo: "Repository") -> Optional[Pack]:
+    """Find the pack holding an object, in the repository or its alternates."""
+    objects_dir = os.path.join(repo.ugit_dir, "objects")
+    return find_packed_object([objects_dir] + get_alternate_object_dirs(repo), sha)
+
+
+def _object_path_in(objects_dir: str, sha: str) -> Optional[str]:
+    """Find an object in one object directory, in either storage layout."""
+    for object_path in (
+        os.path.join(objects_dir, sha[:2], sha[2:]),  # New format
+        os.path.join(objects_dir, sha),  # Old format
+    ):
+        if os.path.exists(object_path):
+            return object_path
+    return None
+
+
+def _sync_files(paths: List[str]) -> None:
+    """
+    Flush a batch of files to disk behind a single barrier.
+
+    On Linux, one syncfs() flushes the filesystem holding the files, so no
+    file is fsynced on its own and other mounted filesystems are left
+    alone. On macOS, fsync() only hands data to the drive, so each file is
+    fsynced and one F_FULLFSYNC then flushes the drive's cache. Elsewhere,
+    or if syncfs() is unavailable, each file is fsynced.
+    """
+    if sys.platform == "linux" and _syncfs(os.path.dirname(paths[0])):
+        return
+    for path in paths:
+        fd = os.open(path, os.O_RDWR)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    if sys.platform == "darwin":
+        import fcntl
+
+        fd = os.open(paths[0], os.O_RDONLY)
+        try:
+            fcntl.fcntl(fd, fcntl.F_FULLFSYNC)
+        finally:
+            os.close(fd)
+
+
+def _syncfs(path: str) -> bool:
+    """Flush the filesystem holding path with syncfs(), False if it failed."""
+    try:
+        libc_syncfs = ctypes.CDLL(None, use_errno=True).syncfs
+    except (OSError, AttributeError):
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return bool(libc_syncfs(fd) == 0)
+    finally:
+        os.close(fd)
@@ -0,0 +1,342 @@
+"""
+Object database backends for ugit.
+
+An ObjectDatabase stores objects by SHA-1 and supports read, write,
+exists, iterate and batch_write. core.objectStorage picks where a
+repository keeps the objects it writes:
+
+    files   one zlib file per object under objects/, plus packs (default)
+    sqlite  a single SQLite database in WAL mode, .ugit/objects.sqlite,
+            for servers hosting many small repositories, where one file
+            per object exhausts inodes
+
+MemoryObjectDatabase keeps objects in a dictionary for tests and
+benchmarks. It is not a core.objectStorage value, since a repository
+configured with it would lose every object when the process exits.
+
+Whatever the backend, packs, alternates and promisor remotes are still
+read from disk, so fetch and clone work unchanged; the backend replaces
+loose object files only. hash_object, get_object and object_exists in
+core.objects dispatch to it. gc, repack and the object maintenance tasks
+delete loose object files directly, so they refuse to run with another
+backend (see require_file_storage).
+"""
+
+import os
+import sqlite3
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..utils.atomic import get_fsync_method
+from ..utils.config import Config
+from .compression import compress, get_compression_levels
+from .exceptions import UgitError
+from .pack import get_packs, object_sha
+
+if TYPE_CHECKING:
+    from .repository import Repository
+
+OBJECT_STORAGES = ("files", "sqlite")
+DEFAULT_OBJECT_STORAGE = "files"
+SQLITE_FILE = "objects.sqlite"
+
+# SQLite synchronous level for each core.fsyncMethod
+_SQLITE_SYNCHRONOUS = {"none": "OFF", "per-file": "FULL", "batch": "NORMAL"}
+
+# .ugit directory -> (config mtime, storage, database)
+_databases: Dict[str, Tuple[int, str, "ObjectDatabase"]] = {}
+_databases_lock = threading.Lock()
+
+
+class ObjectDatabase(ABC):
+    """Storage for objects, addressed by the SHA-1 of their header and data."""
+
+    @abstractmethod
+    def read(self, sha: str) -> Tuple[str, bytes]:
+        """
+        Read an object.
+
+        Args:
+            sha: SHA-1 hash of the object
+
+        Returns:
+            Tuple of (object_type, content)
+
+        Raises:
+            FileNotFoundError: If the object is not stored here
+        """
+
+    @abstractmethod
+    def write(self, type_: str, data: bytes) -> str:
+        """
+        Store an object, unless it is already stored.
+
+        Args:
+            type_: Object type
+            data: Object content
+
+        Returns:
+            SHA-1 hash of the object
+        """
+
+    @abstractmethod
+    def exists(self, sha: str) -> bool:
+        """Check whether an object is stored here."""
+
+    @abstractmethod
+    def iterate(self) -> Iterator[str]:
+        """Yield the SHA of every object stored here."""
+
+    def batch_write(self, objects: Iterable[Tuple[str, bytes]]) -> List[str]:
+        """
+        Store many objects at once.
+
+        Backends override this to make the whole batch durable in one go.
+
+        Args:
+            objects: (object_type, content) pairs
+
+        Returns:
+            SHA-1 hashes of the objects, in order
+        """
+        return [self.write(type_, data) for type_, data in objects]
+
+    def close(self) -> None:
+        """Release any resources held."""
+
+
+class FileObjectDatabase(ObjectDatabase):
+    """Loose object files and packs under a repository's objects directory."""
+
+    def __init__(self, repo: "Repository"):
+        self.repo = repo
+        self.objects_dir = os.path.join(repo.ugit_dir, "objects")
+
+    def read(self, sha: str) -> Tuple[str, bytes]:
+        from .objects import get_object
+
+        return get_object(sha, repo=self.repo)
+
+    def write(self, type_: str, data: bytes) -> str:
+        from .objects import hash_object
+
+        return hash_object(data, type_, repo=self.repo)
+
+    def exists(self, sha: str) -> bool:
+        from .objects import object_exists
+
+        return object_exists(sha, repo=self.repo)
+
+    def iterate(self) -> Iterator[str]:
+        seen = set()
+        if os.path.isdir(self.objects_dir):
+            for name in sorted(os.listdir(self.objects_dir)):
+                fanout_dir = os.path.join(self.objects_dir, name)
+                if len(name) != 2 or not os.path.isdir(fanout_dir):
+                    continue
+                for file in sorted(os.listdir(fanout_dir)):
+                    if len(file) == 38:
+                        seen.add(name + file)
+                        yield name + file
+        for pack in get_packs(self.objects_dir):
+            for sha in pack:
+                if sha not in seen:
+                    seen.add(sha)
+                    yield sha
+
+    def batch_write(self, objects: Iterable[Tuple[str, bytes]]) -> List[str]:
+        from .objects import object_write_batch
+
+        with object_write_batch(self.repo):
+            return super().batch_write(objects)
+
+
+class MemoryObjectDatabase(ObjectDatabase):
+    """Objects kept in a dictionary; nothing reaches the disk."""
+
+    def __init__(self) -> None:
+        self.objects: Dict[str, Tuple[str, bytes]] = {}
+
+    def read(self, sha: str) -> Tuple[str, bytes]:
+        try:
+            return self.objects[sha]
+        except KeyError:
+            raise FileNotFoundError(f"Object {sha} not found")
+
+    def write(self, type_: str, data: bytes) -> str:
+        sha = object_sha(type_, data)
+        self.objects.setdefault(sha, (type_, data))
+        return sha
+
+    def exists(self, sha: str) -> bool:
+        return sha in self.objects
+
+    def iterate(self) -> Iterator[str]:
+        return iter(list(self.objects))
+
+
+class SQLiteObjectDatabase(ObjectDatabase):
+    """
+    Objects in one SQLite database in WAL mode.
+
+    Content is zlib-compressed as in loose files, at core.compression.
+    One connection is shared by every thread of the process; other
+    processes coordinate through SQLite's own locking.
+    """
+
+    def __init__(self, path: str, synchronous: str = "NORMAL"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS objects ("
+            "sha TEXT PRIMARY KEY, type TEXT NOT NULL, data BLOB NOT NULL"
+            ") WITHOUT ROWID"
+        )
+
+    def read(self, sha: str) -> Tuple[str, bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT type, data FROM objects WHERE sha = ?", (sha,)
+            ).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"Object {sha} not found")
+        try:
+            return row[0], zlib.decompress(row[1])
+        except zlib.error as e:
+            raise ValueError(f"Invalid object format for {sha}: {e}")
+
+    def write(self, type_: str, data: bytes) -> str:
+        return self.batch_write([(type_, data)])[0]
+
+    def exists(self, sha: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM objects WHERE sha = ?", (sha,)
+            ).fetchone()
+        return row is not None
+
+    def iterate(self) -> Iterator[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT sha FROM objects ORDER BY sha")
+            shas = [row[0] for row in rows]
+        return iter(shas)
+
+    def batch_write(self, objects: Iterable[Tuple[str, bytes]]) -> List[str]:
+        level = get_compression_levels(os.path.dirname(self.path))[0]
+        shas: List[str] = []
+        rows = []
+        for type_, data in objects:
+            sha = object_sha(type_, data)
+            shas.append(sha)
+            rows.append((sha, type_, compress(data, level)))
+        with self._lock:
+            # One transaction, so one sync, for the whole batch
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO objects (sha, type, data) "
+                    "VALUES (?, ?, ?)",
+                    rows,
+                )
+        return shas
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def get_object_database(repo: "Repository") -> ObjectDatabase:
+    """
+    Get the object database core.objectStorage selects for a repository.
+
+    Databases are opened once per process and reused while the storage
+    setting stays the same.
+
+    Args:
+        repo: Repository instance
+
+    Returns:
+        The repository's object database
+
+    Raises:
+        UgitError: If core.objectStorage is unknown
+    """
+    config_path = os.path.join(repo.ugit_dir, "config")
+    try:
+        mtime = os.stat(config_path).st_mtime_ns
+    except OSError:
+        mtime = -1
+
+    cached = _databases.get(repo.ugit_dir)
+    if cached is not None and cached[0] == mtime:
+        return cached[2]
+
+    with _databases_lock:
+        cached = _databases.get(repo.ugit_dir)
+        storage = Config(repo.path).get("core", "objectStorage") or ""
+        storage = storage.strip().lower() or DEFAULT_OBJECT_STORAGE
+        if storage not in OBJECT_STORAGES:
+            raise UgitError(
+                f"Unknown core.objectStorage: {storage} "
+                f"(choose from {', '.join(OBJECT_STORAGES)})"
+            )
+        if cached is not None and cached[1] == storage:
+            database = cached[2]  # Only another setting changed
+        else:
+            if cached is not None:
+                cached[2].close()
+            database = _open_database(repo, storage)
+        _databases[repo.ugit_dir] = (mtime, storage, database)
+        return database
+
+
+def loose_object_database(repo: "Repository") -> Optional[ObjectDatabase]:
+    """
+    Get the backend holding a repository's loose objects, unless it is files.
+
+    Args:
+        repo: Repository instance
+
+    Returns:
+        The database, or None when loose objects are plain files
+    """
+    database = get_object_database(repo)
+    return None if isinstance(database, FileObjectDatabase) else database
+
+
+def require_file_storage(repo: "Repository", command: str) -> None:
+    """
+    Refuse a command that manages loose object files on another backend.
+
+    Args:
+        repo: Repository instance
+        command: Name of the command, for the error message
+
+    Raises:
+        UgitError: If core.objectStorage is not files
+    """
+    if loose_object_database(repo) is not None:
+        storage = Config(repo.path).get("core", "objectStorage")
+        raise UgitError(
+            f"{command} is not supported with core.objectStorage={storage}, "
+            f"it only manages loose object files"
+        )
+
+
+def _open_database(repo: "Repository", storage: str) -> ObjectDatabase:
+    if storage == "sqlite":
+        synchronous = _SQLITE_SYNCHRONOUS[get_fsync_method(repo.ugit_dir)]
+        try:
+            return SQLiteObjectDatabase(
+                os.path.join(repo.ugit_dir, SQLITE_FILE), synchronous
+            )
+        except sqlite3.Error as e:
+            raise UgitError(f"Cannot open object database: {e}") from e
+    return FileObjectDatabase(repo)
@@ -0,0 +1,1245 @@
+"""
+Pack files for ugit.
+
+A pack stores many objects in a single file, each one zlib-compressed on
+its own, with a companion index for random access. The layout follows
+Git's version 2 packs:
+
+    header:  b"PACK", version (4 bytes), object count (4 bytes)
+    entries: a type and size varint, then the compressed object data.
+             OFS_DELTA entries put the distance back to their base before
+             the compressed delta, REF_DELTA entries the base's 20-byte SHA.
+    trailer: SHA-1 of everything before it
+
+The .idx next to each pack holds a 256-entry fan-out table, the sorted
+object SHAs, their CRC32s, 4-byte offsets (with an 8-byte table for
+offsets past 2 GiB), then the pack checksum and its own checksum. A lookup
+is a binary search within one fan-out bucket.
+
+Packs are found by get_object and object_exists through get_packs() (and
+the multi-pack-index, see core.midx), so objects can live either loose or
+packed.
+
+Entries are compressed at pack.compression (see core.compression). When a
+new pack is written from objects that are already packed, their entries
+are copied as stored, without an inflate/deflate cycle, once the CRC32
+from the index confirms the bytes. Deltas are copied too when their base
+has already been written to the new pack.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import uuid
+import zlib
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from ..utils.atomic import atomic_write
+from .compression import compress, get_compression_levels
+from .exceptions import CorruptPackError
+
+if TYPE_CHECKING:
+    from .repository import Repository
+
+PACK_SIGNATURE = b"PACK"
+PACK_VERSION = 2
+IDX_SIGNATURE = b"\xfftOc"
+IDX_VERSION = 2
+
+OBJ_COMMIT = 1
+OBJ_TREE = 2
+OBJ_BLOB = 3
+OBJ_TAG = 4
+OBJ_OFS_DELTA = 6
+OBJ_REF_DELTA = 7
+
+TYPE_CODES = {
+    "commit": OBJ_COMMIT,
+    "tree": OBJ_TREE,
+    "blob": OBJ_BLOB,
+    "tag": OBJ_TAG,
+}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+# Pack entry as recorded for the index: (SHA, offset, CRC32 of the raw entry)
+PackEntry = Tuple[str, int, int]
+
+
+class StoredEntry(NamedTuple):
+    """A pack entry as stored, ready to be copied into another pack."""
+
+    type_code: int
+    size: int
+    base_sha: Optional[str]  # Set for deltas
+    compressed: bytes
+
+
+_HEADER_SIZE = 12
+_TRAILER_SIZE = 20
+_READ_CHUNK = 64 * 1024
+_BASE_CACHE_SIZE = 64
+
+# Delta encoding: indexed block size and instruction limits
+_DELTA_BLOCK = 16
+_MAX_INSERT = 0x7F
+_MAX_COPY = 0x10000
+
+
+def object_sha(type_: str, data: bytes) -> str:
+    """Compute the SHA of an object without storing it."""
+    header = f"{type_} {len(data)}\0".encode()
+    return hashlib.sha1(header + data, usedforsecurity=False).hexdigest()
+
+
+def encode_entry_header(type_code: int, size: int) -> bytes:
+    """Encode a pack entry's type and inflated size."""
+    byte = (type_code << 4) | (size & 0x0F)
+    size >>= 4
+    out = bytearray()
+    while size:
+        out.append(byte | 0x80)
+        byte = size & 0x7F
+        size >>= 7
+    out.append(byte)
+    return bytes(out)
+
+
+def _decode_entry_header(
+    buf: Union[bytes, mmap.mmap], pos: int
+) -> Tuple[int, int, int]:
+    """Decode a pack entry header, returning (type code, size, next position)."""
+    byte = buf[pos]
+    pos += 1
+    type_code = (byte >> 4) & 0x07
+    size = byte & 0x0F
+    shift = 4
+    while byte & 0x80:
+        byte = buf[pos]
+        pos += 1
+        size |= (byte & 0x7F) << shift
+        shift += 7
+    return type_code, size, pos
+
+
+def _encode_ofs_delta_distance(distance: int) -> bytes:
+    """Encode the backwards distance from an OFS_DELTA entry to its base."""
+    out = bytearray([distance & 0x7F])
+    distance >>= 7
+    while distance:
+        distance -= 1
+        out.insert(0, 0x80 | (distance & 0x7F))
+        distance >>= 7
+    return bytes(out)
+
+
+def _decode_ofs_delta_distance(
+    buf: Union[bytes, mmap.mmap], pos: int
+) -> Tuple[int, int]:
+    byte = buf[pos]
+    pos += 1
+    distance = byte & 0x7F
+    while byte & 0x80:
+        byte = buf[pos]
+        pos += 1
+        distance = ((distance + 1) << 7) | (byte & 0x7F)
+    return distance, pos
+
+
+def _decode_delta_size(delta: bytes, pos: int) -> Tuple[int, int]:
+    size = 0
+    shift = 0
+    while True:
+        byte = delta[pos]
+        pos += 1
+        size |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return size, pos
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """
+    Rebuild an object from its base and a Git-format binary delta.
+
+    Args:
+        base: Content of the base object
+        delta: Delta of copy and insert instructions
+
+    Returns:
+        Content of the target object
+
+    Raises:
+        CorruptPackError: If the delta does not apply to the base
+    """
+    try:
+        source_size, pos = _decode_delta_size(delta, 0)
+        target_size, pos = _decode_delta_size(delta, pos)
+        if source_size != len(base):
+            raise CorruptPackError("Delta base size mismatch")
+
+        out = bytearray()
+        end = len(delta)
+        while pos < end:
+            op = delta[pos]
+            pos += 1
+            if op & 0x80:
+                # Copy from the base: offset and size bytes are optional
+                offset = 0
+                for i in range(4):
+                    if op & (1 << i):
+                        offset |= delta[pos] << (8 * i)
+                        pos += 1
+                size = 0
+                for i in range(3):
+                    if op & (0x10 << i):
+                        size |= delta[pos] << (8 * i)
+                        pos += 1
+                if size == 0:
+                    size = 0x10000
+                if offset + size > len(base):
+                    raise CorruptPackError("Delta copies past the end of its base")
+                out += base[offset : offset + size]
+            elif op:
+                out += delta[pos : pos + op]
+                pos += op
+            else:
+                raise CorruptPackError("Invalid delta instruction")
+    except IndexError as e:
+        raise CorruptPackError("Truncated delta") from e
+
+    if len(out) != target_size:
+        raise CorruptPackError("Delta result size mismatch")
+    return bytes(out)
+
+
+def _encode_delta_size(size: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = size & 0x7F
+        size >>= 7
+        if not size:
+            out.append(byte)
+            return bytes(out)
+        out.append(byte | 0x80)
+
+
+def _encode_copy(offset: int, size: int) -> bytes:
+    """Encode a delta copy instruction, leaving out zero bytes."""
+    op = 0x80
+    args = bytearray()
+    for i in range(4):
+        byte = (offset >> (8 * i)) & 0xFF
+        if byte:
+            op |= 1 << i
+            args.append(byte)
+    for i in range(3):
+        byte = (size >> (8 * i)) & 0xFF
+        if byte:
+            op |= 0x10 << i
+            args.append(byte)
+    return bytes([op]) + bytes(args)
+
+
+def create_delta(base: bytes, target: bytes) -> bytes:
+    """
+    Encode target as a Git-format binary delta against base.
+
+    Blocks of the base are indexed by content; the target is scanned for
+    matching blocks, each extended as far as it goes and emitted as a copy.
+    Everything else becomes inserts.
+
+    Args:
+        base: Content of the base object
+        target: Content to encode
+
+    Returns:
+        Delta that apply_delta turns back into target
+    """
+    out = bytearray(_encode_delta_size(len(base)) + _encode_delta_size(len(target)))
+    blocks: Dict[bytes, int] = {}
+    for start in range(0, len(base) - _DELTA_BLOCK + 1, _DELTA_BLOCK):
+        blocks.setdefault(base[start : start + _DELTA_BLOCK], start)
+
+    insert = bytearray()
+
+    def flush_insert() -> None:
+        for i in range(0, len(insert), _MAX_INSERT):
+            chunk = insert[i : i + _MAX_INSERT]
+            out.append(len(chunk))
+            out.extend(chunk)
+        insert.clear()
+
+    pos = 0
+    end = len(target)
+    while pos < end:
+        start = blocks.get(target[pos : pos + _DELTA_BLOCK], -1)
+        if start < 0:
+            insert.append(target[pos])
+            pos += 1
+            continue
+
+        length = _DELTA_BLOCK
+        limit = min(end - pos, len(base) - start)
+        while (
+            length + 64 <= limit
+            and target[pos + length : pos + length + 64]
+            == base[start + length : start + length + 64]
+        ):
+            length += 64
+        while length < limit and target[pos + length] == base[start + length]:
+            length += 1
+
+        flush_insert()
+        for i in range(0, length, _MAX_COPY):
+            out += _encode_copy(start + i, min(_MAX_COPY, length - i))
+        pos += length
+
+    flush_insert()
+    return bytes(out)
+
+
+class PackWriter:
+    """Streams objects into a pack file, hashing as it goes."""
+
+    def __init__(
+        self, f: IO[bytes], count: int, level: int = zlib.Z_DEFAULT_COMPRESSION
+    ):
+        """
+        Start a pack.
+
+        Args:
+            f: Binary file object to write to
+            count: Number of objects that will be written
+            level: zlib compression level
+        """
+        self._f = f
+        self._count = count
+        self._level = level
+        self._sha = hashlib.sha1(usedforsecurity=False)
+        self.offset = 0
+        self.entries: List[PackEntry] = []
+        self._offsets: Dict[str, int] = {}
+        self._write(PACK_SIGNATURE + struct.pack(">II", PACK_VERSION, count))
+
+    def _write(self, data: bytes) -> None:
+        self._f.write(data)
+        self._sha.update(data)
+        self.offset += len(data)
+
+    def _add_entry(self, sha: str, raw: bytes) -> None:
+        self.entries.append((sha, self.offset, zlib.crc32(raw)))
+        self._offsets[sha] = self.offset
+        self._write(raw)
+
+    def add_object(self, sha: str, type_: str, data: bytes) -> None:
+        """Write a whole object."""
+        header = encode_entry_header(TYPE_CODES[type_], len(data))
+        self._add_entry(sha, header + compress(data, self._level))
+
+    def add_ref_delta(self, sha: str, base_sha: str, delta: bytes) -> None:
+        """Write an object as a delta against a base named by SHA."""
+        header = encode_entry_header(OBJ_REF_DELTA, len(delta))
+        raw = header + bytes.fromhex(base_sha) + compress(delta, self._level)
+        self._add_entry(sha, raw)
+
+    def add_ofs_delta(self, sha: str, base_offset: int, delta: bytes) -> None:
+        """Write an object as a delta against an earlier entry of this pack."""
+        header = encode_entry_header(OBJ_OFS_DELTA, len(delta))
+        distance = _encode_ofs_delta_distance(self.offset - base_offset)
+        raw = header + distance + compress(delta, self._level)
+        self._add_entry(sha, raw)
+
+    def add_stored(self, sha: str, entry: StoredEntry) -> bool:
+        """
+        Copy an entry from another pack without recompressing it.
+
+        Args:
+            sha: Object SHA
+            entry: The entry as stored in its pack
+
+        Returns:
+            False, writing nothing, for a delta whose base is not yet in
+            this pack
+        """
+        if entry.base_sha is None:
+            header = encode_entry_header(entry.type_code, entry.size)
+        else:
+            base_offset = self._offsets.get(entry.base_sha)
+            if base_offset is None:
+                return False
+            distance = _encode_ofs_delta_distance(self.offset - base_offset)
+            header = encode_entry_header(OBJ_OFS_DELTA, entry.size) + distance
+        self._add_entry(sha, header + entry.compressed)
+        return True
+
+    def finish(self) -> bytes:
+        """
+        Write the trailer.
+
+        Returns:
+            The pack checksum
+
+        Raises:
+            ValueError: If fewer or more objects were written than announced
+        """
+        if len(self.entries) != self._count:
+            raise ValueError(
+                f"Pack announced {self._count} objects but {len(self.entries)} "
+                "were written"
+            )
+        checksum = self._sha.digest()
+        self._f.write(checksum)
+        return checksum
+
+
+def encode_fanout(shas: Iterable[bytes]) -> bytes:
+    """Encode the 256-entry fan-out table of sorted binary SHAs."""
+    fanout = [0] * 256
+    for sha in shas:
+        fanout[sha[0]] += 1
+    total = 0
+    for i in range(256):
+        total += fanout[i]
+        fanout[i] = total
+    return struct.pack(">256I", *fanout)
+
+
+def encode_offsets(offsets: Iterable[int]) -> Tuple[bytes, bytes]:
+    """
+    Encode pack offsets as 4-byte entries plus a table of large ones.
+
+    Offsets past 2 GiB are stored in the 8-byte table; their 4-byte entry
+    has the high bit set and holds the position in that table.
+
+    Returns:
+        Tuple of (4-byte entries, 8-byte large offset table)
+    """
+    small = bytearray()
+    large = bytearray()
+    for offset in offsets:
+        if offset < 0x80000000:
+            small += struct.pack(">I", offset)
+        else:
+            small += struct.pack(">I", 0x80000000 | (len(large) // 8))
+            large += struct.pack(">Q", offset)
+    return bytes(small), bytes(large)
+
+
+def decode_offset(data: bytes, offset_start: int, large_start: int, i: int) -> int:
+    """Decode the i-th offset written by encode_offsets."""
+    start = offset_start + 4 * i
+    offset = int(struct.unpack(">I", data[start : start + 4])[0])
+    if offset & 0x80000000:
+        start = large_start + 8 * (offset & 0x7FFFFFFF)
+        offset = int(struct.unpack(">Q", data[start : start + 8])[0])
+    return offset
+
+
+def write_pack_index(path: str, entries: List[PackEntry], pack_checksum: bytes) -> None:
+    """
+    Write a version 2 pack index.
+
+    Args:
+        path: Path of the .idx file
+        entries: (SHA, offset, CRC32) of every object in the pack
+        pack_checksum: Trailer checksum of the pack
+    """
+    ordered = sorted((bytes.fromhex(sha), offset, crc) for sha, offset, crc in entries)
+    offsets, large_offsets = encode_offsets(offset for _, offset, _ in ordered)
+
+    data = b"".join(
+        [
+            IDX_SIGNATURE,
+            struct.pack(">I", IDX_VERSION),
+            encode_fanout(sha for sha, _, _ in ordered),
+            b"".join(sha for sha, _, _ in ordered),
+            b"".join(struct.pack(">I", crc & 0xFFFFFFFF) for _, _, crc in ordered),
+            offsets,
+            large_offsets,
+            pack_checksum,
+        ]
+    )
+    data += hashlib.sha1(data, usedforsecurity=False).digest()
+    atomic_write(path, data, create_dirs=True)
+
+
+def bisect_sha_table(
+    data: bytes, fanout: Tuple[int, ...], table_start: int, sha: str
+) -> Optional[int]:
+    """
+    Binary search a sorted table of 20-byte SHAs within one fan-out bucket.
+
+    Args:
+        data: Buffer holding the table
+        fanout: 256 cumulative counts of SHAs by first byte
+        table_start: Offset of the table in data
+        sha: Hex SHA to look up
+
+    Returns:
+        Position in the table, or None if the SHA is not in it
+    """
+    try:
+        key = bytes.fromhex(sha)
+    except ValueError:
+        return None
+    if len(key) != 20:
+        return None
+
+    lo = fanout[key[0] - 1] if key[0] else 0
+    hi = fanout[key[0]]
+    while lo < hi:
+        mid = (lo + hi) // 2
+        start = table_start + 20 * mid
+        probe = data[start : start + 20]
+        if probe < key:
+            lo = mid + 1
+        elif probe > key:
+            hi = mid
+        else:
+            return mid
+    return None
+
+
+class PackIndex:
+    """Read access to a version 2 pack index."""
+
+    def __init__(self, path: str):
+        """
+        Load an index file.
+
+        Args:
+            path: Path of the .idx file
+
+        Raises:
+            CorruptPackError: If the file is not a valid index
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self._data = f.read()
+
+        data = self._data
+        if len(data) < 8 + 1024 + 40 or data[:4] != IDX_SIGNATURE:
+            raise CorruptPackError(f"Not a pack index: {path}")
+        if struct.unpack(">I", data[4:8])[0] != IDX_VERSION:
+            raise CorruptPackError(f"Unsupported pack index version: {path}")
+
+        self._fanout: Tuple[int, ...] = struct.unpack(">256I", data[8:1032])
+        self._count = self._fanout[255]
+        self._sha_start = 1032
+        self._crc_start = self._sha_start + 20 * self._count
+        self._offset_start = self._crc_start + 4 * self._count
+        self._large_start = self._offset_start + 4 * self._count
+        if len(data) < self._large_start + 40:
+            raise CorruptPackError(f"Truncated pack index: {path}")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self._count):
+            yield self.sha_at(i)
+
+    @property
+    def pack_checksum(self) -> bytes:
+        """Checksum of the pack this index belongs to."""
+        return self._data[-40:-20]
+
+    def verify_checksum(self) -> bool:
+        """Check the index's own trailing checksum."""
+        digest = hashlib.sha1(self._data[:-20], usedforsecurity=False).digest()
+        return digest == self._data[-20:]
+
+    def sha_at(self, i: int) -> str:
+        """Get the i-th SHA in sorted order."""
+        start = self._sha_start + 20 * i
+        return self._data[start : start + 20].hex()
+
+    def crc_at(self, i: int) -> int:
+        """Get the CRC32 of the i-th entry's raw pack data."""
+        start = self._crc_start + 4 * i
+        return int(struct.unpack(">I", self._data[start : start + 4])[0])
+
+    def offset_at(self, i: int) -> int:
+        """Get the pack offset of the i-th entry."""
+        return decode_offset(self._data, self._offset_start, self._large_start, i)
+
+    def position(self, sha: str) -> Optional[int]:
+        """
+        Find an object's position in the sorted SHA table.
+
+        Args:
+            sha: Hex SHA to look up
+
+        Returns:
+            Position, or None if the object is not in this pack
+        """
+        return bisect_sha_table(self._data, self._fanout, self._sha_start, sha)
+
+    def find(self, sha: str) -> Optional[int]:
+        """Get the pack offset of an object, or None if it is not in this pack."""
+        position = self.position(sha)
+        return None if position is None else self.offset_at(position)
+
+
+class Pack:
+    """A pack file and its index, read through a memory map."""
+
+    def __init__(self, path: str):
+        """
+        Open a pack lazily.
+
+        Args:
+            path: Path of the .pack file (its .idx must sit next to it)
+        """
+        self.path = path
+        self.index_path = path[: -len(".pack")] + ".idx"
+        self._index: Optional[PackIndex] = None
+        self._file: Optional[IO[bytes]] = None
+        self._map: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+        self._base_cache: Dict[int, Tuple[int, bytes]] = {}
+        self._ends: Optional[Dict[int, Tuple[int, int]]] = None
+
+    @property
+    def index(self) -> PackIndex:
+        """The pack's index, loaded on first use."""
+        if self._index is None:
+            self._index = PackIndex(self.index_path)
+        return self._index
+
+    @property
+    def name(self) -> str:
+        """File name of the pack without its extension."""
+        return os.path.basename(self.path)[: -len(".pack")]
+
+    def _data(self) -> mmap.mmap:
+        if self._map is None:
+            with self._lock:
+                if self._map is None:
+                    self._file = open(self.path, "rb")
+                    self._map = mmap.mmap(
+                        self._file.fileno(), 0, access=mmap.ACCESS_READ
+                    )
+        return self._map
+
+    def close(self) -> None:
+        """Release the memory map and file handle."""
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, sha: object) -> bool:
+        return isinstance(sha, str) and self.index.position(sha) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index)
+
+    def get_object(self, sha: str) -> Optional[Tuple[str, bytes]]:
+        """
+        Read an object from the pack.
+
+        Args:
+            sha: Object SHA
+
+        Returns:
+            Tuple of (type, content), or None if the object is not in the pack
+
+        Raises:
+            CorruptPackError: If the entry cannot be decoded
+        """
+        offset = self.index.find(sha)
+        if offset is None:
+            return None
+        type_code, data = self.read_at(offset)
+        return TYPE_NAMES[type_code], data
+
+    def read_at(self, offset: int) -> Tuple[int, bytes]:
+        """
+        Read and fully resolve the entry at an offset.
+
+        Returns:
+            Tuple of (type code, content)
+        """
+        # Walk down the delta chain to a whole object, then apply upwards
+        chain: List[Tuple[int, bytes]] = []
+        while True:
+            cached = self._base_cache.get(offset)
+            if cached is not None:
+                type_code, data = cached
+                break
+
+            type_code, base_offset, data = self._read_raw(offset)
+            if base_offset is None:
+                break
+            chain.append((offset, data))
+            offset = base_offset
+
+        for delta_offset, delta in reversed(chain):
+            data = apply_delta(data, delta)
+            if len(self._base_cache) >= _BASE_CACHE_SIZE:
+                self._base_cache.clear()
+            self._base_cache[delta_offset] = (type_code, data)
+        return type_code, data
+
+    def _read_raw(self, offset: int) -> Tuple[int, Optional[int], bytes]:
+        """
+        Read one entry without resolving it.
+
+        Returns:
+            Tuple of (type code, base offset for deltas or None, inflated data)
+        """
+        data = self._data()
+        try:
+            type_code, size, pos = _decode_entry_header(data, offset)
+            base_offset = None
+            if type_code == OBJ_OFS_DELTA:
+                distance, pos = _decode_ofs_delta_distance(data, pos)
+                base_offset = offset - distance
+            elif type_code == OBJ_REF_DELTA:
+                base_sha = bytes(data[pos : pos + 20]).hex()
+                pos += 20
+                base_offset = self.index.find(base_sha)
+                if base_offset is None:
+                    raise CorruptPackError(
+                        f"Delta base {base_sha} missing from {self.path}"
+                    )
+            elif type_code not in TYPE_NAMES:
+                raise CorruptPackError(f"Unknown object type {type_code}")
+        except IndexError as e:
+            raise CorruptPackError(f"Truncated entry in {self.path}") from e
+
+        inflated, _ = inflate_at(data, pos, size)
+        return type_code, base_offset, inflated
+
+    def _entry_ends(self) -> Dict[int, Tuple[int, int]]:
+        """Map each entry's offset to its end offset and index position."""
+        ends = self._ends
+        if ends is None:
+            index = self.index
+            positions = sorted(range(len(index)), key=index.offset_at)
+            end = len(self._data()) - _TRAILER_SIZE
+            ends = {}
+            for position in reversed(positions):
+                offset = index.offset_at(position)
+                ends[offset] = (end, position)
+                end = offset
+            self._ends = ends
+        return ends
+
+    def stored_entry(self, sha: str) -> Optional[StoredEntry]:
+        """
+        Get an object's entry as stored, without inflating it.
+
+        Entries are bounded by the offsets of the next ones, and their
+        bytes are checked against the CRC32 in the index.
+
+        Args:
+            sha: Object SHA
+
+        Returns:
+            The entry, or None if the object is not in the pack or its
+            entry cannot be copied safely
+        """
+        position = self.index.position(sha)
+        if position is None:
+            return None
+        offset = self.index.offset_at(position)
+        ends = self._entry_ends()
+        end = ends[offset][0]
+        data = self._data()
+        try:
+            type_code, size, pos = _decode_entry_header(data, offset)
+            base_sha = None
+            if type_code == OBJ_OFS_DELTA:
+                distance, pos = _decode_ofs_delta_distance(data, pos)
+                base = ends.get(offset - distance)
+                if base is None:
+                    return None
+                base_sha = self.index.sha_at(base[1])
+            elif type_code == OBJ_REF_DELTA:
+                base_sha = bytes(data[pos : pos + 20]).hex()
+                pos += 20
+            elif type_code not in TYPE_NAMES:
+                return None
+        except IndexError:
+            return None
+        raw = data[offset:end]
+        if zlib.crc32(raw) != self.index.crc_at(position):
+            return None
+        return StoredEntry(type_code, size, base_sha, raw[pos - offset :])
+
+    def raw_entry(self, offset: int) -> bytes:
+        """Get the exact bytes of the entry at an offset, as stored."""
+        data = self._data()
+        type_code, size, pos = _decode_entry_header(data, offset)
+        if type_code == OBJ_OFS_DELTA:
+            _, pos = _decode_ofs_delta_distance(data, pos)
+        elif type_code == OBJ_REF_DELTA:
+            pos += 20
+        _, end = inflate_at(data, pos, size)
+        return bytes(data[offset:end])
+
+
+def inflate_at(buf: Union[bytes, mmap.mmap], pos: int, size: int) -> Tuple[bytes, int]:
+    """
+    Inflate one zlib stream out of a larger buffer.
+
+    Args:
+        buf: Buffer holding the stream
+        pos: Start of the compressed stream
+        size: Expected inflated size
+
+    Returns:
+        Tuple of (inflated data, position just past the stream)
+
+    Raises:
+        CorruptPackError: If the stream is truncated, corrupt or the wrong size
+    """
+    view = memoryview(buf)
+    decompressor = zlib.decompressobj()
+    parts = []
+    # Most entries compress smaller than they inflate, so one read usually does
+    chunk = size + 64
+    try:
+        while not decompressor.eof:
+            piece = view[pos : pos + chunk]
+            if not len(piece):
+                raise CorruptPackError("Truncated compressed data")
+            parts.append(decompressor.decompress(piece))
+            pos += len(piece)
+            chunk = _READ_CHUNK
+    except zlib.error as e:
+        raise CorruptPackError(f"Corrupt compressed data: {e}") from e
+    finally:
+        view.release()
+
+    pos -= len(decompressor.unused_data)
+    data = b"".join(parts)
+    if len(data) != size:
+        raise CorruptPackError("Inflated size does not match the entry header")
+    return data, pos
+
+
+def get_pack_dir(objects_dir: str) -> str:
+    """Get the pack directory of an object directory."""
+    return os.path.join(objects_dir, "pack")
+
+
+_pack_cache: Dict[str, Tuple[int, List[Pack]]] = {}
+_pack_cache_lock = threading.Lock()
+
+
+def get_packs(objects_dir: str) -> List[Pack]:
+    """
+    Get the indexed packs of an object directory.
+
+    The list is cached and refreshed whenever the pack directory changes.
+    Packs without an index (such as in-progress downloads) are ignored.
+
+    Args:
+        objects_dir: Object directory
+
+    Returns:
+        Packs, largest first, since most lookups hit the biggest pack
+    """
+    pack_dir = get_pack_dir(objects_dir)
+    try:
+        mtime = os.stat(pack_dir).st_mtime_ns
+    except OSError:
+        return []
+
+    cached = _pack_cache.get(pack_dir)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with _pack_cache_lock:
+        old = {pack.path: pack for pack in cached[1]} if cached else {}
+        packs = []
+        for name in os.listdir(pack_dir):
+            if not (name.startswith("pack-") and name.endswith(".pack")):
+                continue
+            path = os.path.join(pack_dir, name)
+            if not os.path.exists(path[: -len(".pack")] + ".idx"):
+                continue
+            packs.append(old.pop(path) if path in old else Pack(path))
+        packs.sort(key=lambda pack: os.path.getsize(pack.path), reverse=True)
+        # Stale packs are dropped, not closed: another thread may still be
+        # reading one, and its map is released with the last reference
+        _pack_cache[pack_dir] = (mtime, packs)
+    return packs
+
+
+def invalidate_pack_cache(objects_dir: Optional[str] = None) -> None:
+    """
+    Forget cached pack lists, closing the packs.
+
+    Args:
+        objects_dir: Object directory to forget, or None for all of them
+    """
+    with _pack_cache_lock:
+        if objects_dir is None:
+            keys = list(_pack_cache)
+        else:
+            keys = [get_pack_dir(objects_dir)]
+        for key in keys:
+            entry = _pack_cache.pop(key, None)
+            if entry is not None:
+                for pack in entry[1]:
+                    pack.close()
+
+
+def verify_pack_checksum(path: str) -> bytes:
+    """Check a pack's trailer against its content and return the checksum."""
+    size = os.path.getsize(path)
+    if size < _HEADER_SIZE + _TRAILER_SIZE:
+        raise CorruptPackError(f"Pack too short: {path}")
+
+    digest = hashlib.sha1(usedforsecurity=False)
+    remaining = size - _TRAILER_SIZE
+    with open(path, "rb") as f:
+        while remaining:
+            chunk = f.read(min(_READ_CHUNK * 16, remaining))
+            if not chunk:
+                raise CorruptPackError(f"Pack truncated while reading: {path}")
+            digest.update(chunk)
+            remaining -= len(chunk)
+        trailer = f.read(_TRAILER_SIZE)
+
+    if digest.digest() != trailer:
+        raise CorruptPackError(f"Pack checksum mismatch: {path}")
+    return trailer
+
+
+def index_pack(
+    repo: "Repository",
+    pack_path: str,
+    resolve_base: Optional[Callable[[str], Tuple[str, bytes]]] = None,
+) -> str:
+    """
+    Verify a received pack, index it and install it into objects/pack.
+
+    The trailer checksum is checked before anything is trusted. A thin pack,
+    whose REF_DELTA entries name bases it does not contain, is completed by
+    appending those bases as whole objects, so every installed pack can be
+    read on its own.
+
+    Args:
+        repo: Repository to install the pack into
+        pack_path: Path of the received pack (moved into place when done)
+        resolve_base: Reads a base object missing from the pack; defaults to
+            get_object on the repository
+
+    Returns:
+        Path of the installed .pack file
+
+    Raises:
+        CorruptPackError: If the pack fails verification
+    """
+    if resolve_base is None:
+        from .objects import get_object
+
+        def resolve_base(sha: str) -> Tuple[str, bytes]:
+            return get_object(sha, repo=repo)
+
+    checksum = verify_pack_checksum(pack_path)
+    manifests: List[str] = []
+    entries, missing_bases = _scan_pack_file(pack_path, manifests)
+    if missing_bases:
+        checksum = _complete_thin_pack(pack_path, missing_bases, resolve_base)
+        entries, missing_bases = _scan_pack_file(pack_path, manifests)
+        if missing_bases:
+            raise CorruptPackError("Thin pack could not be completed")
+
+    if manifests:
+        from .chunking import mark_chunked
+
+        mark_chunked(os.path.join(repo.ugit_dir, "objects"))
+    pack_dir = get_pack_dir(os.path.join(repo.ugit_dir, "objects"))
+    os.makedirs(pack_dir, exist_ok=True)
+    final_base = os.path.join(pack_dir, f"pack-{checksum.hex()}")
+
+    write_pack_index(final_base + ".idx.tmp", entries, checksum)
+    if os.path.abspath(pack_path) != os.path.abspath(final_base + ".pack"):
+        os.replace(pack_path, final_base + ".pack")
+    os.replace(final_base + ".idx.tmp", final_base + ".idx")
+    invalidate_pack_cache(os.path.join(repo.ugit_dir, "objects"))
+    return final_base + ".pack"
+
+
+def _scan_pack_file(
+    path: str, manifests: Optional[List[str]] = None
+) -> Tuple[List[PackEntry], List[str]]:
+    """Scan a pack file through a memory map."""
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return scan_pack(data, manifests)
+
+
+def scan_pack(
+    data: Union[bytes, mmap.mmap], manifests: Optional[List[str]] = None
+) -> Tuple[List[PackEntry], List[str]]:
+    """
+    Decode every entry of a pack and compute the object SHAs.
+
+    Whole objects are inflated once to hash them and then dropped; content
+    is only kept while deltas built on it are being resolved.
+
+    Args:
+        data: The complete pack, trailer included
+        manifests: If given, filled with the SHAs of the chunked-file
+            manifests in the pack (see core.chunking)
+
+    Returns:
+        Tuple of (index entries, REF_DELTA bases that are not in the pack)
+
+    Raises:
+        CorruptPackError: If the pack cannot be decoded
+    """
+    if bytes(data[:4]) != PACK_SIGNATURE:
+        raise CorruptPackError("Not a pack file")
+    magic = b""
+    if manifests is not None:
+        from .chunking import MANIFEST_MAGIC
+
+        magic = MANIFEST_MAGIC
+    else:
+        manifests = []
+    version, count = struct.unpack(">II", data[4:12])
+    if version != PACK_VERSION:
+        raise CorruptPackError(f"Unsupported pack version {version}")
+
+    end = len(data) - _TRAILER_SIZE
+    pos = _HEADER_SIZE
+    entries: Dict[int, Tuple[str, int]] = {}  # offset -> (sha, crc)
+    types: Dict[int, int] = {}  # offset -> resolved type code
+    whole: Dict[int, Tuple[int, int]] = {}  # offset -> (data position, size)
+    deltas: Dict[int, Tuple[int, int]] = {}  # offset -> (data position, size)
+    ofs_children: Dict[int, List[int]] = {}  # base offset -> delta offsets
+    ref_children: Dict[str, List[int]] = {}  # base SHA -> delta offsets
+
+    try:
+        for _ in range(count):
+            offset = pos
+            type_code, size, pos = _decode_entry_header(data, pos)
+            if type_code == OBJ_OFS_DELTA:
+                distance, pos = _decode_ofs_delta_distance(data, pos)
+                ofs_children.setdefault(offset - distance, []).append(offset)
+            elif type_code == OBJ_REF_DELTA:
+                base_sha = bytes(data[pos : pos + 20]).hex()
+                pos += 20
+                ref_children.setdefault(base_sha, []).append(offset)
+            elif type_code not in TYPE_NAMES:
+                raise CorruptPackError(f"Unknown object type {type_code}")
+
+            data_pos = pos
+            inflated, pos = inflate_at(data, pos, size)
+            if pos > end:
+                raise CorruptPackError("Pack entry runs into the trailer")
+            crc = zlib.crc32(data[offset:pos])
+
+            if type_code in TYPE_NAMES:
+                entries[offset] = (object_sha(TYPE_NAMES[type_code], inflated), crc)
+                if magic and type_code == OBJ_BLOB and inflated.startswith(magic):
+                    manifests.append(entries[offset][0])
+                types[offset] = type_code
+                whole[offset] = (data_pos, size)
+            else:
+                entries[offset] = ("", crc)
+                deltas[offset] = (data_pos, size)
+    except IndexError as e:
+        raise CorruptPackError("Truncated pack entry") from e
+    if pos != end:
+        raise CorruptPackError("Unexpected data after the last pack entry")
+
+    # Resolve delta trees depth-first from each whole object, so a base's
+    # content is released as soon as everything built on it is hashed
+    for root in list(whole):
+        root_sha = entries[root][0]
+        if root not in ofs_children and root_sha not in ref_children:
+            continue
+        data_pos, size = whole[root]
+        stack = [(root, root_sha, inflate_at(data, data_pos, size)[0])]
+        while stack:
+            base, base_sha, base_data = stack.pop()
+            dependents = ofs_children.pop(base, []) + ref_children.pop(base_sha, [])
+            for child in dependents:
+                data_pos, size = deltas[child]
+                delta, _ = inflate_at(data, data_pos, size)
+                target = apply_delta(base_data, delta)
+                types[child] = types[base]
+                sha = object_sha(TYPE_NAMES[types[child]], target)
+                entries[child] = (sha, entries[child][1])
+                if magic and types[child] == OBJ_BLOB and target.startswith(magic):
+                    manifests.append(sha)
+                stack.append((child, sha, target))
+
+    # Leftover OFS_DELTAs are fine only while they wait on a missing base
+    if any(base not in deltas for base in ofs_children) or (
+        ofs_children and not ref_children
+    ):
+        raise CorruptPackError("OFS_DELTA base is not an entry of the pack")
+
+    result = [(sha, offset, crc) for offset, (sha, crc) in entries.items() if sha]
+    return result, sorted(ref_children)
+
+
+def _complete_thin_pack(
+    pack_path: str,
+    missing_bases: List[str],
+    resolve_base: Callable[[str], Tuple[str, bytes]],
+) -> bytes:
+    """
+    Append the outside bases of a thin pack in place.
+
+    The object count in the header is bumped and the trailer recomputed.
+
+    Returns:
+        The new pack checksum
+    """
+    with open(pack_path, "r+b") as f:
+        f.seek(8)
+        count = int(struct.unpack(">I", f.read(4))[0])
+        f.seek(-_TRAILER_SIZE, os.SEEK_END)
+        f.truncate()
+        for base_sha in missing_bases:
+            try:
+                type_, base_data = resolve_base(base_sha)
+            except (FileNotFoundError, ValueError) as e:
+                raise CorruptPackError(f"Thin pack base {base_sha} is missing") from e
+            f.write(encode_entry_header(TYPE_CODES[type_], len(base_data)))
+            f.write(compress(base_data))
+            count += 1
+        f.seek(8)
+        f.write(struct.pack(">I", count))
+
+        f.seek(0)
+        digest = hashlib.sha1(usedforsecurity=False)
+        for chunk in iter(lambda: f.read(_READ_CHUNK * 16), b""):
+            digest.update(chunk)
+        checksum = digest.digest()
+        f.write(checksum)
+    return checksum
+
+
+def write_pack(
+    repo: "Repository",
+    shas: List[str],
+    f: IO[bytes],
+    level: Optional[int] = None,
+    delta_bases: Optional[Dict[str, str]] = None,
+) -> Tuple[bytes, List[PackEntry]]:
+    """
+    Write objects of a repository into a pack stream.
+
+    Objects listed in delta_bases are written as REF_DELTAs against a base
+    the receiver already has, making the pack thin, when the delta is
+    clearly smaller than the object. Other objects that are already packed
+    have their entries copied without recompressing them.
+
+    Args:
+        repo: Repository to read objects from
+        shas: Objects to pack, in pack order
+        f: Binary file object to write to
+        level: zlib compression level; pack.compression by default
+        delta_bases: Object SHAs mapped to a base SHA left out of the pack
+
+    Returns:
+        Tuple of (pack checksum, index entries)
+
+    Raises:
+        FileNotFoundError: If an object is missing
+    """
+    from .objects import _find_pack, get_object
+
+    if level is None:
+        level = get_compression_levels(repo.ugit_dir)[1]
+    delta_bases = delta_bases or {}
+    writer = PackWriter(f, len(shas), level)
+    for sha in shas:
+        base_sha = delta_bases.get(sha)
+        if base_sha is None:
+            pack = _find_pack(sha, repo)
+            entry = pack.stored_entry(sha) if pack is not None else None
+            if entry is not None and writer.add_stored(sha, entry):
+                continue
+        type_, data = get_object(sha, repo=repo)
+        if base_sha is not None:
+            try:
+                base_type, base = get_object(base_sha, repo=repo)
+            except (FileNotFoundError, ValueError):
+                base_type = ""
+            if base_type == type_:
+                delta = create_delta(base, data)
+                if len(delta) < len(data) // 2:
+                    writer.add_ref_delta(sha, base_sha, delta)
+                    continue
+        writer.add_object(sha, type_, data)
+    return writer.finish(), writer.entries
+
+
+def create_pack(
+    repo: "Repository", shas: List[str], level: Optional[int] = None
+) -> str:
+    """
+    Pack objects into a new indexed pack in objects/pack.
+
+    Args:
+        repo: Repository instance
+        shas: Objects to pack, in pack order
+        level: zlib compression level; pack.compression by default
+
+    Returns:
+        Path of the new .pack file
+    """
+    pack_dir = get_pack_dir(os.path.join(repo.ugit_dir, "objects"))
+    tmp_path = new_temp_pack_path(repo)
+    try:
+        with open(tmp_path, "wb") as f:
+            checksum, entries = write_pack(repo, shas, f, level)
+        final_base = os.path.join(pack_dir, f"pack-{checksum.hex()}")
+        write_pack_index(final_base + ".idx.tmp", entries, checksum)
+        os.replace(tmp_path, final_base + ".pack")
+        os.replace(final_base + ".idx.tmp", final_base + ".idx")
+        invalidate_pack_cache(os.path.join(repo.ugit_dir, "objects"))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return final_base + ".pack"
+
+
+def new_temp_pack_path(repo: "Repository", key: Optional[str] = None) -> str:
+    """
+    Get an objects/pack/tmp-* path for an incoming pack.
+
+    Args:
+        repo: Repository receiving the pack
+        key: Stable name for a download that may be resumed later; a fresh
+            random name is used without one
+
+    Returns:
+        Path of the temporary pack file
+    """
+    pack_dir = get_pack_dir(os.path.join(repo.ugit_dir, "objects"))
+    os.makedirs(pack_dir, exist_ok=True)
+    return os.path.join(pack_dir, f"tmp-{key or uuid.uuid4().hex}.pack")
@@ -0,0 +1,191 @@
+"""
+Partial clones and promisor remotes.
+
+A clone made with --filter=blob:none (or blob:limit=<size>) receives every
+commit and tree but leaves some blobs on the server. The remote it came
+from is recorded as the repository's promisor remote:
+
+    [extensions]
+    partialclone = origin
+
+    [remote]
+    origin.promisor = true
+    origin.partialclonefilter = blob:none
+
+Later fetches from that remote ask for the same filter. When get_object
+cannot find an object in a partial clone, it asks the promisor remote for
+it, and checkout downloads all the blobs it is about to write in one
+batched request first, so missing blobs cost one round trip per checkout
+rather than one per file.
+"""
+
+import os
+import threading
+from typing import TYPE_CHECKING, Iterable, List, Optional
+
+from ..utils.config import Config
+from ..utils.helpers import is_http_url, is_local_path
+from .exceptions import UgitError
+from .objects import object_exists
+from .pack import index_pack, new_temp_pack_path, write_pack
+
+if TYPE_CHECKING:
+    from .repository import Repository
+
+# Size suffixes accepted by blob:limit
+_SIZE_UNITS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3}
+
+# Set while a lazy fetch is running, so it never recurses into another one
+_lazy_fetch = threading.local()
+
+
+def parse_filter(spec: str) -> int:
+    """
+    Parse an object filter into a blob size limit.
+
+    Args:
+        spec: "blob:none", or "blob:limit=<n>" with an optional k, m or g
+            suffix
+
+    Returns:
+        Size in bytes from which blobs are left out (0 leaves out all)
+
+    Raises:
+        UgitError: If the filter is not supported
+    """
+    spec = spec.strip().lower()
+    if spec == "blob:none":
+        return 0
+    if spec.startswith("blob:limit="):
+        value = spec[len("blob:limit=") :]
+        unit = value[-1:] if value[-1:] in _SIZE_UNITS else ""
+        number = value[: len(value) - len(unit)]
+        if number.isdigit():
+            return int(number) * _SIZE_UNITS[unit]
+    raise UgitError(f"Unsupported filter: {spec}")
+
+
+def get_promisor_remote(repo: "Repository") -> Optional[str]:
+    """
+    Get the promisor remote of a partial clone.
+
+    Args:
+        repo: Repository instance
+
+    Returns:
+        Remote name, or None if the repository is not a partial clone
+    """
+    return Config(repo.path).get("extensions", "partialclone") or None
+
+
+def get_partial_clone_filter(repo: "Repository", remote_name: str) -> Optional[str]:
+    """
+    Get the filter fetches from a promisor remote ask for.
+
+    Args:
+        repo: Repository instance
+        remote_name: Remote name
+
+    Returns:
+        Filter spec, or None if the remote is not a promisor remote
+    """
+    return Config(repo.path).get("remote", f"{remote_name}.partialclonefilter")
+
+
+def set_promisor_remote(repo: "Repository", remote_name: str, spec: str) -> None:
+    """
+    Record a remote as the promisor of a partial clone.
+
+    Args:
+        repo: Repository instance
+        remote_name: Remote the filtered objects can be fetched from
+        spec: Filter the clone was made with
+
+    Raises:
+        UgitError: If the filter is not supported
+    """
+    parse_filter(spec)
+    config = Config(repo.path)
+    config.set("remote", f"{remote_name}.promisor", "true")
+    config.set("remote", f"{remote_name}.partialclonefilter", spec)
+    config.set("extensions", "partialclone", remote_name)
+
+
+def fetch_promised_objects(repo: "Repository", shas: Iterable[str]) -> int:
+    """
+    Download the given objects that are missing from a partial clone.
+
+    Does nothing in a repository without a promisor remote.
+
+    Args:
+        repo: Repository instance
+        shas: Objects about to be read
+
+    Returns:
+        Number of objects requested from the promisor remote
+
+    Raises:
+        UgitError: If the promisor remote cannot provide them
+    """
+    remote_name = get_promisor_remote(repo)
+    if remote_name is None:
+        return 0
+    missing = [sha for sha in dict.fromkeys(shas) if not object_exists(sha, repo=repo)]
+    if not missing:
+        return 0
+
+    url = Config(repo.path).get("remote", f"{remote_name}.url")
+    if url and is_http_url(url):
+        from ..commands.http_remote import fetch_objects_http
+
+        fetch_objects_http(repo, url, missing)
+    elif url and is_local_path(url):
+        _copy_objects_local(repo, url, missing)
+    else:
+        raise UgitError(f"Promisor remote '{remote_name}' has no usable URL")
+    return len(missing)
+
+
+def fetch_promised_object(repo: "Repository", sha: str) -> bool:
+    """
+    Fetch one missing object on first access, for get_object.
+
+    Args:
+        repo: Repository instance
+        sha: Object that was not found
+
+    Returns:
+        True if the object is now in the repository
+
+    Raises:
+        FileNotFoundError: If the promisor remote failed to provide it
+    """
+    if getattr(_lazy_fetch, "active", False):
+        return False
+    _lazy_fetch.active = True
+    try:
+        fetched = fetch_promised_objects(repo, [sha])
+    except UgitError as e:
+        raise FileNotFoundError(f"Object {sha} not found: {e}") from e
+    finally:
+        _lazy_fetch.active = False
+    return fetched > 0 and object_exists(sha, repo=repo)
+
+
+def _copy_objects_local(repo: "Repository", url: str, shas: List[str]) -> None:
+    """Copy objects from a local promisor remote as one pack."""
+    from .repository import Repository
+
+    source = Repository(url)
+    available = [sha for sha in shas if object_exists(sha, repo=source)]
+    if not available:
+        raise UgitError(f"Objects not available from {url}")
+
+    tmp_path = new_temp_pack_path(repo)
+    try:
+        with open(tmp_path, "wb") as f:
+            write_pack(source, available, f)
+        index_pack(repo, tmp_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
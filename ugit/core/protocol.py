@@ -0,0 +1,374 @@
+"""
+Server side of the ugit transfer protocol.
+
+A fetch is two requests. The client first asks for the ref advertisement
+(every branch and tag with the commit it points at), then sends the tips
+it wants together with the tips it already has. The server answers with a
+single pack holding exactly the objects the client is missing, computed by
+core.revlist.list_objects, so a fetch costs one round trip per phase no
+matter how many objects are transferred. Pack responses carry their trailer
+checksum as an entity tag, so an interrupted download can ask for the rest
+of the same pack with a Range request instead of starting over.
+
+A push goes the other way. The pusher reads the receiver's advertisement,
+sends a line of ref updates (ref, expected old SHA, new SHA) followed by a
+thin pack whose deltas may use objects the receiver already has as bases,
+and the receiver indexes the pack and applies each update with
+compare-and-swap, so a ref that moved in the meantime is never clobbered.
+Pushing over HTTP is off until the served repository sets
+http.receivepack, and the branch it has checked out is never moved unless
+receive.denyCurrentBranch is "ignore".
+
+The transport (HTTP routes in web.server, the client in
+commands.http_remote) only moves these payloads around.
+"""
+
+import json
+import os
+from typing import IO, TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
+from ..utils.config import Config
+from ..utils.helpers import _get_current_branch
+from ..utils.validation import validate_sha
+from .exceptions import RefUpdateError, UgitError
+from .objects import object_exists
+from .pack import index_pack, write_pack
+from .promisor import parse_filter
+from .refs import is_valid_ref_name, list_refs, update_ref
+from .revlist import list_objects
+
+if TYPE_CHECKING:
+    from .repository import Repository
+
+# Protocol version, bumped on incompatible changes
+PROTOCOL_VERSION = 1
+
+# Features this server supports, advertised to clients
+CAPABILITIES = ["upload-pack", "receive-pack", "thin-pack", "filter", "shallow"]
+
+# Media type of pack responses
+PACK_MEDIA_TYPE = "application/x-ugit-pack"
+
+# Media type of push requests: a line of ref updates, then a pack
+PUSH_MEDIA_TYPE = "application/x-ugit-push"
+
+# Longest ref update line a receiver accepts
+MAX_PUSH_COMMANDS_SIZE = 1024 * 1024
+
+# Result of a successful ref update
+UPDATE_OK = "ok"
+
+# A pushed ref update: (full ref name, expected old SHA or None, new SHA)
+RefUpdate = Tuple[str, Optional[str], str]
+
+
+def advertise_refs(repo: "Repository") -> Dict[str, Any]:
+    """
+    Build the ref advertisement sent at the start of a fetch.
+
+    Args:
+        repo: Repository being served
+
+    Returns:
+        Dictionary with the protocol version, capabilities, the branch HEAD
+        points at (None if detached) and every ref
+    """
+    return {
+        "version": PROTOCOL_VERSION,
+        "capabilities": list(CAPABILITIES),
+        "head": _get_current_branch(repo),
+        "refs": list_refs(repo),
+    }
+
+
+def check_remote_refs(refs: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Keep the branches and tags of another repository's ref listing.
+
+    The names and SHAs come from a server's advertisement or a bundle
+    header and end up as ref files and their content, so every one is
+    checked before anything is written.
+
+    Args:
+        refs: Full ref names mapped to SHAs
+
+    Returns:
+        The refs under refs/heads/ and refs/tags/; others are skipped
+
+    Raises:
+        UgitError: If a branch or tag has an invalid name or SHA
+    """
+    checked: Dict[str, str] = {}
+    for ref, sha in refs.items():
+        if not isinstance(ref, str) or not ref.startswith(
+            ("refs/heads/", "refs/tags/")
+        ):
+            continue
+        if not is_valid_ref_name(ref):
+            raise UgitError(f"Invalid ref name from remote: {ref}")
+        if not isinstance(sha, str) or not validate_sha(sha):
+            raise UgitError(f"Invalid SHA for {ref} from remote: {sha}")
+        checked[ref] = sha
+    return checked
+
+
+def upload_pack(
+    repo: "Repository",
+    wants: Iterable[str],
+    haves: Iterable[str],
+    out: IO[bytes],
+    level: Optional[int] = None,
+    filter_spec: Optional[str] = None,
+    depth: Optional[int] = None,
+    since: Optional[float] = None,
+    shallow: Iterable[str] = (),
+) -> int:
+    """
+    Write the pack a client needs to go from its haves to its wants.
+
+    Args:
+        repo: Repository being served
+        wants: Tips the client asked for
+        haves: Tips the client already has
+        out: Binary file object receiving the pack
+        level: zlib compression level; pack.compression by default
+        filter_spec: Object filter of a partial clone, such as blob:none
+        depth: Commits of history to send below each want, for a shallow
+            fetch
+        since: Leave out commits older than this timestamp
+        shallow: The client's shallow boundary commits
+
+    Returns:
+        Number of objects in the pack
+
+    Raises:
+        UgitError: If a want is invalid or not in the repository, or the
+            filter or shallow options are not valid
+    """
+    wanted: List[str] = list(wants)
+    for sha in wanted:
+        if not validate_sha(sha):
+            raise UgitError(f"Invalid want: {sha}")
+    have_list = [sha for sha in haves if validate_sha(sha)]
+
+    blob_limit = parse_filter(str(filter_spec)) if filter_spec else None
+    if depth is not None and (not isinstance(depth, int) or depth < 1):
+        raise UgitError(f"Invalid depth: {depth}")
+    if since is not None and not isinstance(since, (int, float)):
+        raise UgitError(f"Invalid shallow-since: {since}")
+    shallow_list = [sha for sha in shallow if validate_sha(sha)]
+
+    try:
+        shas = list_objects(
+            repo,
+            wanted,
+            have_list,
+            blob_limit=blob_limit,
+            depth=depth,
+            since=since,
+            shallow=shallow_list,
+        )
+    except ValueError as e:
+        raise UgitError(f"Cannot serve fetch: {e}") from e
+
+    write_pack(repo, shas, out, level)
+    return len(shas)
+
+
+def local_ref_tips(repo: "Repository") -> List[str]:
+    """
+    Get the tips of every local branch, remote-tracking branch and tag.
+
+    These are sent as "haves" so the sending side can skip their history.
+
+    Args:
+        repo: Local repository
+
+    Returns:
+        Distinct tip SHAs
+    """
+    refs = list_refs(repo, ("refs/heads", "refs/remotes", "refs/tags"))
+    return sorted(set(refs.values()))
+
+
+def upload_objects(
+    repo: "Repository",
+    shas: Iterable[str],
+    out: IO[bytes],
+    level: Optional[int] = None,
+) -> int:
+    """
+    Write a pack of exactly the requested objects, without walking history.
+
+    Args:
+        repo: Repository being served
+        shas: Objects the client asked for
+        out: Binary file object receiving the pack
+        level: zlib compression level; pack.compression by default
+
+    Returns:
+        Number of objects in the pack
+
+    Raises:
+        UgitError: If an object is invalid or not in the repository
+    """
+    wanted: List[str] = []
+    for sha in shas:
+        if not validate_sha(sha) or not object_exists(sha, repo=repo):
+            raise UgitError(f"Object not available: {sha}")
+        if sha not in wanted:
+            wanted.append(sha)
+    write_pack(repo, wanted, out, level)
+    return len(wanted)
+
+
+def build_push_pack(
+    repo: "Repository",
+    new_tips: List[str],
+    remote_tips: Iterable[str],
+    out: IO[bytes],
+    level: Optional[int] = None,
+) -> int:
+    """
+    Write the thin pack a push sends.
+
+    Args:
+        repo: Repository being pushed from
+        new_tips: Commits being pushed
+        remote_tips: Tips the receiver advertised
+        out: Binary file object receiving the pack
+        level: zlib compression level; pack.compression by default
+
+    Returns:
+        Number of objects in the pack; nothing is written when it is 0
+    """
+    delta_bases: Dict[str, str] = {}
+    shas = list_objects(repo, new_tips, list(remote_tips), delta_bases)
+    if not shas:
+        return 0
+    write_pack(repo, shas, out, level, delta_bases=delta_bases)
+    return len(shas)
+
+
+def receive_pack_enabled(repo: "Repository") -> bool:
+    """Check whether a repository accepts pushes over HTTP (http.receivepack)."""
+    value = Config(repo.path).get("http", "receivepack", "false") or ""
+    return value.lower() == "true"
+
+
+def receive_pack(
+    repo: "Repository",
+    pack_path: Optional[str],
+    updates: List[RefUpdate],
+    deny_current_branch: bool = True,
+) -> Dict[str, str]:
+    """
+    Install a pushed pack and apply the pushed ref updates.
+
+    Each update is a compare-and-swap on its old value, applied on its own.
+    The branch checked out in repo is refused, since moving it would leave
+    the working tree and index behind, unless receive.denyCurrentBranch is
+    "ignore".
+
+    Args:
+        repo: Repository being pushed to
+        pack_path: Received pack, or None if the push sent no objects
+        updates: Ref updates to apply
+        deny_current_branch: Refuse updates to the checked out branch
+
+    Returns:
+        Each ref mapped to UPDATE_OK or the reason it was rejected
+
+    Raises:
+        CorruptPackError: If the pack fails verification
+    """
+    if pack_path is not None:
+        index_pack(repo, pack_path)
+
+    current_ref = None
+    if deny_current_branch:
+        setting = Config(repo.path).get("receive", "denyCurrentBranch", "refuse")
+        branch = _get_current_branch(repo)
+        if (setting or "").lower() not in ("ignore", "false") and branch:
+            current_ref = f"refs/heads/{branch}"
+
+    results: Dict[str, str] = {}
+    for ref, old_sha, new_sha in updates:
+        if not ref.startswith(("refs/heads/", "refs/tags/")):
+            results[ref] = "refusing to update a ref outside refs/heads or refs/tags"
+        elif ref == current_ref:
+            results[ref] = "refusing to update the checked out branch"
+        elif not validate_sha(new_sha) or not object_exists(new_sha, repo=repo):
+            results[ref] = f"missing object {new_sha}"
+        else:
+            try:
+                update_ref(repo, ref, new_sha, old_sha)
+                results[ref] = UPDATE_OK
+            except RefUpdateError as e:
+                results[ref] = str(e)
+    return results
+
+
+def pack_etag(pack_file: IO[bytes]) -> str:
+    """
+    Get the entity tag of a pack: its trailer checksum, quoted.
+
+    A resumed download names the pack it started with, and only continues
+    if the server would send the same bytes again.
+
+    Args:
+        pack_file: Seekable pack file, left positioned at its end
+
+    Returns:
+        The quoted hex trailer checksum
+    """
+    pack_file.seek(-20, os.SEEK_END)
+    return f'"{pack_file.read(20).hex()}"'
+
+
+def resume_offset(
+    range_header: Optional[str], if_range: Optional[str], etag: str, size: int
+) -> int:
+    """
+    Work out where a pack response starts for a resumed download.
+
+    Only open-ended ranges ("bytes=N-") are served, and only when If-Range
+    names the current pack; anything else gets the whole pack.
+
+    Args:
+        range_header: Range request header, if any
+        if_range: If-Range request header, if any
+        etag: Entity tag of the pack about to be sent
+        size: Size of the pack in bytes
+
+    Returns:
+        Offset of the first byte to send, 0 for the whole pack
+    """
+    if not range_header or if_range != etag:
+        return 0
+    unit, _, spec = range_header.partition("=")
+    start, dash, end = spec.strip().partition("-")
+    if unit.strip() != "bytes" or not dash or end or not start.isdigit():
+        return 0
+    offset = int(start)
+    return offset if offset < size else 0
+
+
+def encode_push_commands(updates: List[RefUpdate]) -> bytes:
+    """Encode ref updates as the first line of a push request."""
+    payload = {"updates": [list(update) for update in updates]}
+    return json.dumps(payload).encode() + b"\n"
+
+
+def decode_push_commands(line: bytes) -> List[RefUpdate]:
+    """
+    Decode the ref update line of a push request.
+
+    Raises:
+        UgitError: If the line is malformed
+    """
+    try:
+        updates = json.loads(line.decode())["updates"]
+        return [(str(ref), old or None, str(new)) for ref, old, new in updates]
+    except (ValueError, KeyError, TypeError) as e:
+        raise UgitError(f"Invalid push commands: {e}") from e
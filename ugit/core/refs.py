@@ -0,0 +1,406 @@
+"""
+Ref storage and updates for ugit.
+
+Refs are small files under .ugit holding a SHA ("loose" refs), or lines of
+.ugit/packed-refs. pack_refs moves loose refs into that file, which is kept
+sorted by ref name:
+
+    # pack-refs with: sorted
+    <sha> refs/heads/main
+    <sha> refs/tags/v1.0
+
+so a ref is found by binary search without parsing the rest of it. A loose
+ref overrides a packed one of the same name, so writers only ever create
+loose files; deleting a ref removes it from both. The parsed file is cached
+per process and re-read when its mtime or size changes.
+
+update_ref changes a ref with compare-and-swap semantics: it takes
+<ref>.lock (created exclusively, so concurrent writers fail instead of
+racing), checks that the ref still holds the value the caller expects, then
+renames the lock file over the ref. packed-refs is rewritten under
+packed-refs.lock the same way.
+"""
+
+import os
+import threading
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from ..utils.validation import validate_sha
+from .exceptions import RefUpdateError
+
+if TYPE_CHECKING:
+    from .repository import Repository
+
+LOCK_SUFFIX = ".lock"
+PACKED_REFS = "packed-refs"
+PACKED_REFS_HEADER = b"# pack-refs with: sorted\n"
+
+# A packed line is a 40-character SHA, a space, the ref name and a newline
+_NAME_OFFSET = 41
+
+# packed-refs path -> ((inode, mtime, size), parsed file)
+_packed_cache: Dict[str, Tuple[Tuple[int, int, int], "PackedRefs"]] = {}
+_packed_lock = threading.Lock()
+
+
+class PackedRefs:
+    """A sorted packed-refs file, searched without splitting it into lines."""
+
+    def __init__(self, data: bytes):
+        """
+        Wrap the content of a packed-refs file.
+
+        Args:
+            data: File content; lines must be sorted by ref name
+        """
+        self._data = data
+        start = 0
+        # Skip the header and any other comment lines at the top
+        while start < len(data) and data[start : start + 1] == b"#":
+            start = data.find(b"\n", start) + 1 or len(data)
+        self._start = start
+
+    def _line_end(self, pos: int) -> int:
+        end = self._data.find(b"\n", pos)
+        return len(self._data) if end < 0 else end
+
+    def _seek(self, name: bytes) -> int:
+        """Get the offset of the first line whose ref name is >= name."""
+        data = self._data
+        lo, hi = self._start, len(data)
+        while lo < hi:
+            mid = data.rfind(b"\n", 0, (lo + hi) // 2) + 1
+            mid = max(mid, lo)
+            end = self._line_end(mid)
+            if data[mid + _NAME_OFFSET : end] < name:
+                lo = end + 1
+            else:
+                hi = mid
+        return lo
+
+    def get(self, ref: str) -> Optional[str]:
+        """
+        Look up one ref.
+
+        Args:
+            ref: Full ref name
+
+        Returns:
+            The SHA, or None if the ref is not packed
+        """
+        name = ref.encode("utf-8")
+        pos = self._seek(name)
+        end = self._line_end(pos)
+        if self._data[pos + _NAME_OFFSET : end] != name:
+            return None
+        return self._data[pos : pos + 40].decode("ascii", "replace")
+
+    def items(self, prefix: str = "") -> Iterator[Tuple[str, str]]:
+        """
+        Iterate over packed refs in name order.
+
+        Args:
+            prefix: Only yield refs whose name starts with this
+
+        Yields:
+            Tuples of (ref name, SHA)
+        """
+        data = self._data
+        raw_prefix = prefix.encode("utf-8")
+        pos = self._seek(raw_prefix)
+        while pos < len(data):
+            end = self._line_end(pos)
+            name = data[pos + _NAME_OFFSET : end]
+            if not name.startswith(raw_prefix):
+                break
+            sha = data[pos : pos + 40].decode("ascii", "replace")
+            yield name.decode("utf-8", "replace"), sha
+            pos = end + 1
+
+
+def read_packed_refs(repo: "Repository") -> PackedRefs:
+    """
+    Get a repository's packed-refs, cached while the file is unchanged.
+
+    Args:
+        repo: Repository instance
+
+    Returns:
+        The parsed file; empty if there is none
+    """
+    path = os.path.join(repo.ugit_dir, PACKED_REFS)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return PackedRefs(b"")
+    # Rewrites rename a new file into place, so the inode changes too
+    key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    cached = _packed_cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with _packed_lock:
+        try:
+            with open(path, "rb") as f:
+                packed = PackedRefs(f.read())
+        except OSError:
+            return PackedRefs(b"")
+        _packed_cache[path] = (key, packed)
+    return packed
+
+
+def read_ref(repo: "Repository", ref: str) -> Optional[str]:
+    """
+    Read the SHA a ref points at.
+
+    Args:
+        repo: Repository instance
+        ref: Full ref name, such as refs/heads/main
+
+    Returns:
+        The SHA, or None if the ref does not exist
+
+    Raises:
+        RefUpdateError: If the ref name is invalid
+    """
+    try:
+        with open(_ref_path(repo, ref), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except (IOError, OSError):
+        return read_packed_refs(repo).get(ref)
+
+
+def list_refs(
+    repo: "Repository", namespaces: Iterable[str] = ("refs/heads", "refs/tags")
+) -> Dict[str, str]:
+    """
+    List the refs of a repository, loose and packed, at any depth.
+
+    Args:
+        repo: Repository instance
+        namespaces: Ref directories to list, such as refs/tags
+
+    Returns:
+        Full ref names (such as refs/heads/main) mapped to SHAs, in name
+        order within each namespace
+    """
+    packed = read_packed_refs(repo)
+    refs: Dict[str, str] = {}
+    for namespace in namespaces:
+        found = dict(packed.items(namespace.rstrip("/") + "/"))
+        found.update(_loose_refs(repo, namespace))
+        for ref in sorted(found):
+            refs[ref] = found[ref]
+    return refs
+
+
+def _loose_refs(repo: "Repository", namespace: str) -> Iterator[Tuple[str, str]]:
+    """Walk the loose ref files of a namespace."""
+    base = os.path.join(repo.ugit_dir, *namespace.strip("/").split("/"))
+    for root, _, files in os.walk(base):
+        for name in files:
+            # Skip locks and atomic_write's temporary files
+            if name.endswith(LOCK_SUFFIX) or name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    sha = f.read().strip()
+            except (IOError, OSError, UnicodeDecodeError):
+                continue
+            if validate_sha(sha):
+                rel = os.path.relpath(path, base).replace(os.sep, "/")
+                yield f"{namespace.rstrip('/')}/{rel}", sha
+
+
+def update_ref(
+    repo: "Repository", ref: str, new_sha: str, old_sha: Optional[str]
+) -> None:
+    """
+    Point a ref at a new SHA if it still holds the expected old one.
+
+    Args:
+        repo: Repository instance
+        ref: Full ref name, such as refs/heads/main
+        new_sha: SHA to store
+        old_sha: SHA the ref must currently hold, or None if it must not
+            exist yet
+
+    Raises:
+        RefUpdateError: If the ref is locked or no longer holds old_sha
+    """
+    path = _ref_path(repo, ref)
+    lock_path = path + LOCK_SUFFIX
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        fd = os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError as e:
+        raise RefUpdateError(f"{ref} is locked by another update") from e
+
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            current = read_ref(repo, ref)
+            if current != old_sha:
+                raise RefUpdateError(
+                    f"{ref} is at {(current or 'nothing')[:8]}, "
+                    f"expected {(old_sha or 'nothing')[:8]}"
+                )
+            f.write(new_sha)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(lock_path, path)
+    except BaseException:
+        # Once renamed the lock is gone, and the name may already belong to
+        # the next updater, so only clean up a lock that is still ours
+        os.remove(lock_path)
+        raise
+
+
+def is_valid_ref_name(ref: str) -> bool:
+    """
+    Check that a full ref name names a file inside refs/.
+
+    Names can come from other repositories, so anything that could escape
+    the refs directory or clash with a lock file is refused.
+    """
+    parts = ref.split("/")
+    if len(parts) < 3 or parts[0] != "refs" or any(p in ("", ".", "..") for p in parts):
+        return False
+    return not ref.endswith(LOCK_SUFFIX) and "\\" not in ref and "\0" not in ref
+
+
+def _ref_path(repo: "Repository", ref: str) -> str:
+    """Get the file of a full ref name, refusing names outside refs/."""
+    if not is_valid_ref_name(ref):
+        raise RefUpdateError(f"Invalid ref name: {ref}")
+    return os.path.join(repo.ugit_dir, *ref.split("/"))
+
+
+def delete_refs(repo: "Repository", refs: Iterable[str]) -> List[str]:
+    """
+    Delete refs, loose and packed.
+
+    Args:
+        repo: Repository instance
+        refs: Full ref names
+
+    Returns:
+        The refs that existed
+
+    Raises:
+        RefUpdateError: If a name is invalid or packed-refs is locked
+    """
+    deleted: List[str] = []
+    packed_names = set()
+    packed = read_packed_refs(repo)
+    for ref in refs:
+        path = _ref_path(repo, ref)
+        existed = False
+        try:
+            os.remove(path)
+            existed = True
+        except FileNotFoundError:
+            pass
+        if packed.get(ref) is not None:
+            packed_names.add(ref)
+            existed = True
+        if existed:
+            deleted.append(ref)
+    if packed_names:
+        _rewrite_packed_refs(
+            repo,
+            lambda current: {
+                ref: sha for ref, sha in current.items() if ref not in packed_names
+            },
+        )
+    return deleted
+
+
+def pack_refs(repo: "Repository", all_refs: bool = False) -> int:
+    """
+    Move loose refs into packed-refs.
+
+    Tags are always packed, and any ref that is already packed is
+    refreshed; branches and remote-tracking refs only with all_refs, since
+    they move often and each move creates a loose file again. Packed loose
+    files are removed unless an update holds their lock.
+
+    Args:
+        repo: Repository instance
+        all_refs: Pack every ref under refs/
+
+    Returns:
+        Number of refs in packed-refs afterwards
+
+    Raises:
+        RefUpdateError: If packed-refs is locked
+    """
+    loose = dict(_loose_refs(repo, "refs"))
+
+    def merge(current: Dict[str, str]) -> Dict[str, str]:
+        for ref, sha in loose.items():
+            if all_refs or ref.startswith("refs/tags/") or ref in current:
+                current[ref] = sha
+        return current
+
+    packed = _rewrite_packed_refs(repo, merge)
+    for ref, sha in packed.items():
+        if loose.get(ref) == sha:
+            _prune_loose_ref(repo, ref, sha)
+    return len(packed)
+
+
+def _prune_loose_ref(repo: "Repository", ref: str, sha: str) -> None:
+    """Remove a loose ref file that still holds the packed SHA."""
+    path = _ref_path(repo, ref)
+    lock_path = path + LOCK_SUFFIX
+    try:
+        fd = os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        return  # Being updated; the loose value wins anyway
+    os.close(fd)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            if f.read().strip() == sha:
+                os.remove(path)
+    except (IOError, OSError):
+        pass
+    finally:
+        # The lock is never renamed here, so it is still ours to remove
+        os.remove(lock_path)
+
+
+def _rewrite_packed_refs(
+    repo: "Repository", change: Callable[[Dict[str, str]], Dict[str, str]]
+) -> Dict[str, str]:
+    """Rewrite packed-refs under its lock, sorted; returns the new content."""
+    path = os.path.join(repo.ugit_dir, PACKED_REFS)
+    lock_path = path + LOCK_SUFFIX
+    try:
+        fd = os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError as e:
+        raise RefUpdateError(f"{PACKED_REFS} is locked by another update") from e
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            refs = change(dict(read_packed_refs(repo).items()))
+            f.write(PACKED_REFS_HEADER)
+            for ref in sorted(refs):
+                f.write(f"{refs[ref]} {ref}\n".encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(lock_path, path)
+    except BaseException:
+        # After the rename the lock name may belong to the next rewriter
+        os.remove(lock_path)
+        raise
+    _packed_cache.pop(path, None)
+    return refs
@@ -7,10 +7,12 @@ and repository state operations.
 
 import os
 import sys
-from typing import Dict, Optional, Tuple
+from typing import Dict, Optional, Set, Tuple
 
 from ..utils.atomic import atomic_write_text
 from ..utils.cache import get_repo_cache
+from .exceptions import RefUpdateError
+from .refs import read_ref
 
 
 class Repository:
@@ -41,18 +43,12 @@ class Repository:
                 head_content = f.read().strip()
 
             if head_content.startswith("ref: "):
-                ref_path = head_content[5:]  # Remove "ref: " prefix
-                ref_file = os.path.join(self.ugit_dir, ref_path)
-                if os.path.exists(ref_file):
-                    with open(ref_file, "r", encoding="utf-8") as f:
-                        return f.read().strip()
-                else:
-                    # This case happens on the first commit of a new repository
-                    return None
+                # None on the first commit of a new repository
+                return read_ref(self, head_content[5:])
 
             # Detached HEAD
             return head_content if head_content else None
-        except (IOError, OSError, UnicodeDecodeError) as e:
+        except (IOError, OSError, UnicodeDecodeError, RefUpdateError) as e:
             print(f"Error reading HEAD: {e}", file=sys.stderr)
             return None
 
@@ -77,6 +73,26 @@ class Repository:
             raise RuntimeError(f"Failed to set HEAD reference: {e}")
 
 
+def stat_matches(entry: Tuple[str, float, int], stat: os.stat_result) -> bool:
+    """
+    Check whether an index entry's cached stat data matches a file.
+
+    Args:
+        entry: Index entry as a (SHA, mtime, size) tuple
+        stat: Result of os.stat() on the working tree file
+
+    Returns:
+        True if mtime and size are unchanged, so the content can be
+        assumed to still hash to the entry's SHA
+    """
+    _, mtime, size = entry
+    return stat.st_mtime == mtime and stat.st_size == size
+
+
+# Marker for index lines that flag an entry as skip-worktree (sparse checkout)
+SKIP_WORKTREE_PREFIX = "skip-worktree "
+
+
 class Index:
     """Manages the staging area (index) for a repository."""
 
@@ -91,6 +107,7 @@ class Index:
         self.index_path = os.path.join(repo.ugit_dir, "index")
         self._cache = get_repo_cache()
         self._cache_key = f"index:{self.index_path}"
+        self._skip_cache_key = f"index-skip-worktree:{self.index_path}"
 
     def read(self) -> Dict[str, Tuple[str, float, int]]:
         """
@@ -106,6 +123,7 @@ class Index:
             return cached  # type: ignore[no-any-return]
 
         index = {}
+        skip_worktree: Set[str] = set()
         if os.path.exists(self.index_path):
             try:
                 with open(self.index_path, "r", encoding="utf-8") as f:
@@ -114,6 +132,11 @@ class Index:
                         if not line:
                             continue
 
+                        # Flag lines never start with a hex SHA
+                        if line.startswith(SKIP_WORKTREE_PREFIX):
+                            skip_worktree.add(line[len(SKIP_WORKTREE_PREFIX) :])
+                            continue
+
                         # New format: sha mtime size path
                         parts = line.split(" ", 3)
                         if len(parts) != 4:
@@ -142,29 +165,60 @@ class Index:
                 print(f"Error reading index: {e}", file=sys.stderr)
 
         # Cache the result
+        self._cache.set(self._skip_cache_key, skip_worktree & set(index))
         self._cache.set(self._cache_key, index)
         return index
 
-    def write(self, index: Dict[str, Tuple[str, float, int]]) -> None:
+    def read_skip_worktree(self) -> Set[str]:
+        """
+        Read the set of paths flagged skip-worktree by sparse checkout.
+
+        Skip-worktree entries stay in the index (so commits keep them) but
+        are not expected to exist in the working directory.
+
+        Returns:
+            Set of index paths with the skip-worktree bit set
+        """
+        cached = self._cache.get(self._skip_cache_key)
+        if cached is None or self._cache.get(self._cache_key) is None:
+            self._cache.invalidate(self._cache_key)
+            self.read()
+            cached = self._cache.get(self._skip_cache_key)
+        return set(cached or ())
+
+    def write(
+        self,
+        index: Dict[str, Tuple[str, float, int]],
+        skip_worktree: Optional[Set[str]] = None,
+    ) -> None:
         """
         Write index to disk using atomic write operation.
 
         Args:
             index: Dictionary mapping file paths to (SHA, mtime, size) tuples.
+            skip_worktree: Paths to flag skip-worktree (None keeps the
+                current flags of paths that are still in the index)
 
         Raises:
             RuntimeError: If writing the index fails
         """
         try:
+            if skip_worktree is None:
+                skip_worktree = self.read_skip_worktree()
+
             # Build index content
             lines = []
             for path, (sha, mtime, size) in sorted(index.items()):
                 lines.append(f"{sha} {mtime} {size} {path}\n")
+            for path in sorted(skip_worktree):
+                if path in index:
+                    lines.append(f"{SKIP_WORKTREE_PREFIX}{path}\n")
 
             content = "".join(lines)
             atomic_write_text(self.index_path, content, create_dirs=True)
 
             # Invalidate cache
             self._cache.invalidate(self._cache_key)
+            self._cache.invalidate(self._skip_cache_key)
         except (IOError, OSError) as e:
             raise RuntimeError(f"Failed to write index: {e}")
@@ -0,0 +1,327 @@
+"""
+Object enumeration for transfers.
+
+list_objects() is ugit's equivalent of ``rev-list --objects wants --not
+haves``: it finds every object reachable from the wanted commits that is
+not already reachable from the commits the other side has.
+
+Commits are walked newest first from both sets at once. Commits reached
+from a "have" are marked uninteresting, and the walk stops as soon as only
+uninteresting commits are left to visit, so the cost is proportional to the
+new history rather than to all of it. Trees and blobs of the boundary
+commits (uninteresting parents of new commits) are subtracted, so unchanged
+files are never sent again.
+
+A blob size limit leaves large blobs out, for partial clones (see
+core.promisor); a limit of 0 leaves out every blob.
+
+Chunked files (see core.chunking) bring their chunks along, minus the
+chunks the boundary commits' files already share, so sending a new
+version of a large file costs the size of the edit.
+
+Shallow boundaries (see core.shallow) are respected on both sides: the
+walk never follows the parents of this repository's boundary commits, nor
+those of the other side's, whose history it does not have. A depth limit or
+a cutoff date makes the new commits themselves stop early, for shallow
+fetches.
+
+When the repository has reachability bitmaps (see core.bitmap), the
+objects to send are found as the wants' bitmap AND NOT the haves' instead
+of by walking. Bitmaps are not used for shallow transfers, nor when delta
+bases must be found for a thin pack.
+"""
+
+import heapq
+import json
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from ..utils.helpers import get_commit_parents, get_tree_files
+from .bitmap import find_reachable, load_bitmap
+from .chunking import chunk_references, uses_chunking
+from .objects import get_object, object_exists
+from .shallow import read_shallow
+
+if TYPE_CHECKING:
+    from .repository import Repository
+
+
+def list_objects(
+    repo: "Repository",
+    wants: Iterable[str],
+    haves: Iterable[str] = (),
+    delta_bases: Optional[Dict[str, str]] = None,
+    blob_limit: Optional[int] = None,
+    depth: Optional[int] = None,
+    since: Optional[float] = None,
+    shallow: Iterable[str] = (),
+) -> List[str]:
+    """
+    List the objects needed to go from the haves to the wants.
+
+    Args:
+        repo: Repository holding the objects
+        wants: Commit or tag SHAs the receiving side asked for
+        haves: Commit SHAs the receiving side already has; ones unknown
+            here are ignored
+        delta_bases: If given, filled with new blobs mapped to the blob at
+            the same path in a boundary commit, which the receiving side
+            has and can serve as a delta base
+        blob_limit: If given, blobs of this many bytes or more are left out
+        depth: If given, how many commits deep to go from each want
+        since: If given, leave out commits older than this (seconds since
+            the epoch), except the wants themselves
+        shallow: Boundary commits of the receiving side
+
+    Returns:
+        Object SHAs in pack order: tags, commits (newest first), trees,
+        then blobs
+
+    Raises:
+        ValueError: If a wanted object is missing or not a commit or tag
+    """
+    cache: Dict[str, Dict[str, Any]] = {}
+    tags: List[str] = []
+    commit_wants: List[str] = []
+    for sha in wants:
+        commit_sha = _peel_tags(repo, sha, tags, cache)
+        if commit_sha not in commit_wants:
+            commit_wants.append(commit_sha)
+
+    if delta_bases is None and depth is None and since is None and not shallow:
+        listed = _list_objects_bitmap(repo, tags + commit_wants, haves, blob_limit)
+        if listed is not None:
+            return listed
+
+    commits, edges = walk_commits(
+        repo, commit_wants, haves, cache, depth=depth, since=since, shallow=shallow
+    )
+
+    # Everything in the boundary trees is already on the other side
+    have_objects: Set[str] = set()
+    have_paths: Dict[str, str] = {}
+    for edge in edges:
+        tree_sha = _load_commit(repo, edge, cache).get("tree")
+        if tree_sha:
+            have_objects.add(tree_sha)
+            for path, blob_sha in _tree_files(repo, tree_sha).items():
+                have_objects.add(blob_sha)
+                have_paths.setdefault(path, blob_sha)
+
+    seen = set(have_objects)
+    trees: List[str] = []
+    blobs: List[str] = []
+    for commit_sha in commits:
+        tree_sha = _load_commit(repo, commit_sha, cache).get("tree")
+        if not tree_sha or tree_sha in seen:
+            continue
+        seen.add(tree_sha)
+        trees.append(tree_sha)
+        for path, blob_sha in _tree_files(repo, tree_sha).items():
+            if blob_sha not in seen:
+                seen.add(blob_sha)
+                if blob_limit is not None and (
+                    blob_limit == 0 or _blob_size(repo, blob_sha) >= blob_limit
+                ):
+                    continue
+                blobs.append(blob_sha)
+                if delta_bases is not None and path in have_paths:
+                    delta_bases[blob_sha] = have_paths[path]
+
+    # Only the chunks of large files that the other side lacks are sent
+    if blobs and uses_chunking(repo):
+        seen.update(chunk_references(repo, have_paths.values()))
+        for chunk_sha in chunk_references(repo, blobs):
+            if chunk_sha not in seen:
+                seen.add(chunk_sha)
+                if blob_limit is None or (
+                    blob_limit > 0 and _blob_size(repo, chunk_sha) < blob_limit
+                ):
+                    blobs.append(chunk_sha)
+
+    return tags + commits + trees + blobs
+
+
+def _list_objects_bitmap(
+    repo: "Repository",
+    wants: List[str],
+    haves: Iterable[str],
+    blob_limit: Optional[int],
+) -> Optional[List[str]]:
+    """List the objects to send with reachability bitmaps, if there are any."""
+    bitmap = load_bitmap(repo)
+    if bitmap is None:
+        return None
+    want_objects = find_reachable(repo, wants, bitmap)
+    have_objects = find_reachable(
+        repo, [sha for sha in haves if object_exists(sha, repo=repo)], bitmap
+    )
+    if want_objects is None or have_objects is None:
+        return None
+
+    listed = want_objects.objects_by_type(exclude=have_objects)
+    blobs = listed["blob"]
+    if blob_limit is not None:
+        blobs = [
+            sha
+            for sha in blobs
+            if blob_limit > 0 and _blob_size(repo, sha) < blob_limit
+        ]
+    return listed["tag"] + listed["commit"] + listed["tree"] + blobs
+
+
+def walk_commits(
+    repo: "Repository",
+    wants: Iterable[str],
+    haves: Iterable[str] = (),
+    cache: Optional[Dict[str, Dict[str, Any]]] = None,
+    depth: Optional[int] = None,
+    since: Optional[float] = None,
+    shallow: Iterable[str] = (),
+) -> Tuple[List[str], Set[str]]:
+    """
+    Find the commits reachable from the wants but not from the haves.
+
+    Args:
+        repo: Repository holding the commits
+        wants: Commit SHAs to start from
+        haves: Commit SHAs whose history should be excluded
+        cache: Parsed commits by SHA, shared with the caller
+        depth: If given, stop this many commits below each want
+        since: If given, stop at commits older than this timestamp
+        shallow: Boundary commits of the other side, whose parents it lacks
+
+    Returns:
+        Tuple of (new commits newest first, boundary commits). Boundary
+        commits are excluded commits whose trees the other side has:
+        excluded parents of new commits, and its shallow commits.
+
+    Raises:
+        ValueError: If a wanted commit is missing
+    """
+    commits_by_sha = cache if cache is not None else {}
+    their_shallow = set(shallow)
+    stop_at = read_shallow(repo) | their_shallow
+    heap: List[Tuple[float, int, str]] = []
+    queued: Set[str] = set()
+    uninteresting: Set[str] = set()
+    depths: Dict[str, int] = {}
+    counter = 0
+
+    def push(sha: str) -> None:
+        nonlocal counter
+        if sha in queued:
+            return
+        try:
+            commit = _load_commit(repo, sha, commits_by_sha)
+        except ValueError:
+            if sha in uninteresting:
+                return  # History the other side has and we do not
+            raise
+        queued.add(sha)
+        counter += 1
+        heapq.heappush(heap, (-_commit_time(commit), counter, sha))
+
+    for sha in haves:
+        if object_exists(sha, repo=repo):
+            uninteresting.add(sha)
+            push(sha)
+    want_list = list(wants)
+    for sha in want_list:
+        depths[sha] = 1
+        push(sha)
+
+    commits: List[str] = []
+    while heap and any(sha not in uninteresting for _, _, sha in heap):
+        _, _, sha = heapq.heappop(heap)
+        commit = _load_commit(repo, sha, commits_by_sha)
+        parents = [] if sha in stop_at else get_commit_parents(commit)
+        if sha in uninteresting:
+            for parent in parents:
+                uninteresting.add(parent)
+                push(parent)
+            continue
+
+        if since is not None and sha not in want_list:
+            if _commit_time(commit) < since:
+                continue  # Too old: its children become shallow
+        commits.append(sha)
+        if depth is not None and depths.get(sha, 1) >= depth:
+            continue  # Deep enough: this commit becomes shallow
+        for parent in parents:
+            parent_depth = depths.get(sha, 1) + 1
+            depths[parent] = min(depths.get(parent, parent_depth), parent_depth)
+            push(parent)
+
+    edges = {
+        parent
+        for sha in commits
+        for parent in get_commit_parents(_load_commit(repo, sha, commits_by_sha))
+        if parent in uninteresting
+    }
+    edges.update(sha for sha in their_shallow if sha in uninteresting)
+    # Clock skew can put an excluded commit on the list; drop it
+    commits = [sha for sha in commits if sha not in uninteresting]
+    return commits, edges
+
+
+def _peel_tags(
+    repo: "Repository", sha: str, tags: List[str], cache: Dict[str, Dict[str, Any]]
+) -> str:
+    """Follow annotated tags down to a commit, collecting the tag objects."""
+    while True:
+        try:
+            type_, data = get_object(sha, repo=repo)
+        except FileNotFoundError as e:
+            raise ValueError(f"Wanted object {sha} not found") from e
+        if type_ == "commit":
+            cache[sha] = json.loads(data.decode())
+            return sha
+        if type_ != "tag":
+            raise ValueError(f"Wanted object {sha} is a {type_}, not a commit")
+        if sha not in tags:
+            tags.append(sha)
+        sha = json.loads(data.decode())["object"]
+
+
+def _load_commit(
+    repo: "Repository", sha: str, cache: Dict[str, Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Load a commit, caching it since commits are immutable."""
+    commit = cache.get(sha)
+    if commit is None:
+        try:
+            type_, data = get_object(sha, repo=repo)
+        except FileNotFoundError as e:
+            raise ValueError(f"Commit {sha} not found") from e
+        if type_ != "commit":
+            raise ValueError(f"Object {sha} is a {type_}, not a commit")
+        commit = json.loads(data.decode())
+        cache[sha] = commit
+    return commit
+
+
+def _tree_files(repo: "Repository", tree_sha: str) -> Dict[str, str]:
+    try:
+        return get_tree_files(tree_sha, repo=repo)
+    except ValueError:
+        return {}
+
+
+def _blob_size(repo: "Repository", sha: str) -> int:
+    """Get the size of a blob (0 if it cannot be read)."""
+    try:
+        return len(get_object(sha, repo=repo)[1])
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def _commit_time(commit: Dict[str, Any]) -> float:
+    """Get a commit's timestamp as seconds since the epoch (0 if unknown)."""
+    timestamp: Optional[str] = commit.get("timestamp")
+    if not timestamp:
+        return 0.0
+    try:
+        return datetime.fromisoformat(timestamp.replace("Z", "+00:00")).timestamp()
+    except (ValueError, TypeError):
+        return 0.0
@@ -0,0 +1,156 @@
+"""
+Shallow repositories.
+
+A shallow clone or fetch cuts history off at a boundary. The boundary
+commits are listed in .ugit/shallow, one SHA per line. Their parents are
+not in the repository, so every history walker treats them as root commits
+instead of failing (or, in a partial clone, asking the promisor remote for
+the parent) when it reaches one.
+
+The boundary is recomputed by update_shallow() after a fetch: a commit
+reachable from a ref is shallow when one of its parents is missing.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, FrozenSet, Iterable, List, Set, Tuple
+
+from ..utils.atomic import atomic_write_text
+from ..utils.helpers import get_commit_parents
+from ..utils.validation import validate_sha
+from .exceptions import UgitError
+from .objects import get_object, object_exists
+
+if TYPE_CHECKING:
+    from .repository import Repository
+
+# Boundary file, relative to .ugit
+SHALLOW_FILE = "shallow"
+
+_shallow_cache: Dict[str, Tuple[int, FrozenSet[str]]] = {}
+_shallow_cache_lock = threading.Lock()
+
+
+def read_shallow(repo: "Repository") -> FrozenSet[str]:
+    """
+    Get the shallow boundary commits of a repository.
+
+    The file is cached until it changes, so walkers can call this freely.
+
+    Args:
+        repo: Repository instance
+
+    Returns:
+        Boundary commit SHAs, empty for a complete repository
+    """
+    path = os.path.join(repo.ugit_dir, SHALLOW_FILE)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return frozenset()
+
+    with _shallow_cache_lock:
+        cached = _shallow_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            shas = frozenset(line.strip() for line in f if validate_sha(line.strip()))
+    except (IOError, OSError):
+        return frozenset()
+
+    with _shallow_cache_lock:
+        _shallow_cache[path] = (mtime, shas)
+    return shas
+
+
+def write_shallow(repo: "Repository", shas: Iterable[str]) -> None:
+    """
+    Replace the shallow boundary; an empty boundary removes the file.
+
+    Args:
+        repo: Repository instance
+        shas: Boundary commit SHAs
+    """
+    path = os.path.join(repo.ugit_dir, SHALLOW_FILE)
+    boundary = sorted(set(shas))
+    if boundary:
+        atomic_write_text(path, "".join(f"{sha}\n" for sha in boundary))
+    elif os.path.exists(path):
+        os.remove(path)
+    with _shallow_cache_lock:
+        _shallow_cache.pop(path, None)
+
+
+def update_shallow(repo: "Repository", tips: Iterable[str]) -> Set[str]:
+    """
+    Recompute the shallow boundary from the commits present.
+
+    Every commit reachable from the tips is visited, so commits that were
+    shallow but whose parents have since been fetched drop off the list.
+
+    Args:
+        repo: Repository instance
+        tips: Commit or tag SHAs to walk from, normally every ref
+
+    Returns:
+        The new boundary
+    """
+    boundary: Set[str] = set()
+    visited: Set[str] = set()
+    stack: List[str] = [sha for sha in tips if object_exists(sha, repo=repo)]
+
+    while stack:
+        sha = stack.pop()
+        if sha in visited:
+            continue
+        visited.add(sha)
+        try:
+            type_, data = get_object(sha, repo=repo)
+            obj = json.loads(data.decode())
+        except (FileNotFoundError, ValueError):
+            continue
+        if type_ == "tag":
+            target = obj.get("object")
+            if target and object_exists(target, repo=repo):
+                stack.append(target)
+            continue
+        if type_ != "commit":
+            continue
+        for parent in get_commit_parents(obj):
+            if object_exists(parent, repo=repo):
+                stack.append(parent)
+            else:
+                boundary.add(sha)
+
+    write_shallow(repo, boundary)
+    return boundary
+
+
+def parse_since(value: str) -> float:
+    """
+    Parse a --shallow-since cutoff.
+
+    Args:
+        value: ISO 8601 date or date and time (UTC unless it has an
+            offset), or seconds since the epoch
+
+    Returns:
+        The cutoff as seconds since the epoch
+
+    Raises:
+        UgitError: If the value is not a date
+    """
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError as e:
+        raise UgitError(f"Invalid date: {value}") from e
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
@@ -0,0 +1,132 @@
+"""
+Cone-mode sparse checkout for ugit.
+
+A sparse checkout only materializes a set of directory "cones" in the
+working tree. A path is inside the sparse checkout when it is:
+
+- a file at the top level of the repository,
+- a file anywhere below one of the cone directories, or
+- a file directly inside a parent directory of a cone.
+
+Paths outside the cones stay in the index with their skip-worktree bit set,
+so commits keep them, but checkout never writes them and status, diff and
+add never look for them on disk.
+
+The cone list is stored one directory per line in .ugit/info/sparse-checkout.
+The file only exists while sparse checkout is enabled.
+"""
+
+import os
+from typing import TYPE_CHECKING, Iterable, List, Optional
+
+from ..utils.atomic import atomic_write_text
+
+if TYPE_CHECKING:
+    from .repository import Repository
+
+
+class SparseCones:
+    """Matches repository paths against a set of cone directories."""
+
+    def __init__(self, cones: Iterable[str]):
+        """
+        Initialize the matcher.
+
+        Args:
+            cones: Cone directories, relative to the repository root
+        """
+        self.cones = sorted({normalize_cone(cone) for cone in cones if cone})
+        self._recursive = tuple(cone + "/" for cone in self.cones)
+        # Parents of every cone: their direct children are included too
+        self._parents = {""}
+        for cone in self.cones:
+            parts = cone.split("/")
+            for i in range(1, len(parts)):
+                self._parents.add("/".join(parts[:i]))
+
+    def matches(self, path: str) -> bool:
+        """
+        Check whether a file belongs in the working tree.
+
+        Args:
+            path: File path relative to the repository root
+
+        Returns:
+            True if the file is inside the sparse checkout
+        """
+        if path.startswith(self._recursive):
+            return True
+        return path.rpartition("/")[0] in self._parents
+
+    def includes_directory(self, directory: str) -> bool:
+        """
+        Check whether a directory can contain files inside the checkout.
+
+        Used to prune working tree walks.
+
+        Args:
+            directory: Directory path relative to the repository root
+
+        Returns:
+            True if the directory has to be walked
+        """
+        directory = directory.strip("/")
+        if not directory or directory in self._parents:
+            return True
+        return (directory + "/").startswith(self._recursive)
+
+
+def normalize_cone(cone: str) -> str:
+    """Normalize a cone directory to a slash-separated relative path."""
+    cone = os.path.normpath(cone).replace(os.sep, "/").strip("/")
+    return "" if cone == "." else cone
+
+
+def _sparse_file(repo: "Repository") -> str:
+    return os.path.join(repo.ugit_dir, "info", "sparse-checkout")
+
+
+def read_sparse_cones(repo: "Repository") -> Optional[SparseCones]:
+    """
+    Read the sparse checkout cones of a repository.
+
+    Args:
+        repo: Repository instance
+
+    Returns:
+        Cone matcher, or None if sparse checkout is not enabled
+    """
+    path = _sparse_file(repo)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except (IOError, OSError):
+        return None
+    return SparseCones(line.strip() for line in lines if line.strip())
+
+
+def write_sparse_cones(repo: "Repository", cones: List[str]) -> SparseCones:
+    """
+    Enable sparse checkout with the given cones.
+
+    The working tree is not updated; re-run a checkout to apply the cones.
+
+    Args:
+        repo: Repository instance
+        cones: Cone directories, relative to the repository root
+
+    Returns:
+        The new cone matcher
+    """
+    matcher = SparseCones(cones)
+    content = "".join(f"{cone}\n" for cone in matcher.cones)
+    atomic_write_text(_sparse_file(repo), content, create_dirs=True)
+    return matcher
+
+
+def disable_sparse_checkout(repo: "Repository") -> None:
+    """Remove the sparse checkout cone file, if any."""
+    try:
+        os.remove(_sparse_file(repo))
+    except FileNotFoundError:
+        pass
@@ -7,8 +7,10 @@ from .helpers import (
     find_repository_root,
     format_timestamp,
     get_commit_data,
+    get_commit_parents,
     get_current_branch_name,
     get_tree_entries,
+    get_tree_files,
     safe_read_file,
     should_ignore_file,
     walk_files,
@@ -28,10 +30,12 @@ __all__ = [
     "safe_read_file",
     "ensure_repository",
     "get_commit_data",
+    "get_commit_parents",
     "get_current_branch_name",
     "should_ignore_file",
     "Config",
     "get_tree_entries",
+    "get_tree_files",
     "atomic_write",
     "atomic_write_text",
     "get_repo_cache",
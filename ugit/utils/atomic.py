@@ -3,12 +3,26 @@ Atomic file operations for ugit.
 
 Provides atomic write operations to prevent corruption during
 critical file updates (index, refs, config).
+
+How hard writes are pushed to disk is set by core.fsyncMethod:
+
+    none      never fsync; fastest, but a crash can lose recent writes
+    per-file  fsync every file before renaming it into place
+    batch     like per-file, except that bulk object writes (see
+              core.objects.object_write_batch) are flushed together
+              (the default)
 """
 
 import os
 import tempfile
 from pathlib import Path
-from typing import Union
+from typing import Dict, Optional, Tuple, Union
+
+FSYNC_METHODS = ("none", "per-file", "batch")
+DEFAULT_FSYNC_METHOD = "batch"
+
+# Config file path -> (mtime, fsync method), so writes don't re-read config
+_fsync_methods: Dict[str, Tuple[int, str]] = {}
 
 
 def atomic_write(
@@ -16,6 +30,7 @@ def atomic_write(
     content: Union[bytes, str],
     mode: str = "wb",
     create_dirs: bool = True,
+    fsync: Optional[bool] = None,
 ) -> None:
     """
     Atomically write content to a file.
@@ -28,6 +43,8 @@ def atomic_write(
         content: Content to write (bytes or str)
         mode: File mode ('wb' for bytes, 'w' for text)
         create_dirs: Whether to create parent directories if needed
+        fsync: Whether to fsync before renaming; None follows the
+            core.fsyncMethod of the repository holding the file
 
     Raises:
         OSError: If the write operation fails
@@ -55,11 +72,15 @@ def atomic_write(
         dir=str(temp_dir), prefix=f".{path.name}.tmp.", suffix=""
     )
 
+    if fsync is None:
+        fsync = _should_fsync(path)
+
     try:
         with os.fdopen(temp_fd, mode) as f:
             f.write(content_bytes)
-            f.flush()
-            os.fsync(f.fileno())  # Ensure data is written to disk
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())  # Ensure data is written to disk
 
         # Atomic rename
         os.replace(temp_path, file_path)
@@ -90,3 +111,61 @@ def atomic_write_text(
     atomic_write(
         file_path, content.encode(encoding), mode="wb", create_dirs=create_dirs
     )
+
+
+def get_fsync_method(ugit_dir: str) -> str:
+    """
+    Get a repository's core.fsyncMethod.
+
+    Args:
+        ugit_dir: Path to the repository's .ugit directory
+
+    Returns:
+        One of FSYNC_METHODS; unknown values fall back to the default
+    """
+    config_path = os.path.join(ugit_dir, "config")
+    try:
+        mtime = os.stat(config_path).st_mtime_ns
+    except OSError:
+        mtime = -1
+    cached = _fsync_methods.get(config_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    from .config import Config  # Config saves through atomic_write
+
+    method = Config(os.path.dirname(ugit_dir)).get("core", "fsyncMethod") or ""
+    method = method.strip().lower()
+    if method not in FSYNC_METHODS:
+        method = DEFAULT_FSYNC_METHOD
+    _fsync_methods[config_path] = (mtime, method)
+    return method
+
+
+def fsync_directory(path: str) -> None:
+    """
+    Flush a directory's entries, making renames into it durable.
+
+    Does nothing where directories cannot be opened, as on Windows.
+
+    Args:
+        path: Directory to flush
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _should_fsync(path: Path) -> bool:
+    """Check core.fsyncMethod for a file inside a repository's .ugit."""
+    for parent in path.absolute().parents:
+        if parent.name == ".ugit":
+            return get_fsync_method(str(parent)) != "none"
+    return True
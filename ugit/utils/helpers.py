@@ -2,7 +2,17 @@
 
 import fnmatch
 import os
-from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, cast
+import shutil
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    cast,
+)
 
 if TYPE_CHECKING:
     from ..core.repository import Repository
@@ -43,7 +53,9 @@ def format_timestamp(timestamp: str) -> str:
 
 
 def walk_files(
-    directory: str = ".", ignore_patterns: Optional[list] = None
+    directory: str = ".",
+    ignore_patterns: Optional[list] = None,
+    include_dir: Optional[Callable[[str], bool]] = None,
 ) -> Iterator[str]:
     """
     Walk files in directory, respecting ignore patterns.
@@ -51,6 +63,8 @@ def walk_files(
     Args:
         directory: Directory to walk
         ignore_patterns: Patterns to ignore (defaults to ['.ugit'])
+        include_dir: Optional predicate on relative directory paths; a
+            directory is not descended into when it returns False
 
     Yields:
         Relative file paths
@@ -65,6 +79,10 @@ def walk_files(
             for d in dirs
             if not any(d.startswith(pattern) for pattern in ignore_patterns)
         ]
+        if include_dir is not None:
+            rel_root = os.path.relpath(root, directory)
+            prefix = "" if rel_root == "." else rel_root.replace(os.sep, "/") + "/"
+            dirs[:] = [d for d in dirs if include_dir(prefix + d)]
 
         for file in files:
             file_path = os.path.relpath(os.path.join(root, file), directory)
@@ -95,6 +113,35 @@ def safe_read_file(path: str) -> bytes:
         raise RuntimeError(f"Cannot read file {path}: {e}")
 
 
+def link_or_copy(source: str, dest: str, hardlink: bool = True) -> bool:
+    """
+    Hardlink a file into place, falling back to a copy.
+
+    Objects are immutable once written, so sharing an inode between
+    repositories is safe. Hardlinks fail across filesystems or on
+    filesystems without link support, in which case the file is copied.
+
+    Args:
+        source: Existing file
+        dest: Path to create (its directory must exist)
+        hardlink: Try a hardlink before copying
+
+    Returns:
+        True if the file was hardlinked, False if it was copied
+
+    Raises:
+        OSError: If the file can be neither linked nor copied
+    """
+    if hardlink:
+        try:
+            os.link(source, dest)
+            return True
+        except OSError:
+            pass  # Cross-device, unsupported or existing: copy instead
+    shutil.copy2(source, dest)
+    return False
+
+
 def ensure_repository() -> "Repository":
     """
     Ensure we're in a repository and return Repository instance.
@@ -197,6 +244,26 @@ def get_commit_data(
         raise ValueError(f"Invalid commit {commit_sha}: {e}")
 
 
+def get_commit_parents(commit: Dict[str, Any]) -> List[str]:
+    """
+    Get every parent of a commit, merge parents included.
+
+    Args:
+        commit: Parsed commit data
+
+    Returns:
+        Parent SHAs in order, without duplicates
+    """
+    parents: List[str] = []
+    candidates = [commit.get("parent")]
+    candidates.extend(commit.get("parents") or [])
+    candidates.append(commit.get("parent2"))
+    for parent in candidates:
+        if parent and isinstance(parent, str) and parent not in parents:
+            parents.append(parent)
+    return parents
+
+
 def get_tree_entries(
     tree_sha: str, repo: Optional["Repository"] = None
 ) -> List[tuple[str, str, str]]:
@@ -229,6 +296,47 @@ def get_tree_entries(
         raise ValueError(f"Invalid tree {tree_sha}: {e}")
 
 
+def get_tree_files(
+    tree_sha: str, repo: Optional["Repository"] = None
+) -> Dict[str, str]:
+    """
+    Get the flat path -> blob SHA listing of a tree object.
+
+    Unlike get_tree_entries, this does not read every entry to work out
+    its mode, so it only inflates the tree object itself.
+
+    Args:
+        tree_sha: SHA of the tree
+        repo: Repository instance (optional, defaults to current repo)
+
+    Returns:
+        Dictionary mapping file paths to blob SHAs
+
+    Raises:
+        ValueError: If the object is missing or not a valid tree
+    """
+    import json
+
+    from ..core.objects import get_object
+    from ..core.repository import Repository
+
+    if repo is None:
+        repo = Repository()
+
+    try:
+        tree_type, tree_content = get_object(tree_sha, repo=repo)
+        if tree_type != "tree":
+            raise ValueError(f"Object {tree_sha} is not a tree")
+        entries = json.loads(tree_content.decode())
+    except (FileNotFoundError, json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid tree {tree_sha}: {e}")
+
+    # Commits store a list of [path, sha] pairs, merges store a mapping
+    if isinstance(entries, dict):
+        return {str(path): str(sha) for path, sha in entries.items()}
+    return {str(path): str(sha) for path, sha in entries}
+
+
 def should_ignore_file(file_path: str, ignored_patterns: List[str]) -> bool:
     """Check if a file should be ignored based on patterns."""
     for pattern in ignored_patterns:
@@ -286,6 +394,19 @@ def get_current_branch_name(repo: Optional["Repository"] = None) -> Optional[str
     return _get_current_branch(repo)
 
 
+def is_http_url(url: str) -> bool:
+    """
+    Check if a URL points to an HTTP(S) remote.
+
+    Args:
+        url: URL or path to check
+
+    Returns:
+        True if URL uses http:// or https://
+    """
+    return url.startswith(("http://", "https://"))
+
+
 def is_local_path(url: str) -> bool:
     """
     Check if a URL represents a local file path.
@@ -316,6 +437,9 @@ def is_ancestor(repo: "Repository", ancestor_sha: str, descendant_sha: str) -> b
     if ancestor_sha == descendant_sha:
         return True
 
+    from ..core.shallow import read_shallow
+
+    shallow = read_shallow(repo)
     visited = set()
     stack = [descendant_sha]
 
@@ -327,6 +451,8 @@ def is_ancestor(repo: "Repository", ancestor_sha: str, descendant_sha: str) -> b
             return True
 
         visited.add(current)
+        if current in shallow:
+            continue  # Parents are beyond the shallow boundary
 
         try:
             commit_data = get_commit_data(current, repo=repo)
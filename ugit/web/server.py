@@ -6,18 +6,42 @@ import json
 import os
 import re
 import sys
+import tempfile
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 from ugit.commands.blame import _get_blame_data
 from ugit.commands.diff import _get_commit_files
 from ugit.commands.grep import _search_tree
+from ugit.core.exceptions import UgitError
+from ugit.core.lfs import (
+    BLOCK_SIZE,
+    is_valid_oid,
+    lfs_object_exists,
+    lfs_object_path,
+    store_lfs_object,
+)
 from ugit.core.objects import get_object
+from ugit.core.pack import new_temp_pack_path
+from ugit.core.protocol import (
+    MAX_PUSH_COMMANDS_SIZE,
+    PACK_MEDIA_TYPE,
+    advertise_refs,
+    decode_push_commands,
+    pack_etag,
+    receive_pack,
+    receive_pack_enabled,
+    resume_offset,
+    upload_objects,
+    upload_pack,
+)
+from ugit.core.refs import list_refs
 from ugit.core.repository import Repository
 from ugit.utils.helpers import get_commit_data, get_tree_entries
 
@@ -711,15 +735,10 @@ class UgitWebServer:
             """Get general repository information"""
             try:
                 # Get branch information
-                branches = []
-                heads_dir = os.path.join(self.repo_path, ".ugit", "refs", "heads")
-                if os.path.exists(heads_dir):
-                    for root, dirs, files in os.walk(heads_dir):
-                        for file in files:
-                            branch_path = os.path.relpath(
-                                os.path.join(root, file), heads_dir
-                            )
-                            branches.append(branch_path.replace(os.sep, "/"))
+                branches = [
+                    ref[len("refs/heads/") :]
+                    for ref in list_refs(self.repo, ("refs/heads",))
+                ]
 
                 # Get current branch
                 current_branch = None
@@ -781,6 +800,139 @@ class UgitWebServer:
             except Exception as e:
                 raise HTTPException(status_code=500, detail=str(e))
 
+        @self.app.get("/ugit/info/refs")
+        def info_refs() -> Any:
+            """Advertise branches and tags to fetching clients"""
+            if not self.repo.is_repository():
+                raise HTTPException(status_code=404, detail="Not a ugit repository")
+            return advertise_refs(self.repo)
+
+        @self.app.post("/ugit/upload-pack")
+        async def serve_upload_pack(request: Request) -> Any:
+            """Send a pack with the objects a client is missing"""
+            try:
+                body = await request.json()
+                wants = list(body.get("wants", []))
+                haves = list(body.get("haves", []))
+                filter_spec = body.get("filter")
+                depth = body.get("depth")
+                since = body.get("since")
+                shallow = [str(sha) for sha in body.get("shallow", [])]
+            except (ValueError, AttributeError, TypeError):
+                raise HTTPException(status_code=400, detail="Invalid request body")
+
+            # Spool the pack so errors surface before the response starts; pack
+            # building blocks, so it runs off the event loop
+            pack_file = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+            try:
+                await run_in_threadpool(
+                    upload_pack,
+                    self.repo,
+                    wants,
+                    haves,
+                    pack_file,
+                    filter_spec=filter_spec,
+                    depth=depth,
+                    since=since,
+                    shallow=shallow,
+                )
+            except UgitError as e:
+                pack_file.close()
+                raise HTTPException(status_code=400, detail=str(e))
+            return _pack_response(pack_file, request)
+
+        @self.app.post("/ugit/objects")
+        async def serve_objects(request: Request) -> Any:
+            """Send a pack of specific objects, for batched object fetches"""
+            try:
+                body = await request.json()
+                shas = list(body.get("shas", []))
+            except (ValueError, AttributeError, TypeError):
+                raise HTTPException(status_code=400, detail="Invalid request body")
+
+            pack_file = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+            try:
+                await run_in_threadpool(upload_objects, self.repo, shas, pack_file)
+            except UgitError as e:
+                pack_file.close()
+                raise HTTPException(status_code=400, detail=str(e))
+            return _pack_response(pack_file, request)
+
+        @self.app.post("/ugit/receive-pack")
+        async def serve_receive_pack(request: Request) -> Any:
+            """Accept a pushed pack and apply its ref updates"""
+            if not receive_pack_enabled(self.repo):
+                raise HTTPException(
+                    status_code=403,
+                    detail="Pushing is disabled, set http.receivepack to enable it",
+                )
+            commands = b""
+            pack_path = None
+            pack_file = None
+            try:
+                # The first line holds the ref updates, the pack follows
+                async for chunk in request.stream():
+                    if pack_file is not None:
+                        pack_file.write(chunk)
+                        continue
+                    commands += chunk
+                    if b"\n" in commands:
+                        commands, rest = commands.split(b"\n", 1)
+                        pack_path = new_temp_pack_path(self.repo)
+                        pack_file = open(pack_path, "wb")
+                        pack_file.write(rest)
+                    elif len(commands) > MAX_PUSH_COMMANDS_SIZE:
+                        raise HTTPException(status_code=400, detail="Invalid push")
+                if pack_file is None or pack_path is None:
+                    raise HTTPException(status_code=400, detail="Invalid push")
+                pack_file.close()
+
+                updates = decode_push_commands(commands)
+                received = pack_path if os.path.getsize(pack_path) else None
+                results = await run_in_threadpool(
+                    receive_pack, self.repo, received, updates
+                )
+            except UgitError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            finally:
+                if pack_file is not None:
+                    pack_file.close()
+                if pack_path is not None and os.path.exists(pack_path):
+                    os.remove(pack_path)
+            return {"results": results}
+
+        @self.app.api_route("/ugit/lfs/objects/{oid}", methods=["GET", "HEAD"])
+        async def serve_lfs_object(oid: str) -> Any:
+            """Send the content of an LFS object"""
+            if not is_valid_oid(oid) or not lfs_object_exists(self.repo, oid):
+                raise HTTPException(status_code=404, detail="LFS object not found")
+            return FileResponse(
+                lfs_object_path(self.repo, oid), media_type="application/octet-stream"
+            )
+
+        @self.app.put("/ugit/lfs/objects/{oid}")
+        async def serve_lfs_upload(oid: str, request: Request) -> Any:
+            """Store an uploaded LFS object once its SHA-256 checks out"""
+            if not receive_pack_enabled(self.repo):
+                raise HTTPException(
+                    status_code=403,
+                    detail="Pushing is disabled, set http.receivepack to enable it",
+                )
+            if not is_valid_oid(oid):
+                raise HTTPException(status_code=400, detail="Invalid LFS object ID")
+            upload = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+            try:
+                async for chunk in request.stream():
+                    upload.write(chunk)
+                upload.seek(0)
+                blocks = iter(lambda: upload.read(BLOCK_SIZE), b"")
+                await run_in_threadpool(store_lfs_object, self.repo, blocks, oid)
+            except UgitError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            finally:
+                upload.close()
+            return {"oid": oid}
+
     def _is_binary_data(self, data: bytes) -> bool:
         """More robust binary file detection"""
         if not data:
@@ -1065,6 +1217,41 @@ class UgitWebServer:
             return None
 
 
+def _pack_response(pack_file: Any, request: Request) -> StreamingResponse:
+    """Stream a spooled pack back to the client, closing it when done
+
+    The pack's trailer checksum is sent as its ETag. A request with
+    "Range: bytes=N-" and a matching If-Range resumes an interrupted
+    download and gets only the bytes from N on.
+    """
+    etag = pack_etag(pack_file)
+    size = pack_file.tell()
+    offset = resume_offset(
+        request.headers.get("range"), request.headers.get("if-range"), etag, size
+    )
+    headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+    status_code = 200
+    if offset:
+        headers["Content-Range"] = f"bytes {offset}-{size - 1}/{size}"
+        status_code = 206
+    pack_file.seek(offset)
+
+    def stream() -> Any:
+        with pack_file:
+            while True:
+                chunk = pack_file.read(64 * 1024)
+                if not chunk:
+                    break
+                yield chunk
+
+    return StreamingResponse(
+        stream(),
+        status_code=status_code,
+        headers=headers,
+        media_type=PACK_MEDIA_TYPE,
+    )
+
+
 def create_app(repo_path: str = ".") -> FastAPI:
     """Create and configure the FastAPI application"""
     server = UgitWebServer(repo_path)